@@ -20,6 +20,7 @@ from backend.api.models_routes import (
     track_task_status,
 )
 from backend.domain.entities.docker.task_build_statuses import TaskBuildStatuses
+from backend.domain.entities.serving_config import ServingConfig
 from backend.domain.ports.dashboard_handler import DashboardHandler
 from backend.domain.ports.registry_handler import RegistryHandler
 from backend.domain.ports.user_handler import UserHandler
@@ -36,6 +37,8 @@ class DeployAgentRequest(BaseModel):
     leave empty when redeploying an agent whose Secret already exists in-cluster."""
 
     secrets: dict[str, str] = {}
+    # Serving-app tuning for this deployment (admission control, ...)
+    serving: ServingConfig = ServingConfig()
 
 
 @router.get("/list")
@@ -128,6 +131,7 @@ def route_deploy_agent(
         current_user["email"],
         agent_registry,
         payload.secrets,
+        payload.serving,
     )
     return JSONResponse({"task_id": task_id, "status": "Agent deployment initiated"}, media_type="application/json")
 
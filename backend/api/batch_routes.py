@@ -1,12 +1,13 @@
 # Philippe Stepniewski
 import inspect
 import uuid
+from typing import Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, UploadFile
 from loguru import logger
 from starlette.responses import JSONResponse, Response
 
-from backend.domain.entities.batch_prediction import BatchPredictionStatus
+from backend.domain.entities.batch_prediction import BatchFileFormat, BatchPredictionStatus
 from backend.domain.ports.batch_prediction_handler import BatchPredictionHandler
 from backend.domain.ports.object_storage_handler import ObjectStorageHandler
 from backend.domain.ports.project_db_handler import ProjectDbHandler
@@ -26,6 +27,9 @@ from backend.utils import sanitize_project_name
 
 router = APIRouter()
 
+# Pods of a sharded batch job (Kubernetes Indexed Job)
+MAX_BATCH_SHARDS = 64
+
 
 def get_batch_handler(request: Request) -> BatchPredictionHandler:
     return request.app.state.batch_handler
@@ -63,6 +67,9 @@ def _run_batch_submission(
     object_storage: ObjectStorageHandler,
     batch_handler: BatchPredictionHandler,
     project_db_handler: ProjectDbHandler,
+    output_format: Optional[BatchFileFormat] = None,
+    shards: int = 1,
+    parallelism: Optional[int] = None,
 ):
     try:
         tasks_status[job_id] = BatchPredictionStatus.BUILDING.value
@@ -76,6 +83,9 @@ def _run_batch_submission(
             batch_handler=batch_handler,
             project_db_handler=project_db_handler,
             registry=registry,
+            output_format=output_format,
+            shards=shards,
+            parallelism=parallelism,
         )
         del tasks_status[job_id]
     except Exception as e:
@@ -91,6 +101,13 @@ async def route_submit_batch(
     request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    output_format: Optional[BatchFileFormat] = Query(
+        None, description="csv, parquet (zstd) or arrow; the format of the uploaded file by default"
+    ),
+    shards: int = Query(1, ge=1, le=MAX_BATCH_SHARDS, description="Input shards, each predicted by its own pod"),
+    parallelism: Optional[int] = Query(
+        None, ge=1, le=MAX_BATCH_SHARDS, description="Shard pods running at once, all of them by default"
+    ),
     batch_handler: BatchPredictionHandler = Depends(get_batch_handler),
     object_storage: ObjectStorageHandler = Depends(get_object_storage_handler),
     project_db_handler: ProjectDbHandler = Depends(get_project_db_handler),
@@ -124,6 +141,9 @@ async def route_submit_batch(
         object_storage,
         batch_handler,
         project_db_handler,
+        output_format,
+        shards,
+        parallelism,
     )
 
     return JSONResponse(
@@ -137,6 +157,7 @@ def route_batch_status(
     project_name: str,
     job_id: str,
     batch_handler: BatchPredictionHandler = Depends(get_batch_handler),
+    object_storage: ObjectStorageHandler = Depends(get_object_storage_handler),
     tasks_status: dict = Depends(get_tasks_status),
     user_adapter: UserHandler = Depends(get_user_adapter),
     current_user: dict = Depends(get_current_user),
@@ -161,7 +182,7 @@ def route_batch_status(
                 media_type="application/json",
             )
 
-    result = get_batch_prediction_status(project_name, job_id, batch_handler)
+    result = get_batch_prediction_status(project_name, job_id, batch_handler, object_storage)
     return JSONResponse(content=result, media_type="application/json")
 
 
@@ -198,11 +219,11 @@ def route_download_batch(
         user_adapter=user_adapter,
     )
     try:
-        content = download_batch_result(project_name, job_id, batch_handler, object_storage)
+        filename, content = download_batch_result(project_name, job_id, batch_handler, object_storage)
         return Response(
             content=content,
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=predictions-{job_id}.csv"},
+            media_type=BatchFileFormat.from_path(filename).media_type,
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
         )
     except Exception as e:
         logger.error(f"Failed to download batch result: {e}")
@@ -9,7 +9,7 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from loguru import logger
 
-from backend.domain.entities.metrics import FleetMetrics, ModelMetrics
+from backend.domain.entities.metrics import FleetMetrics, ModelMetrics, VersionComparison
 from backend.domain.ports.metrics_handler import MetricsHandler
 from backend.domain.ports.user_handler import UserHandler
 from backend.domain.use_cases import metrics_usecases
@@ -101,6 +101,54 @@ async def get_model_metrics(
         raise HTTPException(status_code=503, detail="Prometheus service unavailable")
 
 
+@router.get("/models/{model_id}/versions", response_model=VersionComparison)
+async def get_version_comparison(
+    model_id: str,
+    period: str = Query("1d", regex="^(15m|30m|1h|6h|1d|7d|30d)$"),
+    metrics_handler: MetricsHandler = Depends(get_metrics_handler),
+) -> VersionComparison:
+    """Compare the model versions sharing a deployment's traffic (shadow or canary).
+
+    Parameters
+    ----------
+    model_id : str
+        Deployed model identifier of the incumbent (from K8s deployment)
+    period : str
+        Time window for aggregation (default: '1d')
+    metrics_handler : MetricsHandler
+        Injected metrics handler (Prometheus adapter)
+
+    Returns
+    -------
+    VersionComparison
+        Requests, p50/p95 latency per version, and shadow agreement rate of the candidates
+
+    Raises
+    ------
+    404 Not Found
+        If the deployment's traffic was not split in period
+    503 Service Unavailable
+        If Prometheus unavailable or query fails
+    422 Unprocessable Entity
+        If period parameter invalid
+    """
+    try:
+        logger.debug(f"GET /api/metrics/models/{model_id}/versions?period={period}")
+
+        result = await metrics_usecases.get_version_comparison(
+            model_id=model_id, period=period, metrics_handler=metrics_handler
+        )
+        logger.info(f"Retrieved version comparison for {model_id}")
+        return result
+
+    except ValueError as e:
+        logger.warning(f"No version comparison for {model_id}")
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to retrieve version comparison: {e}")
+        raise HTTPException(status_code=503, detail="Prometheus service unavailable")
+
+
 @router.get("/fleet", response_model=FleetMetrics)
 async def get_fleet_metrics(
     project_name: Optional[str] = None,
@@ -7,20 +7,32 @@ import inspect
 import logging
 import uuid
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from loguru import logger
 
 from backend.domain.entities.docker.task_build_statuses import TaskBuildStatuses
+from backend.domain.entities.serving_config import ServingConfig
 from backend.domain.ports.dashboard_handler import DashboardHandler
 from backend.domain.ports.model_info_db_handler import ModelInfoDbHandler
 from backend.domain.ports.model_registry import ModelRegistry
+from backend.domain.ports.object_storage_handler import ObjectStorageHandler
 from backend.domain.ports.platform_config_handler import PlatformConfigHandler
 from backend.domain.ports.registry_handler import RegistryHandler
 from backend.domain.ports.user_handler import UserHandler
 from backend.domain.use_cases.auth_usecases import get_current_user, get_user_adapter
 from backend.domain.use_cases.compliance_usecases import check_deployment_gate, evaluate_project_compliance
-from backend.domain.use_cases.deploy_model import deploy_model, remove_model_deployment
+from backend.domain.use_cases.deploy_model import (
+    HOT_SWAP_REDEPLOYED,
+    deploy_model,
+    deploy_model_to_multi_model_pod,
+    hot_swap_model,
+    remove_model_deployment,
+    remove_multi_model_deployment,
+    split_traffic,
+    stop_traffic_split,
+)
+from backend.domain.use_cases.traffic_replay import DEFAULT_STEP_SECONDS, replay_traffic
 from backend.domain.use_cases.user_usecases import user_can_perform_action_for_project
 from backend.infrastructure.model_info_sqlite_db_handler import ModelInfoDoesntExistError
 from backend.utils import sanitize_project_name
@@ -28,7 +40,7 @@ from backend.utils import sanitize_project_name
 router = APIRouter()
 
 
-def track_task_status(task_id: str, tasks_status: dict):
+def track_task_status(task_id: str, tasks_status: dict, statuses: dict | None = None):
     """
     Decorator to track the status of a background task.
 
@@ -36,6 +48,8 @@ def track_task_status(task_id: str, tasks_status: dict):
     ----------
     task_id : str
         The unique identifier for the task.
+    statuses : dict, optional
+        Status of the task for return codes of the target function other than 1 (completed) and 0 (failed).
 
     Returns
     -------
@@ -70,6 +84,8 @@ def track_task_status(task_id: str, tasks_status: dict):
                 result = func(*args, **kwargs)
                 if result == 1:
                     tasks_status[task_id] = TaskBuildStatuses.completed
+                elif statuses and result in statuses:
+                    tasks_status[task_id] = statuses[result]
                 else:
                     tasks_status[task_id] = TaskBuildStatuses.failed
                 # Only works if in memory task tracker. In multiple runners, we need to retrieve the status from the
@@ -117,6 +133,10 @@ def get_platform_config_handler(request: Request) -> PlatformConfigHandler:
     return request.app.state.platform_config_handler
 
 
+def get_object_storage_handler(request: Request) -> ObjectStorageHandler:
+    return request.app.state.object_storage_handler
+
+
 @router.get("/list")
 def list_models(
     project_name: str,
@@ -161,6 +181,22 @@ def list_model_versions(
     return JSONResponse(content=model_versions, media_type="application/json")
 
 
+def _check_deployment_gate(
+    project_name: str,
+    model_name: str,
+    version: str,
+    model_info_db_handler: ModelInfoDbHandler,
+    platform_config_handler: PlatformConfigHandler,
+) -> None:
+    try:
+        model_info = model_info_db_handler.get_model_info(model_name, version, project_name)
+        allowed, reason = check_deployment_gate(model_info, platform_config_handler)
+        if not allowed:
+            raise HTTPException(status_code=403, detail=reason)
+    except ModelInfoDoesntExistError:
+        logger.info(f"No model_info found for {model_name}:{version}, skipping compliance gate check")
+
+
 @router.get("/deploy/{model_name}/{version}")
 def route_deploy_model(
     project_name: str,
@@ -168,6 +204,7 @@ def route_deploy_model(
     version: str,
     request: Request,
     background_tasks: BackgroundTasks,
+    serving_config: ServingConfig = Depends(),
     registry_pool: RegistryHandler = Depends(get_registry_pool),
     tasks_status: dict = Depends(get_tasks_status),
     current_user: dict = Depends(get_current_user),
@@ -184,14 +221,7 @@ def route_deploy_model(
         user_adapter=user_adapter,
     )
 
-    # Compliance gate check
-    try:
-        model_info = model_info_db_handler.get_model_info(model_name, version, project_name)
-        allowed, reason = check_deployment_gate(model_info, platform_config_handler)
-        if not allowed:
-            raise HTTPException(status_code=403, detail=reason)
-    except ModelInfoDoesntExistError:
-        logger.info(f"No model_info found for {model_name}:{version}, skipping compliance gate check")
+    _check_deployment_gate(project_name, model_name, version, model_info_db_handler, platform_config_handler)
 
     registry: ModelRegistry = registry_pool.get_registry_adapter(
         project_name, get_project_registry_tracking_uri(project_name, request)
@@ -201,12 +231,253 @@ def route_deploy_model(
     logger.debug(f"Deploying {model_name}:{version} with task_id: {task_id}")
     decorated_task = track_task_status(task_id, tasks_status)(deploy_model)
     background_tasks.add_task(
-        decorated_task, registry, project_name, model_name, version, dashboard_handler, current_user["email"]
+        decorated_task,
+        registry,
+        project_name,
+        model_name,
+        version,
+        dashboard_handler,
+        current_user["email"],
+        serving_config,
+        model_info_db_handler,
     )
 
     return JSONResponse({"task_id": task_id, "status": "Deployment initiated"}, media_type="application/json")
 
 
+@router.get("/deploy_multi_model/{model_name}/{version}")
+def route_deploy_model_to_multi_model_pod(
+    project_name: str,
+    model_name: str,
+    version: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    serving_config: ServingConfig = Depends(),
+    registry_pool: RegistryHandler = Depends(get_registry_pool),
+    tasks_status: dict = Depends(get_tasks_status),
+    current_user: dict = Depends(get_current_user),
+    user_adapter: UserHandler = Depends(get_user_adapter),
+    model_info_db_handler: ModelInfoDbHandler = Depends(get_model_info_db_handler),
+    platform_config_handler: PlatformConfigHandler = Depends(get_platform_config_handler),
+) -> JSONResponse:
+    """Serve the version from the project's multi-model pod for its dependency set, instead of its own pod."""
+    logger.debug(f"Got multi-model deploy call on {project_name}, {model_name}:{version}")
+    user_can_perform_action_for_project(
+        current_user,
+        project_name=project_name,
+        action_name=inspect.currentframe().f_code.co_name,
+        user_adapter=user_adapter,
+    )
+    _check_deployment_gate(project_name, model_name, version, model_info_db_handler, platform_config_handler)
+
+    registry: ModelRegistry = registry_pool.get_registry_adapter(
+        project_name, get_project_registry_tracking_uri(project_name, request)
+    )
+    task_id = str(uuid.uuid4())
+    tasks_status[task_id] = "queued"
+    decorated_task = track_task_status(task_id, tasks_status)(deploy_model_to_multi_model_pod)
+    background_tasks.add_task(
+        decorated_task,
+        registry,
+        project_name,
+        model_name,
+        version,
+        current_user["email"],
+        serving_config,
+    )
+
+    return JSONResponse({"task_id": task_id, "status": "Deployment initiated"}, media_type="application/json")
+
+
+@router.get("/hot_swap/{model_name}/{deployed_version}/{version}")
+def route_hot_swap_model(
+    project_name: str,
+    model_name: str,
+    deployed_version: str,
+    version: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    serving_config: ServingConfig = Depends(),
+    registry_pool: RegistryHandler = Depends(get_registry_pool),
+    tasks_status: dict = Depends(get_tasks_status),
+    current_user: dict = Depends(get_current_user),
+    user_adapter: UserHandler = Depends(get_user_adapter),
+    dashboard_handler: DashboardHandler = Depends(get_dashboard_handler),
+    model_info_db_handler: ModelInfoDbHandler = Depends(get_model_info_db_handler),
+    platform_config_handler: PlatformConfigHandler = Depends(get_platform_config_handler),
+) -> JSONResponse:
+    """Serve `version` from the running deployment of `deployed_version`; the serving settings only apply if the
+    version needs a regular deployment (other dependencies or signature)."""
+    logger.debug(f"Got hot swap call on {project_name}, {model_name}:{deployed_version} -> {version}")
+    user_can_perform_action_for_project(
+        current_user,
+        project_name=project_name,
+        action_name=inspect.currentframe().f_code.co_name,
+        user_adapter=user_adapter,
+    )
+    _check_deployment_gate(project_name, model_name, version, model_info_db_handler, platform_config_handler)
+
+    registry: ModelRegistry = registry_pool.get_registry_adapter(
+        project_name, get_project_registry_tracking_uri(project_name, request)
+    )
+    task_id = str(uuid.uuid4())
+    tasks_status[task_id] = "queued"
+    decorated_task = track_task_status(task_id, tasks_status, {HOT_SWAP_REDEPLOYED: TaskBuildStatuses.redeployed})(
+        hot_swap_model
+    )
+    background_tasks.add_task(
+        decorated_task,
+        registry,
+        project_name,
+        model_name,
+        deployed_version,
+        version,
+        dashboard_handler,
+        current_user["email"],
+        serving_config,
+        model_info_db_handler,
+    )
+
+    return JSONResponse(
+        {
+            "task_id": task_id,
+            "status": "Hot swap initiated",
+            # The pods only tell whether they accept the version once it is uploaded to them
+            "fallback": (
+                "If the running pods refuse the version (other dependencies or signature, several serving workers), "
+                f"it is deployed with a regular build instead and the task ends with {TaskBuildStatuses.redeployed}"
+            ),
+        },
+        media_type="application/json",
+    )
+
+
+@router.get("/traffic_split/{model_name}/{version}/{candidate_version}")
+def route_split_traffic(
+    project_name: str,
+    model_name: str,
+    version: str,
+    candidate_version: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    mode: str = Query("shadow", pattern="^(shadow|canary)$"),
+    weight: float = Query(0.0, ge=0.0, le=1.0),
+    serving_config: ServingConfig = Depends(),
+    registry_pool: RegistryHandler = Depends(get_registry_pool),
+    tasks_status: dict = Depends(get_tasks_status),
+    current_user: dict = Depends(get_current_user),
+    user_adapter: UserHandler = Depends(get_user_adapter),
+    dashboard_handler: DashboardHandler = Depends(get_dashboard_handler),
+    model_info_db_handler: ModelInfoDbHandler = Depends(get_model_info_db_handler),
+    platform_config_handler: PlatformConfigHandler = Depends(get_platform_config_handler),
+) -> JSONResponse:
+    """Mirror ("shadow") or send a `weight` share ("canary") of the traffic of the deployment of `version` to
+    `candidate_version`, deployed with the serving settings if it is not yet."""
+    logger.debug(f"Got traffic split call on {project_name}, {model_name}:{version} -> {candidate_version} ({mode})")
+    user_can_perform_action_for_project(
+        current_user,
+        project_name=project_name,
+        action_name=inspect.currentframe().f_code.co_name,
+        user_adapter=user_adapter,
+    )
+    if mode == "canary":
+        _check_deployment_gate(
+            project_name, model_name, candidate_version, model_info_db_handler, platform_config_handler
+        )
+
+    registry: ModelRegistry = registry_pool.get_registry_adapter(
+        project_name, get_project_registry_tracking_uri(project_name, request)
+    )
+    task_id = str(uuid.uuid4())
+    tasks_status[task_id] = "queued"
+    decorated_task = track_task_status(task_id, tasks_status)(split_traffic)
+    background_tasks.add_task(
+        decorated_task,
+        registry,
+        project_name,
+        model_name,
+        version,
+        candidate_version,
+        mode,
+        weight,
+        dashboard_handler,
+        current_user["email"],
+        serving_config,
+        model_info_db_handler,
+    )
+
+    return JSONResponse({"task_id": task_id, "status": "Traffic split initiated"}, media_type="application/json")
+
+
+@router.get("/stop_traffic_split/{model_name}/{version}")
+def route_stop_traffic_split(
+    project_name: str,
+    model_name: str,
+    version: str,
+    current_user: dict = Depends(get_current_user),
+    user_adapter: UserHandler = Depends(get_user_adapter),
+    dashboard_handler: DashboardHandler = Depends(get_dashboard_handler),
+) -> JSONResponse:
+    logger.debug(f"Got stop traffic split call on {project_name}, {model_name}:{version}")
+    user_can_perform_action_for_project(
+        current_user,
+        project_name=project_name,
+        action_name=inspect.currentframe().f_code.co_name,
+        user_adapter=user_adapter,
+    )
+    return_code = stop_traffic_split(project_name, model_name, version, dashboard_handler, current_user["email"])
+    return JSONResponse({"return_code": return_code}, media_type="application/json")
+
+
+@router.get("/replay/{model_name}/{version}/{candidate_version}")
+def route_replay_traffic(
+    project_name: str,
+    model_name: str,
+    version: str,
+    candidate_version: str,
+    background_tasks: BackgroundTasks,
+    multipliers: str = Query("1,2,4,8", pattern=r"^\d+(\.\d+)?(,\d+(\.\d+)?)*$"),
+    step_seconds: float = Query(DEFAULT_STEP_SECONDS, gt=0, le=600),
+    tasks_status: dict = Depends(get_tasks_status),
+    current_user: dict = Depends(get_current_user),
+    user_adapter: UserHandler = Depends(get_user_adapter),
+    object_storage: ObjectStorageHandler = Depends(get_object_storage_handler),
+    model_info_db_handler: ModelInfoDbHandler = Depends(get_model_info_db_handler),
+) -> JSONResponse:
+    """Benchmark the deployment of `candidate_version` with the traffic captured on `version`, at each multiple of
+    its recorded rate. The report is recorded on the candidate's model info."""
+    logger.debug(f"Got replay call on {project_name}, {model_name}:{version} -> {candidate_version}")
+    user_can_perform_action_for_project(
+        current_user,
+        project_name=project_name,
+        action_name=inspect.currentframe().f_code.co_name,
+        user_adapter=user_adapter,
+    )
+    replay_multipliers = tuple(float(multiplier) for multiplier in multipliers.split(","))
+    if any(multiplier <= 0 for multiplier in replay_multipliers):
+        raise HTTPException(status_code=400, detail="Replay multipliers must be positive")
+
+    task_id = str(uuid.uuid4())
+    tasks_status[task_id] = "queued"
+    decorated_task = track_task_status(task_id, tasks_status)(replay_traffic)
+    background_tasks.add_task(
+        decorated_task,
+        project_name,
+        model_name,
+        version,
+        candidate_version,
+        object_storage,
+        model_info_db_handler,
+        replay_multipliers,
+        step_seconds,
+        task_id[:8],
+    )
+
+    return JSONResponse(
+        {"task_id": task_id, "replay_id": task_id[:8], "status": "Replay initiated"}, media_type="application/json"
+    )
+
+
 @router.get("/undeploy/{model_name}/{version}")
 def route_undeploy(
     project_name: str,
@@ -227,6 +498,25 @@ def route_undeploy(
     return JSONResponse({"return_code": return_code}, media_type="application/json")
 
 
+@router.get("/undeploy_multi_model/{dependency_set}")
+def route_undeploy_multi_model_pod(
+    project_name: str,
+    dependency_set: str,
+    current_user: dict = Depends(get_current_user),
+    user_adapter: UserHandler = Depends(get_user_adapter),
+) -> JSONResponse:
+    """Remove the project's multi-model pod of a dependency set, and every version it serves."""
+    logger.debug(f"Got multi-model undeploy call on {project_name}, dependency set {dependency_set}")
+    user_can_perform_action_for_project(
+        current_user,
+        project_name=project_name,
+        action_name=inspect.currentframe().f_code.co_name,
+        user_adapter=user_adapter,
+    )
+    return_code = remove_multi_model_deployment(project_name, dependency_set, current_user["email"])
+    return JSONResponse({"return_code": return_code}, media_type="application/json")
+
+
 @router.get("/task-status/{task_id}")
 async def check_task_status(
     task_id: str,
@@ -14,6 +14,43 @@ class BatchPredictionStatus(str, Enum):
     FAILED = "failed"
 
 
+class BatchFileFormat(str, Enum):
+    """Input and output file formats of batch predictions; the value is the file extension."""
+
+    CSV = "csv"
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+    @property
+    def media_type(self) -> str:
+        return BATCH_FORMAT_MEDIA_TYPES[self]
+
+    @classmethod
+    def from_path(cls, path: str) -> "BatchFileFormat":
+        extension = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+        return cls(extension) if extension in cls._value2member_map_ else cls.CSV
+
+    @classmethod
+    def detect(cls, content: bytes) -> "BatchFileFormat":
+        """Format of an uploaded file from its magic bytes: Parquet, Arrow IPC (file or stream), CSV otherwise."""
+        if content[:4] == PARQUET_MAGIC:
+            return cls.PARQUET
+        if content[:6] == ARROW_FILE_MAGIC or content[:4] == ARROW_STREAM_CONTINUATION:
+            return cls.ARROW
+        return cls.CSV
+
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_FILE_MAGIC = b"ARROW1"
+# First bytes of every message of an Arrow IPC stream
+ARROW_STREAM_CONTINUATION = b"\xff\xff\xff\xff"
+BATCH_FORMAT_MEDIA_TYPES = {
+    BatchFileFormat.CSV: "text/csv",
+    BatchFileFormat.PARQUET: "application/vnd.apache.parquet",
+    BatchFileFormat.ARROW: "application/vnd.apache.arrow.file",
+}
+
+
 class BatchPrediction(BaseModel):
     job_id: str
     project_name: str
@@ -26,7 +63,13 @@ class BatchPrediction(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
+    # Input rows predicted so far, and their share of the input when its size is known (Parquet)
     row_count: Optional[int] = None
+    progress: Optional[float] = None
+    # Sharded jobs: input shards, and those predicted so far
+    shards: int = 1
+    shards_completed: int = 0
+    shards_failed: int = 0
 
     def to_json(self) -> dict:
         return {
@@ -42,4 +85,8 @@ class BatchPrediction(BaseModel):
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
             "error_message": self.error_message,
             "row_count": self.row_count,
+            "progress": self.progress,
+            "shards": self.shards,
+            "shards_completed": self.shards_completed,
+            "shards_failed": self.shards_failed,
         }
@@ -1,14 +1,924 @@
+"""Batch prediction job, run in the model's image by K8SBatchPredictionAdapter.
+
+The input is streamed from the batch bucket and predicted by chunks. The predictions of each chunk are appended to an
+S3 multipart upload of an output part as they come: the job holds a few chunks and one upload part
+(BATCH_UPLOAD_PART_BYTES) in memory whatever the size of the file, and writes nothing to local disk.
+
+Output parts are committed every BATCH_CHECKPOINT_SECONDS to checkpoints/ next to OUTPUT_PATH, along with a progress
+manifest listing them and the input rows they cover. A restarted pod skips these rows and carries on with the next
+part; once the input is predicted, the parts are assembled, in order, into OUTPUT_PATH.
+
+Chunks are predicted by BATCH_WORKERS processes ("auto": one per CPU of the container limit), each holding the model,
+while a reader thread parses the next chunks and the main thread writes the predictions in input order. BATCH_WORKERS=1
+predicts in the job's process. With BATCH_CHUNK_ROWS=auto, chunks are sized so that a worker predicts one in about
+CHUNK_TARGET_SECONDS, from the throughput measured on the previous ones, within the memory left to the container.
+
+Input and output formats follow the extensions of INPUT_PATH and OUTPUT_PATH: csv, parquet or arrow (Arrow IPC, file
+or stream). Parquet is read row group by row group with range requests, and written with zstd compression. Only the
+columns of the model signature are read.
+
+In a sharded job (BATCH_SHARDS pods of a Kubernetes Indexed Job), the pod of index JOB_COMPLETION_INDEX predicts one
+shard of the input: a byte range of the CSV cut at line boundaries, a range of Parquet row groups or of Arrow record
+batches, with its own parts and manifest. A pod that finds every manifest complete claims the assembly with a
+conditional write of a lock object: the pod that wins it assembles the parts of all the shards, in index order, and the
+others exit. The lock names the shard that holds it, so that its pod resumes the assembly if it is restarted.
+
+Once the output is assembled, its parts are deleted. The manifests, a few hundred bytes per shard, are kept for the row
+count of the job, and the lock so that no other pod assembles the output again. Both are deleted with the other files
+of the job by the batch prediction delete and cleanup routes. A pod restarted after the assembly finds the output in
+place and exits.
+"""
+
+import io
+import json
+import multiprocessing
 import os
+import queue
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import boto3
 import mlflow
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
 from loguru import logger
+from native_threads_template import configure_native_threads, describe_native_threads, worker_count
 
 logger.remove()
 logger.add(sys.stderr, level="INFO")
 
+MODEL_DIR = "/opt/mlflow/"
+# Rows per chunk: an integer, or "auto" to size the chunks from the measured throughput (ChunkSizer)
+_chunk_rows_setting = os.getenv("BATCH_CHUNK_ROWS", "auto")
+BATCH_CHUNK_ROWS = None if _chunk_rows_setting == "auto" else max(1, int(_chunk_rows_setting))
+INITIAL_CHUNK_ROWS = 1000
+MIN_CHUNK_ROWS = 100
+MAX_CHUNK_ROWS = 1_000_000
+CHUNK_TARGET_SECONDS = 2.0
+# Share of the memory left to the container that the chunks in flight may take, and the memory a chunk in flight
+# takes for the size of its DataFrame (the frame, its pickled copy sent to a worker and the worker's copy)
+CHUNK_MEMORY_SHARE = 0.5
+CHUNK_MEMORY_FACTOR = 3
+CGROUP_V2_MEMORY_MAX = "/sys/fs/cgroup/memory.max"
+CGROUP_V2_MEMORY_CURRENT = "/sys/fs/cgroup/memory.current"
+CGROUP_V1_MEMORY_LIMIT = "/sys/fs/cgroup/memory/memory.limit_in_bytes"
+CGROUP_V1_MEMORY_USAGE = "/sys/fs/cgroup/memory/memory.usage_in_bytes"
+# Chunks parsed ahead by the reader thread, and submitted to the workers ahead of the writer, per worker
+PREFETCH_CHUNKS_PER_WORKER = 1
+IN_FLIGHT_CHUNKS_PER_WORKER = 2
+# Record batches read from Parquet before being cut or gathered into chunks
+READ_BATCH_ROWS = 65536
+# S3 refuses multipart parts under 5 MiB, except the last one
+MIN_PART_BYTES = 5 * 1024 * 1024
+BATCH_UPLOAD_PART_BYTES = max(MIN_PART_BYTES, int(os.getenv("BATCH_UPLOAD_PART_BYTES", str(16 * 1024 * 1024))))
+# Predictions gathered per Parquet row group / Arrow record batch, rather than one small group per chunk
+OUTPUT_BATCH_ROWS = 65536
+INPUT_READ_BUFFER_BYTES = 1024 * 1024
+THROUGHPUT_LOG_INTERVAL_SECONDS = 10.0
+# Predictions written to an output part before it is committed to the progress manifest
+BATCH_CHECKPOINT_SECONDS = float(os.getenv("BATCH_CHECKPOINT_SECONDS", "60"))
+# Sharded jobs: shards of the input, and the one predicted by this pod
+BATCH_SHARDS = max(1, int(os.getenv("BATCH_SHARDS", "1")))
+SHARD_INDEX = int(os.getenv("JOB_COMPLETION_INDEX", "0"))
+# Bytes fetched at a time when looking for the line boundary of a CSV shard
+LINE_SEARCH_BYTES = 64 * 1024
+FILE_FORMATS = ("csv", "parquet", "arrow")
+ARROW_FILE_MAGIC = b"ARROW1"
+CSV_DTYPE_MAP = {
+    "double": "float64",
+    "float": "float32",
+    "long": "int64",
+    "integer": "int32",
+    "string": "object",
+}
+
+
+def file_format(path: str) -> str:
+    """csv, parquet or arrow from the extension of an input or output path; csv otherwise."""
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return extension if extension in FILE_FORMATS else "csv"
+
+
+def shard_bounds(total: int, shards: int, index: int) -> Tuple[int, int]:
+    """[start, end) of the index-th of `shards` contiguous, near-equal parts of range(total)."""
+    return total * index // shards, total * (index + 1) // shards
+
+
+def checkpoint_dir(output_path: str) -> str:
+    """Where the output parts and progress manifests of a job are written, next to its output."""
+    directory = output_path.rsplit("/", 1)[0] if "/" in output_path else ""
+    return f"{directory}/checkpoints" if directory else "checkpoints"
+
+
+def manifest_key(output_path: str, shard_index: int) -> str:
+    return f"{checkpoint_dir(output_path)}/manifest-{shard_index:05d}.json"
+
+
+def assembly_lock_key(output_path: str) -> str:
+    return f"{checkpoint_dir(output_path)}/assembly.lock"
+
+
+def part_key(output_path: str, shard_index: int, part_index: int) -> str:
+    return f"{checkpoint_dir(output_path)}/part-{shard_index:05d}-{part_index:06d}.{file_format(output_path)}"
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def memory_headroom() -> Optional[int]:
+    """Bytes left under the memory limit of the container, or available on the node without limit."""
+    for limit_path, usage_path in (
+        (CGROUP_V2_MEMORY_MAX, CGROUP_V2_MEMORY_CURRENT),
+        (CGROUP_V1_MEMORY_LIMIT, CGROUP_V1_MEMORY_USAGE),
+    ):
+        limit, usage = _read_int(limit_path), _read_int(usage_path)
+        # cgroup v2 writes "max" without limit, v1 a number close to 2**63
+        if limit is not None and usage is not None and limit < 2**60:
+            return max(0, limit - usage)
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class ChunkSizer:
+    """Rows of the next chunk: fixed, or tuned from the throughput of the chunks predicted so far.
+
+    A chunk predicted in about CHUNK_TARGET_SECONDS amortizes the per-chunk costs (DataFrame building, transfer to a
+    worker, model call) while keeping every worker busy; `in_flight` chunks must also fit in CHUNK_MEMORY_SHARE of
+    the memory headroom.
+    """
+
+    def __init__(self, fixed_rows: Optional[int] = None, in_flight: int = 1):
+        self.fixed = fixed_rows is not None
+        self.rows = fixed_rows if fixed_rows is not None else INITIAL_CHUNK_ROWS
+        self.in_flight = in_flight
+
+    def __call__(self) -> int:
+        return self.rows
+
+    def observe(self, rows: int, seconds: float, frame_bytes: int) -> None:
+        """Accounts for a chunk of `rows` rows and `frame_bytes` bytes predicted in `seconds`."""
+        if self.fixed or rows == 0:
+            return
+        target = rows / max(seconds, 1e-6) * CHUNK_TARGET_SECONDS
+        headroom = memory_headroom()
+        if headroom is not None and frame_bytes > 0:
+            row_bytes = CHUNK_MEMORY_FACTOR * frame_bytes / rows
+            target = min(target, CHUNK_MEMORY_SHARE * headroom / (self.in_flight * row_bytes))
+        # Half-way to the target, so that one slow chunk does not swing the size
+        self.rows = int(min(MAX_CHUNK_ROWS, max(MIN_CHUNK_ROWS, (self.rows + target) / 2)))
+
+
+class MultipartUploadWriter:
+    """Binary sink uploading to bucket/key by parts of part_bytes: completed on close, aborted on error.
+
+    The multipart upload is only started once a full part is buffered; smaller outputs are written with a single
+    put_object.
+    """
+
+    def __init__(self, s3: Any, bucket: str, key: str, part_bytes: int = BATCH_UPLOAD_PART_BYTES):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_bytes = part_bytes
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: list = []
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.part_bytes:
+            self._upload_part()
+        return len(data)
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        pass
+
+    def _upload_part(self) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        part_number = len(self._parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, PartNumber=part_number, UploadId=self._upload_id, Body=bytes(self._buffer)
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer.clear()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._upload_id is None:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer))
+            self._buffer.clear()
+            return
+        if self._buffer:
+            self._upload_part()
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={"Parts": self._parts}
+        )
+
+    def abort(self) -> None:
+        self.closed = True
+        self._buffer.clear()
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def __enter__(self) -> "MultipartUploadWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable read-only view of an object, fetched with range requests: Parquet reads its footer, then the column
+    chunks of each row group."""
+
+    def __init__(self, s3: Any, bucket: str, key: str):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.size = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        origin = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(0, origin + offset)
+        return self._position
+
+    def readinto(self, buffer: Any) -> int:
+        end = min(self.size, self._position + len(buffer))
+        if end <= self._position:
+            return 0
+        response = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={self._position}-{end - 1}")
+        data = response["Body"].read()
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class ChainReader(io.RawIOBase):
+    """Reads the given binary streams one after the other."""
+
+    def __init__(self, *streams: Any):
+        self._streams = list(streams)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while self._streams:
+            read = self._streams[0].readinto(buffer)
+            if read:
+                return read
+            self._streams.pop(0).close()
+        return 0
+
+    def close(self) -> None:
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+        super().close()
+
+
+def _next_line_start(s3: Any, bucket: str, key: str, offset: int, size: int) -> int:
+    """Offset of the first line of the object starting at or after `offset`."""
+    if offset <= 0:
+        return 0
+    position = offset - 1
+    while position < size:
+        end = min(size, position + LINE_SEARCH_BYTES)
+        data = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={position}-{end - 1}")["Body"].read()
+        newline = data.find(b"\n")
+        if newline >= 0:
+            return position + newline + 1
+        position = end
+    return size
+
+
+def csv_shard_source(s3: Any, bucket: str, key: str, shards: int, index: int) -> BinaryIO:
+    """The header line of a CSV object, then the lines starting in the index-th of `shards` byte ranges of its body.
+
+    Lines are cut at newlines: quoted values spanning several lines are not supported in sharded jobs.
+    """
+    size = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    header_end = _next_line_start(s3, bucket, key, 1, size)
+    streams = []
+    if header_end > 0:
+        streams.append(s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{header_end - 1}")["Body"])
+    low, high = shard_bounds(size - header_end, shards, index)
+    start = _next_line_start(s3, bucket, key, header_end + low, size)
+    end = _next_line_start(s3, bucket, key, header_end + high, size)
+    if end > start:
+        streams.append(s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")["Body"])
+    return io.BufferedReader(ChainReader(*streams), buffer_size=INPUT_READ_BUFFER_BYTES)
+
+
+def object_exists(s3: Any, bucket: str, key: str) -> bool:
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "NotFound", "404"):
+            return False
+        raise
+    return True
+
+
+def read_manifest(s3: Any, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+    """Progress manifest stored at key, None if there is none yet."""
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+
+
+class Checkpoint:
+    """Progress manifest of a shard: its output parts committed so far, and the input rows they cover.
+
+    Rewritten after each part, with the rows of the shard (input_rows) when the input says it.
+    """
+
+    def __init__(self, s3: Any, bucket: str, output_path: str, shard: Tuple[int, int] = (0, 1)):
+        self.s3 = s3
+        self.bucket = bucket
+        self.output_path = output_path
+        self.shard_index = shard[0]
+        self.key = manifest_key(output_path, shard[0])
+        self.manifest = read_manifest(s3, bucket, self.key) or {
+            "shard": shard[0],
+            "shards": shard[1],
+            "rows": 0,
+            "input_rows": None,
+            "parts": [],
+            "complete": False,
+        }
+
+    @property
+    def rows(self) -> int:
+        return self.manifest["rows"]
+
+    @property
+    def complete(self) -> bool:
+        return self.manifest["complete"]
+
+    def next_part_key(self) -> str:
+        return part_key(self.output_path, self.shard_index, len(self.manifest["parts"]))
+
+    def commit_part(self, key: str, rows: int) -> None:
+        self.manifest["parts"].append({"key": key, "rows": rows})
+        self.manifest["rows"] += rows
+        self.save()
+
+    def finish(self) -> None:
+        self.manifest["complete"] = True
+        self.save()
+
+    def save(self) -> None:
+        self.manifest["updated_at"] = time.time()
+        self.s3.put_object(
+            Bucket=self.bucket, Key=self.key, Body=json.dumps(self.manifest).encode(), ContentType="application/json"
+        )
+
+
+def input_columns(metadata: Any) -> Optional[List[str]]:
+    """Input columns of the model signature (MLmodel metadata), the only ones read from the input file."""
+    schema = metadata.get_input_schema() if metadata else None
+    if schema is None or not schema.has_input_names():
+        return None
+    return schema.input_names()
+
+
+def csv_dtype(metadata: Any) -> Optional[Dict[str, str]]:
+    """Column types of the model signature (MLmodel metadata), to parse the CSV columns as the model expects them."""
+    if not (metadata and metadata.signature):
+        return None
+    return {col.name: CSV_DTYPE_MAP.get(str(col.type), "float64") for col in metadata.signature.inputs.inputs}
+
+
+def _arrow_batches(source: BinaryIO, shard: Tuple[int, int] = (0, 1)) -> Iterator[pa.RecordBatch]:
+    index, shards = shard
+    if shards > 1:
+        # The footer of the IPC file format locates every record batch; a stream can only be read whole
+        try:
+            reader = pa.ipc.open_file(source)
+        except pa.ArrowInvalid:
+            if index > 0:
+                logger.warning("Arrow IPC stream input: predicted whole by the first shard")
+                return
+            source.seek(0)
+        else:
+            for batch_index in range(*shard_bounds(reader.num_record_batches, shards, index)):
+                yield reader.get_batch(batch_index)
+            return
+    if not hasattr(source, "peek"):
+        source = io.BufferedReader(source)
+    # The IPC file format is the stream format between its magic (8 bytes with padding) and its footer
+    if source.peek(len(ARROW_FILE_MAGIC))[: len(ARROW_FILE_MAGIC)] == ARROW_FILE_MAGIC:
+        source.read(8)
+    yield from pa.ipc.open_stream(source)
+
+
+def _frames(batches: Iterator[pa.RecordBatch], rows: Callable[[], int], skip_rows: int = 0) -> Iterator[pd.DataFrame]:
+    """DataFrames of rows() rows each (the last one smaller), cut from or gathered across record batches, after the
+    first skip_rows rows."""
+    pending: List[pa.RecordBatch] = []
+    pending_rows = 0
+    for batch in batches:
+        if skip_rows:
+            if batch.num_rows <= skip_rows:
+                skip_rows -= batch.num_rows
+                continue
+            batch, skip_rows = batch.slice(skip_rows), 0
+        offset = 0
+        while offset < batch.num_rows:
+            target = rows()
+            taken = max(0, min(target - pending_rows, batch.num_rows - offset))
+            if taken:
+                pending.append(batch.slice(offset, taken))
+                pending_rows += taken
+                offset += taken
+            if pending_rows >= target:
+                yield pa.Table.from_batches(pending).to_pandas()
+                pending, pending_rows = [], 0
+    if pending_rows:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def read_chunks(
+    source: BinaryIO,
+    input_format: str,
+    chunk_rows: Union[int, Callable[[], int]] = INITIAL_CHUNK_ROWS,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, str]] = None,
+    shard: Tuple[int, int] = (0, 1),
+    skip_rows: int = 0,
+) -> Iterator[pd.DataFrame]:
+    """DataFrames of chunk_rows rows of the input, restricted to `columns` when the file has them.
+
+    chunk_rows is a number of rows, or a callable giving the rows of the next chunk (ChunkSizer). `shard` (index,
+    shards) selects row groups of Parquet and record batches of Arrow files; CSV sources are already cut to their
+    shard (csv_shard_source). The first skip_rows rows, already predicted, are skipped: without reading the Parquet
+    row groups they fill.
+    """
+    rows = chunk_rows if callable(chunk_rows) else (lambda: chunk_rows)
+    wanted = set(columns) if columns else None
+    if input_format == "parquet":
+        parquet_file = pq.ParquetFile(source)
+        names = [name for name in parquet_file.schema_arrow.names if wanted is None or name in wanted]
+        row_groups = list(range(*shard_bounds(parquet_file.num_row_groups, shard[1], shard[0])))
+        while row_groups and skip_rows >= parquet_file.metadata.row_group(row_groups[0]).num_rows:
+            skip_rows -= parquet_file.metadata.row_group(row_groups.pop(0)).num_rows
+        if not row_groups:
+            return
+        yield from _frames(
+            parquet_file.iter_batches(batch_size=READ_BATCH_ROWS, columns=names, row_groups=row_groups),
+            rows,
+            skip_rows,
+        )
+    elif input_format == "arrow":
+        batches = _arrow_batches(source, shard)
+        if wanted is not None:
+            batches = (batch.select([name for name in batch.schema.names if name in wanted]) for batch in batches)
+        yield from _frames(batches, rows, skip_rows)
+    else:
+        usecols = (lambda name: name in wanted) if wanted is not None else None
+        # Line 0 is the header
+        skiprows = (lambda line: 0 < line <= skip_rows) if skip_rows else None
+        with pd.read_csv(source, chunksize=rows(), dtype=dtype, usecols=usecols, skiprows=skiprows) as reader:
+            while True:
+                try:
+                    yield reader.get_chunk(rows())
+                except StopIteration:
+                    return
+
+
+class PredictionWriter:
+    """Writes the predictions of each chunk to `sink` as a "prediction" column, in the output format.
+
+    Without csv_header, CSV predictions are written without header, to follow the ones of a previous shard.
+    """
+
+    def __init__(self, sink: Any, output_format: str, csv_header: bool = True):
+        self.sink = sink
+        self.output_format = output_format
+        self._header_written = not csv_header
+        self._writer: Any = None
+        self._schema: Optional[pa.Schema] = None
+        self._pending: List[pa.Table] = []
+        self._pending_rows = 0
+
+    def write(self, predictions: Any) -> None:
+        frame = pd.DataFrame({"prediction": predictions})
+        if self.output_format == "csv":
+            self.sink.write(frame.to_csv(index=False, header=not self._header_written).encode())
+            self._header_written = True
+            return
+        self.write_table(pa.Table.from_pandas(frame, preserve_index=False))
+
+    def write_table(self, table: pa.Table) -> None:
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        if self._pending_rows >= OUTPUT_BATCH_ROWS:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        if self._writer is None:
+            # Later chunks are cast to the types of the first one
+            self._schema = self._pending[0].schema if self._pending else pa.schema([("prediction", pa.float64())])
+            if self.output_format == "parquet":
+                self._writer = pq.ParquetWriter(self.sink, self._schema, compression="zstd")
+            else:
+                self._writer = pa.ipc.new_file(self.sink, self._schema)
+        if self._pending:
+            table = pa.concat_tables([table.cast(self._schema) for table in self._pending])
+            self._writer.write_table(table)
+        self._pending, self._pending_rows = [], 0
+
+    def close(self) -> None:
+        if self.output_format == "csv":
+            if not self._header_written:
+                self.sink.write(b"prediction\n")
+            return
+        self._write_pending()
+        self._writer.close()
+
+
+class CheckpointWriter:
+    """Writes the predictions to a sequence of output parts, each committed to `checkpoint` once it has been written
+    for checkpoint_seconds; the last one on close, marking the shard complete.
+
+    Parts have no CSV header: assemble_parts writes it once.
+    """
+
+    def __init__(
+        self,
+        s3: Any,
+        bucket: str,
+        checkpoint: Checkpoint,
+        output_format: str,
+        checkpoint_seconds: float = BATCH_CHECKPOINT_SECONDS,
+    ):
+        self.s3 = s3
+        self.bucket = bucket
+        self.checkpoint = checkpoint
+        self.output_format = output_format
+        self.checkpoint_seconds = checkpoint_seconds
+        self._sink: Optional[MultipartUploadWriter] = None
+        self._writer: Optional[PredictionWriter] = None
+        self._part_rows = 0
+        self._part_started_at = 0.0
+
+    def write(self, predictions: Any) -> None:
+        if self._writer is None:
+            self._sink = MultipartUploadWriter(self.s3, self.bucket, self.checkpoint.next_part_key())
+            self._writer = PredictionWriter(self._sink, self.output_format, csv_header=False)
+            self._part_rows, self._part_started_at = 0, time.monotonic()
+        self._writer.write(predictions)
+        self._part_rows += len(predictions)
+        if time.monotonic() - self._part_started_at >= self.checkpoint_seconds:
+            self._commit_part()
+
+    def _commit_part(self) -> None:
+        self._writer.close()
+        self._sink.close()
+        self.checkpoint.commit_part(self._sink.key, self._part_rows)
+        logger.info(
+            f"Checkpoint: {self.checkpoint.rows} rows predicted in {len(self.checkpoint.manifest['parts'])} parts"
+        )
+        self._sink = self._writer = None
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._commit_part()
+        self.checkpoint.finish()
+
+    def __enter__(self) -> "CheckpointWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # The part being written is lost; the pod restarted by the Job starts it over
+        if exc_type is not None and self._sink is not None:
+            self._sink.abort()
+
+
+# Model of a prediction process, loaded by _load_worker_model
+worker_model: Any = None
+
+
+def _load_worker_model(model_dir: str, processes: int) -> None:
+    """Prediction-process initializer: native pools sized like the job's, then the model."""
+    global worker_model
+    configure_native_threads(processes)
+    worker_model = mlflow.pyfunc.load_model(model_dir)
+
+
+def predict_chunk(model: Any, chunk: pd.DataFrame) -> Tuple[list, float]:
+    """Predictions of a chunk, and the seconds model.predict took."""
+    started_at = time.perf_counter()
+    predictions = model.predict(chunk)
+    if hasattr(predictions, "tolist"):
+        predictions = predictions.tolist()
+    return predictions, time.perf_counter() - started_at
+
+
+def _predict_in_worker(chunk: pd.DataFrame) -> Tuple[list, float]:
+    """Module-level so it can be pickled to the prediction processes, which hold their own model."""
+    return predict_chunk(worker_model, chunk)
+
+
+def prediction_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned rather than forked: the job's process runs the reader thread, and the workers load the model themselves
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_load_worker_model,
+        initargs=(MODEL_DIR, workers),
+    )
+
+
+def read_ahead(items: Iterator[Any], depth: int) -> Iterator[Any]:
+    """Iterates `items` in a reader thread, at most `depth` items ahead of the caller."""
+    ready: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    end = object()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read() -> None:
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:  # raised to the caller
+            put((end, e))
+            return
+        put((end, None))
+
+    reader = threading.Thread(target=read, name="batch-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            item, error = ready.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def predict_file(
+    model: Any,
+    source: BinaryIO,
+    sink: Any,
+    input_format: str = "csv",
+    output_format: str = "csv",
+    chunk_rows: Optional[int] = BATCH_CHUNK_ROWS,
+    columns: Optional[List[str]] = None,
+    dtype: Optional[Dict[str, str]] = None,
+    shard: Tuple[int, int] = (0, 1),
+    pool: Optional[Executor] = None,
+    workers: int = 1,
+    writer: Optional[Any] = None,
+    skip_rows: int = 0,
+) -> int:
+    """Predicts the file read from `source` by chunks, writing the predictions to `sink`; returns the rows.
+
+    With a pool of `workers` prediction processes, chunks are read ahead in a thread and predicted
+    IN_FLIGHT_CHUNKS_PER_WORKER per worker at once; without, by `model` in this thread. chunk_rows None sizes the
+    chunks from the measured throughput. `writer` (a CheckpointWriter) replaces the PredictionWriter of `sink`;
+    the first skip_rows rows of the input are not predicted again.
+    """
+    in_flight = IN_FLIGHT_CHUNKS_PER_WORKER * workers if pool is not None else 1
+    prefetch = PREFETCH_CHUNKS_PER_WORKER * workers
+    sizer = ChunkSizer(chunk_rows, in_flight + (prefetch if pool is not None else 0))
+    chunks = read_chunks(source, input_format, sizer, columns, dtype, shard, skip_rows)
+    if pool is not None:
+        chunks = read_ahead(chunks, prefetch)
+
+    started_at = last_log_at = time.perf_counter()
+    rows = 0
+    writer = writer or PredictionWriter(sink, output_format)
+    pending: deque = deque()
+
+    def write_next() -> None:
+        nonlocal rows, last_log_at
+        chunk_len, frame_bytes, future = pending.popleft()
+        predictions, seconds = future.result()
+        sizer.observe(chunk_len, seconds, frame_bytes)
+        writer.write(predictions)
+        rows += chunk_len
+
+        now = time.perf_counter()
+        if now - last_log_at >= THROUGHPUT_LOG_INTERVAL_SECONDS:
+            logger.info(f"{rows} rows predicted, {rows / (now - started_at):.0f} rows/s, chunks of {sizer.rows} rows")
+            last_log_at = now
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        frame_bytes = 0 if sizer.fixed else int(chunk.memory_usage(index=False, deep=True).sum())
+        if pool is None:
+            future: Future = Future()
+            future.set_result(predict_chunk(model, chunk))
+        else:
+            future = pool.submit(_predict_in_worker, chunk)
+        pending.append((len(chunk), frame_bytes, future))
+        while len(pending) >= in_flight:
+            write_next()
+    while pending:
+        write_next()
+    writer.close()
+    return rows
+
+
+def input_row_count(source: BinaryIO, input_format: str, shard: Tuple[int, int] = (0, 1)) -> Optional[int]:
+    """Rows of the shard of the input when its metadata says it (Parquet), None otherwise."""
+    if input_format != "parquet":
+        return None
+    metadata = pq.ParquetFile(source).metadata
+    row_groups = range(*shard_bounds(metadata.num_row_groups, shard[1], shard[0]))
+    return sum(metadata.row_group(index).num_rows for index in row_groups)
+
+
+def shard_manifests(s3: Any, bucket: str, output_path: str) -> Dict[int, Dict[str, Any]]:
+    """Progress manifests of the shards of a job, by shard index."""
+    paginator = s3.get_paginator("list_objects_v2")
+    manifests = {}
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{checkpoint_dir(output_path)}/manifest-"):
+        for item in page.get("Contents", []):
+            manifest = read_manifest(s3, bucket, item["Key"])
+            if manifest is not None:
+                manifests[manifest["shard"]] = manifest
+    return manifests
+
+
+def assemble_parts(s3: Any, bucket: str, output_path: str, part_keys: List[str]) -> None:
+    """Concatenates the output parts, in order, into output_path."""
+    output_format = file_format(output_path)
+    with MultipartUploadWriter(s3, bucket, output_path) as sink:
+        if output_format == "csv":
+            sink.write(b"prediction\n")
+            for key in part_keys:
+                body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+                for data in iter(lambda: body.read(INPUT_READ_BUFFER_BYTES), b""):
+                    sink.write(data)
+            return
+        writer = PredictionWriter(sink, output_format)
+        for key in part_keys:
+            part = S3RangeReader(s3, bucket, key)
+            if output_format == "parquet":
+                batches = pq.ParquetFile(part).iter_batches()
+            else:
+                reader = pa.ipc.open_file(part)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            for batch in batches:
+                writer.write_table(pa.Table.from_batches([batch]))
+        writer.close()
+
+
+def claim_assembly(s3: Any, bucket: str, output_path: str, shard_index: int) -> bool:
+    """Whether this shard assembles the output: the first to create the lock object does, and keeps doing so when its
+    pod is restarted."""
+    key = assembly_lock_key(output_path)
+    try:
+        s3.put_object(Bucket=bucket, Key=key, Body=json.dumps({"shard": shard_index}).encode(), IfNoneMatch="*")
+        return True
+    except ClientError as e:
+        # 409 ConditionalRequestConflict: another pod is creating the lock at the same time
+        if e.response.get("Error", {}).get("Code") not in ("PreconditionFailed", "412", "ConditionalRequestConflict"):
+            raise
+    lock = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    return lock["shard"] == shard_index
+
+
+def delete_parts(s3: Any, bucket: str, output_path: str) -> int:
+    """Deletes the output parts of a job once they are assembled, returns how many were deleted."""
+    paginator = s3.get_paginator("list_objects_v2")
+    keys = [
+        item["Key"]
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{checkpoint_dir(output_path)}/part-")
+        for item in page.get("Contents", [])
+    ]
+    # DeleteObjects takes at most 1000 keys per request
+    for start in range(0, len(keys), 1000):
+        objects = [{"Key": key} for key in keys[start : start + 1000]]
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": objects, "Quiet": True})
+    return len(keys)
+
+
+def predict_shard(s3: Any, batch_bucket: str, input_path: str, output_path: str, checkpoint: Checkpoint) -> None:
+    """Predicts the shard of the input of this pod from where its checkpoint stopped."""
+    # Native pools sized to the job's CPU limit, shared by the prediction processes, before the model's libraries
+    # load (native_threads_template.py)
+    workers = worker_count(os.getenv("BATCH_WORKERS", "auto"))
+    native_threads = configure_native_threads(workers)
+    if workers > 1:
+        # The workers load the model; this process only reads its signature
+        logger.info(f"Predicting with {workers} processes loading the model from {MODEL_DIR}")
+        model, metadata, pool = None, mlflow.models.Model.load(MODEL_DIR), prediction_pool(workers)
+    else:
+        logger.info(f"Loading model from {MODEL_DIR}")
+        model = mlflow.pyfunc.load_model(MODEL_DIR)
+        metadata, pool = model.metadata, None
+    logger.info(describe_native_threads(native_threads))
+
+    input_format, output_format = file_format(input_path), file_format(output_path)
+    columns = input_columns(metadata)
+    dtype = csv_dtype(metadata) if input_format == "csv" else None
+    if dtype:
+        logger.info(f"Using model signature to cast CSV columns: {dtype}")
+
+    logger.info(
+        f"Streaming {batch_bucket}/{input_path} ({input_format}) to {batch_bucket}/{output_path} ({output_format}) "
+        f"by chunks of {BATCH_CHUNK_ROWS or 'auto-sized'} rows"
+    )
+    if checkpoint.rows:
+        logger.info(f"Resuming after the {checkpoint.rows} rows of {len(checkpoint.manifest['parts'])} parts")
+    started_at = time.perf_counter()
+    shard = (SHARD_INDEX, BATCH_SHARDS)
+    if input_format == "csv" and BATCH_SHARDS > 1:
+        source = csv_shard_source(s3, batch_bucket, input_path, BATCH_SHARDS, SHARD_INDEX)
+    elif input_format == "parquet" or BATCH_SHARDS > 1:
+        source = S3RangeReader(s3, batch_bucket, input_path)
+    else:
+        body = s3.get_object(Bucket=batch_bucket, Key=input_path)["Body"]
+        source = io.BufferedReader(body, buffer_size=INPUT_READ_BUFFER_BYTES)
+    try:
+        if checkpoint.manifest["input_rows"] is None:
+            checkpoint.manifest["input_rows"] = input_row_count(source, input_format, shard)
+            checkpoint.save()
+        with CheckpointWriter(s3, batch_bucket, checkpoint, output_format) as writer:
+            rows = predict_file(
+                model,
+                source,
+                None,
+                input_format,
+                output_format,
+                BATCH_CHUNK_ROWS,
+                columns,
+                dtype,
+                shard,
+                pool,
+                workers,
+                writer=writer,
+                skip_rows=checkpoint.rows,
+            )
+    finally:
+        source.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - started_at
+
+    logger.info(
+        f"Batch prediction completed: {rows} predictions written in {elapsed:.1f}s, "
+        f"{rows / elapsed if elapsed > 0 else 0:.0f} rows/s ({checkpoint.rows} rows in total)"
+    )
+
 
 def main():
     input_path = os.environ["INPUT_PATH"]
@@ -25,51 +935,36 @@ def main():
         aws_secret_access_key=secret_key,
     )
 
-    logger.info(f"Downloading input file from {batch_bucket}/{input_path}")
-    response = s3.get_object(Bucket=batch_bucket, Key=input_path)
-    input_data = response["Body"].read()
-
-    local_input = "/tmp/input.csv"
-    with open(local_input, "wb") as f:
-        f.write(input_data)
-
-    logger.info("Loading model from /opt/mlflow/")
-    model = mlflow.pyfunc.load_model("/opt/mlflow/")
-
-    # Read expected column types from MLflow model signature and build dtype map for CSV parsing
-    csv_dtype = None
-    if model.metadata and model.metadata.signature:
-        schema = model.metadata.signature.inputs
-        type_mapping = {
-            "double": "float64",
-            "float": "float32",
-            "long": "int64",
-            "integer": "int32",
-            "string": "object",
-        }
-        csv_dtype = {}
-        for col in schema.inputs:
-            mlflow_type = str(col.type)
-            csv_dtype[col.name] = type_mapping.get(mlflow_type, "float64")
-        logger.info(f"Using model signature to cast CSV columns: {csv_dtype}")
-
-    logger.info("Running predictions by chunks of 1000 rows")
-    all_predictions = []
-    for chunk in pd.read_csv(local_input, chunksize=1000, dtype=csv_dtype):
-        predictions = model.predict(chunk)
-        if hasattr(predictions, "tolist"):
-            predictions = predictions.tolist()
-        all_predictions.extend(predictions)
-
-    output_df = pd.DataFrame({"prediction": all_predictions})
-    local_output = "/tmp/output.csv"
-    output_df.to_csv(local_output, index=False)
-
-    logger.info(f"Uploading results to {batch_bucket}/{output_path}")
-    with open(local_output, "rb") as f:
-        s3.put_object(Bucket=batch_bucket, Key=output_path, Body=f.read())
-
-    logger.info(f"Batch prediction completed: {len(all_predictions)} predictions written")
+    if object_exists(s3, batch_bucket, output_path):
+        # Restarted after the assembly, possibly before its parts were all deleted
+        logger.info(f"Predictions already written to {batch_bucket}/{output_path}")
+        delete_parts(s3, batch_bucket, output_path)
+        return
+
+    checkpoint = Checkpoint(s3, batch_bucket, output_path, (SHARD_INDEX, BATCH_SHARDS))
+    if BATCH_SHARDS > 1:
+        logger.info(f"Shard {SHARD_INDEX + 1}/{BATCH_SHARDS}, checkpointed to {batch_bucket}/{checkpoint.key}")
+    if checkpoint.complete:
+        logger.info(f"Input already predicted ({checkpoint.rows} rows), assembling the output")
+    else:
+        predict_shard(s3, batch_bucket, input_path, output_path, checkpoint)
+
+    manifests = shard_manifests(s3, batch_bucket, output_path)
+    complete = [manifest for manifest in manifests.values() if manifest["complete"]]
+    if len(complete) < BATCH_SHARDS:
+        logger.info(f"{len(complete)}/{BATCH_SHARDS} shards predicted, assembled by the last one")
+        return
+    if not claim_assembly(s3, batch_bucket, output_path, SHARD_INDEX):
+        logger.info("Every shard is predicted, the output is assembled by another one")
+        return
+    part_keys = [part["key"] for index in sorted(manifests) for part in manifests[index]["parts"]]
+    logger.info(
+        f"Assembling {len(part_keys)} parts ({sum(manifest['rows'] for manifest in complete)} rows) into "
+        f"{batch_bucket}/{output_path}"
+    )
+    assemble_parts(s3, batch_bucket, output_path, part_keys)
+    logger.info(f"Predictions written to {batch_bucket}/{output_path}")
+    logger.info(f"Deleted {delete_parts(s3, batch_bucket, output_path)} output parts")
 
 
 if __name__ == "__main__":
@@ -7,9 +7,10 @@ AGENT_BASE_IMAGE = "agent-base:latest"
 
 
 class DockerfileTemplate:
-    def __init__(self, python_version: str, use_agent_base_image: bool = False):
+    def __init__(self, python_version: str, use_agent_base_image: bool = False, onnx_conversion: bool = False):
         self.python_version = python_version
         self.use_agent_base_image = use_agent_base_image
+        self.onnx_conversion = onnx_conversion
         self.dockerfile_template = """
         FROM {base_image}
 
@@ -21,17 +22,86 @@ class DockerfileTemplate:
         ENV OTEL_METRICS_EXPORTER_LABELS="project_name={project_name},model_name={model_name},model_version={model_version}"
         ENV ROOT_PATH=""
 
+        # Micro-batching of concurrent /predict calls (opt-in, can be overridden per deployment)
+        ENV MICRO_BATCHING_ENABLED="false"
+        ENV MICRO_BATCH_MAX_SIZE=32
+        ENV MICRO_BATCH_MAX_WAIT_MS=5
+
+        # Pool running model.predict off the event loop: "thread", or "process" for GIL-bound models
+        ENV INFERENCE_EXECUTOR="thread"
+        ENV INFERENCE_EXECUTOR_WORKERS=4
+        # sklearn/xgboost/lightgbm models with a numeric signature are called directly on a float ndarray
+        ENV NUMPY_FAST_PATH_ENABLED="true"
+        ENV NUMPY_BUFFER_ROWS=64
+        # Served through ONNX Runtime when the build exported the model to onnx/model.onnx (onnx_conversion_template.py)
+        ENV ONNX_RUNTIME_ENABLED="true"
+        # Threads of the OpenMP/BLAS pools of each prediction process: "auto" shares the container's CPU limit
+        # between them (native_threads_template.py)
+        ENV NATIVE_THREADS="auto"
+
+        # In-process prediction cache (opt-in per deployment, see ServingConfig)
+        ENV PREDICTION_CACHE_ENABLED="false"
+        ENV PREDICTION_CACHE_MAX_SIZE=10000
+        ENV PREDICTION_CACHE_TTL_SECONDS=300
+
+        # /predict_stream: rows predicted per chunk, body bytes kept in memory before spilling to disk
+        ENV STREAM_CHUNK_ROWS=1000
+        ENV STREAM_SPOOL_MEMORY_BYTES=8388608
+
+        # Shadow/canary calls to a candidate version (PUT /admin/traffic): timeout, mirrored requests in flight
+        ENV TRAFFIC_SPLIT_TIMEOUT_SECONDS=5
+        ENV SHADOW_MAX_IN_FLIGHT=32
+
+        # Sampling of /predict bodies to object storage for replay benchmarks (opt-in per deployment)
+        ENV TRAFFIC_CAPTURE_ENABLED="false"
+        ENV TRAFFIC_CAPTURE_SAMPLE_SIZE=1000
+        ENV TRAFFIC_CAPTURE_MAX_PAYLOAD_BYTES=65536
+        ENV TRAFFIC_CAPTURE_FLUSH_SECONDS=300
+
+        # Batch jobs (batch_predict_template.py): rows predicted per chunk ("auto": sized from the measured
+        # throughput), prediction processes ("auto": one per CPU of the limit), output bytes per multipart upload part
+        ENV BATCH_CHUNK_ROWS="auto"
+        ENV BATCH_WORKERS="auto"
+        ENV BATCH_UPLOAD_PART_BYTES=16777216
+        # Seconds of predictions per output part committed to the progress manifest, from which a restarted job resumes
+        ENV BATCH_CHECKPOINT_SECONDS=60
+
+        # Synthetic predictions run at startup before /ready reports the pod ready
+        ENV WARMUP_REQUESTS=5
+
+        # Admission control: 0 concurrent requests means no limit (can be overridden per deployment)
+        ENV MAX_CONCURRENT_REQUESTS=0
+        ENV MAX_QUEUED_REQUESTS=100
+        ENV ADMISSION_QUEUE_TIMEOUT_SECONDS=10
+        ENV RETRY_AFTER_SECONDS=1
+
+        # Agent traces waiting to be turned into metrics, off the request path
+        ENV AGENT_METRICS_QUEUE_SIZE=1000
+        # Agent stream events buffered per /agent_predict_stream call before the agent is paused
+        ENV AGENT_STREAM_BUFFER_EVENTS=64
+
         # Setup uv
         RUN which uv || (wget -qO- https://astral.sh/uv/install.sh | sh)
         ENV PATH="/root/.local/bin:$PATH"
 
         WORKDIR /opt/mlflow
-        ENV GUNICORN_CMD_ARGS="--timeout 60 -k gevent"
+        # Serving processes: 1 runs a single uvicorn process; an integer, or "auto" for one per CPU of the
+        # container limit, runs gunicorn pre-forking that many workers around the preloaded model
+        # (gunicorn_conf_template.py). Admission limits and caches apply per worker.
+        ENV SERVING_WORKERS=1
+        # App module: fast_api_template serves the image's model, multi_model_template serves any model of the
+        # project with the same dependencies (K8SMultiModelDeployment)
+        ENV SERVING_APP=fast_api_template
 
         #Copy artefacts and dependencies lists
         COPY custom_model /opt/mlflow
         COPY fast_api_template.py /opt/mlflow
         COPY batch_predict_template.py /opt/mlflow
+        COPY gunicorn_conf_template.py /opt/mlflow
+        COPY multi_model_template.py /opt/mlflow
+        COPY onnx_conversion_template.py /opt/mlflow
+        COPY native_threads_template.py /opt/mlflow
+        COPY model_dependencies_template.py /opt/mlflow
         # Install python model version
 
         RUN YAML_PYTHON_VERSION=$(grep -E "^ *- python=" /opt/mlflow/conda.yaml \
@@ -46,16 +116,19 @@ class DockerfileTemplate:
         # is still reused for any matching wheels, so this stays cheaper than a bare python image.
         RUN uv venv --clear
         RUN uv pip install -r /opt/mlflow/requirements.txt
-        RUN uv pip install uvicorn fastapi cloudpickle loguru mlflow python-multipart boto3
+        RUN uv pip install uvicorn fastapi cloudpickle loguru mlflow python-multipart boto3 orjson msgpack pyarrow \
+            gunicorn uvicorn-worker httpx threadpoolctl
         RUN uv pip install opentelemetry-api opentelemetry-sdk opentelemetry-instrumentation-fastapi \
             opentelemetry-exporter-prometheus
 
+        {onnx_conversion}
+
         # Clean up apt cache to reduce image size
         RUN rm -rf /var/lib/apt/lists/*
         EXPOSE 8000
 
         # Activate conda environment and start the application
-        CMD ["bash", "-c", "uv run opentelemetry-instrument --service_name $IMAGE_NAME uvicorn fast_api_template:app --host 0.0.0.0 --port 8000 --root-path $ROOT_PATH --log-level debug"]
+        CMD ["bash", "-c", "if [ \\"$SERVING_WORKERS\\" = 1 ]; then exec uv run opentelemetry-instrument --service_name $IMAGE_NAME uvicorn $SERVING_APP:app --host 0.0.0.0 --port 8000 --root-path $ROOT_PATH --log-level debug; else exec uv run opentelemetry-instrument --service_name $IMAGE_NAME gunicorn -c gunicorn_conf_template.py $SERVING_APP:app; fi"]
         """
 
     def generate_dockerfile(
@@ -65,6 +138,7 @@ class DockerfileTemplate:
         self.dockerfile_template = self.dockerfile_template.format(
             base_image=self._python_base_image(),
             setup_system_packages=self._setup_system_packages(),
+            onnx_conversion=self._onnx_conversion(),
             image_name=image_name,
             project_name=project_name,
             model_name=model_name,
@@ -88,3 +162,13 @@ class DockerfileTemplate:
             return "# System packages already present in the agent base image"
         return """RUN apt-get update && apt-get install -y nginx curl \
         wget bzip2 libgomp1 ca-certificates && rm -rf /var/lib/apt/lists/*"""
+
+    def _onnx_conversion(self) -> str:
+        if not self.onnx_conversion:
+            return "# ONNX conversion not requested, served with pyfunc"
+        # Converters are installed with the model's packages as constraints, so they can never change what pyfunc
+        # serves; if they cannot be installed, or the conversion fails, the report says so and pyfunc is used.
+        return """# Export the model to ONNX, kept only when its predictions match pyfunc (onnx/conversion.json)
+        RUN uv pip freeze > /tmp/model_packages.txt && \
+            (uv pip install -c /tmp/model_packages.txt onnxruntime skl2onnx onnxmltools || true) && \
+            (uv run python onnx_conversion_template.py /opt/mlflow || true)"""
@@ -1,29 +1,88 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
 import os
-from typing import Any, Dict, Optional
+import random
+import re
+import shutil
+import socket
+import tarfile
+import tempfile
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Literal, Optional
 
+import httpx
 import mlflow
 import numpy as np
 import pandas as pd
-from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
 from mlflow.entities import SpanType
+from model_dependencies_template import hash_model_dependencies
+from native_threads_template import cgroup_cpu_limit, configure_native_threads, describe_native_threads, thread_pools
 from opentelemetry import metrics, trace
 from opentelemetry.exporter.prometheus import PrometheusMetricReader
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-from prometheus_client import generate_latest
-from pydantic import BaseModel, create_model
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import Metric
+from prometheus_client.parser import text_string_to_metric_families
+from pydantic import BaseModel, Field, ValidationError, create_model
 
+# Optional payload codecs, installed by the generated Dockerfile (see "Payload formats" below)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def _prediction_processes() -> int:
+    """Processes of the pod running model.predict at once: the serving workers, times their process pools."""
+    processes = max(1, int(os.getenv("SERVING_PROCESSES", "1")))
+    if os.getenv("INFERENCE_EXECUTOR", "thread").lower() == "process":
+        processes *= max(1, int(os.getenv("INFERENCE_EXECUTOR_WORKERS", "4")))
+    return processes
+
+
+# Before the model is loaded, so that its libraries size their native pools to the container's CPU limit rather
+# than the node's cores (native_threads_template.py). NATIVE_THREADS overrides the per-pool count.
+native_threads = configure_native_threads(_prediction_processes())
+
+# Folder of the model being served: the image's one, until a hot swap (see "Model hot swap" below)
+active_model_dir = "/opt/mlflow/"
 try:
     logger.info("Starting up and loading model...")
-    model = mlflow.pyfunc.load_model("/opt/mlflow/")
+    model = mlflow.pyfunc.load_model(active_model_dir)
     logger.info("Model loaded successfully")
 except Exception as e:
     logger.error(f"Error loading model: {e}")
     model = None
+logger.info(describe_native_threads(native_threads))
 
 image_name = os.environ["IMAGE_NAME"]
+# "project_name=..,model_name=..,model_version=.." from the Dockerfile, attached to the serving histograms
+model_labels = dict(
+    label.split("=", 1) for label in os.getenv("OTEL_METRICS_EXPORTER_LABELS", "").split(",") if "=" in label
+)
 
 tracer = trace.get_tracer(f"model_platform_{image_name}")
 
@@ -38,10 +97,27 @@ MLFLOW_TYPE_MAP = {
     "string": str,
     "boolean": bool,
 }
+# numpy dtypes of the same MLflow column types, used by the compiled signature decoder
+MLFLOW_DTYPE_MAP = {
+    "double": np.float64,
+    "float": np.float32,
+    "long": np.int64,
+    "integer": np.int32,
+    "string": np.object_,
+    "boolean": np.bool_,
+}
+
+
+def _mlflow_type_name(col_type: Any) -> str:
+    # DataType is an enum whose str() is "DataType.double"; complex types (Array, Object) have no name.
+    return getattr(col_type, "name", None) or str(col_type)
+
 
 DynamicInputs = None
 DynamicOutputs = None
 signature_description = ""
+input_columns: list = []
+input_dtypes: Dict[str, np.dtype] = {}
 
 try:
     if model is not None and hasattr(model, "metadata") and model.metadata and model.metadata.signature:
@@ -52,12 +128,17 @@ try:
             fields = {}
             field_descriptions = []
             for col in sig.inputs.inputs:
-                col_type_str = str(col.type)
+                col_type_str = _mlflow_type_name(col.type)
                 py_type = MLFLOW_TYPE_MAP.get(col_type_str, Any)
                 fields[col.name] = (py_type, ...)
                 field_descriptions.append(f"- **{col.name}**: `{col_type_str}`")
             if fields:
                 DynamicInputs = create_model("ModelInputs", **fields)
+                input_columns = list(fields.keys())
+                if all(_mlflow_type_name(col.type) in MLFLOW_DTYPE_MAP for col in sig.inputs.inputs):
+                    input_dtypes = {
+                        col.name: np.dtype(MLFLOW_DTYPE_MAP[_mlflow_type_name(col.type)]) for col in sig.inputs.inputs
+                    }
                 signature_description = "### Input schema (from MLflow signature)\n" + "\n".join(field_descriptions)
                 logger.info(f"Built dynamic input schema with {len(fields)} fields: {list(fields.keys())}")
 
@@ -65,7 +146,10 @@ try:
         if sig.outputs and hasattr(sig.outputs, "inputs") and sig.outputs.inputs:
             out_fields = {}
             for col in sig.outputs.inputs:
-                col_type_str = str(col.type)
+                # Tensor outputs (e.g. a bare sklearn predict) have no column name.
+                if not col.name:
+                    continue
+                col_type_str = _mlflow_type_name(col.type)
                 py_type = MLFLOW_TYPE_MAP.get(col_type_str, Any)
                 out_fields[col.name] = (py_type, ...)
             if out_fields:
@@ -77,6 +161,8 @@ except Exception as e:
     DynamicInputs = None
     DynamicOutputs = None
     signature_description = ""
+    input_columns = []
+    input_dtypes = {}
 
 # ---------------------------------------------------------------------------
 # Request / Response models (dynamic if signature available, generic fallback)
@@ -96,6 +182,1603 @@ class PredictionResponse(BaseModel):
     outputs: Any
 
 
+class BatchPredictionRequest(BaseModel):
+    """Many records at once: column-oriented ({"col": [..]}) or a list of records ([{"col": ..}])."""
+
+    inputs: Dict[str, list] | list[Dict[str, Any]]
+
+
+# ---------------------------------------------------------------------------
+# Signature-compiled input decoder
+# ---------------------------------------------------------------------------
+# When every signature column has a plain MLflow type, the signature is compiled
+# once into a column -> numpy dtype map and JSON inputs are decoded straight into
+# typed columns, instead of PredictionRequest(**body) + model_dump() + building
+# a DataFrame from records. Decoding errors are reported as a 422.
+class InputDecodeError(ValueError):
+    pass
+
+
+def _to_typed_column(values: Any, dtype: np.dtype) -> np.ndarray:
+    """Convert a JSON list of scalars to a numpy column of `dtype`, rejecting lossy or ill-typed values."""
+    if not isinstance(values, list):
+        raise TypeError("expected a list of values")
+    array = np.asarray(values)
+    if array.ndim != 1:
+        raise TypeError("expected scalar values")
+    if len(array) == 0:
+        return array.astype(dtype)
+    kind = array.dtype.kind
+    if dtype.kind == "O":
+        if kind != "U":
+            raise TypeError("expected strings")
+        return array.astype(object)
+    if dtype.kind == "b":
+        if kind != "b":
+            raise TypeError("expected booleans")
+        return array
+    if kind == "U":
+        # Numeric strings, which pydantic's lax mode used to accept as well.
+        array = array.astype(np.float64)
+    elif kind not in "biuf":
+        raise TypeError("expected numbers")
+    if dtype.kind == "i" and array.dtype.kind == "f" and not np.all(np.mod(array, 1) == 0):
+        raise ValueError("expected integers")
+    return array.astype(dtype)
+
+
+class SignatureDecoder:
+    """Decodes JSON inputs into typed numpy columns, in signature order. Extra keys are ignored."""
+
+    def __init__(self, dtypes: Dict[str, np.dtype]):
+        self.dtypes = dtypes
+
+    def decode(self, inputs: Any, single_record: bool = True) -> Dict[str, np.ndarray]:
+        if not isinstance(inputs, dict):
+            raise InputDecodeError("'inputs' must be an object mapping column names to values")
+        missing = [name for name in self.dtypes if name not in inputs]
+        if missing:
+            raise InputDecodeError(f"Missing input columns: {missing}")
+        columns = {}
+        for name, dtype in self.dtypes.items():
+            values = [inputs[name]] if single_record else inputs[name]
+            try:
+                columns[name] = _to_typed_column(values, dtype)
+            except (TypeError, ValueError) as e:
+                raise InputDecodeError(f"Invalid value for column '{name}' ({dtype}): {e}") from e
+        if len({len(column) for column in columns.values()}) > 1:
+            raise InputDecodeError("All columns must have the same number of values")
+        return columns
+
+
+signature_decoder = SignatureDecoder(input_dtypes) if input_dtypes else None
+if signature_decoder is not None:
+    logger.info(f"Compiled signature decoder: { {name: str(dtype) for name, dtype in input_dtypes.items()} }")
+
+
+def _decode_record(body: Any) -> Dict[str, Any]:
+    """Decode a /predict JSON body into 1-row columns, via the compiled decoder or the pydantic fallback."""
+    if not isinstance(body, dict):
+        raise InputDecodeError('Body must be a JSON object like {"inputs": {...}}')
+    if signature_decoder is not None:
+        return signature_decoder.decode(body.get("inputs"))
+    try:
+        input_data = PredictionRequest(**body).inputs
+    except ValidationError as e:
+        raise InputDecodeError(str(e)) from e
+    if isinstance(input_data, BaseModel):
+        input_data = input_data.model_dump()
+    return {name: [value] for name, value in input_data.items()}
+
+
+def _decode_batch(body: Any) -> Any:
+    """Decode a /predict_batch body into typed columns (or raw records), without validating a pydantic model per row.
+
+    The model input itself is built by _batch_model_input, so that both steps can be timed separately.
+    """
+    inputs = body.get("inputs") if isinstance(body, dict) else None
+    if isinstance(inputs, list):
+        if not all(isinstance(record, dict) for record in inputs):
+            raise InputDecodeError("'inputs' list must only contain records (JSON objects)")
+        if signature_decoder is None:
+            return inputs
+        inputs = {name: [record.get(name) for record in inputs] for name in signature_decoder.dtypes}
+    if not isinstance(inputs, dict):
+        raise InputDecodeError('Body must be {"inputs": {"col": [..]}} or {"inputs": [{"col": ..}, ..]}')
+
+    if signature_decoder is not None:
+        return signature_decoder.decode(inputs, single_record=False)
+    missing = [name for name in input_columns if name not in inputs]
+    if missing:
+        raise InputDecodeError(f"Missing input columns: {missing}")
+    return inputs
+
+
+def _batch_model_input(columns: Any) -> Any:
+    """Build the model input (a DataFrame, or columns on the NumPy fast path) from what _decode_batch returned."""
+    if isinstance(columns, list):
+        input_df = pd.DataFrame.from_records(columns)
+    elif signature_decoder is not None:
+        # Decoded columns are already typed numpy arrays of equal length.
+        return _model_input(columns)
+    else:
+        try:
+            input_df = pd.DataFrame(columns)
+        except ValueError as e:
+            raise InputDecodeError(str(e)) from e
+    return input_df[input_columns] if input_columns else input_df
+
+
+def _concat_columns(rows: list) -> Any:
+    """Stack decoded 1-row columns into one model input, column by column when all rows share the same keys."""
+    columns = rows[0].keys()
+    if all(row.keys() == columns for row in rows):
+        return _model_input({name: np.concatenate([row[name] for row in rows]) for name in columns})
+    return pd.concat([pd.DataFrame(row) for row in rows], ignore_index=True)
+
+
+def _input_rows(model_input: Any) -> int:
+    if isinstance(model_input, dict):
+        return len(next(iter(model_input.values()), ()))
+    return len(model_input)
+
+
+def _serialize_predictions(predictions: Any) -> Any:
+    if isinstance(predictions, pd.DataFrame):
+        return predictions.to_dict(orient="records")
+    if isinstance(predictions, (np.ndarray, pd.Series)):
+        return predictions.tolist()
+    return predictions
+
+
+# ---------------------------------------------------------------------------
+# Payload formats: JSON (default), MessagePack and Apache Arrow IPC streams
+# ---------------------------------------------------------------------------
+# The request format is picked from Content-Type and the response format from
+# Accept, so existing JSON clients are unaffected. JSON is parsed and rendered
+# with orjson when available (numpy arrays are serialized without .tolist()),
+# MessagePack carries the same {"inputs": ...}/{"outputs": ...} documents, and
+# Arrow streams map columns straight to the model DataFrame.
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+PAYLOAD_CODECS = {"json": True, "msgpack": msgpack is not None, "arrow": pa is not None}
+
+
+def _payload_format(media_type: str) -> Optional[str]:
+    media_type = media_type.lower()
+    if ARROW_STREAM_MEDIA_TYPE in media_type:
+        return "arrow"
+    if any(msgpack_type in media_type for msgpack_type in MSGPACK_MEDIA_TYPES):
+        return "msgpack"
+    if "application/json" in media_type:
+        return "json"
+    return None
+
+
+def _require_codec(payload_format: str, status_code: int) -> None:
+    if not PAYLOAD_CODECS[payload_format]:
+        raise HTTPException(
+            status_code=status_code, detail=f"{payload_format} payloads are not supported by this image"
+        )
+
+
+async def _load_document(request: Request, payload_format: str) -> Any:
+    """Parse a JSON or MessagePack body into the same python document; a malformed body is an InputDecodeError."""
+    try:
+        if payload_format == "msgpack":
+            _require_codec("msgpack", 415)
+            return msgpack.unpackb(await request.body())
+        if orjson is not None:
+            return orjson.loads(await request.body())
+        return await request.json()
+    except ValueError as e:  # json/orjson.JSONDecodeError, msgpack's FormatError, ExtraData...
+        raise InputDecodeError(f"Malformed {payload_format} body: {e}") from e
+
+
+def _arrow_to_dataframe(raw: bytes) -> pd.DataFrame:
+    """Read an Arrow IPC stream into the model DataFrame, sharing the Arrow buffers where the types allow it."""
+    _require_codec("arrow", 415)
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(raw)).read_all()
+    except pa.ArrowInvalid as e:
+        raise InputDecodeError(f"Invalid Arrow IPC stream: {e}") from e
+    if input_columns:
+        missing = [name for name in input_columns if name not in table.column_names]
+        if missing:
+            raise InputDecodeError(f"Missing input columns: {missing}")
+        table = table.select(input_columns)
+    return table.to_pandas(split_blocks=True)
+
+
+def _predictions_to_arrow(predictions: Any) -> "pa.Table":
+    if isinstance(predictions, pd.DataFrame):
+        return pa.Table.from_pandas(predictions, preserve_index=False)
+    if isinstance(predictions, pd.Series):
+        return pa.table({"prediction": predictions.to_numpy()})
+    predictions = np.asarray(predictions)
+    if predictions.ndim == 2:
+        return pa.table({f"prediction_{i}": predictions[:, i] for i in range(predictions.shape[1])})
+    return pa.table({"prediction": pa.array(list(predictions)) if predictions.ndim > 2 else predictions})
+
+
+def _encode_predictions(predictions: Any, accept: str) -> Response:
+    """Render predictions in the format asked for by the Accept header, JSON {"outputs": ...} by default."""
+    response_format = _payload_format(accept) or "json"
+    if response_format == "arrow":
+        _require_codec("arrow", 406)
+        table = _predictions_to_arrow(predictions)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE)
+    if response_format == "msgpack":
+        _require_codec("msgpack", 406)
+        return Response(
+            content=msgpack.packb({"outputs": _serialize_predictions(predictions)}), media_type=MSGPACK_MEDIA_TYPES[0]
+        )
+    if orjson is not None:
+        try:
+            content = orjson.dumps({"outputs": predictions}, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # DataFrames, Series, non-contiguous arrays...
+            content = orjson.dumps({"outputs": _serialize_predictions(predictions)}, option=orjson.OPT_SERIALIZE_NUMPY)
+        return Response(content=content, media_type="application/json")
+    return JSONResponse({"outputs": _serialize_predictions(predictions)})
+
+
+# ---------------------------------------------------------------------------
+# NumPy fast path for array-capable flavors
+# ---------------------------------------------------------------------------
+# sklearn, xgboost and lightgbm models take a plain 2-D ndarray, and for small
+# payloads building a DataFrame for the pyfunc wrapper costs more than the
+# prediction itself. When the MLmodel has one of these flavors and the
+# signature only has numeric scalar columns, decoded columns are copied into a
+# float64 matrix (in the column order the model was fitted with) and the
+# flavor model is called directly. Batches of up to NUMPY_BUFFER_ROWS rows
+# reuse a per-thread preallocated matrix. The path is only kept if it gives
+# the same result as the pyfunc wrapper on a synthetic row at startup;
+# NUMPY_FAST_PATH_ENABLED=false turns it off.
+#
+# When the image was built with the ONNX conversion step and the export passed
+# its parity check (onnx/conversion.json, see onnx_conversion_template.py), the
+# same float32 matrix is run through ONNX Runtime instead of the flavor model;
+# ONNX_RUNTIME_ENABLED=false goes back to the flavor model.
+NUMPY_FAST_PATH_ENABLED = os.getenv("NUMPY_FAST_PATH_ENABLED", "true").lower() == "true"
+NUMPY_BUFFER_ROWS = int(os.getenv("NUMPY_BUFFER_ROWS", "64"))
+NUMPY_FAST_PATH_FLAVORS = ("sklearn", "xgboost", "lightgbm")
+# Numpy dtype kinds that convert exactly enough to float64: float, (unsigned) integer, boolean
+NUMPY_FAST_PATH_DTYPE_KINDS = "fiub"
+ONNX_RUNTIME_ENABLED = os.getenv("ONNX_RUNTIME_ENABLED", "true").lower() == "true"
+# Same tolerance as the build-time parity check: ONNX Runtime computes in float32
+ONNX_PARITY_RTOL = 1e-4
+ONNX_PARITY_ATOL = 1e-5
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+class NumpyPredictor:
+    """Calls the flavor model (or its ONNX export) directly on a matrix assembled from decoded columns."""
+
+    def __init__(
+        self, predict_fn: Callable, columns: list, buffer_rows: int, dtype: Any = np.float64, backend: str = "numpy"
+    ):
+        self.predict_fn = predict_fn
+        self.columns = columns
+        self.buffer_rows = buffer_rows
+        self.dtype = dtype
+        self.backend = backend
+        # Inference threads run concurrently, so each one gets its own buffer.
+        self._local = threading.local()
+
+    def predict(self, columns: Dict[str, np.ndarray]) -> Any:
+        rows = len(columns[self.columns[0]])
+        if rows <= self.buffer_rows:
+            buffer = getattr(self._local, "buffer", None)
+            if buffer is None:
+                buffer = self._local.buffer = np.empty((self.buffer_rows, len(self.columns)), dtype=self.dtype)
+            matrix = buffer[:rows]
+        else:
+            matrix = np.empty((rows, len(self.columns)), dtype=self.dtype)
+        for index, name in enumerate(self.columns):
+            matrix[:, index] = columns[name]
+        return self.predict_fn(matrix)
+
+
+def _matches_pyfunc(model: Any, predictor: NumpyPredictor, rtol: float = 1e-05, atol: float = 1e-08) -> bool:
+    record = {name: np.zeros(1, dtype=dtype) for name, dtype in input_dtypes.items()}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            fast = predictor.predict(record)
+        fast, expected = np.asarray(fast), np.asarray(model.predict(pd.DataFrame(record)))
+        same = fast.shape == expected.shape and (
+            np.array_equal(fast, expected)
+            or (fast.dtype.kind == "f" and np.allclose(fast, expected, rtol=rtol, atol=atol))
+        )
+        if not same:
+            logger.warning(f"{predictor.backend} fast path disabled: it does not match the pyfunc prediction")
+        return same
+    except Exception as e:
+        logger.warning(f"{predictor.backend} fast path disabled: {e}")
+        return False
+
+
+def _build_onnx_predictor(model_dir: str) -> Optional[NumpyPredictor]:
+    """Runs the export left by the build's ONNX conversion step, when its parity check passed."""
+    try:
+        with open(os.path.join(model_dir, "onnx", "conversion.json")) as f:
+            conversion = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if conversion.get("serving_backend") != "onnx":
+        logger.info(f"Not served with ONNX Runtime: {conversion.get('reason')}")
+        return None
+    if onnxruntime is None:
+        logger.warning("Not served with ONNX Runtime: onnxruntime is not installed")
+        return None
+    onnx_path = os.path.join(model_dir, "onnx", "model.onnx")
+    # One session per process: ONNX Runtime's thread pools do not survive the fork of process-pool and gunicorn
+    # workers.
+    sessions = {os.getpid(): onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])}
+    input_name = sessions[os.getpid()].get_inputs()[0].name
+    output_name = sessions[os.getpid()].get_outputs()[conversion["output_index"]].name
+    ravel = conversion.get("ravel", False)
+
+    def predict(matrix: np.ndarray) -> np.ndarray:
+        session = sessions.get(os.getpid())
+        if session is None:
+            session = sessions[os.getpid()] = onnxruntime.InferenceSession(
+                onnx_path, providers=["CPUExecutionProvider"]
+            )
+        output = session.run([output_name], {input_name: matrix})[0]
+        return output[:, 0] if ravel else output
+
+    return NumpyPredictor(predict, conversion["columns"], NUMPY_BUFFER_ROWS, dtype=np.float32, backend="onnx")
+
+
+def _build_numpy_predictor(model: Any, model_dir: str) -> Optional[NumpyPredictor]:
+    if model is None or not input_dtypes:
+        return None
+    if any(dtype.kind not in NUMPY_FAST_PATH_DTYPE_KINDS for dtype in input_dtypes.values()):
+        return None
+    if ONNX_RUNTIME_ENABLED:
+        try:
+            predictor = _build_onnx_predictor(model_dir)
+        except Exception as e:
+            logger.warning(f"Not served with ONNX Runtime: {e}")
+            predictor = None
+        if predictor is not None and _matches_pyfunc(model, predictor, ONNX_PARITY_RTOL, ONNX_PARITY_ATOL):
+            logger.info(f"Served with ONNX Runtime, columns {predictor.columns}")
+            return predictor
+
+    if not NUMPY_FAST_PATH_ENABLED:
+        return None
+    flavors = model.metadata.flavors
+    if not any(flavor in flavors for flavor in NUMPY_FAST_PATH_FLAVORS):
+        return None
+    try:
+        raw_model = model.get_raw_model()
+    except Exception as e:  # older MLflow, or a flavor without a raw model
+        logger.info(f"NumPy fast path unavailable: {e}")
+        return None
+    if type(raw_model).__module__.startswith("xgboost") and type(raw_model).__name__ == "Booster":
+        return None  # the native xgboost Booster only predicts on a DMatrix
+
+    # Same method as the pyfunc wrapper (e.g. predict_proba for sklearn models logged with pyfunc_predict_fn).
+    predict_fn = getattr(raw_model, flavors.get("python_function", {}).get("predict_fn", "predict"), None)
+    columns = list(input_dtypes)
+    fitted_columns = getattr(raw_model, "feature_names_in_", None)
+    if fitted_columns is not None:
+        if set(fitted_columns) != set(columns):
+            return None
+        columns = list(fitted_columns)
+    if predict_fn is None:
+        return None
+
+    predictor = NumpyPredictor(predict_fn, columns, NUMPY_BUFFER_ROWS)
+    if not _matches_pyfunc(model, predictor):
+        return None
+
+    if fitted_columns is not None:
+        # Fitted on a DataFrame: sklearn warns on every ndarray call, while columns are already in fitted order.
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    logger.info(f"NumPy fast path enabled for {type(raw_model).__name__}, columns {columns}")
+    return predictor
+
+
+numpy_predictor = _build_numpy_predictor(model, active_model_dir)
+
+
+def _model_input(columns: Dict[str, np.ndarray]) -> Any:
+    """What the inference workers get for decoded columns: the columns themselves on the NumPy fast path."""
+    if numpy_predictor is not None:
+        return columns
+    return pd.DataFrame(columns, copy=False)
+
+
+# ---------------------------------------------------------------------------
+# Inference executor: keep model.predict off the event loop
+# ---------------------------------------------------------------------------
+# model.predict is synchronous; called inline it would stall every other request
+# on the pod (including /health and /metrics) for the whole inference. It runs
+# on a bounded pool instead, so the event loop only handles I/O. "thread" suits
+# models that release the GIL (numpy/BLAS, most native libraries); "process"
+# suits GIL-bound pure-python models. Agents always use the thread pool since
+# their MLflow traces are recorded in-process.
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread").lower()
+INFERENCE_EXECUTOR_WORKERS = max(1, int(os.getenv("INFERENCE_EXECUTOR_WORKERS", "4")))
+
+
+def _predict_with(model: Any, predictor: Optional[NumpyPredictor], input_data: Any) -> Any:
+    if isinstance(input_data, dict):  # decoded columns, see _model_input
+        if predictor is not None:
+            return predictor.predict(input_data)
+        # Decoded for a fast path that a model swap has since removed
+        input_data = pd.DataFrame(input_data, copy=False)
+    return model.predict(input_data)
+
+
+def _predict_in_worker(input_data: Any) -> Any:
+    """Module-level so it can be pickled to process-pool workers, which hold their own model."""
+    return _predict_with(model, numpy_predictor, input_data)
+
+
+def _use_model_dir(model_dir: str) -> None:
+    """Process-pool initializer: workers not forked from the serving process load the active model themselves."""
+    global model, numpy_predictor, active_model_dir
+    if model_dir != active_model_dir:
+        model = mlflow.pyfunc.load_model(model_dir)
+        numpy_predictor = _build_numpy_predictor(model, model_dir)
+        active_model_dir = model_dir
+
+
+class InferenceExecutor:
+    """Bounded pool running model.predict, with in-flight accounting for /metrics."""
+
+    def __init__(self, kind: str, max_workers: int):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._pool: Executor = self._thread_pool
+        if kind == "process":
+            self._pool = self._process_pool()
+        elif kind != "thread":
+            logger.warning(f"Unknown INFERENCE_EXECUTOR '{kind}', falling back to a thread pool")
+            self.kind = "thread"
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=_use_model_dir, initargs=(active_model_dir,)
+        )
+
+    def restart_process_pool(self) -> None:
+        """Start new worker processes for the active model; the current ones exit once their tasks are done."""
+        if self.kind == "process":
+            previous, self._pool = self._pool, self._process_pool()
+            previous.shutdown(wait=False)
+
+    async def predict(self, input_data: Any) -> Any:
+        return await self._submit(self._pool, _predict_in_worker, input_data)
+
+    async def run_in_thread(self, fn: Callable, *args: Any) -> Any:
+        return await self._submit(self._thread_pool, fn, *args)
+
+    async def _submit(self, pool: Executor, fn: Callable, *args: Any) -> Any:
+        self.in_flight += 1
+        _inference_in_flight.add(1)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+            _inference_in_flight.add(-1)
+
+    def utilization(self) -> float:
+        return min(self.in_flight, self.max_workers) / self.max_workers
+
+
+inference_executor = InferenceExecutor(INFERENCE_EXECUTOR, INFERENCE_EXECUTOR_WORKERS)
+logger.info(f"Inference executor: {inference_executor.kind} pool with {INFERENCE_EXECUTOR_WORKERS} workers")
+
+# ---------------------------------------------------------------------------
+# Micro-batching (opt-in): coalesce concurrent single-record /predict calls
+# ---------------------------------------------------------------------------
+# Tree and linear models spend far more time in per-call overhead than in the
+# actual math on a single row. When enabled, JSON records are queued and a
+# single worker task collects them into batches, flushed as one DataFrame into
+# one model.predict call as soon as MICRO_BATCH_MAX_SIZE records are waiting or
+# MICRO_BATCH_MAX_WAIT_MS has elapsed since the first one; the rows are then
+# scattered back to the callers. Up to INFERENCE_EXECUTOR_WORKERS batches are
+# predicted at once while the next one is collected, so that every worker of
+# the inference pool is kept busy.
+MICRO_BATCHING_ENABLED = os.getenv("MICRO_BATCHING_ENABLED", "false").lower() == "true"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+
+
+def _prediction_rows(predictions: Any, index: int) -> Any:
+    """Slice row `index` out of a batch prediction, keeping the container type of a 1-row predict."""
+    if isinstance(predictions, (pd.DataFrame, pd.Series)):
+        return predictions.iloc[index : index + 1]
+    return predictions[index : index + 1]
+
+
+class MicroBatcher:
+    """Queue of pending single-record predictions, batched by one background task.
+
+    The worker task is started lazily on the first call so that it is bound to
+    the event loop actually serving requests. It flushes each batch in a task of
+    its own, at most max_concurrent_flushes at once: while they are all running,
+    records wait in the queue and make up the next, fuller, batch.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, max_concurrent_flushes: int = 1):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_flushes = max(1, max_concurrent_flushes)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_slots: Optional[asyncio.Semaphore] = None
+        # Strong references to the running flushes, which the event loop only holds weakly
+        self._flushes: set = set()
+
+    async def predict(self, record: Dict[str, Any]) -> Any:
+        """Queue decoded 1-row columns (see _decode_record) and wait for their slice of the batch prediction."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._flush_slots = asyncio.Semaphore(self.max_concurrent_flushes)
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, time.perf_counter()))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._flush_slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            flush = asyncio.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flush_done)
+
+    def _flush_done(self, flush: asyncio.Task) -> None:
+        self._flushes.discard(flush)
+        self._flush_slots.release()
+
+    async def _flush(self, batch: list) -> None:
+        flushed_at = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            _micro_batch_queue_wait.record(flushed_at - enqueued_at, model_labels)
+        _micro_batch_size.record(len(batch), model_labels)
+
+        try:
+            with _timed_stage("/predict", "dataframe"):
+                model_input = _concat_columns([record for record, _, _ in batch])
+            with _timed_stage("/predict", "predict"), tracer.start_as_current_span("model_inference"):
+                predictions = await inference_executor.predict(model_input)
+            if len(predictions) != len(batch):
+                raise ValueError(f"Model returned {len(predictions)} predictions for a batch of {len(batch)} rows")
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for index, (_, future, _) in enumerate(batch):
+            # Callers that disconnected meanwhile have a cancelled future.
+            if not future.done():
+                future.set_result(_prediction_rows(predictions, index))
+
+
+micro_batcher = (
+    MicroBatcher(MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS, INFERENCE_EXECUTOR_WORKERS)
+    if MICRO_BATCHING_ENABLED
+    else None
+)
+if micro_batcher is not None:
+    logger.info(
+        f"Micro-batching enabled: max_batch_size={MICRO_BATCH_MAX_SIZE}, max_wait_ms={MICRO_BATCH_MAX_WAIT_MS}, "
+        f"up to {INFERENCE_EXECUTOR_WORKERS} batches predicted at once"
+    )
+
+# ---------------------------------------------------------------------------
+# Prediction cache (opt-in, per deployment)
+# ---------------------------------------------------------------------------
+# Callers such as pricing or eligibility checks send the same feature vector
+# over and over. Predictions are cached under a hash of the model artefacts
+# (the empty file named after hash_directory() that download_model_artifacts
+# leaves in the model folder) plus the canonical decoded input row, with LRU
+# eviction beyond PREDICTION_CACHE_MAX_SIZE entries and a TTL. Identical
+# requests arriving while the first one is still computing share its result
+# (single-flight) instead of all reaching the model.
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "false").lower() == "true"
+PREDICTION_CACHE_MAX_SIZE = int(os.getenv("PREDICTION_CACHE_MAX_SIZE", "10000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "300"))
+
+
+def _read_model_hash(model_dir: str) -> str:
+    try:
+        return next((name for name in sorted(os.listdir(model_dir)) if re.fullmatch(r"[0-9a-f]{64}", name)), "")
+    except OSError:
+        return ""
+
+
+class PredictionCache:
+    """TTL + LRU cache of predictions, with single-flight coalescing of identical in-flight requests."""
+
+    def __init__(self, model_hash: str, max_size: int, ttl_seconds: float):
+        self.model_hash = model_hash
+        self.max_size = max(1, max_size)
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    def key(self, record: Dict[str, Any]) -> str:
+        canonical = json.dumps({name: np.asarray(values).tolist() for name, values in record.items()}, sort_keys=True)
+        return hashlib.sha256(f"{self.model_hash}:{canonical}".encode()).hexdigest()
+
+    async def get_or_compute(self, record: Dict[str, Any], compute: Callable) -> Any:
+        key = self.key(record)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                _prediction_cache_requests.add(1, {"result": "hit"})
+                return value
+            del self._entries[key]
+            _prediction_cache_evictions.add(1, {"reason": "expired"})
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            _prediction_cache_requests.add(1, {"result": "coalesced"})
+        else:
+            _prediction_cache_requests.add(1, {"result": "miss"})
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._on_computed(key, done))
+        # Shielded so that one caller disconnecting does not cancel the others' prediction.
+        return await asyncio.shield(task)
+
+    def _on_computed(self, key: str, task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            _prediction_cache_evictions.add(1, {"reason": "capacity"})
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+prediction_cache = None
+if PREDICTION_CACHE_ENABLED:
+    prediction_cache = PredictionCache(
+        _read_model_hash("/opt/mlflow/"), PREDICTION_CACHE_MAX_SIZE, PREDICTION_CACHE_TTL_SECONDS
+    )
+    logger.info(
+        f"Prediction cache enabled: max_size={PREDICTION_CACHE_MAX_SIZE}, ttl={PREDICTION_CACHE_TTL_SECONDS}s, "
+        f"model_hash={prediction_cache.model_hash or 'unknown'}"
+    )
+
+
+async def _predict_record(record: Dict[str, Any]) -> Any:
+    """Predict one decoded record, through the micro-batcher when enabled."""
+    if micro_batcher is not None:
+        return await micro_batcher.predict(record)
+    with _timed_stage("/predict", "dataframe"):
+        model_input = _model_input(record)
+    with _timed_stage("/predict", "predict"), tracer.start_as_current_span("model_inference"):
+        return await inference_executor.predict(model_input)
+
+
+# ---------------------------------------------------------------------------
+# Warm-up and readiness
+# ---------------------------------------------------------------------------
+# The first predictions after a start pay for lazy initialisation (imports
+# inside the flavor, JIT, BLAS and inference pool threads). Once the app has
+# started, WARMUP_REQUESTS synthetic records built from the signature go
+# through the regular prediction path. /ready fails until the model is loaded
+# and warmed up; it is the readiness probe set by K8SModelDeployment, whereas
+# /health only tells that the process is up. Models without a scalar
+# signature (agents, tensor inputs) are not warmed up: there is no meaningful
+# synthetic input for them, and for an agent it would mean a paid LLM call.
+WARMUP_REQUESTS = int(os.getenv("WARMUP_REQUESTS", "5"))
+# Synthetic value by numpy dtype kind; numeric columns get 0
+SYNTHETIC_VALUES = {"O": "", "b": False}
+
+warmup_done = False
+
+
+def _synthetic_record() -> Dict[str, np.ndarray]:
+    return {name: np.full(1, SYNTHETIC_VALUES.get(dtype.kind, 0), dtype=dtype) for name, dtype in input_dtypes.items()}
+
+
+async def _warm_up() -> None:
+    global warmup_done
+    if model is not None and signature_decoder is not None and WARMUP_REQUESTS > 0:
+        started_at = time.perf_counter()
+        try:
+            # Concurrent, so that every worker of the inference pool gets initialised.
+            predictions = await asyncio.gather(*(_predict_record(_synthetic_record()) for _ in range(WARMUP_REQUESTS)))
+            _encode_predictions(predictions[0], "")
+            logger.info(
+                f"Warm-up done: {WARMUP_REQUESTS} synthetic predictions in {time.perf_counter() - started_at:.2f}s"
+            )
+        except Exception as e:
+            # A model may reject all-zero inputs while serving real ones fine: don't block the rollout on it.
+            logger.warning(f"Warm-up prediction failed, marking the model ready anyway: {e}")
+    warmup_done = True
+
+
+async def _prepare_model() -> None:
+    # A version hot swapped into the deployment before this pod started is served from the start (see "Model hot swap")
+    await _restore_served_version()
+    await _warm_up()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background_tasks = [asyncio.create_task(_prepare_model())]
+    if METRICS_MULTIPROC_DIR:
+        background_tasks.append(asyncio.create_task(_write_metrics_snapshots()))
+    if traffic_capture is not None:
+        background_tasks.append(asyncio.create_task(_capture_traffic()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    if traffic_capture is not None:
+        await _flush_traffic_capture()
+    if _candidate_client is not None:
+        await _candidate_client.aclose()
+    if METRICS_MULTIPROC_DIR:
+        _remove_metrics_snapshot()
+
+
+# ---------------------------------------------------------------------------
+# Multi-worker metrics
+# ---------------------------------------------------------------------------
+# With SERVING_WORKERS other than 1 the image runs gunicorn with forked workers
+# (gunicorn_conf_template.py) and a scrape reaches any one of them. The OTel
+# Prometheus reader only knows its own process, and prometheus_client's
+# multiprocess mode does not cover it, so every worker writes its exposition
+# to METRICS_MULTIPROC_DIR every METRICS_SNAPSHOT_INTERVAL_SECONDS, and
+# /metrics merges all of them: counters and histograms are summed, and so are
+# gauges unless WORKER_GAUGE_AGGREGATION says otherwise. Single-process pods
+# keep serving their registry as is.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("METRICS_SNAPSHOT_INTERVAL_SECONDS", "5"))
+WORKER_GAUGE_AGGREGATION: Dict[str, Callable] = {
+    "inference_executor_utilization": lambda values: sum(values) / len(values),
+    "process_start_time_seconds": min,
+    "process_max_fds": max,
+    "python_info": max,
+}
+
+
+def _metrics_snapshot_path() -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"{os.getpid()}.prom")
+
+
+def _write_metrics_snapshot() -> None:
+    path = _metrics_snapshot_path()
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(generate_latest())
+    # Atomic, so that a scrape in another worker never reads a half-written file.
+    os.replace(f"{path}.tmp", path)
+
+
+def _remove_metrics_snapshot() -> None:
+    try:
+        os.remove(_metrics_snapshot_path())
+    except FileNotFoundError:
+        pass
+
+
+async def _write_metrics_snapshots() -> None:
+    while True:
+        try:
+            _write_metrics_snapshot()
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+        await asyncio.sleep(METRICS_SNAPSHOT_INTERVAL_SECONDS)
+
+
+class WorkerMetricsCollector:
+    """prometheus_client collector merging the metrics snapshots of all workers."""
+
+    def collect(self):
+        families: Dict[str, Metric] = {}
+        samples: Dict[tuple, list] = {}
+        for file_name in sorted(os.listdir(METRICS_MULTIPROC_DIR)):
+            if not file_name.endswith(".prom"):
+                continue
+            try:
+                with open(os.path.join(METRICS_MULTIPROC_DIR, file_name)) as f:
+                    exposition = f.read()
+            except FileNotFoundError:  # worker exited meanwhile
+                continue
+            for family in text_string_to_metric_families(exposition):
+                families.setdefault(family.name, Metric(family.name, family.documentation, family.type, family.unit))
+                for sample in family.samples:
+                    key = (family.name, sample.name, tuple(sorted(sample.labels.items())))
+                    samples.setdefault(key, []).append(sample.value)
+
+        for (family_name, sample_name, labels), values in samples.items():
+            metric = families[family_name]
+            aggregate = WORKER_GAUGE_AGGREGATION.get(family_name, sum) if metric.type == "gauge" else sum
+            metric.add_sample(sample_name, dict(labels), aggregate(values))
+        return list(families.values())
+
+
+worker_metrics_registry = None
+if METRICS_MULTIPROC_DIR:
+    worker_metrics_registry = CollectorRegistry(auto_describe=False)
+    worker_metrics_registry.register(WorkerMetricsCollector())
+
+
+# ---------------------------------------------------------------------------
+# Admission control (opt-in, per deployment)
+# ---------------------------------------------------------------------------
+# Without a limit, a burst is accepted whole and queues inside uvicorn until
+# clients time out, and latency degrades for every caller. With
+# MAX_CONCURRENT_REQUESTS > 0, at most that many prediction requests run at
+# once and up to MAX_QUEUED_REQUESTS wait for a slot. Beyond that requests are
+# shed right away with 429; a request that waited ADMISSION_QUEUE_TIMEOUT_SECONDS
+# without getting a slot gets 503. Both carry a Retry-After header.
+# /health, /ready and /metrics are never limited.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "0"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "100"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded waiting queue in front of the prediction endpoints."""
+
+    def __init__(self, max_concurrency: int, max_queue_depth: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def acquire(self) -> None:
+        # locked() is also true while others are already waiting, so queued requests are not overtaken.
+        if self._slots.locked():
+            if self.queued >= self.max_queue_depth:
+                self._shed("queue_full", 429)
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._shed("queue_timeout", 503)
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    @staticmethod
+    def _shed(reason: str, status_code: int) -> None:
+        _admission_shed.add(1, {"reason": reason})
+        raise HTTPException(
+            status_code=status_code,
+            detail=f"Server saturated ({reason}), retry later",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+
+admission_controller = (
+    AdmissionController(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS, ADMISSION_QUEUE_TIMEOUT_SECONDS)
+    if MAX_CONCURRENT_REQUESTS > 0
+    else None
+)
+if admission_controller is not None:
+    logger.info(
+        f"Admission control enabled: max_concurrency={MAX_CONCURRENT_REQUESTS}, max_queue_depth={MAX_QUEUED_REQUESTS}"
+    )
+
+
+async def admit_request():
+    """Dependency of the prediction endpoints holding an admission slot for the duration of the request."""
+    if admission_controller is None:
+        yield
+        return
+    await admission_controller.acquire()
+    try:
+        yield
+    finally:
+        admission_controller.release()
+
+
+# ---------------------------------------------------------------------------
+# Agent streaming (Server-Sent Events)
+# ---------------------------------------------------------------------------
+# /agent_predict only answers once the whole agent run is over. The streaming
+# variant iterates the ResponsesAgent predict_stream generator on an inference
+# worker thread and forwards every event (text deltas, tool calls, output
+# items) as an SSE message as soon as it is produced. Events go through a queue
+# of AGENT_STREAM_BUFFER_EVENTS: when the client reads slower than the agent
+# produces, the worker thread blocks rather than buffering without bound, and
+# it stops iterating once the client has disconnected.
+AGENT_STREAM_BUFFER_EVENTS = int(os.getenv("AGENT_STREAM_BUFFER_EVENTS", "64"))
+# How often a worker blocked on a full queue checks whether the client is gone
+AGENT_STREAM_STOP_POLL_SECONDS = 0.5
+# Sentinel closing the event queue
+_STREAM_END = ("end", None)
+# Producers of streams whose client went away, still running on their worker thread
+agent_stream_producers: set = set()
+
+
+def _produce_agent_stream(
+    body: Dict[str, Any], events: asyncio.Queue, loop: asyncio.AbstractEventLoop, stop: threading.Event
+) -> None:
+    """Run predict_stream on a worker thread, pushing ("event" | "error", payload) tuples onto `events`."""
+
+    def put(item: tuple) -> bool:
+        future = asyncio.run_coroutine_threadsafe(events.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=AGENT_STREAM_STOP_POLL_SECONDS)
+                return True
+            except FutureTimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    try:
+        stream = model.predict_stream(body)
+        try:
+            for event in stream:
+                if stop.is_set() or not put(("event", event)):
+                    break
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+        put(_STREAM_END)
+    except Exception as e:
+        put(("error", e))
+    # Read on this thread, as in _agent_predict_with_trace_id; also recorded for runs cut short by the client.
+    trace_id = mlflow.get_last_active_trace_id(thread_local=True)
+    loop.call_soon_threadsafe(agent_metrics_recorder.submit, trace_id)
+
+
+def _sse_message(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _stream_agent_events(body: Dict[str, Any]):
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue(maxsize=AGENT_STREAM_BUFFER_EVENTS)
+    stop = threading.Event()
+    started_at = time.perf_counter()
+    producer = asyncio.ensure_future(inference_executor.run_in_thread(_produce_agent_stream, body, events, loop, stop))
+    status = "cancelled"
+    first_event = True
+    try:
+        while True:
+            kind, payload = await events.get()
+            if kind == "end":
+                status = "success"
+                yield "event: done\ndata: [DONE]\n\n"
+                return
+            if kind == "error":
+                status = "error"
+                logger.opt(exception=payload).error("Agent stream failed")
+                yield _sse_message("error", {"detail": str(payload)})
+                return
+            if first_event:
+                first_event = False
+                _stage_duration.record(
+                    time.perf_counter() - started_at,
+                    {**model_labels, "endpoint": "/agent_predict_stream", "stage": "first_event"},
+                )
+            if hasattr(payload, "model_dump"):
+                payload = payload.model_dump()
+            yield _sse_message(payload.get("type", "message"), payload)
+    finally:
+        # Lets the worker thread stop early when the client went away mid-stream.
+        stop.set()
+        _agent_invocations.add(1, {"status": status})
+        if status == "cancelled":
+            # The worker thread only notices at its next event: keep the task referenced until then (the event
+            # loop only keeps weak references to tasks) rather than holding the cancelled response on it.
+            agent_stream_producers.add(producer)
+            producer.add_done_callback(_agent_stream_producer_done)
+        else:
+            # Its last put was the end or error event
+            try:
+                await producer
+            except Exception:
+                logger.exception("Agent stream producer failed")
+
+
+def _agent_stream_producer_done(producer: asyncio.Future) -> None:
+    agent_stream_producers.discard(producer)
+    if not producer.cancelled() and producer.exception() is not None:
+        logger.opt(exception=producer.exception()).error("Agent stream producer failed")
+
+
+# ---------------------------------------------------------------------------
+# Streaming predictions (NDJSON / CSV)
+# ---------------------------------------------------------------------------
+# /predict and /predict_batch hold the whole body, its parsed form and the
+# DataFrame in memory at once. /predict_stream copies the body as it arrives
+# into a spool file (kept in memory up to STREAM_SPOOL_MEMORY_BYTES, on disk
+# beyond), then reads it back STREAM_CHUNK_ROWS rows at a time, predicts each
+# chunk and streams its results as NDJSON lines before reading the next one.
+# Memory is bounded by the chunk size, not by the payload size. The body is
+# spooled before answering rather than read while the results are sent: HTTP/1
+# clients (and ingress proxies) usually upload the whole body before reading.
+STREAM_CHUNK_ROWS = max(1, int(os.getenv("STREAM_CHUNK_ROWS", "1000")))
+STREAM_SPOOL_MEMORY_BYTES = int(os.getenv("STREAM_SPOOL_MEMORY_BYTES", str(8 * 1024 * 1024)))
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl")
+CSV_MEDIA_TYPE = "text/csv"
+
+
+def _ndjson_line(document: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(document, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(document, default=str) + "\n").encode()
+
+
+def _ndjson_model_inputs(spool: Any) -> Iterator[Any]:
+    """Model inputs of STREAM_CHUNK_ROWS records each, from an NDJSON body with one record object per line."""
+    loads = orjson.loads if orjson is not None else json.loads
+    records = []
+    for line_number, line in enumerate(spool, start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(loads(line))
+        except ValueError as e:
+            raise InputDecodeError(f"Line {line_number}: invalid JSON ({e})") from e
+        if len(records) == STREAM_CHUNK_ROWS:
+            yield _batch_model_input(_decode_batch({"inputs": records}))
+            records = []
+    if records:
+        yield _batch_model_input(_decode_batch({"inputs": records}))
+
+
+def _csv_model_inputs(spool: Any) -> Iterator[Any]:
+    """Model inputs of STREAM_CHUNK_ROWS rows each, from a CSV body with a header line."""
+    for chunk in pd.read_csv(spool, chunksize=STREAM_CHUNK_ROWS, dtype=input_dtypes or None):
+        missing = [name for name in input_columns if name not in chunk.columns]
+        if missing:
+            raise InputDecodeError(f"Missing input columns: {missing}")
+        if numpy_predictor is not None:
+            yield _model_input({name: chunk[name].to_numpy() for name in input_dtypes})
+        else:
+            yield chunk[input_columns] if input_columns else chunk
+
+
+async def _stream_predictions(spool: Any, model_inputs: Iterator[Any]):
+    rows_done = 0
+    try:
+        while True:
+            try:
+                # Reading and decoding the next chunk is blocking work too.
+                model_input = await asyncio.to_thread(next, model_inputs, None)
+            except ValueError as e:  # InputDecodeError, or a CSV parser error
+                yield _ndjson_line({"error": str(e), "row": rows_done})
+                return
+            if model_input is None:
+                return
+            with _timed_stage("/predict_stream", "predict"), tracer.start_as_current_span("model_inference"):
+                predictions = await inference_executor.predict(model_input)
+            with _timed_stage("/predict_stream", "serialize"):
+                lines = b"".join(_ndjson_line(row) for row in _serialize_predictions(predictions))
+            rows_done += _input_rows(model_input)
+            yield lines
+    except Exception as e:
+        # The 200 status line is long gone: report the failure in the stream itself.
+        logger.exception("Streaming prediction failed")
+        yield _ndjson_line({"error": str(e), "row": rows_done})
+    finally:
+        spool.close()
+        _row_count.record(rows_done, {**model_labels, "endpoint": "/predict_stream"})
+
+
+# ---------------------------------------------------------------------------
+# Model hot swap
+# ---------------------------------------------------------------------------
+# A new version of the model that needs no other dependencies than the ones
+# installed in the image does not need a new image nor a new pod. The platform
+# uploads its artefacts (a .tar.gz of the model folder) to PUT /admin/model:
+# they are extracted under MODEL_VERSIONS_DIR, loaded and warmed up with
+# synthetic predictions while the current model keeps serving, then `model` and
+# its NumPy fast path are switched. Requests already running keep a reference to
+# the previous model, which is released when the last of them returns.
+# The new version must have the same dependency files and the same signature
+# (request schemas and decoders are built from it at startup), otherwise the
+# swap is refused with 409 and the version needs a regular build. The platform
+# first stages the version on every pod of the deployment (activate=false:
+# loaded and warmed up, not served yet), and discards it from all of them if
+# one refuses it. Once every pod staged it, the platform saves the version in
+# the serving state of the deployment (K8SModelDeployment), then has every pod
+# serve it (POST /admin/model/activate). The serving state is read into
+# SERVED_MODEL_VERSION and SERVED_MODEL_URI when a pod starts: a pod started
+# after the swap downloads that version from the registry (MLFLOW_TRACKING_URI)
+# and serves it before it reports ready, or keeps its image's version if it
+# cannot. The admin endpoints answer 404 unless MODEL_ADMIN_TOKEN is set, which
+# K8SModelDeployment does from the deployment's admin Secret.
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+MODEL_VERSIONS_DIR = os.getenv("MODEL_VERSIONS_DIR", "/opt/mlflow_versions")
+MODEL_VERSION_PATTERN = r"[A-Za-z0-9][A-Za-z0-9._-]*"
+SERVED_MODEL_VERSION = os.getenv("SERVED_MODEL_VERSION", "")
+SERVED_MODEL_URI = os.getenv("SERVED_MODEL_URI", "")
+
+image_dependency_hash = hash_model_dependencies(active_model_dir)
+active_model_version = model_labels.get("model_version", "")
+model_swap_lock = asyncio.Lock()
+
+
+@dataclass
+class StagedModel:
+    version: str
+    model_dir: str
+    model: Any
+    predictor: Optional[NumpyPredictor]
+
+
+# Loaded and warmed up, waiting for POST /admin/model/activate
+staged_model: Optional[StagedModel] = None
+
+
+class ModelSwapError(Exception):
+    def __init__(self, status_code: int, reason: str, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+
+
+def _signature(model: Any) -> Optional[dict]:
+    signature = model.metadata.signature if model is not None and model.metadata else None
+    return signature.to_dict() if signature is not None else None
+
+
+def _extract_model_archive(archive: Any, model_dir: str) -> None:
+    with tarfile.open(fileobj=archive, mode="r:gz") as tar:
+        for member in tar.getmembers():
+            path = os.path.realpath(os.path.join(model_dir, member.name))
+            if not (member.isfile() or member.isdir()) or os.path.commonpath([model_dir, path]) != model_dir:
+                raise ModelSwapError(400, "invalid_archive", f"Unexpected archive member: {member.name}")
+        tar.extractall(model_dir)
+
+
+def _load_candidate(model_dir: str) -> tuple:
+    candidate = mlflow.pyfunc.load_model(model_dir)
+    return candidate, _build_numpy_predictor(candidate, model_dir)
+
+
+def _warm_up_candidate(candidate: Any, predictor: Optional[NumpyPredictor]) -> None:
+    record = _synthetic_record()
+    model_input = record if predictor is not None else pd.DataFrame(record)
+    _encode_predictions(_predict_with(candidate, predictor, model_input), "")
+
+
+async def _swap_model(archive: Any, version: str, activate: bool = True) -> Dict[str, Any]:
+    """Serves the version in `archive`, or only stages it (loaded and warmed up, see _activate_staged_model)."""
+    global staged_model
+    async with model_swap_lock:
+        started_at = time.perf_counter()
+        model_dir = os.path.realpath(os.path.join(MODEL_VERSIONS_DIR, version))
+        if model_dir == os.path.realpath(active_model_dir):
+            return _served_model()
+        _discard_staged_model()
+        try:
+            shutil.rmtree(model_dir, ignore_errors=True)
+            os.makedirs(model_dir)
+            try:
+                await inference_executor.run_in_thread(_extract_model_archive, archive, model_dir)
+            except tarfile.TarError as e:
+                raise ModelSwapError(400, "invalid_archive", f"Invalid model archive: {e}")
+        except ModelSwapError as e:
+            shutil.rmtree(model_dir, ignore_errors=True)
+            _model_swaps.add(1, {**model_labels, "result": e.reason})
+            raise
+        if not activate:
+            staged_model = StagedModel(version, model_dir, *await _prepare_model_dir(model_dir))
+            logger.info(f"Version {version} staged in {time.perf_counter() - started_at:.2f}s")
+            return {**_served_model(), "staged_version": version}
+        await _serve_model_dir(model_dir, version)
+        logger.info(f"Now serving version {version} (swapped in {time.perf_counter() - started_at:.2f}s)")
+        return _served_model()
+
+
+async def _activate_staged_model(version: str) -> Dict[str, Any]:
+    global staged_model
+    async with model_swap_lock:
+        if version == active_model_version:
+            return _served_model()
+        if staged_model is None or staged_model.version != version:
+            raise ModelSwapError(409, "not_staged", f"Version {version} is not staged")
+        staged, staged_model = staged_model, None
+        _serve_prepared_model(staged.model_dir, staged.version, staged.model, staged.predictor)
+        logger.info(f"Now serving staged version {version}")
+        return _served_model()
+
+
+def _discard_staged_model() -> None:
+    """Called with model_swap_lock held."""
+    global staged_model
+    if staged_model is not None:
+        shutil.rmtree(staged_model.model_dir, ignore_errors=True)
+        logger.info(f"Discarded staged version {staged_model.version}")
+        staged_model = None
+
+
+def _download_version(uri: str, version: str) -> str:
+    """Downloads a version of the model into a folder of its own: each worker of a multi-worker pod restores it."""
+    os.makedirs(MODEL_VERSIONS_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=MODEL_VERSIONS_DIR)
+    try:
+        # Into staging_dir itself for a models:/ URI, into a subfolder of it for others
+        local_path = mlflow.artifacts.download_artifacts(artifact_uri=uri, dst_path=staging_dir)
+        model_dir = os.path.join(os.path.realpath(MODEL_VERSIONS_DIR), f"{version}-{os.getpid()}")
+        shutil.rmtree(model_dir, ignore_errors=True)
+        os.rename(local_path, model_dir)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return model_dir
+
+
+async def _restore_served_version() -> None:
+    """Serves the version hot swapped into the deployment before this pod started, if any."""
+    if not SERVED_MODEL_URI or SERVED_MODEL_VERSION == active_model_version:
+        return
+    started_at = time.perf_counter()
+    try:
+        model_dir = await inference_executor.run_in_thread(_download_version, SERVED_MODEL_URI, SERVED_MODEL_VERSION)
+    except Exception as e:
+        _model_swaps.add(1, {**model_labels, "result": "download_failed"})
+        logger.error(f"Could not download version {SERVED_MODEL_VERSION}, serving {active_model_version}: {e}")
+        return
+    try:
+        async with model_swap_lock:
+            await _serve_model_dir(model_dir, SERVED_MODEL_VERSION)
+    except ModelSwapError as e:
+        logger.error(f"Could not restore version {SERVED_MODEL_VERSION}, serving {active_model_version}: {e}")
+        return
+    logger.info(f"Now serving version {SERVED_MODEL_VERSION} (restored in {time.perf_counter() - started_at:.2f}s)")
+
+
+async def _serve_model_dir(model_dir: str, version: str) -> None:
+    """Checks, loads and warms up the version in model_dir, then serves it. Called with model_swap_lock held."""
+    _serve_prepared_model(model_dir, version, *await _prepare_model_dir(model_dir))
+
+
+async def _prepare_model_dir(model_dir: str) -> tuple:
+    """Checks, loads and warms up the version in model_dir next to the served one; removes model_dir if refused."""
+    try:
+        if hash_model_dependencies(model_dir) != image_dependency_hash:
+            raise ModelSwapError(409, "dependencies_changed", "The new version needs other dependencies")
+        try:
+            candidate, predictor = await inference_executor.run_in_thread(_load_candidate, model_dir)
+        except Exception as e:
+            raise ModelSwapError(422, "load_failed", f"Could not load the new version: {e}")
+        if _signature(candidate) != _signature(model):
+            raise ModelSwapError(409, "signature_changed", "The new version has another signature")
+        if signature_decoder is not None:
+            try:
+                # Concurrent, so that every thread of the inference pool runs the new model once.
+                await asyncio.gather(
+                    *(
+                        inference_executor.run_in_thread(_warm_up_candidate, candidate, predictor)
+                        for _ in range(max(1, WARMUP_REQUESTS))
+                    )
+                )
+            except Exception as e:
+                raise ModelSwapError(422, "warmup_failed", f"Warm-up prediction failed on the new version: {e}")
+    except ModelSwapError as e:
+        shutil.rmtree(model_dir, ignore_errors=True)
+        _model_swaps.add(1, {**model_labels, "result": e.reason})
+        raise
+    return candidate, predictor
+
+
+def _serve_prepared_model(model_dir: str, version: str, candidate: Any, predictor: Optional[NumpyPredictor]) -> None:
+    global model, numpy_predictor, active_model_dir, active_model_version
+    previous_dir = active_model_dir
+    # Workers read both globals per call; a call between the two assignments still gets a consistent pair.
+    model, numpy_predictor = candidate, predictor
+    active_model_dir, active_model_version = model_dir, version
+    inference_executor.restart_process_pool()
+    if prediction_cache is not None:
+        prediction_cache.model_hash = _read_model_hash(model_dir)
+    if os.path.dirname(previous_dir) == os.path.realpath(MODEL_VERSIONS_DIR):
+        shutil.rmtree(previous_dir, ignore_errors=True)
+    _model_swaps.add(1, {**model_labels, "result": "success"})
+
+
+def _served_model() -> Dict[str, Any]:
+    return {
+        "model_version": active_model_version,
+        "model_hash": _read_model_hash(active_model_dir),
+        "dependency_hash": image_dependency_hash,
+        "serving_backend": _serving_backend(),
+        "traffic_split": traffic_split.model_dump() if traffic_split is not None else None,
+    }
+
+
+def _serving_backend() -> str:
+    return numpy_predictor.backend if numpy_predictor is not None else "pyfunc"
+
+
+def require_admin_token(request: Request) -> None:
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {MODEL_ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+# ---------------------------------------------------------------------------
+# Shadow and canary traffic
+# ---------------------------------------------------------------------------
+# To see how a candidate version behaves under real traffic before it takes
+# over, the platform deploys it next to this pod and points PUT /admin/traffic
+# at it. In "shadow" mode every /predict request is answered by this pod as
+# usual, then mirrored to the candidate off the request path and both
+# predictions are compared (numbers within SHADOW_AGREEMENT_RTOL). At most
+# SHADOW_MAX_IN_FLIGHT mirrored calls are pending; extra ones are dropped
+# rather than queued. In "canary" mode a `weight` share of /predict requests is
+# proxied to the candidate and gets its answer; when the candidate fails, this
+# pod answers instead. Latency is recorded per version as seen from here: this
+# pod's own handling of /predict, the candidate's round trip. Multipart uploads
+# are never split. The platform sets the split on every pod, and saves it in
+# TRAFFIC_SPLIT for the pods started later.
+TRAFFIC_SPLIT_TIMEOUT_SECONDS = float(os.getenv("TRAFFIC_SPLIT_TIMEOUT_SECONDS", "5"))
+SHADOW_MAX_IN_FLIGHT = int(os.getenv("SHADOW_MAX_IN_FLIGHT", "32"))
+SHADOW_AGREEMENT_RTOL = float(os.getenv("SHADOW_AGREEMENT_RTOL", "1e-6"))
+# Request headers the candidate needs to decode the body and encode its answer like this pod
+TRAFFIC_SPLIT_HEADERS = ("content-type", "accept")
+SERVED_VERSION_HEADER = "X-Served-Model-Version"
+
+
+class TrafficSplit(BaseModel):
+    mode: Literal["shadow", "canary"]
+    candidate_url: str = Field(pattern=r"^https?://")
+    candidate_version: str = Field(pattern=f"^{MODEL_VERSION_PATTERN}$")
+    # Share of requests answered by the candidate, canary mode only
+    weight: float = Field(default=0.0, ge=0, le=1)
+
+
+def _initial_traffic_split() -> Optional[TrafficSplit]:
+    if not os.getenv("TRAFFIC_SPLIT"):
+        return None
+    try:
+        return TrafficSplit.model_validate_json(os.environ["TRAFFIC_SPLIT"])
+    except ValidationError as e:
+        logger.error(f"Ignoring invalid TRAFFIC_SPLIT: {e}")
+        return None
+
+
+traffic_split: Optional[TrafficSplit] = _initial_traffic_split()
+shadow_tasks: set = set()
+_candidate_client: Optional[httpx.AsyncClient] = None
+
+
+def _split_labels(split: TrafficSplit, role: str) -> Dict[str, str]:
+    version = split.candidate_version if role == "candidate" else active_model_version
+    return {**model_labels, "mode": split.mode, "role": role, "target_version": version}
+
+
+async def _call_candidate(split: TrafficSplit, body: bytes, headers: Any) -> httpx.Response:
+    global _candidate_client
+    if _candidate_client is None:
+        _candidate_client = httpx.AsyncClient(timeout=TRAFFIC_SPLIT_TIMEOUT_SECONDS)
+    started_at = time.perf_counter()
+    response = await _candidate_client.post(
+        f"{split.candidate_url.rstrip('/')}/predict",
+        content=body,
+        headers={name: headers[name] for name in TRAFFIC_SPLIT_HEADERS if name in headers},
+    )
+    if response.status_code == 200:
+        _traffic_split_duration.record(time.perf_counter() - started_at, _split_labels(split, "candidate"))
+    return response
+
+
+async def _canary_response(split: TrafficSplit, body: bytes, headers: Any) -> Optional[Response]:
+    """The candidate's answer, or None when this pod should answer instead."""
+    try:
+        response = await _call_candidate(split, body, headers)
+    except httpx.HTTPError as e:
+        logger.warning(f"Canary call to version {split.candidate_version} failed: {e!r}")
+        response = None
+    if response is None or response.status_code != 200:
+        _traffic_split_requests.add(1, {**_split_labels(split, "candidate"), "result": "fallback"})
+        return None
+    _traffic_split_requests.add(1, {**_split_labels(split, "candidate"), "result": "served"})
+    return Response(
+        content=response.content,
+        media_type=response.headers.get("content-type"),
+        headers={SERVED_VERSION_HEADER: split.candidate_version},
+    )
+
+
+def _response_outputs(content: bytes, media_type: str) -> Any:
+    """Predictions of a /predict answer, or None for formats that are not compared (Arrow)."""
+    payload_format = _payload_format(media_type or "")
+    if payload_format == "json":
+        return json.loads(content)["outputs"]
+    if payload_format == "msgpack" and msgpack is not None:
+        return msgpack.unpackb(content)["outputs"]
+    return None
+
+
+def predictions_agree(incumbent: Any, candidate: Any) -> bool:
+    try:
+        incumbent_array, candidate_array = np.asarray(incumbent), np.asarray(candidate)
+        if incumbent_array.shape != candidate_array.shape:
+            return False
+        if incumbent_array.dtype.kind in "fiub" and candidate_array.dtype.kind in "fiub":
+            return bool(np.allclose(incumbent_array, candidate_array, rtol=SHADOW_AGREEMENT_RTOL, atol=0))
+        return bool(np.array_equal(incumbent_array, candidate_array))
+    except ValueError:  # ragged nested lists
+        return incumbent == candidate
+
+
+async def _shadow(split: TrafficSplit, body: bytes, headers: Any, incumbent: Response) -> None:
+    labels = _split_labels(split, "candidate")
+    try:
+        response = await _call_candidate(split, body, headers)
+    except httpx.HTTPError as e:
+        logger.debug(f"Shadow call to version {split.candidate_version} failed: {e!r}")
+        _traffic_split_requests.add(1, {**labels, "result": "error"})
+        return
+    if response.status_code != 200:
+        _traffic_split_requests.add(1, {**labels, "result": "error"})
+        return
+    _traffic_split_requests.add(1, {**labels, "result": "mirrored"})
+    try:
+        expected = _response_outputs(incumbent.body, incumbent.media_type)
+        actual = _response_outputs(response.content, response.headers.get("content-type", ""))
+    except (ValueError, KeyError, TypeError):
+        expected = actual = None
+    if expected is None or actual is None:
+        agreement = "not_compared"
+    else:
+        agreement = "agree" if predictions_agree(expected, actual) else "disagree"
+    _shadow_agreement.add(1, {**model_labels, "target_version": split.candidate_version, "result": agreement})
+
+
+def _mirror(split: TrafficSplit, body: bytes, headers: Any, incumbent: Response) -> None:
+    if len(shadow_tasks) >= SHADOW_MAX_IN_FLIGHT:
+        _traffic_split_requests.add(1, {**_split_labels(split, "candidate"), "result": "dropped"})
+        return
+    task = asyncio.create_task(_shadow(split, body, headers, incumbent))
+    # The event loop only keeps weak references to tasks.
+    shadow_tasks.add(task)
+    task.add_done_callback(shadow_tasks.discard)
+
+
+# ---------------------------------------------------------------------------
+# Traffic capture
+# ---------------------------------------------------------------------------
+# With TRAFFIC_CAPTURE_ENABLED the bodies of /predict requests answered with a
+# 200 are sampled so that candidate versions can be benchmarked on real
+# payloads (replay_traffic on the platform). Each capture window keeps a
+# uniform reservoir sample of at most TRAFFIC_CAPTURE_SAMPLE_SIZE bodies, none
+# bigger than TRAFFIC_CAPTURE_MAX_PAYLOAD_BYTES, together with the number of
+# requests seen so that the replay knows the recorded rate. Every
+# TRAFFIC_CAPTURE_FLUSH_SECONDS, and at shutdown, the window is written to the
+# batch-predictions bucket under TRAFFIC_CAPTURE_PREFIX and a new one starts.
+# Each serving worker captures and uploads its own windows.
+TRAFFIC_CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() == "true"
+TRAFFIC_CAPTURE_SAMPLE_SIZE = int(os.getenv("TRAFFIC_CAPTURE_SAMPLE_SIZE", "1000"))
+TRAFFIC_CAPTURE_MAX_PAYLOAD_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_PAYLOAD_BYTES", "65536"))
+TRAFFIC_CAPTURE_FLUSH_SECONDS = float(os.getenv("TRAFFIC_CAPTURE_FLUSH_SECONDS", "300"))
+TRAFFIC_CAPTURE_PREFIX = os.getenv("TRAFFIC_CAPTURE_PREFIX", "")
+TRAFFIC_CAPTURE_BUCKET = os.getenv("BATCH_BUCKET", "batch-predictions")
+
+
+class TrafficCapture:
+    """Reservoir sample (algorithm R) of the /predict bodies of the current capture window."""
+
+    def __init__(self, sample_size: int, max_payload_bytes: int):
+        self.sample_size = sample_size
+        self.max_payload_bytes = max_payload_bytes
+        self._lock = threading.Lock()
+        self._start_window()
+
+    def _start_window(self) -> None:
+        self.started_at = time.time()
+        self.requests_seen = 0
+        self.oversize = 0
+        self.samples: list = []
+
+    def offer(self, body: bytes, content_type: str, accept: str) -> None:
+        with self._lock:
+            self.requests_seen += 1
+            if len(body) > self.max_payload_bytes:
+                self.oversize += 1
+                return
+            sample = {"t": time.time(), "content_type": content_type, "accept": accept, "body": body}
+            eligible = self.requests_seen - self.oversize
+            if len(self.samples) < self.sample_size:
+                self.samples.append(sample)
+                return
+            slot = random.randrange(eligible)
+            if slot < self.sample_size:
+                self.samples[slot] = sample
+
+    def drain(self) -> Optional[Dict[str, Any]]:
+        """The finished window, ready to be serialized, or None if no request was seen; starts a new one."""
+        with self._lock:
+            window = {
+                "model_version": active_model_version,
+                "started_at": self.started_at,
+                "ended_at": time.time(),
+                "requests_seen": self.requests_seen,
+                "oversize": self.oversize,
+                "samples": sorted(self.samples, key=lambda sample: sample["t"]),
+            }
+            self._start_window()
+        if not window["requests_seen"]:
+            return None
+        for sample in window["samples"]:
+            sample["body"] = base64.b64encode(sample["body"]).decode("ascii")
+        return window
+
+
+traffic_capture: Optional[TrafficCapture] = (
+    TrafficCapture(TRAFFIC_CAPTURE_SAMPLE_SIZE, TRAFFIC_CAPTURE_MAX_PAYLOAD_BYTES) if TRAFFIC_CAPTURE_ENABLED else None
+)
+
+
+def _upload_capture_window(window: Dict[str, Any]) -> str:
+    import boto3
+
+    key = f"{TRAFFIC_CAPTURE_PREFIX.rstrip('/')}/{int(window['started_at'])}-{socket.gethostname()}-{os.getpid()}.json"
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=os.environ["MLFLOW_S3_ENDPOINT_URL"],
+        aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+    )
+    s3.put_object(Bucket=TRAFFIC_CAPTURE_BUCKET, Key=key, Body=json.dumps(window).encode())
+    return key
+
+
+async def _flush_traffic_capture() -> None:
+    window = traffic_capture.drain()
+    if window is None:
+        return
+    try:
+        key = await asyncio.to_thread(_upload_capture_window, window)
+    except Exception as e:
+        _traffic_capture_uploads.add(1, {**model_labels, "result": "error"})
+        logger.warning(f"Failed to upload captured traffic: {e!r}")
+        return
+    _traffic_capture_uploads.add(1, {**model_labels, "result": "uploaded"})
+    logger.info(f"Uploaded {len(window['samples'])} captured requests of {window['requests_seen']} to {key}")
+
+
+async def _capture_traffic() -> None:
+    while True:
+        await asyncio.sleep(TRAFFIC_CAPTURE_FLUSH_SECONDS)
+        await _flush_traffic_capture()
+
+
 # ---------------------------------------------------------------------------
 # FastAPI application
 # ---------------------------------------------------------------------------
@@ -111,6 +1794,7 @@ app = FastAPI(
     description=api_description,
     version="1.0.0",
     root_path=os.getenv("ROOT_PATH", ""),
+    lifespan=lifespan,
 )
 
 
@@ -118,89 +1802,373 @@ app = FastAPI(
     "/predict",
     response_model=PredictionResponse,
     summary="Run inference",
-    description="Send input features as JSON or upload a file for prediction.",
+    dependencies=[Depends(admit_request)],
+    description=(
+        "Send input features as JSON, MessagePack or an Arrow IPC stream (Content-Type), or upload a file for "
+        "prediction. The response format follows the Accept header (JSON by default)."
+    ),
 )
 async def predict(request: Request, file: Optional[UploadFile] = File(None)):
-    tracer = trace.get_tracer(__name__)
+    if "multipart/form-data" in request.headers.get("content-type", ""):
+        return await _predict_response(request, file)
+
+    split = traffic_split
+    if split is None:
+        response = await _predict_response(request, file)
+    else:
+        response = await _split_response(split, request, file)
+    if traffic_capture is not None and response.status_code == 200:
+        traffic_capture.offer(
+            await request.body(), request.headers.get("content-type", ""), request.headers.get("accept", "")
+        )
+    return response
+
+
+async def _split_response(split: TrafficSplit, request: Request, file: Optional[UploadFile]) -> Response:
+    body = await request.body()
+    if split.mode == "canary" and random.random() < split.weight:
+        response = await _canary_response(split, body, request.headers)
+        if response is not None:
+            return response
+    started_at = time.perf_counter()
+    response = await _predict_response(request, file)
+    _traffic_split_duration.record(time.perf_counter() - started_at, _split_labels(split, "incumbent"))
+    _traffic_split_requests.add(1, {**_split_labels(split, "incumbent"), "result": "served"})
+    response.headers[SERVED_VERSION_HEADER] = active_model_version
+    if split.mode == "shadow":
+        _mirror(split, body, request.headers, response)
+    return response
+
+
+async def _predict_response(request: Request, file: Optional[UploadFile]) -> Response:
     try:
         content_type = request.headers.get("content-type", "")
+        payload_format = _payload_format(content_type)
 
         if "multipart/form-data" in content_type:
             if not file:
                 raise HTTPException(status_code=400, detail="No file uploaded")
-            contents = await file.read()
+            with _timed_stage("/predict", "parse"):
+                contents = await file.read()
+            _record_payload("/predict", len(contents))
             logger.info("Received file for inference")
-            with tracer.start_as_current_span("model_inference"):
-                model_predict = model.predict(contents)
+            with _timed_stage("/predict", "predict"), tracer.start_as_current_span("model_inference"):
+                model_predict = await inference_executor.predict(contents)
 
-        elif "application/json" in content_type:
-            body = await request.json()
-            payload = PredictionRequest(**body)
-            input_data = payload.inputs
-            logger.info("Received JSON data for inference")
-
-            if isinstance(input_data, dict):
-                input_df = pd.DataFrame([input_data])
-            elif isinstance(input_data, BaseModel):
-                input_df = pd.DataFrame([input_data.model_dump()])
-            else:
-                input_df = pd.DataFrame(input_data)
+        elif payload_format == "arrow":
+            with _timed_stage("/predict", "parse"):
+                raw = await request.body()
+            try:
+                with _timed_stage("/predict", "dataframe"):
+                    input_df = _arrow_to_dataframe(raw)
+            except InputDecodeError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            _record_payload("/predict", len(raw), len(input_df))
+            logger.info("Received Arrow data for inference")
+            with _timed_stage("/predict", "predict"), tracer.start_as_current_span("model_inference"):
+                model_predict = await inference_executor.predict(input_df)
 
-            with tracer.start_as_current_span("model_inference"):
-                model_predict = model.predict(input_df)
+        elif payload_format is not None:
+            try:
+                with _timed_stage("/predict", "parse"):
+                    body = await _load_document(request, payload_format)
+                with _timed_stage("/predict", "decode"):
+                    record = _decode_record(body)
+            except InputDecodeError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            _record_payload("/predict", len(await request.body()), 1)
+            logger.info(f"Received {payload_format} data for inference")
+
+            if prediction_cache is not None:
+                model_predict = await prediction_cache.get_or_compute(record, lambda: _predict_record(record))
+            else:
+                model_predict = await _predict_record(record)
 
         else:
             raise HTTPException(status_code=400, detail="Unsupported content type")
 
-        if isinstance(model_predict, np.ndarray):
-            model_predict = model_predict.tolist()
-
-        return PredictionResponse(outputs=model_predict)
+        with _timed_stage("/predict", "serialize"):
+            return _encode_predictions(model_predict, request.headers.get("accept", ""))
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Prediction failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(
+    "/predict_batch",
+    response_model=PredictionResponse,
+    summary="Run inference on many records",
+    dependencies=[Depends(admit_request)],
+    description=(
+        'Send many records in one call, column-oriented ({"inputs": {"col": [..]}}) or as a list of records '
+        '({"inputs": [{"col": ..}, ..]}), as JSON or MessagePack, or send an Arrow IPC stream. Predictions are '
+        "returned as one array, in input order, in the format given by the Accept header (JSON by default)."
+    ),
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": BatchPredictionRequest.model_json_schema()},
+                MSGPACK_MEDIA_TYPES[0]: {"schema": BatchPredictionRequest.model_json_schema()},
+                ARROW_STREAM_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def predict_batch(request: Request):
+    payload_format = _payload_format(request.headers.get("content-type", "")) or "json"
+    try:
+        if payload_format == "arrow":
+            with _timed_stage("/predict_batch", "parse"):
+                raw = await request.body()
+            with _timed_stage("/predict_batch", "dataframe"):
+                model_input = _arrow_to_dataframe(raw)
+        else:
+            with _timed_stage("/predict_batch", "parse"):
+                body = await _load_document(request, payload_format)
+            with _timed_stage("/predict_batch", "decode"):
+                columns = _decode_batch(body)
+            with _timed_stage("/predict_batch", "dataframe"):
+                model_input = _batch_model_input(columns)
+    except (InputDecodeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    rows = _input_rows(model_input)
+    _record_payload("/predict_batch", len(await request.body()), rows)
+    logger.info(f"Received batch of {rows} records for inference ({payload_format})")
+
+    try:
+        with _timed_stage("/predict_batch", "predict"), tracer.start_as_current_span("model_inference"):
+            model_predict = await inference_executor.predict(model_input)
+        with _timed_stage("/predict_batch", "serialize"):
+            return _encode_predictions(model_predict, request.headers.get("accept", ""))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Batch prediction failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post(
+    "/predict_stream",
+    summary="Run inference on a stream of records",
+    description=(
+        "Send newline-delimited JSON records (application/x-ndjson) or CSV with a header line (text/csv). Records "
+        f"are predicted {STREAM_CHUNK_ROWS} at a time and the predictions streamed back as NDJSON, one line per "
+        'record in input order. A failure midway ends the stream with an {"error": .., "row": ..} line, "row" '
+        "being the number of records predicted before it."
+    ),
+    dependencies=[Depends(admit_request)],
+    response_class=StreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                NDJSON_MEDIA_TYPES[0]: {"schema": {"type": "string"}},
+                CSV_MEDIA_TYPE: {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def predict_stream(request: Request):
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:
+        read_model_inputs = _ndjson_model_inputs
+    elif media_type == CSV_MEDIA_TYPE:
+        read_model_inputs = _csv_model_inputs
+    else:
+        raise HTTPException(status_code=415, detail=f"Expected {' or '.join(NDJSON_MEDIA_TYPES)} or {CSV_MEDIA_TYPE}")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        with _timed_stage("/predict_stream", "parse"):
+            async for chunk in request.stream():
+                spool.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    _payload_size.record(size, {**model_labels, "endpoint": "/predict_stream"})
+    logger.info(f"Received {size} bytes of {media_type} for streaming inference")
+    return StreamingResponse(_stream_predictions(spool, read_model_inputs(spool)), media_type=NDJSON_MEDIA_TYPES[0])
+
+
 @app.post(
     "/agent_predict",
     summary="Run agent inference (MLflow ResponsesAgent)",
+    dependencies=[Depends(admit_request)],
     description='Send a Responses API payload to invoke an agent: {"input": [{"role": "user", "content": "..."}]}',
 )
 async def agent_predict(request: Request):
-    tracer = trace.get_tracer(__name__)
     try:
-        body = await request.json()
+        with _timed_stage("/agent_predict", "parse"):
+            body = await request.json()
+        _record_payload("/agent_predict", len(await request.body()))
         logger.info("Received agent payload for inference")
 
         # MLflow's pyfunc wrapper around ResponsesAgent expects either a dict matching
         # the signature OR a single-row DataFrame. Pass the raw dict — the wrapper
         # will validate against the schema and build the ResponsesAgentRequest internally.
-        with tracer.start_as_current_span("agent_inference"):
-            response = model.predict(body)
+        with _timed_stage("/agent_predict", "predict"), tracer.start_as_current_span("agent_inference"):
+            response, trace_id = await inference_executor.run_in_thread(_agent_predict_with_trace_id, body)
 
         _agent_invocations.add(1, {"status": "success"})
-        _record_agent_metrics_from_last_trace()
+        agent_metrics_recorder.submit(trace_id)
 
-        if hasattr(response, "model_dump"):
-            return response.model_dump()
-        if hasattr(response, "tolist"):
-            return response.tolist()
-        return response
+        with _timed_stage("/agent_predict", "serialize"):
+            if hasattr(response, "model_dump"):
+                return response.model_dump()
+            if hasattr(response, "tolist"):
+                return response.tolist()
+            return response
     except Exception as e:
         _agent_invocations.add(1, {"status": "error"})
         logger.exception("Agent prediction failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(
+    "/agent_predict_stream",
+    summary="Run agent inference, streaming events (Server-Sent Events)",
+    description=(
+        "Same payload as /agent_predict. The ResponsesAgent stream events (text deltas, tool calls, output items) "
+        "are sent as SSE messages, named after the event type, as soon as the agent produces them; the stream ends "
+        "with a 'done' event, or an 'error' event if the agent fails."
+    ),
+    dependencies=[Depends(admit_request)],
+    response_class=StreamingResponse,
+)
+async def agent_predict_stream(request: Request):
+    try:
+        with _timed_stage("/agent_predict_stream", "parse"):
+            body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON document")
+    _record_payload("/agent_predict_stream", len(await request.body()))
+    logger.info("Received agent payload for streaming inference")
+    return StreamingResponse(
+        _stream_agent_events(body),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx-based ingresses from holding the events back.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/health", summary="Health check")
 async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready", summary="Readiness check", description="Fails with 503 until the model is loaded and warmed up.")
+async def readiness_check():
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not warmup_done:
+        raise HTTPException(status_code=503, detail="Model warming up")
+    return {"status": "ready"}
+
+
 @app.get("/metrics", summary="Prometheus metrics")
 def metrics_endpoint():
-    return Response(content=generate_latest(), media_type="text/plain")
+    if worker_metrics_registry is None:
+        return Response(content=generate_latest(), media_type="text/plain")
+    # Fresh numbers for the worker serving this scrape; the others are at most one interval old.
+    _write_metrics_snapshot()
+    return Response(content=generate_latest(worker_metrics_registry), media_type="text/plain")
+
+
+@app.get("/admin/model", summary="Served model version", dependencies=[Depends(require_admin_token)])
+async def served_model():
+    return _served_model()
+
+
+@app.put(
+    "/admin/model",
+    summary="Hot swap the served model",
+    description=(
+        "Upload the artefacts of another version of the model as a .tar.gz of its MLflow model folder. It is loaded "
+        "and warmed up next to the current one, then serves the next requests or, with activate=false, waits for "
+        "POST /admin/model/activate. Answers 409 if the version needs other dependencies or has "
+        "another signature than the served one."
+    ),
+    dependencies=[Depends(require_admin_token)],
+    openapi_extra={"requestBody": {"required": True, "content": {"application/gzip": {"schema": {"type": "string"}}}}},
+)
+async def swap_model(request: Request, version: str, activate: bool = True):
+    if not re.fullmatch(MODEL_VERSION_PATTERN, version):
+        raise HTTPException(status_code=422, detail=f"Invalid version: {version}")
+    if METRICS_MULTIPROC_DIR:
+        # Each gunicorn worker holds its own model and this request only reaches one of them.
+        raise HTTPException(status_code=409, detail="Hot swap needs a single serving worker (SERVING_WORKERS=1)")
+
+    archive = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MEMORY_BYTES)
+    try:
+        async for chunk in request.stream():
+            archive.write(chunk)
+        archive.seek(0)
+        logger.info(f"Received artefacts of version {version} for a hot swap")
+        return await _swap_model(archive, version, activate)
+    except ModelSwapError as e:
+        logger.warning(f"Hot swap to version {version} refused: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    finally:
+        archive.close()
+
+
+@app.post(
+    "/admin/model/activate",
+    summary="Serve the staged model",
+    description="Serve the version staged by PUT /admin/model?activate=false. Answers 409 if it is not staged.",
+    dependencies=[Depends(require_admin_token)],
+)
+async def activate_staged_model(version: str):
+    try:
+        return await _activate_staged_model(version)
+    except ModelSwapError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@app.delete("/admin/model/staged", summary="Discard the staged model", dependencies=[Depends(require_admin_token)])
+async def discard_staged_model():
+    async with model_swap_lock:
+        _discard_staged_model()
+    return _served_model()
+
+
+@app.get("/admin/traffic", summary="Shadow or canary traffic split", dependencies=[Depends(require_admin_token)])
+async def get_traffic_split():
+    return traffic_split.model_dump() if traffic_split is not None else {"mode": None}
+
+
+@app.put(
+    "/admin/traffic",
+    summary="Mirror or split /predict traffic to a candidate version",
+    description=(
+        "shadow: answer every request and mirror it to the candidate, comparing predictions. canary: answer a "
+        "`weight` share of the requests with the candidate. Replaces the current split."
+    ),
+    dependencies=[Depends(require_admin_token)],
+)
+async def set_traffic_split(split: TrafficSplit):
+    global traffic_split
+    if METRICS_MULTIPROC_DIR:
+        # Each gunicorn worker holds its own split and this request only reaches one of them.
+        raise HTTPException(status_code=409, detail="Traffic split needs a single serving worker (SERVING_WORKERS=1)")
+    traffic_split = split
+    logger.info(f"Traffic split: {split.mode} to version {split.candidate_version} ({split.candidate_url})")
+    return split.model_dump()
+
+
+@app.delete("/admin/traffic", summary="Stop the traffic split", dependencies=[Depends(require_admin_token)])
+async def delete_traffic_split():
+    global traffic_split
+    traffic_split = None
+    logger.info("Traffic split stopped")
+    return {"mode": None}
 
 
 FastAPIInstrumentor.instrument_app(app)
@@ -217,8 +2185,9 @@ metrics.set_meter_provider(metric_provider)
 # ---------------------------------------------------------------------------
 # Agents emit a rich MLflow trace per call (mlflow.langchain.autolog). The basic
 # HTTP instrumentation can't see token usage / tool calls / cost, so after each
-# /agent_predict we read the trace just produced and turn it into OTel counters,
-# exported on the same /metrics endpoint Prometheus already scrapes.
+# /agent_predict the trace just produced is read back, off the request path (see
+# AgentMetricsRecorder), and turned into OTel counters, exported on the same
+# /metrics endpoint Prometheus already scrapes.
 # Counters are created without the "_total" suffix — the Prometheus exporter
 # appends it (e.g. agent_tokens -> agent_tokens_total).
 _agent_meter = metrics.get_meter("model_platform.agent_metrics")
@@ -235,17 +2204,28 @@ _agent_llm_calls = _agent_meter.create_counter(
     "agent_llm_calls", description="LLM / chat-model spans, summed per agent run."
 )
 _agent_tool_calls = _agent_meter.create_counter("agent_tool_calls", description="Tool spans, by tool name.")
+_agent_metrics_dropped = _agent_meter.create_counter(
+    "agent_metrics_dropped_traces", description="Agent traces skipped because the metrics queue was full."
+)
 
 
-def _record_agent_metrics_from_last_trace() -> None:
-    """Translate the MLflow trace from the last agent call into OTel metrics.
+def _agent_predict_with_trace_id(body: Dict[str, Any]) -> tuple:
+    """Run the agent and return its response with the id of the MLflow trace it produced.
+
+    Runs on an inference worker thread: the trace id is read thread-locally right
+    after predict, so concurrent agent calls on other threads can't be mixed up.
+    """
+    response = model.predict(body)
+    return response, mlflow.get_last_active_trace_id(thread_local=True)
+
+
+def _record_agent_metrics_from_trace(trace_id: Optional[str]) -> None:
+    """Translate the MLflow trace of an agent call into OTel metrics.
 
     Best-effort: any failure is logged and swallowed so that monitoring never
-    breaks the agent response. Relies on the global last-active trace, which is
-    safe here because model.predict() runs synchronously (one at a time).
+    breaks the agent response.
     """
     try:
-        trace_id = mlflow.get_last_active_trace_id()
         if not trace_id:
             logger.debug("No active MLflow trace id; skipping agent metrics")
             return
@@ -292,6 +2272,282 @@ def _record_agent_metrics_from_last_trace() -> None:
         logger.warning(f"Failed to record agent metrics from MLflow trace: {e}")
 
 
+AGENT_METRICS_QUEUE_SIZE = int(os.getenv("AGENT_METRICS_QUEUE_SIZE", "1000"))
+
+
+class AgentMetricsRecorder:
+    """Bounded queue of agent trace ids, turned into metrics by one background task.
+
+    Reading a trace back waits for autolog's pending writes (flush=True), which
+    must not delay the agent response. When the queue is full the trace is
+    skipped and counted instead of holding the request. Like MicroBatcher, the
+    worker task is started lazily on the event loop serving requests.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # A dedicated thread, so that blocking trace reads never take an inference pool worker.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-metrics")
+
+    def submit(self, trace_id: Optional[str]) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._worker = asyncio.create_task(self._run())
+        try:
+            self._queue.put_nowait(trace_id)
+        except asyncio.QueueFull:
+            _agent_metrics_dropped.add(1)
+            logger.warning(f"Agent metrics queue full ({self.max_size}); skipping trace {trace_id}")
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            trace_id = await self._queue.get()
+            await loop.run_in_executor(self._executor, _record_agent_metrics_from_trace, trace_id)
+
+
+agent_metrics_recorder = AgentMetricsRecorder(AGENT_METRICS_QUEUE_SIZE)
+
+
+def _observe_agent_metrics_pending(options):
+    return [metrics.Observation(agent_metrics_recorder.pending())]
+
+
+_agent_meter.create_observable_gauge(
+    "agent_metrics_pending_traces",
+    callbacks=[_observe_agent_metrics_pending],
+    description="Agent traces waiting for their metrics to be extracted.",
+)
+
+
+# ---------------------------------------------------------------------------
+# Per-stage serving metrics
+# ---------------------------------------------------------------------------
+# The HTTP instrumentation only sees the whole request. These histograms split
+# /predict, /predict_batch and /agent_predict into parse (reading the body),
+# decode (validating it against the signature), dataframe, predict and
+# serialize, so a regression can be traced to the stage that causes it. They
+# carry the model labels from OTEL_METRICS_EXPORTER_LABELS. The default OTel
+# buckets (0-10000) are meant for milliseconds, hence the explicit ones.
+LATENCY_BUCKETS_SECONDS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+PAYLOAD_BUCKETS_BYTES = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864]
+ROW_COUNT_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000, 100000]
+
+_serving_meter = metrics.get_meter("model_platform.serving_metrics")
+_stage_duration = _serving_meter.create_histogram(
+    "inference_stage_duration_seconds",
+    unit="s",
+    description="Time spent in each stage of a prediction request, by endpoint and stage.",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS_SECONDS,
+)
+_payload_size = _serving_meter.create_histogram(
+    "inference_payload_size_bytes",
+    unit="By",
+    description="Size of prediction request bodies, by endpoint.",
+    explicit_bucket_boundaries_advisory=PAYLOAD_BUCKETS_BYTES,
+)
+_row_count = _serving_meter.create_histogram(
+    "inference_row_count",
+    description="Number of rows per prediction request, by endpoint.",
+    explicit_bucket_boundaries_advisory=ROW_COUNT_BUCKETS,
+)
+
+
+@contextmanager
+def _timed_stage(endpoint: str, stage: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_duration.record(time.perf_counter() - started_at, {**model_labels, "endpoint": endpoint, "stage": stage})
+
+
+def _record_payload(endpoint: str, size_bytes: int, rows: Optional[int] = None) -> None:
+    attributes = {**model_labels, "endpoint": endpoint}
+    _payload_size.record(size_bytes, attributes)
+    if rows is not None:
+        _row_count.record(rows, attributes)
+
+
+# ---------------------------------------------------------------------------
+# Micro-batching metrics
+# ---------------------------------------------------------------------------
+_micro_batch_size = _serving_meter.create_histogram(
+    "micro_batch_size", description="Number of records coalesced into one model.predict call."
+)
+_micro_batch_queue_wait = _serving_meter.create_histogram(
+    "micro_batch_queue_wait_seconds",
+    unit="s",
+    description="Time a record waited in the micro-batching queue before its batch was flushed.",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS_SECONDS,
+)
+
+
+_inference_in_flight = _serving_meter.create_up_down_counter(
+    "inference_executor_in_flight", description="Predictions submitted to the inference pool and not yet completed."
+)
+
+
+def _observe_executor_max_workers(options):
+    return [metrics.Observation(inference_executor.max_workers, {"kind": inference_executor.kind})]
+
+
+def _observe_executor_utilization(options):
+    return [metrics.Observation(inference_executor.utilization(), {"kind": inference_executor.kind})]
+
+
+_serving_meter.create_observable_gauge(
+    "inference_executor_max_workers",
+    callbacks=[_observe_executor_max_workers],
+    description="Size of the inference pool.",
+)
+_serving_meter.create_observable_gauge(
+    "inference_executor_utilization",
+    callbacks=[_observe_executor_utilization],
+    description="Share of inference pool workers busy (0-1).",
+)
+
+
+# ---------------------------------------------------------------------------
+# Admission control metrics
+# ---------------------------------------------------------------------------
+_admission_shed = _serving_meter.create_counter(
+    "admission_shed_requests", description="Prediction requests rejected by admission control, by reason."
+)
+
+
+def _observe_admission_in_flight(options):
+    return [metrics.Observation(admission_controller.in_flight if admission_controller is not None else 0)]
+
+
+def _observe_admission_queued(options):
+    return [metrics.Observation(admission_controller.queued if admission_controller is not None else 0)]
+
+
+_serving_meter.create_observable_gauge(
+    "admission_in_flight_requests",
+    callbacks=[_observe_admission_in_flight],
+    description="Prediction requests holding an admission slot.",
+)
+_serving_meter.create_observable_gauge(
+    "admission_queued_requests",
+    callbacks=[_observe_admission_queued],
+    description="Prediction requests waiting for an admission slot.",
+)
+
+
+# ---------------------------------------------------------------------------
+# Prediction cache metrics
+# ---------------------------------------------------------------------------
+_prediction_cache_requests = _serving_meter.create_counter(
+    "prediction_cache_requests", description="Prediction cache lookups, by result (hit, miss, coalesced)."
+)
+_prediction_cache_evictions = _serving_meter.create_counter(
+    "prediction_cache_evictions", description="Prediction cache evictions, by reason (capacity, expired)."
+)
+
+
+def _observe_prediction_cache_size(options):
+    return [metrics.Observation(prediction_cache.size() if prediction_cache is not None else 0)]
+
+
+_serving_meter.create_observable_gauge(
+    "prediction_cache_entries", callbacks=[_observe_prediction_cache_size], description="Entries in the cache."
+)
+
+# ---------------------------------------------------------------------------
+# Model hot swap metrics
+# ---------------------------------------------------------------------------
+_model_swaps = _serving_meter.create_counter(
+    "model_swaps", description="Model hot swaps, by result (success, or why the version was refused)."
+)
+
+
+def _observe_served_model(options):
+    labels = {**model_labels, "served_model_version": active_model_version, "serving_backend": _serving_backend()}
+    return [metrics.Observation(1, labels)]
+
+
+_serving_meter.create_observable_gauge(
+    "served_model_info",
+    callbacks=[_observe_served_model],
+    description="1, labelled with the served version and backend (onnx, numpy or pyfunc).",
+)
+
+
+# ---------------------------------------------------------------------------
+# Shadow and canary traffic metrics
+# ---------------------------------------------------------------------------
+_traffic_split_duration = _serving_meter.create_histogram(
+    "traffic_split_duration_seconds",
+    unit="s",
+    description="Latency of /predict per version while traffic is split: this pod's handling, the candidate's round "
+    "trip.",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS_SECONDS,
+)
+_traffic_split_requests = _serving_meter.create_counter(
+    "traffic_split_requests",
+    description="/predict requests while traffic is split, by version, role and result (served, fallback, mirrored, "
+    "dropped, error).",
+)
+_shadow_agreement = _serving_meter.create_counter(
+    "shadow_prediction_agreement",
+    description="Mirrored requests whose candidate prediction agrees with this pod's, or not.",
+)
+
+
+# ---------------------------------------------------------------------------
+# Traffic capture metrics
+# ---------------------------------------------------------------------------
+_traffic_capture_uploads = _serving_meter.create_counter(
+    "traffic_capture_uploads", description="Capture windows written to object storage, by result (uploaded, error)."
+)
+
+
+def _observe_traffic_capture(options):
+    if traffic_capture is None:
+        return []
+    return [metrics.Observation(traffic_capture.requests_seen, model_labels)]
+
+
+_serving_meter.create_observable_gauge(
+    "traffic_capture_window_requests",
+    callbacks=[_observe_traffic_capture],
+    description="/predict requests seen in the current capture window.",
+)
+
+
+# ---------------------------------------------------------------------------
+# Native thread metrics
+# ---------------------------------------------------------------------------
+def _observe_native_threads(options):
+    return [
+        metrics.Observation(pool["num_threads"], {"library": pool["internal_api"], "api": pool["user_api"]})
+        for pool in thread_pools()
+    ]
+
+
+def _observe_cpu_limit(options):
+    return [metrics.Observation(cgroup_cpu_limit() or 0)]
+
+
+_serving_meter.create_observable_gauge(
+    "native_thread_pool_threads",
+    callbacks=[_observe_native_threads],
+    description="Threads of each native pool (OpenMP, BLAS) loaded in the serving process, by library.",
+)
+_serving_meter.create_observable_gauge(
+    "container_cpu_limit",
+    callbacks=[_observe_cpu_limit],
+    description="CPU limit of the container from its cgroup, 0 without limit.",
+)
+
+
 # Tracer exporter
 zipkin_endpoint = os.getenv("ZIPKIN_ENDPOINT")
 if zipkin_endpoint:
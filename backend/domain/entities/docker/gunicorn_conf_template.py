@@ -0,0 +1,41 @@
+"""Gunicorn settings of the serving image in multi-worker mode (SERVING_WORKERS other than 1).
+
+The app module, and so the MLflow model, is imported once in the master
+(preload_app) before the workers are forked: they share the model pages
+copy-on-write instead of each holding a copy. Each worker writes its metrics
+to METRICS_MULTIPROC_DIR, which /metrics merges (see fast_api_template.py).
+"""
+
+import os
+import shutil
+
+# Gunicorn puts its working directory, /opt/mlflow, on sys.path before loading this file
+from native_threads_template import cgroup_cpu_limit, worker_count
+
+# Read by fast_api_template.py in every worker; set before the app is preloaded.
+metrics_multiproc_dir = os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/serving_metrics")
+
+bind = "0.0.0.0:8000"
+workers = worker_count(os.getenv("SERVING_WORKERS", "auto"))
+# Read by fast_api_template.py to share the CPU limit between the workers' native thread pools
+os.environ["SERVING_PROCESSES"] = str(workers)
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+loglevel = "info"
+
+
+def on_starting(server):
+    # Snapshots left by a previous container run would be merged into /metrics.
+    shutil.rmtree(metrics_multiproc_dir, ignore_errors=True)
+    os.makedirs(metrics_multiproc_dir, exist_ok=True)
+    server.log.info(f"Serving with {workers} workers (CPU limit: {cgroup_cpu_limit()})")
+
+
+def child_exit(server, worker):
+    # A worker that died without running its shutdown must not keep reporting its gauges.
+    try:
+        os.remove(os.path.join(metrics_multiproc_dir, f"{worker.pid}.prom"))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,23 @@
+"""Hash of the dependency set of an MLflow model.
+
+Two versions whose dependency files are the same run in the same image. The platform groups the versions served by
+one multi-model Deployment by this hash (backend.utils), and the serving apps check it before hot swapping a version
+(fast_api_template.py) or loading one next to the others (multi_model_template.py): the file is copied next to them
+in the image, and imported from the backend, so that both sides always hash the same way.
+"""
+
+import hashlib
+import os
+
+MODEL_DEPENDENCY_FILES = ("requirements.txt", "conda.yaml", "python_env.yaml")
+
+
+def hash_model_dependencies(model_dir: str) -> str:
+    """sha256 of the dependency files of the model in model_dir, whatever its weights."""
+    hasher = hashlib.sha256()
+    for name in MODEL_DEPENDENCY_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                hasher.update(name.encode() + b"\0" + f.read() + b"\0")
+    return hasher.hexdigest()
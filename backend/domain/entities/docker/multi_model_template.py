@@ -0,0 +1,443 @@
+"""Multi-model serving app, started instead of fast_api_template.py when SERVING_APP=multi_model_template.
+
+One pod serves the versions of the project's models deployed to it that need the dependency set installed in its
+image, under /models/{name}/{version}/predict (see K8SMultiModelDeployment). A version is downloaded from the project
+registry (MLFLOW_TRACKING_URI) and loaded on its first request, and the least recently used versions are evicted
+once the loaded ones exceed MODEL_MEMORY_BUDGET_MB. The pod is ready as long as it can reach the registry.
+
+Only the versions deployed through the platform, which checks the deployment gate of each version, are served: they
+are read at start from the DEPLOYED_MODEL_* variables of the deployment's serving state, and added to the running pods
+by PUT /admin/models/{name}/{version}. Any other version of the registry gets a 404.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+import httpx
+import mlflow
+import numpy as np
+import pandas as pd
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from loguru import logger
+from mlflow.exceptions import MlflowException
+from model_dependencies_template import hash_model_dependencies
+from native_threads_template import cgroup_cpu_limit, configure_native_threads, describe_native_threads, thread_pools
+from opentelemetry import metrics
+from opentelemetry.exporter.prometheus import PrometheusMetricReader
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from prometheus_client import generate_latest
+
+image_name = os.environ["IMAGE_NAME"]
+# "project_name=.." set by K8SMultiModelDeployment, attached to every metric along with the model name and version
+pod_labels = dict(
+    label.split("=", 1) for label in os.getenv("OTEL_METRICS_EXPORTER_LABELS", "").split(",") if "=" in label
+)
+
+# The image was built around one model version, whose dependency files describe what is installed.
+IMAGE_MODEL_DIR = "/opt/mlflow/"
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/tmp/models")
+MODEL_MEMORY_BUDGET_BYTES = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024
+INFERENCE_EXECUTOR_WORKERS = max(1, int(os.getenv("INFERENCE_EXECUTOR_WORKERS", "4")))
+# Versions remembered as needing another dependency set, least recently requested first forgotten
+MAX_REFUSED_VERSIONS = int(os.getenv("MAX_REFUSED_VERSIONS", "1024"))
+# Project registry the models are downloaded from, set by K8SMultiModelDeployment
+MLFLOW_TRACKING_URI = os.environ["MLFLOW_TRACKING_URI"]
+# Within the 2s timeout of the readiness probe set by K8SMultiModelDeployment
+REGISTRY_CHECK_TIMEOUT_SECONDS = float(os.getenv("REGISTRY_CHECK_TIMEOUT_SECONDS", "1"))
+
+# Guards the admin endpoints, which answer 404 without it; set from the deployment's admin Secret
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+# Serving state entries of the deployed versions, {"name": .., "version": ..} each
+DEPLOYED_MODEL_ENV_PREFIX = "DEPLOYED_MODEL_"
+
+image_dependency_hash = hash_model_dependencies(IMAGE_MODEL_DIR)
+os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+
+# Before the flavor's libraries are loaded, as in fast_api_template.py
+native_threads = configure_native_threads(max(1, int(os.getenv("SERVING_PROCESSES", "1"))))
+try:
+    # Imports the flavor's libraries once, so that their memory is not counted as the first served model's.
+    mlflow.pyfunc.load_model(IMAGE_MODEL_DIR)
+except Exception as e:
+    logger.warning(f"Could not preload the image's model: {e}")
+logger.info(describe_native_threads(native_threads))
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_EXECUTOR_WORKERS, thread_name_prefix="inference")
+
+
+# ---------------------------------------------------------------------------
+# Model store: lazy loading and LRU eviction
+# ---------------------------------------------------------------------------
+# The memory of a model is estimated as the growth of the process RSS while it
+# loads (loads run one at a time so that the growth can be attributed), and at
+# least the size of its artefacts: once a model has been evicted, the next one
+# may reuse the freed heap without growing the RSS. The least recently used
+# models are evicted after a load brings the total above the budget, so the
+# budget can be exceeded by the model being loaded; a model bigger than the
+# whole budget is still served, alone. Evicted models stay in memory until the
+# requests using them return.
+class ModelLoadError(Exception):
+    def __init__(self, status_code: int, reason: str, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+
+
+class LoadedModel:
+    def __init__(self, name: str, version: str, model: Any, memory_bytes: int):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+
+    def labels(self) -> Dict[str, str]:
+        return {**pod_labels, "model_name": self.name, "model_version": self.version}
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def _model_dir(name: str, version: str) -> str:
+    # Hashed so that a model name cannot point outside of the cache folder
+    return os.path.join(MODEL_CACHE_DIR, hashlib.sha256(f"{name}/{version}".encode()).hexdigest()[:32])
+
+
+def _download_model(name: str, version: str, model_dir: str) -> None:
+    download_dir = tempfile.mkdtemp(dir=MODEL_CACHE_DIR)
+    try:
+        mlflow.artifacts.download_artifacts(artifact_uri=f"models:/{name}/{version}", dst_path=download_dir)
+    except MlflowException as e:
+        shutil.rmtree(download_dir, ignore_errors=True)
+        if e.error_code == "RESOURCE_DOES_NOT_EXIST":
+            raise ModelLoadError(404, "not_found", f"Model {name} version {version} not found")
+        raise
+    os.rename(download_dir, model_dir)
+
+
+def _load_model(name: str, version: str) -> LoadedModel:
+    model_dir = _model_dir(name, version)
+    if not os.path.isdir(model_dir):
+        _download_model(name, version, model_dir)
+    if hash_model_dependencies(model_dir) != image_dependency_hash:
+        shutil.rmtree(model_dir, ignore_errors=True)
+        raise ModelLoadError(
+            409, "dependencies_changed", f"Model {name} version {version} needs another dependency set"
+        )
+    rss_before = _rss_bytes()
+    model = mlflow.pyfunc.load_model(model_dir)
+    memory_bytes = max(_rss_bytes() - rss_before, _directory_size(model_dir))
+    return LoadedModel(name, version, model, memory_bytes)
+
+
+class ModelStore:
+    """Models loaded on their first request, least recently used first evicted beyond the memory budget."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._models: OrderedDict = OrderedDict()
+        self._loading: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._load_lock = asyncio.Lock()
+        # Versions needing other dependencies are not downloaded again on every request
+        self._refused: OrderedDict = OrderedDict()
+
+    async def get(self, name: str, version: str) -> LoadedModel:
+        key = (name, version)
+        if key in self._refused:
+            self._refused.move_to_end(key)
+            raise self._refused[key]
+        loaded = self._models.get(key)
+        if loaded is not None:
+            self._models.move_to_end(key)
+            return loaded
+        # Requests arriving while the model loads wait for the same load.
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.ensure_future(self._load(name, version))
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, name: str, version: str) -> LoadedModel:
+        labels = {**pod_labels, "model_name": name, "model_version": version}
+        async with self._load_lock:
+            started_at = time.perf_counter()
+            try:
+                loaded = await asyncio.get_running_loop().run_in_executor(inference_pool, _load_model, name, version)
+            except ModelLoadError as e:
+                _model_loads.add(1, {**labels, "result": e.reason})
+                if e.status_code == 409:
+                    self._refuse(name, version, e)
+                raise
+            except Exception:
+                _model_loads.add(1, {**labels, "result": "error"})
+                raise
+            _model_loads.add(1, {**labels, "result": "success"})
+            _model_load_duration.record(time.perf_counter() - started_at, labels)
+            self._models[(name, version)] = loaded
+            logger.info(f"Loaded {name} version {version} ({loaded.memory_bytes / 2**20:.0f} MB)")
+            self._evict()
+            return loaded
+
+    def _refuse(self, name: str, version: str, error: ModelLoadError) -> None:
+        self._refused[(name, version)] = error
+        while len(self._refused) > MAX_REFUSED_VERSIONS:
+            self._refused.popitem(last=False)
+
+    def _evict(self) -> None:
+        while self.memory_bytes() > self.budget_bytes and len(self._models) > 1:
+            _, evicted = self._models.popitem(last=False)
+            shutil.rmtree(_model_dir(evicted.name, evicted.version), ignore_errors=True)
+            _model_evictions.add(1, {**evicted.labels(), "reason": "memory_budget"})
+            logger.info(f"Evicted {evicted.name} version {evicted.version} to stay within the memory budget")
+
+    def memory_bytes(self) -> int:
+        return sum(loaded.memory_bytes for loaded in self._models.values())
+
+    def loaded(self) -> list:
+        return list(self._models.values())
+
+
+model_store = ModelStore(MODEL_MEMORY_BUDGET_BYTES)
+
+
+def _deployed_models_from_env() -> set:
+    deployed = set()
+    for key, value in os.environ.items():
+        if not key.startswith(DEPLOYED_MODEL_ENV_PREFIX):
+            continue
+        try:
+            model = json.loads(value)
+            deployed.add((model["name"], model["version"]))
+        except (ValueError, TypeError, KeyError):
+            logger.warning(f"Ignoring malformed deployed model {key}={value!r}")
+    return deployed
+
+
+# (name, version) of the models this pod may serve
+deployed_models = _deployed_models_from_env()
+
+
+def _model_input(body: Any) -> pd.DataFrame:
+    """DataFrame from {"inputs": ..}: one record, a list of records or columns of values."""
+    inputs = body.get("inputs") if isinstance(body, dict) else None
+    if isinstance(inputs, dict):
+        if all(isinstance(values, list) for values in inputs.values()):
+            return pd.DataFrame(inputs)
+        return pd.DataFrame([inputs])
+    if isinstance(inputs, list) and all(isinstance(record, dict) for record in inputs):
+        return pd.DataFrame(inputs)
+    raise ValueError('Expected {"inputs": {..}} or {"inputs": [{..}, ..]}')
+
+
+def _serialize_predictions(predictions: Any) -> Any:
+    if isinstance(predictions, pd.DataFrame):
+        return predictions.to_dict(orient="records")
+    if isinstance(predictions, (np.ndarray, pd.Series)):
+        return predictions.tolist()
+    return predictions
+
+
+# ---------------------------------------------------------------------------
+# FastAPI application
+# ---------------------------------------------------------------------------
+app = FastAPI(
+    title=f"Multi-model API - {image_name}",
+    description=(
+        "Serves the project's models that share this pod's dependencies. A model version is loaded on its first "
+        "request, so that request takes longer, and the least recently used versions are unloaded to stay within "
+        "the pod's memory budget."
+    ),
+    version="1.0.0",
+    root_path=os.getenv("ROOT_PATH", ""),
+)
+
+
+def require_admin_token(request: Request) -> None:
+    if not MODEL_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {MODEL_ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/models/{name}/{version}/predict", summary="Run inference with a model version")
+async def predict(name: str, version: str, request: Request):
+    if (name, version) not in deployed_models:
+        raise HTTPException(status_code=404, detail=f"Model {name} version {version} is not deployed on this pod")
+    try:
+        loaded = await model_store.get(name, version)
+    except ModelLoadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Loading {name} version {version} failed")
+        raise HTTPException(status_code=500, detail=f"Could not load model {name} version {version}: {e}")
+
+    try:
+        model_input = _model_input(await request.json())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    started_at = time.perf_counter()
+    try:
+        predictions = await asyncio.get_running_loop().run_in_executor(
+            inference_pool, loaded.model.predict, model_input
+        )
+    except Exception as e:
+        logger.exception(f"Prediction with {name} version {version} failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        _prediction_duration.record(time.perf_counter() - started_at, loaded.labels())
+    return {"outputs": _serialize_predictions(predictions)}
+
+
+@app.get("/models", summary="Loaded models")
+async def loaded_models():
+    return {
+        "memory_budget_bytes": model_store.budget_bytes,
+        "memory_bytes": model_store.memory_bytes(),
+        "models": [
+            {"name": loaded.name, "version": loaded.version, "memory_bytes": loaded.memory_bytes}
+            for loaded in model_store.loaded()
+        ],
+    }
+
+
+@app.put(
+    "/admin/models/{name}/{version}",
+    summary="Deploy a model version",
+    description="Serve the version from this pod; it is loaded on its first request.",
+    dependencies=[Depends(require_admin_token)],
+)
+async def deploy_model_version(name: str, version: str):
+    deployed_models.add((name, version))
+    logger.info(f"Model {name} version {version} deployed")
+    return {"name": name, "version": version}
+
+
+@app.get("/health", summary="Health check")
+async def health_check():
+    return {"status": "healthy"}
+
+
+async def _registry_reachable() -> bool:
+    try:
+        async with httpx.AsyncClient(timeout=REGISTRY_CHECK_TIMEOUT_SECONDS) as client:
+            response = await client.get(f"{MLFLOW_TRACKING_URI.rstrip('/')}/health")
+    except httpx.HTTPError as e:
+        logger.warning(f"Model registry unreachable: {e}")
+        return False
+    return response.status_code == 200
+
+
+@app.get("/ready", summary="Readiness check", description="Fails with 503 while the model registry is unreachable.")
+async def readiness_check():
+    # Models are loaded by their first request, downloaded from the registry: a pod that cannot reach it would
+    # fail every request for a version it has not loaded yet.
+    if not await _registry_reachable():
+        raise HTTPException(status_code=503, detail="Model registry unreachable")
+    return {"status": "ready"}
+
+
+@app.get("/metrics", summary="Prometheus metrics")
+def metrics_endpoint():
+    return Response(content=generate_latest(), media_type="text/plain")
+
+
+FastAPIInstrumentor.instrument_app(app)
+resource = Resource.create(attributes={SERVICE_NAME: f"model-platform-{image_name}"})
+reader = PrometheusMetricReader()
+metric_provider = MeterProvider(resource=resource, metric_readers=[reader])
+metrics.set_meter_provider(metric_provider)
+
+# ---------------------------------------------------------------------------
+# Model store metrics
+# ---------------------------------------------------------------------------
+LATENCY_BUCKETS_SECONDS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+LOAD_BUCKETS_SECONDS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+_serving_meter = metrics.get_meter("model_platform.serving_metrics")
+_model_loads = _serving_meter.create_counter(
+    "model_loads", description="Model loads, by model and result (success, not_found, dependencies_changed, error)."
+)
+_model_load_duration = _serving_meter.create_histogram(
+    "model_load_duration_seconds",
+    unit="s",
+    description="Download and load time of a model on its first request.",
+    explicit_bucket_boundaries_advisory=LOAD_BUCKETS_SECONDS,
+)
+_model_evictions = _serving_meter.create_counter("model_evictions", description="Models unloaded, by model and reason.")
+_prediction_duration = _serving_meter.create_histogram(
+    "model_prediction_duration_seconds",
+    unit="s",
+    description="model.predict time, by model.",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS_SECONDS,
+)
+
+
+def _observe_loaded_models(options):
+    return [metrics.Observation(len(model_store.loaded()), pod_labels)]
+
+
+def _observe_model_memory(options):
+    return [metrics.Observation(loaded.memory_bytes, loaded.labels()) for loaded in model_store.loaded()]
+
+
+def _observe_memory_budget(options):
+    return [metrics.Observation(model_store.budget_bytes, pod_labels)]
+
+
+_serving_meter.create_observable_gauge(
+    "loaded_models", callbacks=[_observe_loaded_models], description="Models currently loaded."
+)
+_serving_meter.create_observable_gauge(
+    "loaded_model_memory_bytes",
+    callbacks=[_observe_model_memory],
+    unit="By",
+    description="Estimated memory of each loaded model.",
+)
+_serving_meter.create_observable_gauge(
+    "model_memory_budget_bytes",
+    callbacks=[_observe_memory_budget],
+    unit="By",
+    description="Memory budget of the loaded models.",
+)
+
+
+def _observe_native_threads(options):
+    return [
+        metrics.Observation(
+            pool["num_threads"], {**pod_labels, "library": pool["internal_api"], "api": pool["user_api"]}
+        )
+        for pool in thread_pools()
+    ]
+
+
+def _observe_cpu_limit(options):
+    return [metrics.Observation(cgroup_cpu_limit() or 0, pod_labels)]
+
+
+_serving_meter.create_observable_gauge(
+    "native_thread_pool_threads",
+    callbacks=[_observe_native_threads],
+    description="Threads of each native pool (OpenMP, BLAS) loaded in the serving process, by library.",
+)
+_serving_meter.create_observable_gauge(
+    "container_cpu_limit",
+    callbacks=[_observe_cpu_limit],
+    description="CPU limit of the container from its cgroup, 0 without limit.",
+)
@@ -0,0 +1,102 @@
+"""Native thread pools of the model libraries sized to the container's CPU limit.
+
+OpenMP, OpenBLAS and MKL start one thread per core of the node, not of the pod: numpy, sklearn, xgboost or lightgbm
+in a pod limited to 2 CPUs on a 64-core node run 64 threads that the CFS quota throttles, and the tail latency pays
+for it. The serving and batch templates call configure_native_threads() at startup, before the model is loaded: it
+sets the *_NUM_THREADS variables read by the libraries loaded afterwards (the model's own), and limits with
+threadpoolctl the pools of the ones already loaded (numpy's BLAS).
+
+NATIVE_THREADS sets the threads of each pool; "auto" shares the CPU limit of the container (its CPUs without limit)
+between the processes running predictions in the pod, rounded down, at least 1.
+
+The CPU limit also sizes the serving workers (gunicorn_conf_template.py) and the batch prediction processes
+(batch_predict_template.py), which import worker_count from here.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPU limit of the container (e.g. 2.5 for limits.cpu: 2500m), or None without limit."""
+    try:
+        quota, period = _read(CGROUP_V2_CPU_MAX).split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(_read(CGROUP_V1_CPU_QUOTA))
+        return quota / int(_read(CGROUP_V1_CPU_PERIOD)) if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def container_cpus() -> float:
+    """CPU limit of the container, or the CPUs the process may run on without limit."""
+    cpu_limit = cgroup_cpu_limit()
+    return cpu_limit if cpu_limit is not None else len(os.sched_getaffinity(0))
+
+
+def worker_count(setting: str) -> int:
+    """Number of worker processes for a setting: an integer, or "auto" for one per CPU of the container limit."""
+    if setting != "auto":
+        return max(1, int(setting))
+    return max(1, int(container_cpus()))
+
+
+def native_thread_count(setting: str, processes: int = 1) -> int:
+    """Threads per pool for NATIVE_THREADS: an integer, or "auto" for the container's CPUs shared by `processes`."""
+    if setting != "auto":
+        return max(1, int(setting))
+    return max(1, int(container_cpus() / max(1, processes)))
+
+
+def thread_pools() -> List[Dict[str, Any]]:
+    """Native pools loaded in the process, as reported by threadpoolctl (none without it)."""
+    if threadpoolctl is None:
+        return []
+    return [
+        {"user_api": pool["user_api"], "internal_api": pool["internal_api"], "num_threads": pool["num_threads"]}
+        for pool in threadpoolctl.threadpool_info()
+    ]
+
+
+def configure_native_threads(processes: int = 1) -> Dict[str, Any]:
+    """Sizes the native pools of this process and of the libraries it loads later; returns the settings applied."""
+    threads = native_thread_count(os.getenv("NATIVE_THREADS", "auto"), processes)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    if threadpoolctl is not None:
+        threadpoolctl.threadpool_limits(limits=threads)
+    return {"threads": threads, "cpu_limit": cgroup_cpu_limit(), "processes": processes}
+
+
+def describe_native_threads(settings: Dict[str, Any]) -> str:
+    """One startup log line: the settings applied and the pools loaded by then."""
+    pools = ", ".join(f"{pool['internal_api']}={pool['num_threads']}" for pool in thread_pools()) or "none reported"
+    return (
+        f"Native threads: {settings['threads']} per pool (CPU limit: {settings['cpu_limit']}, "
+        f"{settings['processes']} prediction processes); pools: {pools}"
+    )
@@ -0,0 +1,209 @@
+"""ONNX export of the image's model, run once while the serving image is built (DockerfileTemplate onnx_conversion).
+
+sklearn, xgboost and lightgbm models with a numeric signature are converted with skl2onnx or onnxmltools, in the
+image so that the model is loaded with the exact library versions it was logged with. The export is only kept when
+ONNX Runtime predicts the same as the MLflow pyfunc model on sample rows generated from the signature (plus the
+logged input example): fast_api_template.py then serves through ONNX Runtime, and through pyfunc otherwise.
+
+The report written next to the export (onnx/conversion.json) says which backend was chosen and why, with the parity
+check results; the platform reads it back after the build and records it on the model info. This script never
+fails the build: anything going wrong is only a reason to keep serving with pyfunc.
+"""
+
+import json
+import os
+import sys
+import warnings
+from typing import Any, Dict, Optional
+
+import mlflow
+import numpy as np
+import pandas as pd
+
+ONNX_DIR = "onnx"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_REPORT_FILE = "conversion.json"
+CONVERTIBLE_FLAVORS = ("sklearn", "xgboost", "lightgbm")
+# Numpy dtype kinds that convert exactly enough to float32: float, (unsigned) integer, boolean
+NUMERIC_DTYPE_KINDS = "fiub"
+PARITY_SAMPLE_ROWS = 256
+# ONNX Runtime computes in float32 where the flavor libraries use float64
+PARITY_RTOL = 1e-4
+PARITY_ATOL = 1e-5
+PARITY_SEED = 0
+
+
+class OnnxConversionError(Exception):
+    """The model is served with pyfunc; the message says why."""
+
+
+def _input_dtypes(model: Any) -> Dict[str, np.dtype]:
+    schema = model.metadata.get_input_schema() if model.metadata else None
+    if schema is None or not schema.has_input_names():
+        raise OnnxConversionError("The model has no signature with named input columns")
+    try:
+        dtypes = {name: np.dtype(dtype) for name, dtype in zip(schema.input_names(), schema.numpy_types())}
+    except Exception:
+        raise OnnxConversionError("The signature has non-scalar input columns")
+    if any(dtype.kind not in NUMERIC_DTYPE_KINDS for dtype in dtypes.values()):
+        raise OnnxConversionError("The signature has non-numeric input columns")
+    return dtypes
+
+
+def sample_inputs(input_dtypes: Dict[str, np.dtype], rows: int, seed: int = PARITY_SEED) -> pd.DataFrame:
+    """Seeded rows of the signature's types, on a few scales so that tree models go down several branches."""
+    rng = np.random.default_rng(seed)
+    scales = np.resize([1.0, 10.0, 1000.0], rows)
+    columns = {}
+    for name, dtype in input_dtypes.items():
+        if dtype.kind == "b":
+            values = rng.integers(0, 2, rows).astype(bool)
+        elif dtype.kind == "u":
+            values = rng.integers(0, 100, rows)
+        elif dtype.kind == "i":
+            values = rng.integers(-100, 100, rows)
+        else:
+            values = rng.standard_normal(rows) * scales
+        columns[name] = values.astype(dtype)
+    return pd.DataFrame(columns)
+
+
+def _parity_inputs(model: Any, model_dir: str, input_dtypes: Dict[str, np.dtype]) -> pd.DataFrame:
+    sample = sample_inputs(input_dtypes, PARITY_SAMPLE_ROWS)
+    try:
+        example = model.metadata.load_input_example(model_dir)
+    except Exception:
+        example = None
+    if isinstance(example, pd.DataFrame) and set(example.columns) == set(input_dtypes):
+        sample = pd.concat([example[list(input_dtypes)].astype(input_dtypes), sample], ignore_index=True)
+    return sample
+
+
+def compare_predictions(actual: Any, expected: Any) -> Dict[str, Any]:
+    """Parity of ONNX Runtime predictions with the pyfunc ones: exact for labels, within tolerance for scores."""
+    actual, expected = np.asarray(actual), np.asarray(expected)
+    if actual.ndim == 2 and actual.shape[1] == 1 and expected.ndim == 1:
+        actual = actual[:, 0]
+    result = {"rows": int(expected.shape[0]) if expected.ndim else 0, "passed": False, "max_abs_diff": None}
+    if actual.shape != expected.shape:
+        result["mismatched_rows"] = result["rows"]
+        return result
+    if expected.dtype.kind in "fc" and actual.dtype.kind in "fiub":
+        actual = actual.astype(np.float64)
+        row_matches = np.isclose(actual, expected, rtol=PARITY_RTOL, atol=PARITY_ATOL)
+        result["max_abs_diff"] = float(np.max(np.abs(actual - expected))) if expected.size else 0.0
+    else:
+        row_matches = actual == expected
+    if row_matches.ndim > 1:
+        row_matches = row_matches.reshape(row_matches.shape[0], -1).all(axis=1)
+    result["mismatched_rows"] = int(np.size(row_matches) - np.count_nonzero(row_matches))
+    result["passed"] = result["mismatched_rows"] == 0
+    return result
+
+
+def _convert(raw_model: Any, flavor: str, n_features: int) -> Any:
+    try:
+        if flavor == "sklearn":
+            from skl2onnx import convert_sklearn
+            from skl2onnx.common.data_types import FloatTensorType
+
+            # zipmap off: class probabilities as a float tensor rather than a list of dicts
+            options = {"zipmap": False} if hasattr(raw_model, "predict_proba") else None
+            return convert_sklearn(
+                raw_model, initial_types=[("input", FloatTensorType([None, n_features]))], options=options
+            )
+
+        import onnxmltools
+        from onnxmltools.convert.common.data_types import FloatTensorType
+
+        initial_types = [("input", FloatTensorType([None, n_features]))]
+        if flavor == "xgboost":
+            return onnxmltools.convert_xgboost(raw_model, initial_types=initial_types)
+        return onnxmltools.convert_lightgbm(raw_model, initial_types=initial_types, zipmap=False)
+    except ImportError as e:
+        raise OnnxConversionError(f"ONNX converter not installed: {e}")
+    except Exception as e:
+        raise OnnxConversionError(f"ONNX conversion failed: {e}")
+
+
+def convert_model(model_dir: str) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"serving_backend": "pyfunc", "flavor": None, "reason": None, "parity": None}
+    model = mlflow.pyfunc.load_model(model_dir)
+    flavor = next((name for name in CONVERTIBLE_FLAVORS if name in model.metadata.flavors), None)
+    if flavor is None:
+        raise OnnxConversionError(f"No ONNX converter for the flavors {sorted(model.metadata.flavors)}")
+    report["flavor"] = flavor
+    try:
+        input_dtypes = _input_dtypes(model)
+    except OnnxConversionError as e:
+        report["reason"] = str(e)
+        return report
+
+    try:
+        import onnxruntime
+    except ImportError as e:
+        report["reason"] = f"ONNX Runtime not installed: {e}"
+        return report
+
+    raw_model = model.get_raw_model()
+    columns = list(input_dtypes)
+    fitted_columns = getattr(raw_model, "feature_names_in_", None)
+    if fitted_columns is not None and set(fitted_columns) == set(columns):
+        columns = [str(name) for name in fitted_columns]
+    try:
+        onnx_model = _convert(raw_model, flavor, len(columns))
+    except OnnxConversionError as e:
+        report["reason"] = str(e)
+        return report
+
+    sample = _parity_inputs(model, model_dir, input_dtypes)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = np.asarray(model.predict(sample))
+    session = onnxruntime.InferenceSession(onnx_model.SerializeToString(), providers=["CPUExecutionProvider"])
+    matrix = sample[columns].to_numpy(dtype=np.float32)
+    input_name = session.get_inputs()[0].name
+
+    # Classifiers export the labels and the probabilities: keep the output the pyfunc model returns.
+    best: Optional[Dict[str, Any]] = None
+    for index, output in enumerate(session.get_outputs()):
+        try:
+            actual = session.run([output.name], {input_name: matrix})[0]
+        except Exception:
+            continue
+        parity = {**compare_predictions(actual, expected), "output": output.name}
+        if parity["passed"]:
+            os.makedirs(os.path.join(model_dir, ONNX_DIR), exist_ok=True)
+            with open(os.path.join(model_dir, ONNX_DIR, ONNX_MODEL_FILE), "wb") as f:
+                f.write(onnx_model.SerializeToString())
+            report.update(
+                serving_backend="onnx",
+                parity=parity,
+                columns=columns,
+                output_index=index,
+                ravel=actual.ndim == 2 and expected.ndim == 1,
+            )
+            return report
+        if best is None or parity["mismatched_rows"] < best["mismatched_rows"]:
+            best = parity
+    report["parity"] = best
+    report["reason"] = "ONNX Runtime predictions differ from the pyfunc model"
+    return report
+
+
+def main(model_dir: str) -> Dict[str, Any]:
+    try:
+        report = convert_model(model_dir)
+    except OnnxConversionError as e:
+        report = {"serving_backend": "pyfunc", "flavor": None, "reason": str(e), "parity": None}
+    except Exception as e:
+        report = {"serving_backend": "pyfunc", "flavor": None, "reason": f"ONNX conversion failed: {e}", "parity": None}
+    os.makedirs(os.path.join(model_dir, ONNX_DIR), exist_ok=True)
+    with open(os.path.join(model_dir, ONNX_DIR, ONNX_REPORT_FILE), "w") as f:
+        json.dump(report, f)
+    print(f"ONNX conversion: serving with {report['serving_backend']} ({report['reason'] or report['parity']})")
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "/opt/mlflow")
@@ -2,3 +2,5 @@ class TaskBuildStatuses:
     in_progress = "DOCKER_BUILD_IN_PROGRESS"
     completed = "DOCKER_BUILD_COMPLETED"
     failed = "DOCKER_BUILD_FAILED"
+    # Hot swap refused by the running pods, the version was deployed with a regular build instead
+    redeployed = "HOT_SWAP_REFUSED_DOCKER_BUILD_COMPLETED"
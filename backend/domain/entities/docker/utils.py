@@ -1,3 +1,4 @@
+import json
 import os
 import re
 import shutil
@@ -9,9 +10,13 @@ from loguru import logger
 
 from backend import PROJECT_DIR
 from backend.domain.entities.docker.dockerfile_template import AGENT_BASE_IMAGE, DockerfileTemplate
+from backend.domain.ports.model_info_db_handler import ModelInfoDbHandler
 from backend.domain.use_cases.files_management import create_tmp_artefacts_folder, remove_directory
 from backend.infrastructure.mlflow_model_registry_adapter import MLFlowModelRegistryAdapter
 
+# Written in the image by onnx_conversion_template.py
+ONNX_CONVERSION_REPORT_PATH = "/opt/mlflow/onnx/conversion.json"
+
 
 def _display_docker_build_logs(build_logs):
     for chunk in build_logs:
@@ -132,6 +137,66 @@ def copy_batch_predict_template_to_tmp_docker_folder(dest_path: str) -> None:
     shutil.copy(src_path, dest_path)
 
 
+def copy_gunicorn_conf_template_to_tmp_docker_folder(dest_path: str) -> None:
+    """
+    Copies the Gunicorn settings used by multi-worker serving to the specified destination path.
+
+    Args:
+        dest_path (str): The destination path where the Gunicorn settings will be copied.
+    """
+    src_path = os.path.join(PROJECT_DIR, "backend/domain/entities/docker/gunicorn_conf_template.py")
+    logger.info(f"Copying Gunicorn settings from {src_path} to {dest_path}")
+    shutil.copy(src_path, dest_path)
+
+
+def copy_multi_model_template_to_tmp_docker_folder(dest_path: str) -> None:
+    """
+    Copies the multi-model serving app to the specified destination path.
+
+    Args:
+        dest_path (str): The destination path where the multi-model serving app will be copied.
+    """
+    src_path = os.path.join(PROJECT_DIR, "backend/domain/entities/docker/multi_model_template.py")
+    logger.info(f"Copying multi-model serving app from {src_path} to {dest_path}")
+    shutil.copy(src_path, dest_path)
+
+
+def copy_onnx_conversion_template_to_tmp_docker_folder(dest_path: str) -> None:
+    """
+    Copies the ONNX conversion step of the image build to the specified destination path.
+
+    Args:
+        dest_path (str): The destination path where the ONNX conversion script will be copied.
+    """
+    src_path = os.path.join(PROJECT_DIR, "backend/domain/entities/docker/onnx_conversion_template.py")
+    logger.info(f"Copying ONNX conversion script from {src_path} to {dest_path}")
+    shutil.copy(src_path, dest_path)
+
+
+def copy_native_threads_template_to_tmp_docker_folder(dest_path: str) -> None:
+    """
+    Copies the native thread pool sizing shared by the serving and batch templates to the specified destination path.
+
+    Args:
+        dest_path (str): The destination path where the native thread pool sizing will be copied.
+    """
+    src_path = os.path.join(PROJECT_DIR, "backend/domain/entities/docker/native_threads_template.py")
+    logger.info(f"Copying native thread pool sizing from {src_path} to {dest_path}")
+    shutil.copy(src_path, dest_path)
+
+
+def copy_model_dependencies_template_to_tmp_docker_folder(dest_path: str) -> None:
+    """
+    Copies the dependency set hash shared by the serving templates to the specified destination path.
+
+    Args:
+        dest_path (str): The destination path where the dependency set hash will be copied.
+    """
+    src_path = os.path.join(PROJECT_DIR, "backend/domain/entities/docker/model_dependencies_template.py")
+    logger.info(f"Copying dependency set hash from {src_path} to {dest_path}")
+    shutil.copy(src_path, dest_path)
+
+
 def prepare_docker_context(
     registry: MLFlowModelRegistryAdapter, project_name: str, model_name: str, version: str
 ) -> str:
@@ -150,12 +215,23 @@ def prepare_docker_context(
     path_dest = create_tmp_artefacts_folder(model_name, project_name, version, path=os.path.join(PROJECT_DIR, "tmp"))
     copy_fast_api_template_to_tmp_docker_folder(path_dest)
     copy_batch_predict_template_to_tmp_docker_folder(path_dest)
+    copy_gunicorn_conf_template_to_tmp_docker_folder(path_dest)
+    copy_multi_model_template_to_tmp_docker_folder(path_dest)
+    copy_onnx_conversion_template_to_tmp_docker_folder(path_dest)
+    copy_native_threads_template_to_tmp_docker_folder(path_dest)
+    copy_model_dependencies_template_to_tmp_docker_folder(path_dest)
     registry.download_model_artifacts(model_name, version, path_dest)
     return path_dest
 
 
 def build_docker_image_from_context_path(
-    context_path: str, image_name: str, project_name: str, model_name: str, version: str, is_agent: bool = False
+    context_path: str,
+    image_name: str,
+    project_name: str,
+    model_name: str,
+    version: str,
+    is_agent: bool = False,
+    onnx_conversion: bool = False,
 ) -> int:
     """
     Builds a Docker image from the specified context path and image name.
@@ -166,11 +242,14 @@ def build_docker_image_from_context_path(
         is_agent (bool): Whether this image is for an agent, in which case the build reuses the
             pre-built `agent-base` image (langgraph/langchain/mlflow/fastapi/otel already installed)
             instead of a bare Python image.
+        onnx_conversion (bool): Whether the build tries to export the model to ONNX
+            (onnx_conversion_template.py), served through ONNX Runtime when its predictions match pyfunc.
     """
     use_agent_base_image = is_agent and ensure_agent_base_image()
     dockerfile = DockerfileTemplate(
         python_version="3.9",
         use_agent_base_image=use_agent_base_image,
+        onnx_conversion=onnx_conversion,
     )
     dockerfile.generate_dockerfile(context_path, image_name, project_name, model_name, version)
     logger.info(f"Starting docker build in {context_path}")
@@ -256,6 +335,31 @@ def ensure_agent_base_image() -> bool:
     return status == 1
 
 
+def read_onnx_conversion_report(image_name: str) -> dict:
+    """Report left in the image by its ONNX conversion step: chosen serving backend, reason and parity check."""
+    cmd = ["docker", "run", "--rm", "--entrypoint", "cat", image_name, ONNX_CONVERSION_REPORT_PATH]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.warning(f"No ONNX conversion report in image '{image_name}': {result.stderr.strip()}")
+        return {"serving_backend": "pyfunc", "reason": "The ONNX conversion step left no report"}
+    try:
+        return json.loads(result.stdout)
+    except ValueError:
+        return {"serving_backend": "pyfunc", "reason": "Unreadable ONNX conversion report"}
+
+
+def record_serving_backend(
+    model_info_db_handler: ModelInfoDbHandler, project_name: str, model_name: str, version: str, report: dict
+) -> None:
+    """Records the backend the image serves with, and its ONNX conversion report, on the model info."""
+    try:
+        model_info_db_handler.update_serving_backend(
+            model_name, version, project_name, report.get("serving_backend", "pyfunc"), json.dumps(report)
+        )
+    except Exception as e:
+        logger.warning(f"Could not record the serving backend of {project_name}/{model_name}/{version}: {e}")
+
+
 def sanitize_name(project_name: str) -> str:
     """Nettoie et format le nom pour être valid dans Kubernetes."""
     sanitized_name = re.sub(r"[^a-z0-9-]", "-", project_name.lower())
@@ -265,7 +369,13 @@ def sanitize_name(project_name: str) -> str:
 
 
 def build_model_docker_image(
-    registry: MLFlowModelRegistryAdapter, project_name: str, model_name: str, version: str, is_agent: bool = False
+    registry: MLFlowModelRegistryAdapter,
+    project_name: str,
+    model_name: str,
+    version: str,
+    is_agent: bool = False,
+    onnx_conversion: bool = False,
+    model_info_db_handler: ModelInfoDbHandler | None = None,
 ) -> int:
     """
     Generates and builds a Docker image for the specified model and version.
@@ -276,6 +386,10 @@ def build_model_docker_image(
         model_name (str): The name of the model.
         version (str): The version of the model.
         is_agent (bool): Whether this is an agent image (uses the pre-built agent-base image).
+        onnx_conversion (bool): Whether to try serving the model through ONNX Runtime (see
+            onnx_conversion_template.py); the model falls back to pyfunc when it cannot be converted.
+        model_info_db_handler (ModelInfoDbHandler | None): Where the chosen serving backend and the ONNX
+            parity check results are recorded, when given.
 
     Returns:
         str: The name of the built Docker image.
@@ -290,8 +404,16 @@ def build_model_docker_image(
         sanitize_name(model_name),
         sanitize_name(version),
         is_agent=is_agent,
+        onnx_conversion=onnx_conversion,
     )
     if build_status:
         # clean_build_context(context_path)
-        pass
+        if model_info_db_handler is not None:
+            report = (
+                read_onnx_conversion_report(image_name)
+                if onnx_conversion
+                else {"serving_backend": "pyfunc", "reason": "ONNX conversion not requested"}
+            )
+            logger.info(f"{image_name} serves with {report.get('serving_backend')}: {report}")
+            record_serving_backend(model_info_db_handler, project_name, model_name, version, report)
     return build_status
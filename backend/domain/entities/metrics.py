@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel, Field
 
@@ -111,3 +112,78 @@ class FleetMetrics(BaseModel):
             "total_calls": self.total_calls,
             "period": self.period,
         }
+
+
+class VersionMetrics(BaseModel):
+    """Metrics of one model version while a deployment splits its traffic.
+
+    Parameters
+    ----------
+    target_version : str
+        Model version
+    role : str
+        'incumbent' (the deployment's own version) or 'candidate'
+    total_requests : int
+        Requests answered by, or mirrored to, the version in period
+    p50_latency_ms : Optional[float]
+        Median /predict latency
+    p95_latency_ms : Optional[float]
+        95th percentile /predict latency
+    agreement_rate : Optional[float]
+        Percentage of mirrored requests where a shadow candidate agrees with the incumbent
+    """
+
+    target_version: str
+    role: str
+    total_requests: int = Field(..., ge=0)
+    p50_latency_ms: Optional[float] = Field(None, ge=0)
+    p95_latency_ms: Optional[float] = Field(None, ge=0)
+    agreement_rate: Optional[float] = Field(None, ge=0, le=100, description="Shadow agreement percentage")
+
+
+class VersionComparison(BaseModel):
+    """Side by side metrics of the versions sharing a deployment's traffic (shadow or canary).
+
+    Parameters
+    ----------
+    model_id : str
+        Deployed model identifier of the incumbent
+    period : str
+        Time window for aggregation
+    versions : list[VersionMetrics]
+        One entry per version and role
+    timestamp : datetime
+        When metrics were collected
+    """
+
+    model_id: str
+    period: str = "7d"
+    versions: list[VersionMetrics]
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "model_id": "credit-v2-prod",
+                "period": "1d",
+                "versions": [
+                    {
+                        "target_version": "2",
+                        "role": "incumbent",
+                        "total_requests": 12000,
+                        "p50_latency_ms": 4.1,
+                        "p95_latency_ms": 9.8,
+                        "agreement_rate": None,
+                    },
+                    {
+                        "target_version": "3",
+                        "role": "candidate",
+                        "total_requests": 11990,
+                        "p50_latency_ms": 6.3,
+                        "p95_latency_ms": 14.2,
+                        "agreement_rate": 99.2,
+                    },
+                ],
+                "timestamp": "2026-03-13T10:30:00",
+            }
+        }
@@ -14,6 +14,9 @@ class ModelInfo(BaseModel):
     suggested_risk_level: Optional[str] = None
     deterministic_compliance: Optional[str] = "not_evaluated"
     llm_compliance: Optional[str] = "not_evaluated"
+    serving_backend: Optional[str] = None  # "onnx" | "pyfunc", set when the serving image is built
+    onnx_conversion: Optional[str] = None  # JSON report of the ONNX conversion and its parity check
+    replay_report: Optional[str] = None  # JSON report of the last replay of captured traffic against this version
 
     def to_json(self) -> dict:
         return {
@@ -26,4 +29,7 @@ class ModelInfo(BaseModel):
             "act_review": self.act_review,
             "deterministic_compliance": self.deterministic_compliance,
             "llm_compliance": self.llm_compliance,
+            "serving_backend": self.serving_backend,
+            "onnx_conversion": self.onnx_conversion,
+            "replay_report": self.replay_report,
         }
@@ -27,7 +27,13 @@ PROJECT_ACTIONS_MINIMUM_LEVEL[ProjectRole.VIEWER] = PROJECT_ACTIONS_MINIMUM_LEVE
 ]
 PROJECT_ACTIONS_MINIMUM_LEVEL[ProjectRole.DEVELOPER] = PROJECT_ACTIONS_MINIMUM_LEVEL[ProjectRole.VIEWER] + [
     "route_deploy_model",
+    "route_hot_swap_model",
+    "route_split_traffic",
+    "route_stop_traffic_split",
+    "route_replay_traffic",
+    "route_deploy_model_to_multi_model_pod",
     "route_undeploy",
+    "route_undeploy_multi_model_pod",
     "check_task_status",
 ]
 PROJECT_ACTIONS_MINIMUM_LEVEL[ProjectRole.MAINTAINER] = PROJECT_ACTIONS_MINIMUM_LEVEL[ProjectRole.DEVELOPER] + [
@@ -0,0 +1,57 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+# Serving-app setting -> environment variable read by fast_api_template.py
+SERVING_ENV_VARS = {
+    "prediction_cache": "PREDICTION_CACHE_ENABLED",
+    "prediction_cache_max_size": "PREDICTION_CACHE_MAX_SIZE",
+    "prediction_cache_ttl_seconds": "PREDICTION_CACHE_TTL_SECONDS",
+    "warmup_requests": "WARMUP_REQUESTS",
+    "max_concurrent_requests": "MAX_CONCURRENT_REQUESTS",
+    "max_queued_requests": "MAX_QUEUED_REQUESTS",
+    "admission_queue_timeout_seconds": "ADMISSION_QUEUE_TIMEOUT_SECONDS",
+    "serving_workers": "SERVING_WORKERS",
+    "model_memory_budget_mb": "MODEL_MEMORY_BUDGET_MB",
+    "onnx_conversion": "ONNX_RUNTIME_ENABLED",
+    "traffic_capture": "TRAFFIC_CAPTURE_ENABLED",
+    "traffic_capture_sample_size": "TRAFFIC_CAPTURE_SAMPLE_SIZE",
+    "native_threads": "NATIVE_THREADS",
+}
+
+
+class ServingConfig(BaseModel):
+    """Per-deployment tuning of the generated serving app.
+
+    Passed to the model pod as env vars; fields left unset keep the defaults
+    baked into the image by DockerfileTemplate.
+    """
+
+    prediction_cache: Optional[bool] = None
+    prediction_cache_max_size: Optional[int] = Field(default=None, gt=0)
+    prediction_cache_ttl_seconds: Optional[float] = Field(default=None, gt=0)
+    warmup_requests: Optional[int] = Field(default=None, ge=0)
+    # 0 disables admission control
+    max_concurrent_requests: Optional[int] = Field(default=None, ge=0)
+    max_queued_requests: Optional[int] = Field(default=None, ge=0)
+    admission_queue_timeout_seconds: Optional[float] = Field(default=None, gt=0)
+    # Pre-forked serving processes: a count, or "auto" for one per CPU of the container limit
+    serving_workers: Optional[str] = Field(default=None, pattern=r"^(auto|[1-9][0-9]*)$")
+    # Multi-model pods only: memory of the loaded models beyond which the least recently used are unloaded
+    model_memory_budget_mb: Optional[int] = Field(default=None, gt=0)
+    # Build step exporting the model to ONNX, served through ONNX Runtime when its predictions match pyfunc
+    onnx_conversion: Optional[bool] = None
+    # Reservoir sampling of /predict bodies to object storage, replayed against candidate versions
+    traffic_capture: Optional[bool] = None
+    traffic_capture_sample_size: Optional[int] = Field(default=None, gt=0)
+    # Threads of the OpenMP/BLAS pools of each prediction process: a count, or "auto" to share the CPU limit
+    native_threads: Optional[str] = Field(default=None, pattern=r"^(auto|[1-9][0-9]*)$")
+
+    def to_env_vars(self) -> dict[str, str]:
+        env_vars = {}
+        for field_name, env_name in SERVING_ENV_VARS.items():
+            value = getattr(self, field_name)
+            if value is None:
+                continue
+            env_vars[env_name] = str(value).lower() if isinstance(value, bool) else str(value)
+        return env_vars
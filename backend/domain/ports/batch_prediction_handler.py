@@ -1,5 +1,6 @@
 # Philippe Stepniewski
 from abc import ABC, abstractmethod
+from typing import Optional
 
 from backend.domain.entities.batch_prediction import BatchPrediction
 
@@ -7,7 +8,15 @@ from backend.domain.entities.batch_prediction import BatchPrediction
 class BatchPredictionHandler(ABC):
     @abstractmethod
     def create_batch_job(
-        self, project_name: str, model_name: str, model_version: str, input_path: str, output_path: str, job_id: str
+        self,
+        project_name: str,
+        model_name: str,
+        model_version: str,
+        input_path: str,
+        output_path: str,
+        job_id: str,
+        shards: int = 1,
+        parallelism: Optional[int] = None,
     ) -> BatchPrediction:
         pass
 
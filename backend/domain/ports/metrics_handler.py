@@ -23,6 +23,33 @@ class MetricsResult(TypedDict):
     total_errors: int
 
 
+class VersionMetricsResult(TypedDict):
+    """Return type for per-version queries while a deployment's traffic is split.
+
+    Attributes
+    ----------
+    target_version : str
+        Model version the figures are about
+    role : str
+        'incumbent' (the deployment's own version) or 'candidate'
+    total_requests : int
+        Requests answered by (or mirrored to) the version
+    p50_latency_ms : Optional[float]
+        Median /predict latency
+    p95_latency_ms : Optional[float]
+        95th percentile /predict latency
+    agreement_rate : Optional[float]
+        Percentage of mirrored requests where a shadow candidate agrees with the incumbent
+    """
+
+    target_version: str
+    role: str
+    total_requests: int
+    p50_latency_ms: Optional[float]
+    p95_latency_ms: Optional[float]
+    agreement_rate: Optional[float]
+
+
 class MetricsHandler(ABC):
     """Abstract interface for metrics retrieval from time-series database.
 
@@ -75,3 +102,26 @@ class MetricsHandler(ABC):
             If database connection fails
         """
         pass
+
+    @abstractmethod
+    async def get_version_comparison(self, model_id: str, period: str = "7d") -> list[VersionMetricsResult]:
+        """Query per-version latency and prediction agreement of a deployment splitting its traffic.
+
+        Parameters
+        ----------
+        model_id : str
+            Deployed model identifier of the incumbent
+        period : str
+            Time period for aggregation
+
+        Returns
+        -------
+        list[VersionMetricsResult]
+            One entry per version and role, empty if the traffic was never split
+
+        Raises
+        ------
+        Exception
+            If database connection fails
+        """
+        pass
@@ -50,6 +50,21 @@ class ModelInfoDbHandler(ABC):
     ) -> bool:
         pass
 
+    @abstractmethod
+    def update_serving_backend(
+        self,
+        model_name: str,
+        model_version: str,
+        project_name: str,
+        serving_backend: str,
+        onnx_conversion: str | None = None,
+    ) -> bool:
+        pass
+
+    @abstractmethod
+    def update_replay_report(self, model_name: str, model_version: str, project_name: str, replay_report: str) -> bool:
+        pass
+
     @abstractmethod
     def search_model_infos(self, query: str, project_name: str | None = None) -> list[ModelInfo]:
         pass
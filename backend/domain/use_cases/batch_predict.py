@@ -1,7 +1,11 @@
 # Philippe Stepniewski
+import json
+from typing import Optional
+
 from fastapi import HTTPException
 from loguru import logger
 
+from backend.domain.entities.batch_prediction import BatchFileFormat, BatchPrediction, BatchPredictionStatus
 from backend.domain.entities.docker.utils import build_model_docker_image, check_docker_image_exists, sanitize_name
 from backend.domain.ports.batch_prediction_handler import BatchPredictionHandler
 from backend.domain.ports.object_storage_handler import ObjectStorageHandler
@@ -30,28 +34,72 @@ def submit_batch_prediction(
     batch_handler: BatchPredictionHandler,
     project_db_handler: ProjectDbHandler,
     registry=None,
+    output_format: Optional[BatchFileFormat] = None,
+    shards: int = 1,
+    parallelism: Optional[int] = None,
 ):
     project = project_db_handler.get_project(project_name)
     if not project.batch_enabled:
         raise HTTPException(status_code=400, detail="Batch predictions are not enabled for this project")
 
-    input_path = f"{project_name}/{model_name}/{version}/{job_id}/input.csv"
-    output_path = f"{project_name}/{model_name}/{version}/{job_id}/predictions-{job_id}.csv"
+    # The batch job picks its reader and writer from the extensions; the output keeps the input format by default
+    input_format = BatchFileFormat.detect(file_content)
+    output_format = output_format or input_format
+    input_file = f"input.{input_format.value}"
+    output_file = f"predictions-{job_id}.{output_format.value}"
+    input_path = f"{project_name}/{model_name}/{version}/{job_id}/{input_file}"
+    output_path = f"{project_name}/{model_name}/{version}/{job_id}/{output_file}"
 
-    logger.info(f"Uploading input file to {input_path}")
-    object_storage.upload_file(project_name, f"{model_name}/{version}/{job_id}/input.csv", file_content)
+    logger.info(f"Uploading {input_format.value} input file to {input_path}")
+    object_storage.upload_file(project_name, f"{model_name}/{version}/{job_id}/{input_file}", file_content)
 
     if registry:
         ensure_model_image_exists(registry, project_name, model_name, version)
 
     batch_prediction = batch_handler.create_batch_job(
-        project_name, model_name, version, input_path, output_path, job_id
+        project_name, model_name, version, input_path, output_path, job_id, shards=shards, parallelism=parallelism
     )
     return batch_prediction.to_json()
 
 
-def get_batch_prediction_status(project_name: str, job_id: str, batch_handler: BatchPredictionHandler):
+def batch_manifest_prefix(project_name: str, batch_prediction: BatchPrediction) -> str:
+    """Where the job writes the progress manifests of its shards (batch_predict_template.py), in the project's space."""
+    job_dir = batch_prediction.output_path.removeprefix(f"{project_name}/").rsplit("/", 1)[0]
+    return f"{job_dir}/checkpoints/manifest-"
+
+
+def read_batch_progress(
+    project_name: str, batch_prediction: BatchPrediction, object_storage: ObjectStorageHandler
+) -> BatchPrediction:
+    """Sets the rows predicted so far by the job, and their share of the input when every shard knows its size."""
+    manifests = [
+        json.loads(object_storage.download_file(project_name, path))
+        for path in object_storage.list_files(project_name, batch_manifest_prefix(project_name, batch_prediction))
+    ]
+    if not manifests:
+        return batch_prediction
+    batch_prediction.row_count = sum(manifest["rows"] for manifest in manifests)
+    input_rows = [manifest.get("input_rows") for manifest in manifests]
+    if batch_prediction.status == BatchPredictionStatus.COMPLETED:
+        batch_prediction.progress = 1.0
+    elif len(manifests) == batch_prediction.shards and None not in input_rows:
+        total = sum(input_rows)
+        batch_prediction.progress = round(batch_prediction.row_count / total, 4) if total else 1.0
+    return batch_prediction
+
+
+def get_batch_prediction_status(
+    project_name: str,
+    job_id: str,
+    batch_handler: BatchPredictionHandler,
+    object_storage: Optional[ObjectStorageHandler] = None,
+):
     batch_prediction = batch_handler.get_job_status(project_name, job_id)
+    if object_storage is not None:
+        try:
+            batch_prediction = read_batch_progress(project_name, batch_prediction, object_storage)
+        except Exception as e:
+            logger.warning(f"Could not read the progress of batch job {job_id}: {e}")
     return batch_prediction.to_json()
 
 
@@ -65,13 +113,16 @@ def download_batch_result(
     job_id: str,
     batch_handler: BatchPredictionHandler,
     object_storage: ObjectStorageHandler,
-):
+) -> tuple[str, bytes]:
+    """File name and content of the predictions of a job, in the output format it was submitted with."""
     batch_prediction = batch_handler.get_job_status(project_name, job_id)
-    model = batch_prediction.model_name
-    version = batch_prediction.model_version
-    output_remote_path = f"{model}/{version}/{job_id}/predictions-{job_id}.csv"
+    output_remote_path = batch_prediction.output_path.removeprefix(f"{project_name}/")
+    if not output_remote_path:
+        model = batch_prediction.model_name
+        version = batch_prediction.model_version
+        output_remote_path = f"{model}/{version}/{job_id}/predictions-{job_id}.csv"
     content = object_storage.download_file(project_name, output_remote_path)
-    return content
+    return output_remote_path.rsplit("/", 1)[-1], content
 
 
 def delete_batch_prediction(
@@ -30,6 +30,33 @@ class SimulationStats(TypedDict):
     last_error: str | None
 
 
+def find_model_deployment(project_name: str, model_name: str, version: str | None = None) -> ModelDeployment:
+    """Deployment of the model in the project's K8s namespace (of `version` if given).
+
+    Raises
+    ------
+    ValueError
+        If the model deployment is not found in the project
+    """
+    k8s_adapter = K8SDeploymentClusterAdapter()
+    deployed_models: list[ModelDeployment] = k8s_adapter.list_deployments_for_project(project_name)
+    # Deployment labels hold sanitized names
+    for model in deployed_models:
+        if model.model_name not in (model_name, sanitize_project_name(model_name)):
+            continue
+        if version is None or model.model_version == sanitize_project_name(version):
+            return model
+
+    target = model_name if version is None else f"{model_name} version {version}"
+    raise ValueError(f"Model {target} not found in K8s for project {project_name}. Please deploy the model first.")
+
+
+def model_endpoint_url(project_name: str, deployment: ModelDeployment) -> str:
+    """In-cluster /predict URL of a deployment: http://service-name.namespace.svc.cluster.local:port/predict"""
+    namespace = sanitize_project_name(project_name)
+    return f"http://{deployment.deployment_name}.{namespace}.svc.cluster.local:8000/predict"
+
+
 class UserBehaviorSimulator:
     """Simulates user behavior by making periodic calls to deployed model endpoints."""
 
@@ -80,27 +107,10 @@ class UserBehaviorSimulator:
             "last_error": None,
         }
 
-        # Discover the endpoint URL from K8s deployment
-        k8s_adapter = K8SDeploymentClusterAdapter()
-        deployed_models: list[ModelDeployment] = k8s_adapter.list_deployments_for_project(project_name)
-
-        deployment = None
-        for model in deployed_models:
-            if model.model_name == model_name:
-                deployment = model
-                break
-
-        if not deployment:
-            raise ValueError(
-                f"Model {model_name} not found in K8s for project {project_name}. "
-                f"Please deploy the model first before starting a simulation."
-            )
-
-        # Construct the endpoint URL following the pattern:
-        # http://service-name.namespace.svc.cluster.local:port/predict
-        namespace = sanitize_project_name(project_name)
-        self.endpoint_url: str = f"http://{deployment.deployment_name}.{namespace}.svc.cluster.local:8000/predict"
+        deployment = find_model_deployment(project_name, model_name)
+        self.endpoint_url: str = model_endpoint_url(project_name, deployment)
         logger.info(f"Model endpoint discovered: {self.endpoint_url}")
+        namespace = sanitize_project_name(project_name)
 
         # Initialize payload generator with dynamically discovered feature specs
         self._payload_generator = PayloadGenerator()
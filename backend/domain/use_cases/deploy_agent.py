@@ -12,6 +12,7 @@ from loguru import logger
 from backend.domain.entities.docker.utils import build_model_docker_image
 from backend.domain.entities.event import Event
 from backend.domain.entities.model_deployment import ModelDeployment
+from backend.domain.entities.serving_config import ServingConfig
 from backend.domain.ports.agent_registry import AgentRegistry
 from backend.domain.ports.dashboard_handler import DashboardHandler
 from backend.infrastructure.k8s_agent_deployment_adapter import K8SAgentDeployment
@@ -31,6 +32,7 @@ def deploy_agent(
     current_user: str = None,
     agent_registry: AgentRegistry | None = None,
     secret_values: dict[str, str] | None = None,
+    serving_config: ServingConfig | None = None,
     k8s_deployment_cluster_cls: Callable[[], K8SDeploymentClusterAdapter] = K8SDeploymentClusterAdapter,
     k8s_agent_deployment_cls: Callable[..., K8SAgentDeployment] = K8SAgentDeployment,
 ) -> int:
@@ -51,6 +53,8 @@ def deploy_agent(
             env_vars: dict[str, str] = {}
             if agent_registry is not None:
                 env_vars = agent_registry.get_deployment_config(agent_name, version)
+            if serving_config is not None:
+                env_vars = {**env_vars, **serving_config.to_env_vars()}
             dashboard_uid = dashboard_handler.generate_dashboard_uid(project_name, agent_name, version)
             k8s_agent_deployment = k8s_agent_deployment_cls(
                 project_name, agent_name, version, dashboard_uid, env_vars, secret_values
@@ -1,17 +1,28 @@
+import os
+import shutil
+import tempfile
 import time
 
 from loguru import logger
 
+from backend.domain.entities.docker.model_dependencies_template import hash_model_dependencies
 from backend.domain.entities.docker.utils import build_model_docker_image
 from backend.domain.entities.event import Event
 from backend.domain.entities.model_deployment import ModelDeployment
+from backend.domain.entities.serving_config import ServingConfig
 from backend.domain.ports.dashboard_handler import DashboardHandler
+from backend.domain.ports.model_info_db_handler import ModelInfoDbHandler
+from backend.domain.use_cases.traffic_replay import capture_prefix
 from backend.infrastructure.k8s_deployment_cluster_adapter import K8SDeploymentClusterAdapter
-from backend.infrastructure.k8s_model_deployment_adapter import K8SModelDeployment
+from backend.infrastructure.k8s_model_deployment_adapter import K8SModelDeployment, ModelSwapRefusedError
+from backend.infrastructure.k8s_multi_model_deployment_adapter import K8SMultiModelDeployment
 from backend.infrastructure.log_events_handler_json_adapter import LogEventsHandlerFileAdapter
 from backend.infrastructure.mlflow_model_registry_adapter import MLFlowModelRegistryAdapter
+from backend.utils import sanitize_project_name
 
 EVENT_LOGGER = LogEventsHandlerFileAdapter()
+# Returned by hot_swap_model when the running pods refused the version and it was deployed with a regular build
+HOT_SWAP_REDEPLOYED = 2
 
 
 def deploy_model(
@@ -21,16 +32,28 @@ def deploy_model(
     version: str,
     dashboard_handler: DashboardHandler,
     current_user: str = None,
+    serving_config: ServingConfig | None = None,
+    model_info_db_handler: ModelInfoDbHandler | None = None,
 ) -> int:
     k8s_deployment = K8SDeploymentClusterAdapter()
     if not k8s_deployment.check_if_model_deployment_exists(project_name, model_name, version):
-        build_status = build_model_docker_image(registry, project_name, model_name, version)
+        build_status = build_model_docker_image(
+            registry,
+            project_name,
+            model_name,
+            version,
+            onnx_conversion=serving_config is not None and bool(serving_config.onnx_conversion),
+            model_info_db_handler=model_info_db_handler,
+        )
         logger.info(f"Build status for project {project_name}, model {model_name}, version {version}: {build_status}")
         if build_status == 1:
             logger.info(f"Model build successful for {project_name}, model {model_name}, version {version}")
 
             dashboard_uid = dashboard_handler.generate_dashboard_uid(project_name, model_name, version)
-            k8s_model_deployment = K8SModelDeployment(project_name, model_name, version, dashboard_uid)
+            env_vars = serving_config.to_env_vars() if serving_config is not None else {}
+            if serving_config is not None and serving_config.traffic_capture:
+                env_vars["TRAFFIC_CAPTURE_PREFIX"] = f"{project_name}/{capture_prefix(model_name, version)}"
+            k8s_model_deployment = K8SModelDeployment(project_name, model_name, version, dashboard_uid, env_vars)
             k8s_model_deployment.create_model_deployment()
             deployment_name = k8s_model_deployment.service_name
             model_deployment = ModelDeployment(
@@ -55,6 +78,295 @@ def deploy_model(
     return build_status
 
 
+def hot_swap_model(
+    registry: MLFlowModelRegistryAdapter,
+    project_name: str,
+    model_name: str,
+    deployed_version: str,
+    version: str,
+    dashboard_handler: DashboardHandler,
+    current_user: str = None,
+    serving_config: ServingConfig | None = None,
+    model_info_db_handler: ModelInfoDbHandler | None = None,
+) -> int:
+    """
+    Serves `version` from the running deployment of `deployed_version`, without a new image nor a pod restart.
+
+    The artefacts of `version` are pushed to every serving pod, which loads and warms them up next to the current
+    model before switching to them; pods started later download `version` from the registry. When the pods refuse
+    it because it needs other dependencies or has another signature, or because they run several serving workers
+    (409), `version` is deployed with a regular image build instead.
+
+    Args:
+        registry (MLFlowModelRegistryAdapter): The model registry adapter to download the artefacts from.
+        project_name (str): The name of the project.
+        model_name (str): The name of the model.
+        deployed_version (str): The version whose deployment should serve the new one.
+        version (str): The version to serve.
+        dashboard_handler (DashboardHandler): The dashboard handler, for the fallback deployment.
+        current_user (str): The name of the user who is swapping the model.
+        serving_config (ServingConfig): Serving settings of the fallback deployment.
+        model_info_db_handler (ModelInfoDbHandler): Where the fallback deployment records its serving backend.
+
+    Returns:
+        int: 1 once swapped, HOT_SWAP_REDEPLOYED once deployed with a regular build instead, 0 on failure.
+
+    """
+    k8s_deployment = K8SDeploymentClusterAdapter()
+    if not k8s_deployment.check_if_model_deployment_exists(project_name, model_name, deployed_version):
+        logger.error(f"No deployment of project {project_name}, model {model_name}, version {deployed_version}")
+        return 0
+
+    dashboard_uid = dashboard_handler.generate_dashboard_uid(project_name, model_name, deployed_version)
+    k8s_model_deployment = K8SModelDeployment(project_name, model_name, deployed_version, dashboard_uid)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = registry.download_model_artifacts(model_name, version, tmp_dir)
+        archive_path = shutil.make_archive(os.path.join(tmp_dir, "model"), "gztar", root_dir=model_path)
+        try:
+            k8s_model_deployment.swap_model_version(archive_path, version, f"models:/{model_name}/{version}")
+        except ModelSwapRefusedError as e:
+            if e.status_code != 409:
+                logger.error(f"Hot swap of {model_name} to version {version} failed: {e}")
+                return 0
+            logger.info(f"Version {version} of {model_name} cannot be hot swapped ({e.detail}), deploying it instead")
+            deployed = deploy_model(
+                registry,
+                project_name,
+                model_name,
+                version,
+                dashboard_handler,
+                current_user,
+                serving_config,
+                model_info_db_handler,
+            )
+            return HOT_SWAP_REDEPLOYED if deployed == 1 else deployed
+
+    model_deployment = ModelDeployment(
+        project_name=project_name,
+        model_name=model_name,
+        model_version=version,
+        deployment_name=k8s_model_deployment.service_name,
+        deployment_date=int(time.time()),
+        dashboard_uid=dashboard_uid,
+    )
+    EVENT_LOGGER.add_event(
+        Event(action=hot_swap_model.__name__, user=current_user, entity=model_deployment), project_name
+    )
+    return 1
+
+
+def split_traffic(
+    registry: MLFlowModelRegistryAdapter,
+    project_name: str,
+    model_name: str,
+    version: str,
+    candidate_version: str,
+    mode: str,
+    weight: float,
+    dashboard_handler: DashboardHandler,
+    current_user: str = None,
+    serving_config: ServingConfig | None = None,
+    model_info_db_handler: ModelInfoDbHandler | None = None,
+) -> int:
+    """
+    Sends the traffic of the deployment of `version` to the deployment of `candidate_version` too.
+
+    In "shadow" mode every /predict request is mirrored to the candidate, whose answer is only compared with the
+    served one; in "canary" mode a `weight` share of the requests is answered by the candidate. The candidate is
+    deployed first when it is not yet. Latencies per version and prediction agreement are exported by the
+    incumbent's pod and shown on its dashboard.
+
+    Args:
+        registry (MLFlowModelRegistryAdapter): The model registry adapter, to deploy the candidate.
+        project_name (str): The name of the project.
+        model_name (str): The name of the model.
+        version (str): The deployed version receiving the traffic.
+        candidate_version (str): The version to compare it with.
+        mode (str): "shadow" or "canary".
+        weight (float): Share of the requests answered by the candidate in canary mode.
+        dashboard_handler (DashboardHandler): The dashboard handler.
+        current_user (str): The name of the user who is splitting the traffic.
+        serving_config (ServingConfig): Serving settings of the candidate deployment, if it has to be created.
+        model_info_db_handler (ModelInfoDbHandler): Where the candidate deployment records its serving backend.
+
+    """
+    k8s_deployment = K8SDeploymentClusterAdapter()
+    if not k8s_deployment.check_if_model_deployment_exists(project_name, model_name, version):
+        logger.error(f"No deployment of project {project_name}, model {model_name}, version {version}")
+        return 0
+    if not k8s_deployment.check_if_model_deployment_exists(project_name, model_name, candidate_version):
+        deployed = deploy_model(
+            registry,
+            project_name,
+            model_name,
+            candidate_version,
+            dashboard_handler,
+            current_user,
+            serving_config,
+            model_info_db_handler,
+        )
+        if deployed != 1:
+            logger.error(f"Candidate version {candidate_version} of {model_name} could not be deployed")
+            return 0
+
+    dashboard_uid = dashboard_handler.generate_dashboard_uid(project_name, model_name, version)
+    k8s_model_deployment = K8SModelDeployment(project_name, model_name, version, dashboard_uid)
+    candidate_dashboard_uid = dashboard_handler.generate_dashboard_uid(project_name, model_name, candidate_version)
+    candidate = K8SModelDeployment(project_name, model_name, candidate_version, candidate_dashboard_uid)
+    try:
+        k8s_model_deployment.set_traffic_split(mode, candidate, weight)
+    except ModelSwapRefusedError as e:
+        logger.error(f"Traffic split of {model_name} version {version} refused: {e}")
+        return 0
+
+    model_deployment = ModelDeployment(
+        project_name=project_name,
+        model_name=model_name,
+        model_version=version,
+        deployment_name=k8s_model_deployment.service_name,
+        deployment_date=int(time.time()),
+        dashboard_uid=dashboard_uid,
+    )
+    EVENT_LOGGER.add_event(
+        Event(action=split_traffic.__name__, user=current_user, entity=model_deployment), project_name
+    )
+    return 1
+
+
+def stop_traffic_split(
+    project_name: str, model_name: str, version: str, dashboard_handler: DashboardHandler, current_user: str = None
+) -> int:
+    """
+    Serves all the traffic of the deployment of `version` again. The candidate deployment is left running.
+
+    Args:
+        project_name (str): The name of the project.
+        model_name (str): The name of the model.
+        version (str): The deployed version whose traffic was split.
+        dashboard_handler (DashboardHandler): The dashboard handler.
+        current_user (str): The name of the user who is stopping the split.
+
+    """
+    dashboard_uid = dashboard_handler.generate_dashboard_uid(project_name, model_name, version)
+    k8s_model_deployment = K8SModelDeployment(project_name, model_name, version, dashboard_uid)
+    try:
+        k8s_model_deployment.clear_traffic_split()
+    except ModelSwapRefusedError as e:
+        logger.error(f"Could not stop the traffic split of {model_name} version {version}: {e}")
+        return 0
+
+    model_deployment = ModelDeployment(
+        project_name=project_name,
+        model_name=model_name,
+        model_version=version,
+        deployment_name=k8s_model_deployment.service_name,
+        deployment_date=int(time.time()),
+        dashboard_uid=dashboard_uid,
+    )
+    EVENT_LOGGER.add_event(
+        Event(action=stop_traffic_split.__name__, user=current_user, entity=model_deployment), project_name
+    )
+    return 1
+
+
+def deploy_model_to_multi_model_pod(
+    registry: MLFlowModelRegistryAdapter,
+    project_name: str,
+    model_name: str,
+    version: str,
+    current_user: str = None,
+    serving_config: ServingConfig | None = None,
+) -> int:
+    """
+    Serves the version from the project's multi-model pod for its dependency set, creating the pod if needed.
+
+    Only the first version of a dependency set gets an image build; the pod then loads each version deployed to it on
+    its first request, under /models/{model_name}/{version}/predict.
+
+    Args:
+        registry (MLFlowModelRegistryAdapter): The model registry adapter to download the artefacts from.
+        project_name (str): The name of the project.
+        model_name (str): The name of the model.
+        version (str): The version of the model.
+        current_user (str): The name of the user who is deploying the model.
+        serving_config (ServingConfig): Serving settings of the pod, applied when it is created. The pod runs a
+            single serving worker: each worker would hold its own models, within its own memory budget.
+
+    """
+    if serving_config is not None and serving_config.serving_workers not in (None, "1"):
+        logger.error(f"A multi-model pod runs a single serving worker, not {serving_config.serving_workers}")
+        return 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dependency_hash = hash_model_dependencies(registry.download_model_artifacts(model_name, version, tmp_dir))
+    env_vars = serving_config.to_env_vars() if serving_config is not None else {}
+    k8s_multi_model_deployment = K8SMultiModelDeployment(project_name, dependency_hash, env_vars=env_vars)
+
+    deployment_exists = k8s_multi_model_deployment.deployment_exists()
+    if not deployment_exists:
+        build_status = build_model_docker_image(registry, project_name, model_name, version)
+        if build_status != 1:
+            logger.error(f"Docker build failed for project {project_name}, model {model_name}, version {version}")
+            return build_status
+        # Built for this version, the image has the dependencies of the whole set.
+        k8s_multi_model_deployment.docker_image_name = sanitize_project_name(
+            f"{project_name}_{model_name}_{version}_ctr"
+        )
+
+    # Saved before the pod is created, which reads the deployed versions at start
+    try:
+        k8s_multi_model_deployment.deploy_model_version(model_name, version)
+    except ModelSwapRefusedError as e:
+        logger.error(f"Model {model_name} version {version} could not be deployed to the running pods: {e}")
+        return 0
+    if not deployment_exists:
+        k8s_multi_model_deployment.create_model_deployment()
+
+    logger.info(
+        f"Model {model_name} version {version} served at {k8s_multi_model_deployment.model_path(model_name, version)}"
+    )
+    model_deployment = ModelDeployment(
+        project_name=project_name,
+        model_name=model_name,
+        model_version=version,
+        deployment_name=k8s_multi_model_deployment.service_name,
+        deployment_date=int(time.time()),
+        dashboard_uid="",
+    )
+    EVENT_LOGGER.add_event(
+        Event(action=deploy_model_to_multi_model_pod.__name__, user=current_user, entity=model_deployment),
+        project_name,
+    )
+    return 1
+
+
+def remove_multi_model_deployment(project_name: str, dependency_set: str, current_user: str = None) -> int:
+    """
+    Removes the project's multi-model pod of a dependency set, and with it every version it serves.
+
+    Args:
+        project_name (str): The name of the project.
+        dependency_set (str): The dependency set of the pod, as listed in its deployment (model version).
+        current_user (str): The name of the user who is removing the deployment.
+
+    """
+    k8s_multi_model_deployment = K8SMultiModelDeployment(project_name, dependency_set)
+    k8s_multi_model_deployment.delete_model_deployment()
+
+    model_deployment = ModelDeployment(
+        project_name=project_name,
+        model_name=k8s_multi_model_deployment.model_name,
+        model_version=k8s_multi_model_deployment.model_version,
+        deployment_name=k8s_multi_model_deployment.service_name,
+        deployment_date=0,
+        dashboard_uid="",
+    )
+    EVENT_LOGGER.add_event(
+        Event(action=remove_multi_model_deployment.__name__, user=current_user, entity=model_deployment),
+        project_name,
+    )
+    return True
+
+
 def remove_model_deployment(
     project_name: str, model_name: str, version: str, dashboard_handler: DashboardHandler, current_user: str = None
 ) -> int:
@@ -8,7 +8,7 @@ from typing import Optional
 
 from loguru import logger
 
-from backend.domain.entities.metrics import FleetMetrics, ModelMetrics
+from backend.domain.entities.metrics import FleetMetrics, ModelMetrics, VersionComparison, VersionMetrics
 from backend.domain.ports.metrics_handler import MetricsHandler
 
 
@@ -123,3 +123,41 @@ def get_fleet_metrics(
         total_calls=total_calls,
         period=period,
     )
+
+
+async def get_version_comparison(model_id: str, period: str, metrics_handler: MetricsHandler) -> VersionComparison:
+    """Retrieve per-version latency and agreement of a deployment splitting its traffic.
+
+    Parameters
+    ----------
+    model_id : str
+        Model deployment identifier of the incumbent
+    period : str
+        Time window
+    metrics_handler : MetricsHandler
+        Injected metrics data source adapter
+
+    Returns
+    -------
+    VersionComparison
+        Incumbent first, then the candidates
+
+    Raises
+    ------
+    ValueError
+        If the deployment never split its traffic in period
+    Exception
+        If metrics handler fails
+    """
+    logger.debug(f"Fetching version comparison for model={model_id}, period={period}")
+
+    results = await metrics_handler.get_version_comparison(model_id, period)
+    if not results:
+        logger.warning(f"No traffic split metrics found for model {model_id}")
+        raise ValueError(f"Model {model_id} not found or its traffic was not split")
+
+    versions = sorted(
+        (VersionMetrics(**result) for result in results),
+        key=lambda version: (version.role != "incumbent", version.target_version),
+    )
+    return VersionComparison(model_id=model_id, period=period, versions=versions)
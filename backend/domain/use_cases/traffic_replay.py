@@ -0,0 +1,295 @@
+"""Replay of captured production traffic against a candidate model version.
+
+Serving pods deployed with traffic_capture write reservoir samples of their /predict bodies to the project's space
+of the batch-predictions bucket, next to the batch jobs: {model_name}/{version}/captures/. A replay fires these
+payloads, in their recorded order, at the deployment of another version: first at the recorded request rate, then
+at each multiple of it, for step_seconds each. Every step reports the throughput achieved and the p50/p95/p99
+latency and error rate; the first step where the candidate falls behind the target rate or starts failing is its
+saturation point. The report is written to {model_name}/{candidate_version}/replays/{replay_id}/report.json and on
+the candidate's model info.
+
+Requests are sent open-loop (on schedule, whether the previous ones have answered or not) up to max_in_flight
+concurrent calls, so that a slow candidate shows up as a lower achieved rate instead of slowing the replay down.
+"""
+
+import asyncio
+import base64
+import json
+import time
+import uuid
+from typing import Any, Optional, TypedDict
+
+import httpx
+from loguru import logger
+
+from backend.domain.ports.model_info_db_handler import ModelInfoDbHandler
+from backend.domain.ports.object_storage_handler import ObjectStorageHandler
+from backend.domain.use_cases.demo_usecases import find_model_deployment, model_endpoint_url
+
+DEFAULT_MULTIPLIERS = (1.0, 2.0, 4.0, 8.0)
+DEFAULT_STEP_SECONDS = 30.0
+DEFAULT_MAX_IN_FLIGHT = 64
+REQUEST_TIMEOUT_SECONDS = 10.0
+# Most recent capture windows replayed
+MAX_CAPTURE_WINDOWS = 24
+# A step is saturated when the candidate answers less than this share of the target rate...
+SATURATION_THROUGHPUT_RATIO = 0.9
+# ...or fails more than this share of the requests
+SATURATION_ERROR_RATE = 0.01
+
+
+class ReplayStep(TypedDict):
+    multiplier: float
+    target_rps: float
+    achieved_rps: float
+    requests: int
+    errors: int
+    error_rate: float
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+    saturated: bool
+
+
+def capture_prefix(model_name: str, version: str) -> str:
+    """Where the serving pods of `version` write captured traffic, in the project's space."""
+    return f"{model_name}/{version}/captures/"
+
+
+def replay_report_path(model_name: str, version: str, replay_id: str) -> str:
+    return f"{model_name}/{version}/replays/{replay_id}/report.json"
+
+
+def _covered_seconds(intervals: list[tuple[float, float]]) -> float:
+    """Length of the union of the capture windows: workers of one pod capture over the same period."""
+    covered, current_start, current_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                covered += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        covered += current_end - current_start
+    return covered
+
+
+def load_captured_traffic(
+    project_name: str, model_name: str, version: str, object_storage: ObjectStorageHandler
+) -> dict[str, Any]:
+    """Samples of the most recent capture windows of `version`, with the request rate they were recorded at.
+
+    Raises
+    ------
+    ValueError
+        If no traffic of `version` was captured
+    """
+    window_paths = sorted(
+        path
+        for path in object_storage.list_files(project_name, capture_prefix(model_name, version))
+        if path.endswith(".json")
+    )[-MAX_CAPTURE_WINDOWS:]
+    samples, intervals, requests_seen = [], [], 0
+    for path in window_paths:
+        window = json.loads(object_storage.download_file(project_name, path))
+        requests_seen += window["requests_seen"]
+        intervals.append((window["started_at"], window["ended_at"]))
+        samples.extend(window["samples"])
+    if not samples:
+        raise ValueError(f"No traffic captured for model {model_name} version {version} in project {project_name}")
+
+    samples.sort(key=lambda sample: sample["t"])
+    duration = _covered_seconds(intervals)
+    return {
+        "windows": len(window_paths),
+        "requests_seen": requests_seen,
+        "recorded_rps": requests_seen / duration if duration > 0 else 0.0,
+        "samples": [
+            {
+                "content_type": sample.get("content_type") or "application/json",
+                "accept": sample.get("accept") or "",
+                "body": base64.b64decode(sample["body"]),
+            }
+            for sample in samples
+        ],
+    }
+
+
+def _percentile_ms(sorted_latencies: list[float], percentile: float) -> Optional[float]:
+    if not sorted_latencies:
+        return None
+    index = min(len(sorted_latencies) - 1, max(0, int(round(percentile / 100 * len(sorted_latencies))) - 1))
+    return round(sorted_latencies[index] * 1000, 2)
+
+
+def summarize_step(
+    multiplier: float, target_rps: float, elapsed_seconds: float, results: list[tuple[bool, float]]
+) -> ReplayStep:
+    """Throughput, latency percentiles of the successful calls and error rate of one replay step."""
+    latencies = sorted(latency for success, latency in results if success)
+    errors = len(results) - len(latencies)
+    error_rate = errors / len(results) if results else 0.0
+    achieved_rps = len(latencies) / elapsed_seconds if elapsed_seconds > 0 else 0.0
+    return {
+        "multiplier": multiplier,
+        "target_rps": round(target_rps, 2),
+        "achieved_rps": round(achieved_rps, 2),
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(error_rate, 4),
+        "p50_ms": _percentile_ms(latencies, 50),
+        "p95_ms": _percentile_ms(latencies, 95),
+        "p99_ms": _percentile_ms(latencies, 99),
+        "saturated": achieved_rps < SATURATION_THROUGHPUT_RATIO * target_rps or error_rate > SATURATION_ERROR_RATE,
+    }
+
+
+class TrafficReplayer:
+    """Fires captured payloads at an endpoint at increasing multiples of their recorded rate.
+
+    Raises
+    ------
+    ValueError
+        If a multiplier is not positive
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        samples: list[dict],
+        recorded_rps: float,
+        multipliers: tuple[float, ...] = DEFAULT_MULTIPLIERS,
+        step_seconds: float = DEFAULT_STEP_SECONDS,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ):
+        if not multipliers or any(multiplier <= 0 for multiplier in multipliers):
+            raise ValueError(f"Replay multipliers must be positive, got {multipliers}")
+        self.endpoint_url = endpoint_url
+        self.samples = samples
+        self.recorded_rps = recorded_rps
+        self.multipliers = multipliers
+        self.step_seconds = step_seconds
+        self.max_in_flight = max_in_flight
+
+    async def _send(self, client: httpx.AsyncClient, slots: asyncio.Semaphore, sample: dict) -> tuple[bool, float]:
+        headers = {"Content-Type": sample["content_type"]}
+        if sample["accept"]:
+            headers["Accept"] = sample["accept"]
+        async with slots:
+            started_at = time.perf_counter()
+            try:
+                response = await client.post(self.endpoint_url, content=sample["body"], headers=headers)
+                success = response.status_code == 200
+            except httpx.HTTPError as e:
+                logger.debug(f"Replayed request failed: {e!r}")
+                success = False
+            return success, time.perf_counter() - started_at
+
+    async def run_step(self, client: httpx.AsyncClient, multiplier: float) -> ReplayStep:
+        target_rps = self.recorded_rps * multiplier
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = []
+        started_at = time.perf_counter()
+        for index in range(max(1, int(target_rps * self.step_seconds))):
+            delay = started_at + index / target_rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sample = self.samples[index % len(self.samples)]
+            tasks.append(asyncio.create_task(self._send(client, slots, sample)))
+        results = await asyncio.gather(*tasks)
+        step = summarize_step(multiplier, target_rps, time.perf_counter() - started_at, results)
+        logger.info(
+            f"Replay x{multiplier}: {step['achieved_rps']}/{step['target_rps']} rps, p95 {step['p95_ms']} ms, "
+            f"{step['errors']} errors"
+        )
+        return step
+
+    async def run(self) -> dict[str, Any]:
+        """Runs the steps in order, stopping at the first saturated one."""
+        steps: list[ReplayStep] = []
+        limits = httpx.Limits(max_connections=self.max_in_flight)
+        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS, limits=limits) as client:
+            for multiplier in self.multipliers:
+                step = await self.run_step(client, multiplier)
+                steps.append(step)
+                if step["saturated"]:
+                    break
+        saturated = next((step for step in steps if step["saturated"]), None)
+        sustained = [step["achieved_rps"] for step in steps if not step["saturated"]]
+        return {
+            "steps": steps,
+            "saturation_point": (
+                {"multiplier": saturated["multiplier"], "target_rps": saturated["target_rps"]} if saturated else None
+            ),
+            "max_sustained_rps": max(sustained) if sustained else None,
+        }
+
+
+def replay_traffic(
+    project_name: str,
+    model_name: str,
+    version: str,
+    candidate_version: str,
+    object_storage: ObjectStorageHandler,
+    model_info_db_handler: ModelInfoDbHandler,
+    multipliers: tuple[float, ...] = DEFAULT_MULTIPLIERS,
+    step_seconds: float = DEFAULT_STEP_SECONDS,
+    replay_id: str | None = None,
+) -> int:
+    """
+    Benchmarks the deployment of `candidate_version` with the traffic captured on `version`.
+
+    Args:
+        project_name (str): The name of the project.
+        model_name (str): The name of the model.
+        version (str): The version whose captured traffic is replayed.
+        candidate_version (str): The deployed version receiving the replay.
+        object_storage (ObjectStorageHandler): Where the captures are read and the report is written.
+        model_info_db_handler (ModelInfoDbHandler): Where the report is recorded for the candidate.
+        multipliers (tuple[float, ...]): Multiples of the recorded request rate, one step each.
+        step_seconds (float): Duration of each step.
+        replay_id (str): Identifier of the report, generated if not given.
+
+    """
+    replay_id = replay_id or str(uuid.uuid4())[:8]
+    try:
+        captured = load_captured_traffic(project_name, model_name, version, object_storage)
+        deployment = find_model_deployment(project_name, model_name, candidate_version)
+    except ValueError as e:
+        logger.error(f"Cannot replay traffic of {model_name} version {version}: {e}")
+        return 0
+    if captured["recorded_rps"] <= 0:
+        logger.error(f"The traffic captured for model {model_name} version {version} has no duration")
+        return 0
+    endpoint_url = model_endpoint_url(project_name, deployment)
+    logger.info(
+        f"Replaying {len(captured['samples'])} payloads captured on {model_name} v{version} "
+        f"({captured['recorded_rps']:.2f} rps) at {endpoint_url}"
+    )
+
+    replayer = TrafficReplayer(endpoint_url, captured["samples"], captured["recorded_rps"], multipliers, step_seconds)
+    started_at = time.time()
+    result = asyncio.run(replayer.run())
+    report = {
+        "replay_id": replay_id,
+        "model_name": model_name,
+        "captured_version": version,
+        "candidate_version": candidate_version,
+        "endpoint_url": endpoint_url,
+        "capture_windows": captured["windows"],
+        "captured_requests": captured["requests_seen"],
+        "replayed_payloads": len(captured["samples"]),
+        "recorded_rps": round(captured["recorded_rps"], 2),
+        "started_at": started_at,
+        "finished_at": time.time(),
+        **result,
+    }
+
+    report_json = json.dumps(report)
+    object_storage.upload_file(
+        project_name, replay_report_path(model_name, candidate_version, replay_id), report_json.encode()
+    )
+    model_info_db_handler.update_replay_report(model_name, candidate_version, project_name, report_json)
+    logger.info(f"Replay {replay_id} of {model_name} v{candidate_version} done: {report['saturation_point']}")
+    return 1
@@ -10,6 +10,9 @@ from loguru import logger
 from backend.domain.ports.dashboard_handler import DashboardHandler
 from backend.utils import sanitize_project_name
 
+# Metrics exported by the serving pods, scraped under the deployment's job label
+JOB_SCOPED_METRIC_PREFIXES = ("http_", "agent_", "traffic_split_", "shadow_")
+
 
 def extract_base_name(service_name: str) -> str:
     """Extract base name for Prometheus pod matching from K8s service_name.
@@ -117,11 +120,12 @@ class GrafanaDashboardAdapter(DashboardHandler):
                     elif "kube_pod_container_status_restarts_total" in expr:
                         expr = expr.replace('container="{CONTAINER}"', container_pattern)
 
-                    # http (transport) and agent (business) metrics are per-job:
-                    # scope them to this deployment by injecting the job filter.
-                    # Template exprs for these metrics must carry a `{...}` brace
-                    # (use `{}` when there is no label) so the filter can be added.
-                    if "http_" in expr or "agent_" in expr:
+                    # http (transport), agent (business) and traffic split metrics
+                    # are per-job: scope them to this deployment by injecting the
+                    # job filter. Template exprs for these metrics must carry a
+                    # `{...}` brace (use `{}` when there is no label) so the filter
+                    # can be added.
+                    if any(prefix in expr for prefix in JOB_SCOPED_METRIC_PREFIXES):
                         expr = expr.replace("{", f'{{job="{service_name}", ', 1)
 
                     target["expr"] = expr
@@ -109,6 +109,7 @@ class K8SAgentDeployment(K8SModelDeployment):
                                 ports=[client.V1ContainerPort(container_port=self.port)],
                                 env=env_vars,
                                 env_from=env_from,
+                                readiness_probe=self._readiness_probe(),
                             )
                         ],
                         restart_policy="Always",
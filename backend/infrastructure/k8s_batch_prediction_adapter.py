@@ -1,5 +1,6 @@
 # Philippe Stepniewski
 from datetime import datetime, timezone
+from typing import Optional
 
 from kubernetes import client
 from kubernetes.client.rest import ApiException
@@ -10,6 +11,20 @@ from backend.domain.ports.batch_prediction_handler import BatchPredictionHandler
 from backend.infrastructure.k8s_deployment import K8SDeployment
 from backend.utils import sanitize_project_name
 
+# Retries of a job, or of each shard of a sharded job, before it fails: a retried pod resumes from the
+# progress manifest of its shard (batch_predict_template.py)
+BATCH_BACKOFF_LIMIT = 3
+
+
+def _count_indexes(indexes: Optional[str]) -> int:
+    """Number of indexes in a Job status interval list such as "1,3-5"."""
+    count = 0
+    for interval in (indexes or "").split(","):
+        if interval:
+            first, _, last = interval.partition("-")
+            count += int(last or first) - int(first) + 1
+    return count
+
 
 class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
     def __init__(self):
@@ -17,8 +32,23 @@ class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
         self.batch_api = client.BatchV1Api()
 
     def create_batch_job(
-        self, project_name: str, model_name: str, model_version: str, input_path: str, output_path: str, job_id: str
+        self,
+        project_name: str,
+        model_name: str,
+        model_version: str,
+        input_path: str,
+        output_path: str,
+        job_id: str,
+        shards: int = 1,
+        parallelism: Optional[int] = None,
     ) -> BatchPrediction:
+        """
+        Creates the Job predicting input_path to output_path.
+
+        With more than one shard, an Indexed Job runs one pod per shard of the input (its JOB_COMPLETION_INDEX), at
+        most `parallelism` at once (all of them by default); the pod completing the last shard assembles the shard
+        outputs in order into output_path (batch_predict_template.py).
+        """
         namespace = sanitize_project_name(project_name)
         docker_image_name = sanitize_project_name(f"{project_name}_{model_name}_{model_version}_ctr")
 
@@ -31,7 +61,17 @@ class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
             client.V1EnvVar(
                 name="AWS_SECRET_ACCESS_KEY", value=self._get_env("AWS_SECRET_ACCESS_KEY", "minio_password")
             ),
+            client.V1EnvVar(name="BATCH_SHARDS", value=str(shards)),
         ]
+        if shards > 1:
+            sharding = dict(
+                completion_mode="Indexed",
+                completions=shards,
+                parallelism=min(parallelism or shards, shards),
+                backoff_limit_per_index=BATCH_BACKOFF_LIMIT,
+            )
+        else:
+            sharding = dict(backoff_limit=BATCH_BACKOFF_LIMIT)
 
         job = client.V1Job(
             metadata=client.V1ObjectMeta(
@@ -48,7 +88,7 @@ class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
                 },
             ),
             spec=client.V1JobSpec(
-                backoff_limit=1,
+                **sharding,
                 ttl_seconds_after_finished=3600,
                 template=client.V1PodTemplateSpec(
                     metadata=client.V1ObjectMeta(
@@ -85,6 +125,7 @@ class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
             input_path=input_path,
             output_path=output_path,
             created_at=datetime.now(timezone.utc),
+            shards=shards,
         )
 
     def get_job_status(self, project_name: str, job_id: str) -> BatchPrediction:
@@ -125,7 +166,8 @@ class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
 
     def _job_to_batch_prediction(self, job: client.V1Job) -> BatchPrediction:
         labels = job.metadata.labels or {}
-        status = self._map_job_status(job.status)
+        shards = job.spec.completions or 1
+        status = self._map_job_status(job.status, shards)
 
         started_at = None
         completed_at = None
@@ -158,12 +200,18 @@ class K8sBatchPredictionAdapter(BatchPredictionHandler, K8SDeployment):
             started_at=started_at,
             completed_at=completed_at,
             error_message=error_message,
+            shards=shards,
+            shards_completed=job.status.succeeded or 0,
+            shards_failed=_count_indexes(job.status.failed_indexes) if shards > 1 else job.status.failed or 0,
         )
 
-    def _map_job_status(self, status: client.V1JobStatus) -> BatchPredictionStatus:
-        if status.succeeded and status.succeeded > 0:
+    def _map_job_status(self, status: client.V1JobStatus, shards: int = 1) -> BatchPredictionStatus:
+        if status.succeeded and status.succeeded >= shards:
             return BatchPredictionStatus.COMPLETED
-        if status.failed and status.failed > 0:
+        # Failed pods are retried from their checkpoint: the job only fails once it has exhausted its retries
+        if any(c.type == "Failed" and c.status == "True" for c in status.conditions or []):
+            return BatchPredictionStatus.FAILED
+        if shards > 1 and status.failed_indexes:
             return BatchPredictionStatus.FAILED
         if status.active and status.active > 0:
             return BatchPredictionStatus.RUNNING
@@ -52,7 +52,8 @@ class K8SDeploymentClusterAdapter(DeploymentClusterHandler, K8SDeployment):
 
     def list_deployments_for_project(self, project_name: str) -> list[ModelDeployment]:
         project_name = sanitize_project_name(project_name)
-        # Exclude both model_registry pods AND agent deployments
+        # Exclude model_registry pods and agent deployments; multi-model pods are listed as "models" version
+        # {dependency_set}
         label_selector = f"project_name={project_name},type notin (model_registry, agent)"
         deployments = self.apps_api_instance.list_namespaced_deployment(
             namespace=project_name, label_selector=label_selector
@@ -1,5 +1,10 @@
+import base64
+import json
+import os
+import secrets
 import time
 
+import httpx
 from kubernetes import client
 from kubernetes.client.rest import ApiException
 from loguru import logger
@@ -8,9 +13,32 @@ from backend.domain.ports.model_deployment_handler import ModelDeployment
 from backend.infrastructure.k8s_deployment import K8SDeployment
 from backend.utils import sanitize_project_name, sanitize_ressource_name
 
+# Loading and warming up the uploaded version happens within the swap request
+MODEL_SWAP_TIMEOUT_SECONDS = 300
+SERVED_VERSION_ANNOTATION = "model-platform/served-model-version"
+TRAFFIC_SPLIT_TIMEOUT_SECONDS = 30
+TRAFFIC_SPLIT_ANNOTATION = "model-platform/traffic-split"
+
+
+class ModelSwapRefusedError(Exception):
+    """The serving pod refused an admin request (hot swap of a version: other dependencies or signature, failed
+    warm-up...; traffic split), or could not be reached (503)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
 
 class K8SModelDeployment(ModelDeployment, K8SDeployment):
-    def __init__(self, project_name: str, model_name: str, model_version: str, dashboard_uid: str):
+    def __init__(
+        self,
+        project_name: str,
+        model_name: str,
+        model_version: str,
+        dashboard_uid: str,
+        env_vars: dict[str, str] | None = None,
+    ):
         super().__init__()
         self.namespace = sanitize_project_name(project_name)
         self.docker_image_name = sanitize_project_name(f"{project_name}_{model_name}_{model_version}_ctr")
@@ -19,6 +47,10 @@ class K8SModelDeployment(ModelDeployment, K8SDeployment):
         self.model_name = sanitize_project_name(model_name)
         self.model_version = sanitize_project_name(model_version)
         self.dashboard_uid = dashboard_uid
+        # Serving-app settings for this deployment (see ServingConfig.to_env_vars)
+        self.env_vars = env_vars or {}
+        # Holds MODEL_ADMIN_TOKEN, which guards the serving app's /admin endpoints (model hot swap)
+        self.admin_secret_name = f"{self.service_name}-admin"
 
     def create_model_deployment(self):
         logger.info(f"Creating model deployment in {self.namespace} namespace")
@@ -34,6 +66,210 @@ class K8SModelDeployment(ModelDeployment, K8SDeployment):
         logger.info(f"Deleting model deployment {self.service_name} in {self.namespace} namespace")
         self._delete_model_deployment()
         self._delete_model_service()
+        self._delete_admin_secret()
+        self._delete_serving_state()
+
+    def swap_model_version(self, archive_path: str, version: str, model_uri: str) -> dict:
+        """Hot swap the model served by every running pod for `version`, from a .tar.gz of its MLflow model folder.
+
+        The version is first staged (loaded and warmed up) on every pod, then saved in the serving state of the
+        deployment, so that pods started later download `model_uri` from the registry, and only then served by every
+        pod. Returns the answer of each pod, by pod name. Raises ModelSwapRefusedError if a pod refuses the version
+        or cannot be reached while staging it, after discarding it from the pods that staged it: they all keep
+        serving the previous version. A version refused with 409 needs a regular build.
+        """
+        pods = self._serving_pods()
+        staged = []
+        try:
+            for pod_name, pod_url in pods.items():
+                with open(archive_path, "rb") as archive:
+                    self._admin_request(
+                        "PUT",
+                        "/admin/model",
+                        base_url=pod_url,
+                        params={"version": version, "activate": "false"},
+                        content=archive,
+                        headers={"Content-Type": "application/gzip"},
+                        timeout=MODEL_SWAP_TIMEOUT_SECONDS,
+                    )
+                staged.append(pod_name)
+        except ModelSwapRefusedError:
+            for pod_name in staged:
+                try:
+                    self._admin_request("DELETE", "/admin/model/staged", base_url=pods[pod_name])
+                except ModelSwapRefusedError as e:
+                    # Replaced by the next staged version, and never served meanwhile
+                    logger.warning(f"Could not discard version {version} staged on pod {pod_name}: {e}")
+            raise
+
+        self._save_serving_state(
+            {
+                "SERVED_MODEL_VERSION": version,
+                "SERVED_MODEL_URI": model_uri,
+                "MLFLOW_TRACKING_URI": self.registry_tracking_uri(),
+            }
+        )
+        responses = {}
+        for pod_name, pod_url in pods.items():
+            try:
+                responses[pod_name] = self._admin_request(
+                    "POST", "/admin/model/activate", base_url=pod_url, params={"version": version}
+                )
+            except ModelSwapRefusedError as e:
+                # The staged version is already loaded: only a pod going away fails here, and the pod replacing it
+                # serves the version from the serving state.
+                logger.error(f"Pod {pod_name} did not switch to version {version}: {e}")
+        self._annotate({SERVED_VERSION_ANNOTATION: version})
+        logger.info(f"✅ Deployment {self.service_name} now serves version {version} ({len(responses)} pods swapped)")
+        return responses
+
+    def set_traffic_split(self, mode: str, candidate: "K8SModelDeployment", weight: float = 0.0) -> dict:
+        """Mirror ("shadow") or send a `weight` share ("canary") of the /predict traffic of every running pod to
+        another deployment.
+
+        Once all of them split it, the split is saved in the serving state of the deployment for pods started later.
+        Returns the answer of each pod, by pod name. Raises ModelSwapRefusedError if a pod refuses the split (e.g.
+        several serving workers), once the pods that accepted it stopped splitting.
+        """
+        split = {
+            "mode": mode,
+            "candidate_url": candidate.service_url(),
+            "candidate_version": candidate.model_version,
+            "weight": weight,
+        }
+        pods = self._serving_pods()
+        responses = {}
+        try:
+            for pod_name, pod_url in pods.items():
+                responses[pod_name] = self._admin_request(
+                    "PUT", "/admin/traffic", base_url=pod_url, json=split, timeout=TRAFFIC_SPLIT_TIMEOUT_SECONDS
+                )
+        except ModelSwapRefusedError:
+            for pod_name in responses:
+                try:
+                    self._admin_request(
+                        "DELETE", "/admin/traffic", base_url=pods[pod_name], timeout=TRAFFIC_SPLIT_TIMEOUT_SECONDS
+                    )
+                except ModelSwapRefusedError as e:
+                    logger.warning(f"Could not stop the traffic split of pod {pod_name}: {e}")
+            raise
+        self._save_serving_state({"TRAFFIC_SPLIT": json.dumps(split)})
+        self._annotate({TRAFFIC_SPLIT_ANNOTATION: json.dumps(split)})
+        logger.info(f"✅ Deployment {self.service_name} now sends {mode} traffic to {candidate.service_name}")
+        return responses
+
+    def clear_traffic_split(self) -> dict:
+        # Saved first: a pod started while the split is being cleared does not pick it up again
+        self._save_serving_state({"TRAFFIC_SPLIT": None})
+        responses = {
+            pod_name: self._admin_request(
+                "DELETE", "/admin/traffic", base_url=pod_url, timeout=TRAFFIC_SPLIT_TIMEOUT_SECONDS
+            )
+            for pod_name, pod_url in self._serving_pods().items()
+        }
+        self._annotate({TRAFFIC_SPLIT_ANNOTATION: None})
+        logger.info(f"✅ Deployment {self.service_name} no longer splits its traffic")
+        return responses
+
+    def service_url(self) -> str:
+        return f"http://{self.service_name}.{self.namespace}.svc.cluster.local:{self.port}"
+
+    def registry_tracking_uri(self) -> str:
+        """The project's MLflow registry, as reached from its pods."""
+        return f"http://{self.namespace}.{self.namespace}.svc.cluster.local:5000"
+
+    def _serving_pods(self) -> dict[str, str]:
+        """URL of each running pod of the deployment, by pod name: a call to the Service only reaches one of them."""
+        pods = self.service_api_instance.list_namespaced_pod(self.namespace, label_selector=f"app={self.service_name}")
+        return {
+            pod.metadata.name: f"http://{pod.status.pod_ip}:{self.port}"
+            for pod in pods.items
+            if pod.status.phase == "Running" and pod.status.pod_ip and pod.metadata.deletion_timestamp is None
+        }
+
+    def _admin_request(
+        self, method: str, path: str, base_url: str | None = None, headers: dict | None = None, **kwargs
+    ) -> dict:
+        try:
+            response = httpx.request(
+                method,
+                f"{base_url or self.service_url()}{path}",
+                headers={**(headers or {}), "Authorization": f"Bearer {self._read_admin_token()}"},
+                **kwargs,
+            )
+        except httpx.HTTPError as e:
+            # Pod restarting, timeout...: handled by the callers like a refusal, never as a 409
+            raise ModelSwapRefusedError(503, f"Serving pod unreachable: {e!r}")
+        if response.status_code != 200:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise ModelSwapRefusedError(response.status_code, detail)
+        return response.json()
+
+    def _annotate(self, annotations: dict) -> None:
+        self.apps_api_instance.patch_namespaced_deployment(
+            name=self.service_name, namespace=self.namespace, body={"metadata": {"annotations": annotations}}
+        )
+
+    @property
+    def serving_state_name(self) -> str:
+        """ConfigMap of the settings changed on the running pods (hot swapped version, traffic split), read by the pods
+        at start."""
+        return f"{self.service_name}-serving-state"
+
+    def _save_serving_state(self, values: dict) -> None:
+        """Sets the given settings (None removes one) for the pods started from now on; running ones are not
+        restarted."""
+        try:
+            self.service_api_instance.patch_namespaced_config_map(
+                self.serving_state_name, self.namespace, body={"data": values}
+            )
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            self.service_api_instance.create_namespaced_config_map(
+                self.namespace,
+                client.V1ConfigMap(
+                    metadata=client.V1ObjectMeta(name=self.serving_state_name, labels={"app": self.service_name}),
+                    data={key: value for key, value in values.items() if value is not None},
+                ),
+            )
+
+    def _delete_serving_state(self) -> None:
+        try:
+            self.service_api_instance.delete_namespaced_config_map(self.serving_state_name, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"⚠️ Error while deleting config map {self.serving_state_name}: {e}")
+
+    def _create_admin_secret(self):
+        """Create the admin token Secret once; redeploys keep the token the running pods were started with."""
+        try:
+            self.service_api_instance.read_namespaced_secret(self.admin_secret_name, self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                secret = client.V1Secret(
+                    metadata=client.V1ObjectMeta(name=self.admin_secret_name, labels={"app": self.service_name}),
+                    string_data={"MODEL_ADMIN_TOKEN": secrets.token_urlsafe(32)},
+                )
+                self.service_api_instance.create_namespaced_secret(self.namespace, secret)
+                logger.info(f"✅ Secret {self.admin_secret_name} created")
+            else:
+                logger.error(f"⚠️ Error while creating secret {self.admin_secret_name}: {e}")
+
+    def _read_admin_token(self) -> str:
+        secret = self.service_api_instance.read_namespaced_secret(self.admin_secret_name, self.namespace)
+        return base64.b64decode(secret.data["MODEL_ADMIN_TOKEN"]).decode()
+
+    def _delete_admin_secret(self):
+        try:
+            self.service_api_instance.delete_namespaced_secret(self.admin_secret_name, self.namespace)
+            logger.info(f"✅ Secret {self.admin_secret_name} successfully deleted!")
+        except ApiException as e:
+            if e.status != 404:
+                logger.error(f"⚠️ Error while deleting secret {self.admin_secret_name}: {e}")
 
     def _create_or_update_model_service(self):
         service = client.V1Service(
@@ -58,7 +294,48 @@ class K8SModelDeployment(ModelDeployment, K8SDeployment):
             else:
                 logger.info(f"⚠️ Error while creating/updating the service: {e}")
 
+    def _readiness_probe(self) -> client.V1Probe:
+        """Keep the pod out of the Service until the serving app has loaded and warmed up the model."""
+        return client.V1Probe(
+            http_get=client.V1HTTPGetAction(path="/ready", port=self.port),
+            initial_delay_seconds=5,
+            period_seconds=5,
+            timeout_seconds=2,
+            failure_threshold=3,
+        )
+
+    def _object_storage_env_vars(self) -> list[client.V1EnvVar]:
+        """Access to the batch-predictions bucket, where the pod writes captured traffic."""
+        return [
+            client.V1EnvVar(name="BATCH_BUCKET", value="batch-predictions"),
+            client.V1EnvVar(name="MLFLOW_S3_ENDPOINT_URL", value=os.environ.get("MLFLOW_S3_ENDPOINT_URL", "")),
+            client.V1EnvVar(name="AWS_ACCESS_KEY_ID", value=os.environ.get("AWS_ACCESS_KEY_ID", "minio_user")),
+            client.V1EnvVar(
+                name="AWS_SECRET_ACCESS_KEY", value=os.environ.get("AWS_SECRET_ACCESS_KEY", "minio_password")
+            ),
+        ]
+
     def _create_model_service_deployment(self):
+        self._create_admin_secret()
+        # A (re)deployment serves the version of its image, whatever was hot swapped into the previous pods
+        self._delete_serving_state()
+        env_vars = [
+            client.V1EnvVar(
+                name="ROOT_PATH",
+                value=f"/deploy/{self.namespace}/{self.service_name}",
+            ),
+        ]
+        for key, value in self.env_vars.items():
+            env_vars.append(client.V1EnvVar(name=key, value=value))
+        if self.env_vars.get("TRAFFIC_CAPTURE_ENABLED") == "true":
+            env_vars.extend(self._object_storage_env_vars())
+        env_from = [
+            client.V1EnvFromSource(secret_ref=client.V1SecretEnvSource(name=self.admin_secret_name, optional=True)),
+            client.V1EnvFromSource(
+                config_map_ref=client.V1ConfigMapEnvSource(name=self.serving_state_name, optional=True)
+            ),
+        ]
+
         deployment = client.V1Deployment(
             metadata=client.V1ObjectMeta(
                 name=self.service_name,
@@ -83,12 +360,9 @@ class K8SModelDeployment(ModelDeployment, K8SDeployment):
                                 image=f"{self.docker_image_name}:latest",
                                 image_pull_policy="IfNotPresent",  # Ajouté pour éviter les erreurs de pull
                                 ports=[client.V1ContainerPort(container_port=self.port)],
-                                env=[
-                                    client.V1EnvVar(
-                                        name="ROOT_PATH",
-                                        value=f"/deploy/{self.namespace}/{self.service_name}",
-                                    ),
-                                ],
+                                env=env_vars,
+                                env_from=env_from,
+                                readiness_probe=self._readiness_probe(),
                             )
                         ],
                         restart_policy="Always",  # Bonne pratique pour un Deployment
@@ -0,0 +1,143 @@
+"""Kubernetes deployment of a multi-model serving pod.
+
+Every model version of a project needing the same dependencies (same requirements.txt, conda.yaml and
+python_env.yaml, see hash_model_dependencies) is served by one shared Deployment, named after that dependency set.
+The pod runs the image built for the first version deployed with this dependency set, started with
+SERVING_APP=multi_model_template: it downloads a version of the project's models from the project registry on its
+first request (/models/{name}/{version}/predict) and unloads the least recently used ones beyond its memory budget.
+
+The pod only serves the versions deployed to it by deploy_model_version, saved in the serving state of the deployment
+for the pods started later and sent to the running ones. Deleting the deployment (delete_model_deployment) removes
+them along with the pod, its Service and ServiceMonitor.
+"""
+
+import hashlib
+import json
+import time
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from loguru import logger
+
+from backend.infrastructure.k8s_model_deployment_adapter import K8SModelDeployment
+
+# Serving state entries read by multi_model_template.py at start, one per deployed version
+DEPLOYED_MODEL_ENV_PREFIX = "DEPLOYED_MODEL_"
+
+
+class K8SMultiModelDeployment(K8SModelDeployment):
+    def __init__(
+        self,
+        project_name: str,
+        dependency_hash: str,
+        docker_image_name: str | None = None,
+        env_vars: dict[str, str] | None = None,
+    ):
+        self.dependency_set = dependency_hash[:12]
+        super().__init__(project_name, "models", self.dependency_set, "", env_vars)
+        if docker_image_name is not None:
+            self.docker_image_name = docker_image_name
+
+    def deployment_exists(self) -> bool:
+        try:
+            self.apps_api_instance.read_namespaced_deployment(self.service_name, self.namespace)
+            return True
+        except ApiException as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def model_path(self, model_name: str, version: str) -> str:
+        """Path of the predict endpoint of a model version, behind the platform's deployment ingress."""
+        return f"/deploy/{self.namespace}/{self.service_name}/models/{model_name}/{version}/predict"
+
+    def deploy_model_version(self, model_name: str, version: str) -> dict:
+        """Lets the pods serve a version: saved in the serving state first, so that a pod started meanwhile gets it,
+        then sent to every running pod.
+
+        Returns the answer of each pod, by pod name. Raises ModelSwapRefusedError if a pod cannot be reached.
+        """
+        # A ConfigMap key per version: concurrent deployments of several versions do not overwrite each other
+        key = (
+            f"{DEPLOYED_MODEL_ENV_PREFIX}{hashlib.sha256(f'{model_name}/{version}'.encode()).hexdigest()[:16].upper()}"
+        )
+        self._save_serving_state({key: json.dumps({"name": model_name, "version": version})})
+        return {
+            pod_name: self._admin_request("PUT", f"/admin/models/{model_name}/{version}", base_url=pod_url)
+            for pod_name, pod_url in self._serving_pods().items()
+        }
+
+    def _create_model_service_deployment(self):
+        """Same shape as the single-model deployment, running the multi-model app with access to the registry."""
+        self._create_admin_secret()
+        env_vars = [
+            client.V1EnvVar(name="ROOT_PATH", value=f"/deploy/{self.namespace}/{self.service_name}"),
+            client.V1EnvVar(name="SERVING_APP", value="multi_model_template"),
+            client.V1EnvVar(name="MLFLOW_TRACKING_URI", value=self.registry_tracking_uri()),
+            # The image's values name the version it was built for, not this pod.
+            client.V1EnvVar(name="IMAGE_NAME", value=self.service_name),
+            client.V1EnvVar(name="OTEL_METRICS_EXPORTER_LABELS", value=f"project_name={self.project_name}"),
+        ]
+        for key, value in self.env_vars.items():
+            env_vars.append(client.V1EnvVar(name=key, value=value))
+        # Unlike the single-model deployment, the serving state (the deployed versions) outlives a redeployment
+        env_from = [
+            client.V1EnvFromSource(secret_ref=client.V1SecretEnvSource(name=self.admin_secret_name, optional=True)),
+            client.V1EnvFromSource(
+                config_map_ref=client.V1ConfigMapEnvSource(name=self.serving_state_name, optional=True)
+            ),
+        ]
+
+        deployment = client.V1Deployment(
+            metadata=client.V1ObjectMeta(
+                name=self.service_name,
+                labels={
+                    "app": self.service_name,
+                    "project_name": self.project_name,
+                    # Listed with the model deployments as "models" version {dependency_set}
+                    "model_name": self.model_name,
+                    "model_version": self.model_version,
+                    "dashboard_uid": "",
+                    "type": "multi_model",
+                    "dependency_set": self.dependency_set,
+                    "deployment_date": str(int(time.time())),
+                },
+            ),
+            spec=client.V1DeploymentSpec(
+                replicas=1,
+                selector=client.V1LabelSelector(match_labels={"app": self.service_name}),
+                template=client.V1PodTemplateSpec(
+                    metadata=client.V1ObjectMeta(labels={"app": self.service_name, "type": "multi_model"}),
+                    spec=client.V1PodSpec(
+                        containers=[
+                            client.V1Container(
+                                name=self.service_name,
+                                image=f"{self.docker_image_name}:latest",
+                                image_pull_policy="IfNotPresent",
+                                ports=[client.V1ContainerPort(container_port=self.port)],
+                                env=env_vars,
+                                env_from=env_from,
+                                readiness_probe=self._readiness_probe(),
+                            )
+                        ],
+                        restart_policy="Always",
+                    ),
+                ),
+            ),
+        )
+
+        try:
+            self.apps_api_instance.read_namespaced_deployment(self.service_name, self.namespace)
+            self.apps_api_instance.replace_namespaced_deployment(
+                namespace=self.namespace, name=self.service_name, body=deployment
+            )
+            logger.info(f"✅ Deployment {self.service_name} successfully updated!")
+        except ApiException as e:
+            if e.status == 404:
+                try:
+                    self.apps_api_instance.create_namespaced_deployment(namespace=self.namespace, body=deployment)
+                    logger.info(f"✅ Deployment {self.service_name} successfully created!")
+                except ApiException as create_err:
+                    logger.error(f"❌ Failed to create deployment {self.service_name}: {create_err}")
+            else:
+                logger.error(f"⚠️ Error while updating deployment {self.service_name}: {e}")
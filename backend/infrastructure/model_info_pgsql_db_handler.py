@@ -25,8 +25,7 @@ class ModelInfoPostgresDBHandler(ModelInfoDbHandler):
         connection = self._connect()
         try:
             cursor = connection.cursor()
-            cursor.execute(
-                """
+            cursor.execute("""
                 CREATE TABLE IF NOT EXISTS model_infos (
                     id            SERIAL PRIMARY KEY,
                     model_name    TEXT NOT NULL,
@@ -36,16 +35,13 @@ class ModelInfoPostgresDBHandler(ModelInfoDbHandler):
                     risk_level    TEXT,
                     UNIQUE (model_name, model_version, project_name)
                 )
-                """
-            )
-            cursor.execute(
-                """
+                """)
+            cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_model_infos_fts
                 ON model_infos USING GIN (
                     to_tsvector('simple', COALESCE(model_card, '') || ' ' || COALESCE(risk_level, ''))
                 )
-                """
-            )
+                """)
             cursor.execute("ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS generated_model_card TEXT")
             cursor.execute("ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS act_review TEXT")
             cursor.execute(
@@ -55,6 +51,9 @@ class ModelInfoPostgresDBHandler(ModelInfoDbHandler):
                 "ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS llm_compliance TEXT DEFAULT 'not_evaluated'"
             )
             cursor.execute("ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS suggested_risk_level TEXT")
+            cursor.execute("ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS serving_backend TEXT")
+            cursor.execute("ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS onnx_conversion TEXT")
+            cursor.execute("ALTER TABLE model_infos ADD COLUMN IF NOT EXISTS replay_report TEXT")
             connection.commit()
         finally:
             connection.close()
@@ -219,6 +218,41 @@ class ModelInfoPostgresDBHandler(ModelInfoDbHandler):
             connection.close()
             return True
 
+    def update_serving_backend(
+        self,
+        model_name: str,
+        model_version: str,
+        project_name: str,
+        serving_backend: str,
+        onnx_conversion: str | None = None,
+    ) -> bool:
+        connection = self._connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE model_infos SET serving_backend = %s, onnx_conversion = %s "
+                "WHERE model_name = %s AND model_version = %s AND project_name = %s",
+                (serving_backend, onnx_conversion, model_name, model_version, project_name),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+            return True
+
+    def update_replay_report(self, model_name: str, model_version: str, project_name: str, replay_report: str) -> bool:
+        connection = self._connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE model_infos SET replay_report = %s "
+                "WHERE model_name = %s AND model_version = %s AND project_name = %s",
+                (replay_report, model_name, model_version, project_name),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+            return True
+
     def delete_model_info(self, model_name: str, model_version: str, project_name: str) -> bool:
         connection = self._connect()
         try:
@@ -35,8 +35,10 @@ def map_rows_to_model_infos(rows: list) -> list[ModelInfo]:
             deterministic_compliance=row[8] if len(row) > 8 else "not_evaluated",
             llm_compliance=row[9] if len(row) > 9 else "not_evaluated",
             suggested_risk_level=row[10] if len(row) > 10 else None,
-        )
-        for row in rows
+            serving_backend=row[11] if len(row) > 11 else None,
+            onnx_conversion=row[12] if len(row) > 12 else None,
+            replay_report=row[13] if len(row) > 13 else None,
+        ) for row in rows
     ]
 
 
@@ -49,8 +51,7 @@ class ModelInfoSQLiteDBHandler(ModelInfoDbHandler):
         connection = sqlite3.connect(self.db_path)
         try:
             cursor = connection.cursor()
-            cursor.execute(
-                """
+            cursor.execute("""
                 CREATE TABLE IF NOT EXISTS model_infos (
                     id            INTEGER PRIMARY KEY AUTOINCREMENT,
                     model_name    TEXT NOT NULL,
@@ -60,14 +61,16 @@ class ModelInfoSQLiteDBHandler(ModelInfoDbHandler):
                     risk_level    TEXT,
                     UNIQUE (model_name, model_version, project_name)
                 )
-                """
-            )
+                """)
             for col in [
                 "generated_model_card",
                 "act_review",
                 "deterministic_compliance",
                 "llm_compliance",
                 "suggested_risk_level",
+                "serving_backend",
+                "onnx_conversion",
+                "replay_report",
             ]:
                 try:
                     cursor.execute(f"ALTER TABLE model_infos ADD COLUMN {col} TEXT")
@@ -235,6 +238,41 @@ class ModelInfoSQLiteDBHandler(ModelInfoDbHandler):
             connection.close()
             return True
 
+    def update_serving_backend(
+        self,
+        model_name: str,
+        model_version: str,
+        project_name: str,
+        serving_backend: str,
+        onnx_conversion: str | None = None,
+    ) -> bool:
+        connection = sqlite3.connect(self.db_path)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE model_infos SET serving_backend = ?, onnx_conversion = ? "
+                "WHERE model_name = ? AND model_version = ? AND project_name = ?",
+                (serving_backend, onnx_conversion, model_name, model_version, project_name),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+            return True
+
+    def update_replay_report(self, model_name: str, model_version: str, project_name: str, replay_report: str) -> bool:
+        connection = sqlite3.connect(self.db_path)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                "UPDATE model_infos SET replay_report = ? "
+                "WHERE model_name = ? AND model_version = ? AND project_name = ?",
+                (replay_report, model_name, model_version, project_name),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+            return True
+
     def delete_model_info(self, model_name: str, model_version: str, project_name: str) -> bool:
         connection = sqlite3.connect(self.db_path)
         try:
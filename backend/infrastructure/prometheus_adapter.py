@@ -5,13 +5,14 @@ time-series database. Handles connection pooling, query building, and
 error recovery.
 """
 
+import math
 import os
 from typing import Optional
 
 import httpx
 from loguru import logger
 
-from backend.domain.ports.metrics_handler import MetricsHandler, MetricsResult
+from backend.domain.ports.metrics_handler import MetricsHandler, MetricsResult, VersionMetricsResult
 
 
 class PrometheusAdapter(MetricsHandler):
@@ -120,6 +121,53 @@ class PrometheusAdapter(MetricsHandler):
             logger.error(f"Failed to parse Prometheus response: {e}")
             raise
 
+    async def _execute_vector_query(self, query: str) -> list[tuple[dict, float]]:
+        """Execute PromQL query and extract every series of the result vector.
+
+        Parameters
+        ----------
+        query : str
+            PromQL query string
+
+        Returns
+        -------
+        list[tuple[dict, float]]
+            (labels, value) per series, NaN values (empty histograms) left out
+
+        Raises
+        ------
+        Exception
+            If HTTP request fails or response parsing fails
+        """
+        try:
+            logger.debug(f"Executing PromQL: {query[:100]}...")
+            response = await self.client.get(
+                f"{self.prometheus_url}/api/v1/query",
+                params={"query": query},
+                timeout=self.query_timeout,
+            )
+            response.raise_for_status()
+
+            data = response.json()
+
+            if data["status"] != "success":
+                logger.warning(f"PromQL error: {data.get('error', 'Unknown error')}")
+                return []
+
+            series = []
+            for sample in data.get("data", {}).get("result", []):
+                value = float(sample["value"][1])
+                if not math.isnan(value):
+                    series.append((sample["metric"], value))
+            return series
+
+        except httpx.HTTPError as e:
+            logger.error(f"HTTP error querying Prometheus: {e}")
+            raise
+        except (ValueError, KeyError, IndexError) as e:
+            logger.error(f"Failed to parse Prometheus response: {e}")
+            raise
+
     async def get_model_metrics(self, model_id: str, period: str = "7d") -> Optional[MetricsResult]:
         """Query metrics for a single deployed model.
 
@@ -278,6 +326,85 @@ class PrometheusAdapter(MetricsHandler):
             logger.error(f"Failed to query fleet metrics: {e}")
             raise
 
+    async def get_version_comparison(self, model_id: str, period: str = "7d") -> list[VersionMetricsResult]:
+        """Query per-version latency and prediction agreement of a deployment splitting its traffic.
+
+        The incumbent's serving pod exports traffic_split_* metrics labelled by target_version and role
+        (incumbent or candidate): its own handling time, and the round trip of the requests it sends to the
+        candidate. shadow_prediction_agreement counts mirrored requests by result (agree, disagree,
+        not_compared); the agreement rate leaves the uncompared ones out.
+
+        PromQL Queries Used:
+        - latency: histogram_quantile(q, sum(rate(traffic_split_duration_seconds_bucket{
+            job=...}[period])) by (le, target_version, role))
+        - requests: sum(increase(traffic_split_requests_total{
+            job=..., result=~"served|mirrored"}[period])) by (target_version, role)
+        - agreement: sum(increase(shadow_prediction_agreement_total{
+            job=..., result=~"agree|disagree"}[period])) by (target_version, result)
+
+        Parameters
+        ----------
+        model_id : str
+            K8s service / deployment name of the incumbent (matches Prometheus 'job' label)
+        period : str
+            Time window
+
+        Returns
+        -------
+        list[VersionMetricsResult]
+            One entry per version and role, empty if the traffic was never split
+        """
+        try:
+            duration = self._period_to_duration(period)
+            logger.debug(f"Querying version comparison for model_id={model_id}, period={period}")
+
+            requests = await self._execute_vector_query(
+                f"sum(increase(traffic_split_requests_total{{"
+                f'job="{model_id}",result=~"served|mirrored"}}[{duration}])) by (target_version, role)'
+            )
+            results: dict[tuple[str, str], VersionMetricsResult] = {}
+            for labels, value in requests:
+                key = (labels.get("target_version", ""), labels.get("role", ""))
+                results[key] = {
+                    "target_version": key[0],
+                    "role": key[1],
+                    "total_requests": int(value),
+                    "p50_latency_ms": None,
+                    "p95_latency_ms": None,
+                    "agreement_rate": None,
+                }
+
+            for quantile, field in ((0.5, "p50_latency_ms"), (0.95, "p95_latency_ms")):
+                latencies = await self._execute_vector_query(
+                    f"histogram_quantile({quantile}, sum(rate(traffic_split_duration_seconds_bucket{{"
+                    f'job="{model_id}"}}[{duration}])) by (le, target_version, role))'
+                )
+                for labels, value in latencies:
+                    key = (labels.get("target_version", ""), labels.get("role", ""))
+                    if key in results:
+                        results[key][field] = round(value * 1000, 2)
+
+            agreement = await self._execute_vector_query(
+                f"sum(increase(shadow_prediction_agreement_total{{"
+                f'job="{model_id}",result=~"agree|disagree"}}[{duration}])) by (target_version, result)'
+            )
+            compared: dict[str, dict[str, float]] = {}
+            for labels, value in agreement:
+                compared.setdefault(labels.get("target_version", ""), {})[labels.get("result", "")] = value
+            for version, counts in compared.items():
+                total = counts.get("agree", 0.0) + counts.get("disagree", 0.0)
+                if (version, "candidate") in results and total > 0:
+                    results[(version, "candidate")]["agreement_rate"] = round(
+                        100.0 * counts.get("agree", 0.0) / total, 2
+                    )
+
+            logger.info(f"Version comparison for {model_id}: {len(results)} versions")
+            return list(results.values())
+
+        except Exception as e:
+            logger.error(f"Failed to query version comparison for model {model_id}: {e}")
+            raise
+
     async def close(self):
         """Close HTTP client connection pool.
 
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import typer
 
 from cli.utils.api_calls import get_and_print, post_and_print
@@ -20,6 +22,15 @@ def deploy_agent(
         "Pushed straight to the cluster, never stored by the platform. Omit when redeploying "
         "an agent whose Secret already exists.",
     ),
+    max_concurrent_requests: Optional[int] = typer.Option(
+        None, help="Requests served at once by the pod before queueing (0 for no limit)"
+    ),
+    max_queued_requests: Optional[int] = typer.Option(
+        None, help="Requests waiting for a slot before new ones are rejected with 429"
+    ),
+    serving_workers: Optional[str] = typer.Option(
+        None, help='Serving processes sharing the model: a count, or "auto" for one per CPU of the pod limit'
+    ),
 ):
     """Deploy a new agent to a project"""
     secrets = {}
@@ -29,9 +40,16 @@ def deploy_agent(
             raise typer.Exit(code=1)
         key, value = item.split("=", 1)
         secrets[key] = value
+    serving = {}
+    if max_concurrent_requests is not None:
+        serving["max_concurrent_requests"] = max_concurrent_requests
+    if max_queued_requests is not None:
+        serving["max_queued_requests"] = max_queued_requests
+    if serving_workers is not None:
+        serving["serving_workers"] = serving_workers
     post_and_print(
         f"/{project_name}/agents/deploy/{agent_name}/{agent_version}",
-        {"secrets": secrets},
+        {"secrets": secrets, "serving": serving},
         "❌ Error deploying agent",
         success_message="✅ Agent deployed successfully",
     )
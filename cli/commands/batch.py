@@ -1,4 +1,7 @@
 # Philippe Stepniewski
+import re
+from typing import Optional
+
 import typer
 
 from cli.utils.api_calls import get_and_print
@@ -9,14 +12,25 @@ def submit_batch(
     project_name: str,
     model_name: str,
     version: str,
-    file_path: str = typer.Option(..., help="Path to the CSV file to process"),
+    file_path: str = typer.Option(..., help="Path to the CSV, Parquet or Arrow file to process"),
+    output_format: Optional[str] = typer.Option(
+        None, help="csv, parquet or arrow; the format of the input file by default"
+    ),
+    shards: int = typer.Option(1, help="Split the input into this many shards, each predicted by its own pod"),
+    parallelism: Optional[int] = typer.Option(None, help="Shard pods running at once, all of them by default"),
 ):
     """Submit a batch prediction job"""
     client = get_client()
+    params = {"shards": shards}
+    if output_format:
+        params["output_format"] = output_format
+    if parallelism is not None:
+        params["parallelism"] = parallelism
     with open(file_path, "rb") as f:
         r = client.post(
             f"/{project_name}/batch/submit/{model_name}/{version}",
-            files={"file": (file_path.split("/")[-1], f, "text/csv")},
+            files={"file": (file_path.split("/")[-1], f, "application/octet-stream")},
+            params=params,
         )
     if r.status_code == 200:
         result = r.json()
@@ -46,12 +60,15 @@ def list_batch_jobs(project_name: str):
 def download_batch_result(
     project_name: str,
     job_id: str,
-    output: str = typer.Option("predictions.csv", help="Output file path"),
+    output: Optional[str] = typer.Option(None, help="Output file path, the name given by the server by default"),
 ):
     """Download the result of a batch prediction job"""
     client = get_client()
     r = client.get(f"/{project_name}/batch/download/{job_id}")
     if r.status_code == 200:
+        if output is None:
+            filename = re.search(r"filename=([^;]+)", r.headers.get("content-disposition", ""))
+            output = filename.group(1).strip('"') if filename else f"predictions-{job_id}.csv"
         with open(output, "wb") as f:
             f.write(r.content)
         print(f"Results downloaded to {output}")
@@ -1,3 +1,6 @@
+from typing import Optional
+from urllib.parse import urlencode
+
 import typer
 
 from cli.utils.api_calls import get_and_print
@@ -10,15 +13,122 @@ def list_models(project_name: str):
     )
 
 
-def deploy_model(project_name: str, model_name: str = typer.Option(), model_version: str = typer.Option()):
+def deploy_model(
+    project_name: str,
+    model_name: str = typer.Option(),
+    model_version: str = typer.Option(),
+    prediction_cache: bool = typer.Option(False, help="Cache predictions of repeated inputs in the serving pod"),
+    max_concurrent_requests: Optional[int] = typer.Option(
+        None, help="Requests served at once by the pod before queueing (0 for no limit)"
+    ),
+    max_queued_requests: Optional[int] = typer.Option(
+        None, help="Requests waiting for a slot before new ones are rejected with 429"
+    ),
+    serving_workers: Optional[str] = typer.Option(
+        None, help='Serving processes sharing the model: a count, or "auto" for one per CPU of the pod limit'
+    ),
+    multi_model: bool = typer.Option(
+        False, help="Serve from the project's shared pod for the model's dependencies instead of a dedicated pod"
+    ),
+    model_memory_budget_mb: Optional[int] = typer.Option(
+        None, help="Multi-model pod: memory of the loaded models beyond which the least recently used are unloaded"
+    ),
+    onnx: bool = typer.Option(
+        False, help="Export the model to ONNX at build time and serve it with ONNX Runtime if predictions match"
+    ),
+    capture_traffic: bool = typer.Option(
+        False, help="Sample /predict payloads to object storage, to replay them against other versions"
+    ),
+    native_threads: Optional[str] = typer.Option(
+        None, help='Threads of the OpenMP/BLAS pools per serving process: a count, or "auto" from the pod CPU limit'
+    ),
+):
     """Deploy a new model to a project"""
+    params = {}
+    if prediction_cache:
+        params["prediction_cache"] = "true"
+    if max_concurrent_requests is not None:
+        params["max_concurrent_requests"] = max_concurrent_requests
+    if max_queued_requests is not None:
+        params["max_queued_requests"] = max_queued_requests
+    if serving_workers is not None:
+        params["serving_workers"] = serving_workers
+    if model_memory_budget_mb is not None:
+        params["model_memory_budget_mb"] = model_memory_budget_mb
+    if onnx:
+        params["onnx_conversion"] = "true"
+    if capture_traffic:
+        params["traffic_capture"] = "true"
+    if native_threads is not None:
+        params["native_threads"] = native_threads
+    deploy_route = "deploy_multi_model" if multi_model else "deploy"
+    endpoint = f"/{project_name}/models/{deploy_route}/{model_name}/{model_version}"
+    if params:
+        endpoint += f"?{urlencode(params)}"
     get_and_print(
-        f"/{project_name}/models/deploy/{model_name}/{model_version}",
+        endpoint,
         "❌ Error deploying model",
         success_message="✅ Model deployed successfully",
     )
 
 
+def hot_swap_model(
+    project_name: str,
+    model_name: str = typer.Option(),
+    deployed_version: str = typer.Option(help="Version whose running deployment should serve the new one"),
+    model_version: str = typer.Option(),
+):
+    """Serve a new model version from a running deployment, without rebuilding its image"""
+    get_and_print(
+        f"/{project_name}/models/hot_swap/{model_name}/{deployed_version}/{model_version}",
+        "❌ Error swapping model",
+        success_message="✅ Model swap initiated",
+    )
+
+
+def split_traffic(
+    project_name: str,
+    model_name: str = typer.Option(),
+    model_version: str = typer.Option(help="Deployed version receiving the traffic"),
+    candidate_version: str = typer.Option(help="Version to compare it with, deployed if it is not yet"),
+    mode: str = typer.Option("shadow", help="shadow: mirror every request; canary: answer a share of them"),
+    weight: float = typer.Option(0.0, help="Share of the requests answered by the candidate in canary mode"),
+):
+    """Compare a candidate model version with a deployed one on live traffic"""
+    get_and_print(
+        f"/{project_name}/models/traffic_split/{model_name}/{model_version}/{candidate_version}"
+        f"?mode={mode}&weight={weight}",
+        "❌ Error splitting traffic",
+        success_message="✅ Traffic split initiated",
+    )
+
+
+def stop_traffic_split(project_name: str, model_name: str = typer.Option(), model_version: str = typer.Option()):
+    """Serve all the traffic of a deployed model version again"""
+    get_and_print(
+        f"/{project_name}/models/stop_traffic_split/{model_name}/{model_version}",
+        "❌ Error stopping traffic split",
+        success_message="✅ Traffic split stopped",
+    )
+
+
+def replay_traffic(
+    project_name: str,
+    model_name: str = typer.Option(),
+    model_version: str = typer.Option(help="Version whose captured traffic is replayed"),
+    candidate_version: str = typer.Option(help="Deployed version to benchmark"),
+    multipliers: str = typer.Option("1,2,4,8", help="Multiples of the recorded request rate, one step each"),
+    step_seconds: float = typer.Option(30, help="Duration of each step"),
+):
+    """Benchmark a deployed model version with the traffic captured on another one"""
+    params = {"multipliers": multipliers, "step_seconds": step_seconds}
+    get_and_print(
+        f"/{project_name}/models/replay/{model_name}/{model_version}/{candidate_version}?{urlencode(params)}",
+        "❌ Error starting traffic replay",
+        success_message="✅ Traffic replay initiated",
+    )
+
+
 def undeploy_model(project_name: str, model_name: str = typer.Option(), model_version: str = typer.Option()):
     """Undeploy a model from a project"""
     get_and_print(
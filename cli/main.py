@@ -11,7 +11,17 @@ from cli.commands.agent import (
 from cli.commands.auth import login, me
 from cli.commands.batch import batch_status, delete_batch_job, download_batch_result, list_batch_jobs, submit_batch
 from cli.commands.demo import get_status, list_simulations, start_simulation, stop_simulation
-from cli.commands.models import deploy_model, list_deployed_models, list_models, search_model_infos, undeploy_model
+from cli.commands.models import (
+    deploy_model,
+    hot_swap_model,
+    list_deployed_models,
+    list_models,
+    replay_traffic,
+    search_model_infos,
+    split_traffic,
+    stop_traffic_split,
+    undeploy_model,
+)
 from cli.commands.projects import (
     add_project,
     add_user_to_project,
@@ -44,6 +54,10 @@ project_app.command("add")(add_project)
 project_app.command("add-user")(add_user_to_project)
 project_app.command("list-models")(list_models)
 project_app.command("deploy")(deploy_model)
+project_app.command("hot-swap")(hot_swap_model)
+project_app.command("traffic-split")(split_traffic)
+project_app.command("stop-traffic-split")(stop_traffic_split)
+project_app.command("replay-traffic")(replay_traffic)
 project_app.command("undeploy")(undeploy_model)
 project_app.command("list-deployed-models")(list_deployed_models)
 project_app.command("delete")(delete_project)
@@ -108,6 +108,30 @@ def test_create_dashboard_job_filter_logic(adapter, mock_k8s_client):
     )
 
 
+def test_create_dashboard_scopes_traffic_split_metrics(adapter, mock_k8s_client):
+    """Per-version latency and shadow agreement panels only show this deployment's split."""
+    mock_k8s_client.read_namespaced_config_map.side_effect = ApiException(status=404)
+
+    adapter.create_dashboard(
+        project_name="test-project",
+        model_name="test-model",
+        version="v1",
+        service_name="test-service",
+        dashboard_uid="test-project-test-model-v1-abc123",
+    )
+
+    cm_body = mock_k8s_client.create_namespaced_config_map.call_args[1]["body"].data
+    dashboard_json = json.loads(cm_body["test-project-test-model-v1-abc123.json"])
+    split_exprs = [
+        tgt["expr"]
+        for panel in dashboard_json["panels"]
+        for tgt in panel.get("targets", [])
+        if "traffic_split_" in tgt["expr"] or "shadow_" in tgt["expr"]
+    ]
+    assert len(split_exprs) == 4
+    assert all('{job="test-service", }' in expr for expr in split_exprs)
+
+
 def test_create_dashboard_agent_uses_agent_template(adapter, mock_k8s_client):
     """Agents must render the /agent_predict template into a dedicated folder."""
     mock_k8s_client.read_namespaced_config_map.side_effect = ApiException(status=404)
@@ -1,6 +1,5 @@
 # Philippe Stepniewski
 import os
-from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -85,7 +84,14 @@ def test_map_job_status_failed(mock_k8s):
     status = MagicMock()
     status.succeeded = None
     status.failed = 1
+    status.active = 1
+    status.conditions = None
+    # The failed pod is being retried
+    assert adapter._map_job_status(status) == BatchPredictionStatus.RUNNING
+
+    status.failed = 4
     status.active = None
+    status.conditions = [MagicMock(type="Failed", status="True")]
     assert adapter._map_job_status(status) == BatchPredictionStatus.FAILED
 
 
@@ -127,3 +133,60 @@ def test_delete_batch_job(mock_k8s):
     assert call_kwargs[1]["name"] == "batch-my-job-id"
     assert call_kwargs[1]["namespace"] == "test-project"
     assert result is True
+
+
+def test_create_sharded_batch_job_is_an_indexed_job(mock_k8s):
+    mock_batch_api, mock_client = mock_k8s
+
+    from backend.infrastructure.k8s_batch_prediction_adapter import K8sBatchPredictionAdapter
+
+    adapter = K8sBatchPredictionAdapter()
+
+    result = adapter.create_batch_job(
+        project_name="test-project",
+        model_name="my-model",
+        model_version="1",
+        input_path="test-project/my-model/1/abc/input.csv",
+        output_path="test-project/my-model/1/abc/predictions-abc.csv",
+        job_id="abc12345",
+        shards=8,
+        parallelism=4,
+    )
+
+    spec_kwargs = mock_client.V1JobSpec.call_args.kwargs
+    assert spec_kwargs["completion_mode"] == "Indexed"
+    assert spec_kwargs["completions"] == 8
+    assert spec_kwargs["parallelism"] == 4
+    assert "backoff_limit" not in spec_kwargs
+    env = {call.kwargs["name"]: call.kwargs["value"] for call in mock_client.V1EnvVar.call_args_list}
+    assert env["BATCH_SHARDS"] == "8"
+    assert result.shards == 8
+
+
+def test_map_sharded_job_status_waits_for_every_shard(mock_k8s):
+    from backend.infrastructure.k8s_batch_prediction_adapter import K8sBatchPredictionAdapter
+
+    adapter = K8sBatchPredictionAdapter()
+
+    status = MagicMock()
+    status.succeeded = 3
+    status.failed = 1
+    status.active = 1
+    status.failed_indexes = None
+    status.conditions = None
+    # A failed shard still being retried does not fail the job
+    assert adapter._map_job_status(status, shards=4) == BatchPredictionStatus.RUNNING
+
+    status.failed_indexes = "2"
+    assert adapter._map_job_status(status, shards=4) == BatchPredictionStatus.FAILED
+
+    status.succeeded = 4
+    status.failed_indexes = None
+    assert adapter._map_job_status(status, shards=4) == BatchPredictionStatus.COMPLETED
+
+
+def test_count_indexes_of_job_status_intervals():
+    from backend.infrastructure.k8s_batch_prediction_adapter import _count_indexes
+
+    assert _count_indexes("1,3-5") == 4
+    assert _count_indexes(None) == 0
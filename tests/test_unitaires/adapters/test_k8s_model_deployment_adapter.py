@@ -0,0 +1,329 @@
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+os.environ.setdefault("MP_HOST_NAME", "localhost")
+os.environ.setdefault("MP_DEPLOYMENT_PATH", "/deploy")
+os.environ.setdefault("MP_DEPLOYMENT_PORT", "8000")
+
+
+def _make_adapter(env_vars=None):
+    from backend.infrastructure.k8s_model_deployment_adapter import K8SModelDeployment
+
+    deployment = K8SModelDeployment("proj", "model", "1", "dash-uid", env_vars)
+    deployment.apps_api_instance = MagicMock()
+    deployment.service_api_instance = MagicMock()
+    return deployment
+
+
+@pytest.fixture(autouse=True)
+def no_kube_config():
+    with patch("backend.infrastructure.k8s_deployment.config.load_kube_config", return_value=None):
+        yield
+
+
+def _running_pods(adapter, *ips):
+    pods = [
+        MagicMock(status=MagicMock(phase="Running", pod_ip=ip), metadata=MagicMock(deletion_timestamp=None))
+        for ip in ips
+    ]
+    for index, pod in enumerate(pods):
+        pod.metadata.name = f"pod-{index}"
+    adapter.service_api_instance.list_namespaced_pod.return_value.items = pods
+
+
+def _deployed_container(adapter):
+    if adapter.apps_api_instance.create_namespaced_deployment.called:
+        body = adapter.apps_api_instance.create_namespaced_deployment.call_args.kwargs["body"]
+    else:
+        body = adapter.apps_api_instance.replace_namespaced_deployment.call_args.kwargs["body"]
+    return body.spec.template.spec.containers[0]
+
+
+class TestK8SModelDeploymentEnv:
+    def test_only_root_path_by_default(self):
+        adapter = _make_adapter()
+        adapter._create_model_service_deployment()
+
+        env = {e.name: e.value for e in _deployed_container(adapter).env}
+        assert env == {"ROOT_PATH": f"/deploy/{adapter.namespace}/{adapter.service_name}"}
+
+    def test_serving_env_vars_are_injected(self):
+        adapter = _make_adapter({"PREDICTION_CACHE_ENABLED": "true", "PREDICTION_CACHE_TTL_SECONDS": "60"})
+        adapter._create_model_service_deployment()
+
+        env = {e.name: e.value for e in _deployed_container(adapter).env}
+        assert env["PREDICTION_CACHE_ENABLED"] == "true"
+        assert env["PREDICTION_CACHE_TTL_SECONDS"] == "60"
+        assert "ROOT_PATH" in env
+
+    def test_traffic_capture_gets_object_storage_access(self):
+        adapter = _make_adapter({"TRAFFIC_CAPTURE_ENABLED": "true", "TRAFFIC_CAPTURE_PREFIX": "proj/model/1/captures/"})
+        with patch.dict(os.environ, {"MLFLOW_S3_ENDPOINT_URL": "http://minio:9000"}):
+            adapter._create_model_service_deployment()
+
+        env = {e.name: e.value for e in _deployed_container(adapter).env}
+        assert env["MLFLOW_S3_ENDPOINT_URL"] == "http://minio:9000"
+        assert env["BATCH_BUCKET"] == "batch-predictions"
+        assert "AWS_SECRET_ACCESS_KEY" in env
+
+
+class TestK8SModelDeploymentReadiness:
+    def test_readiness_probe_targets_ready_endpoint(self):
+        adapter = _make_adapter()
+        adapter._create_model_service_deployment()
+
+        probe = _deployed_container(adapter).readiness_probe
+        assert probe.http_get.path == "/ready"
+        assert probe.http_get.port == adapter.port
+
+
+class TestK8SModelDeploymentHotSwap:
+    def test_pod_gets_admin_token_and_serving_state(self):
+        adapter = _make_adapter()
+        adapter._create_model_service_deployment()
+
+        secret_source, state_source = _deployed_container(adapter).env_from
+        assert secret_source.secret_ref.name == f"{adapter.service_name}-admin"
+        assert state_source.config_map_ref.name == f"{adapter.service_name}-serving-state"
+        assert state_source.config_map_ref.optional
+
+    def test_redeploy_resets_serving_state(self):
+        adapter = _make_adapter()
+        adapter._create_model_service_deployment()
+
+        adapter.service_api_instance.delete_namespaced_config_map.assert_called_once_with(
+            f"{adapter.service_name}-serving-state", adapter.namespace
+        )
+
+    def test_admin_secret_is_kept_on_redeploy(self):
+        adapter = _make_adapter()
+        adapter._create_model_service_deployment()
+
+        adapter.service_api_instance.create_namespaced_secret.assert_not_called()
+
+    def test_swap_uploads_archive_to_every_pod_and_saves_version(self, tmp_path):
+        import base64
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {
+            "MODEL_ADMIN_TOKEN": base64.b64encode(b"token").decode()
+        }
+        _running_pods(adapter, "10.0.0.1", "10.0.0.2")
+        archive = tmp_path / "model.tar.gz"
+        archive.write_bytes(b"archive")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"model_version": "2"}
+
+        saved_before_activation = []
+        config_maps = adapter.service_api_instance.patch_namespaced_config_map
+
+        def admin_request(method, url, **kwargs):
+            if url.endswith("/activate"):
+                saved_before_activation.append(config_maps.called)
+            return response
+
+        with patch(
+            "backend.infrastructure.k8s_model_deployment_adapter.httpx.request", side_effect=admin_request
+        ) as request:
+            responses = adapter.swap_model_version(str(archive), "2", "models:/model/2")
+
+        assert responses == {"pod-0": {"model_version": "2"}, "pod-1": {"model_version": "2"}}
+        assert [call.args for call in request.call_args_list] == [
+            ("PUT", "http://10.0.0.1:8000/admin/model"),
+            ("PUT", "http://10.0.0.2:8000/admin/model"),
+            ("POST", "http://10.0.0.1:8000/admin/model/activate"),
+            ("POST", "http://10.0.0.2:8000/admin/model/activate"),
+        ]
+        assert request.call_args_list[0].kwargs["params"] == {"version": "2", "activate": "false"}
+        assert request.call_args.kwargs["params"] == {"version": "2"}
+        assert request.call_args.kwargs["headers"]["Authorization"] == "Bearer token"
+        assert saved_before_activation == [True, True]
+        name, namespace = adapter.service_api_instance.patch_namespaced_config_map.call_args.args
+        assert name == f"{adapter.service_name}-serving-state"
+        state = adapter.service_api_instance.patch_namespaced_config_map.call_args.kwargs["body"]["data"]
+        assert state["SERVED_MODEL_VERSION"] == "2"
+        assert state["SERVED_MODEL_URI"] == "models:/model/2"
+        assert state["MLFLOW_TRACKING_URI"] == f"http://{namespace}.{namespace}.svc.cluster.local:5000"
+        body = adapter.apps_api_instance.patch_namespaced_deployment.call_args.kwargs["body"]
+        assert body["metadata"]["annotations"] == {"model-platform/served-model-version": "2"}
+
+    def test_serving_state_is_created_on_first_swap(self, tmp_path):
+        from kubernetes.client.rest import ApiException
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter)
+        adapter.service_api_instance.patch_namespaced_config_map.side_effect = ApiException(status=404)
+        archive = tmp_path / "model.tar.gz"
+        archive.write_bytes(b"archive")
+
+        assert adapter.swap_model_version(str(archive), "2", "models:/model/2") == {}
+
+        config_map = adapter.service_api_instance.create_namespaced_config_map.call_args.args[1]
+        assert config_map.metadata.name == f"{adapter.service_name}-serving-state"
+        assert config_map.data["SERVED_MODEL_VERSION"] == "2"
+
+    def test_refused_swap_raises(self, tmp_path):
+        from backend.infrastructure.k8s_model_deployment_adapter import ModelSwapRefusedError
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1")
+        archive = tmp_path / "model.tar.gz"
+        archive.write_bytes(b"archive")
+        response = MagicMock(status_code=409)
+        response.json.return_value = {"detail": "The new version needs other dependencies"}
+
+        with patch("backend.infrastructure.k8s_model_deployment_adapter.httpx.request", return_value=response):
+            with pytest.raises(ModelSwapRefusedError) as error:
+                adapter.swap_model_version(str(archive), "2", "models:/model/2")
+
+        assert error.value.status_code == 409
+        adapter.service_api_instance.patch_namespaced_config_map.assert_not_called()
+        adapter.apps_api_instance.patch_namespaced_deployment.assert_not_called()
+
+    def test_version_is_discarded_from_every_pod_when_one_refuses_it(self, tmp_path):
+        from backend.infrastructure.k8s_model_deployment_adapter import ModelSwapRefusedError
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1", "10.0.0.2")
+        archive = tmp_path / "model.tar.gz"
+        archive.write_bytes(b"archive")
+        staged, refused = MagicMock(status_code=200), MagicMock(status_code=409)
+        refused.json.return_value = {"detail": "The new version has another signature"}
+
+        def admin_request(method, url, **kwargs):
+            return refused if url.startswith("http://10.0.0.2") else staged
+
+        with patch(
+            "backend.infrastructure.k8s_model_deployment_adapter.httpx.request", side_effect=admin_request
+        ) as request:
+            with pytest.raises(ModelSwapRefusedError) as error:
+                adapter.swap_model_version(str(archive), "2", "models:/model/2")
+
+        assert error.value.status_code == 409
+        assert [call.args for call in request.call_args_list] == [
+            ("PUT", "http://10.0.0.1:8000/admin/model"),
+            ("PUT", "http://10.0.0.2:8000/admin/model"),
+            ("DELETE", "http://10.0.0.1:8000/admin/model/staged"),
+        ]
+        adapter.service_api_instance.patch_namespaced_config_map.assert_not_called()
+        adapter.apps_api_instance.patch_namespaced_deployment.assert_not_called()
+
+    def test_unreachable_pod_is_a_refusal(self, tmp_path):
+        import httpx
+
+        from backend.infrastructure.k8s_model_deployment_adapter import ModelSwapRefusedError
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1")
+        archive = tmp_path / "model.tar.gz"
+        archive.write_bytes(b"archive")
+
+        with patch(
+            "backend.infrastructure.k8s_model_deployment_adapter.httpx.request",
+            side_effect=httpx.ReadTimeout("timed out"),
+        ):
+            with pytest.raises(ModelSwapRefusedError) as error:
+                adapter.swap_model_version(str(archive), "2", "models:/model/2")
+
+        assert error.value.status_code == 503
+        adapter.service_api_instance.patch_namespaced_config_map.assert_not_called()
+
+
+class TestK8SModelDeploymentTrafficSplit:
+    def test_split_points_every_pod_at_candidate_service_and_is_saved(self):
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1", "10.0.0.2")
+        candidate = _make_adapter()
+        candidate.service_name, candidate.model_version = "proj-model-2-deployment", "2"
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"mode": "canary"}
+
+        with patch("backend.infrastructure.k8s_model_deployment_adapter.httpx.request", return_value=response) as put:
+            responses = adapter.set_traffic_split("canary", candidate, 0.1)
+
+        assert responses == {"pod-0": {"mode": "canary"}, "pod-1": {"mode": "canary"}}
+        assert [call.args for call in put.call_args_list] == [
+            ("PUT", "http://10.0.0.1:8000/admin/traffic"),
+            ("PUT", "http://10.0.0.2:8000/admin/traffic"),
+        ]
+        split = {
+            "mode": "canary",
+            "candidate_url": f"http://{candidate.service_name}.{candidate.namespace}.svc.cluster.local:8000",
+            "candidate_version": "2",
+            "weight": 0.1,
+        }
+        assert put.call_args.kwargs["json"] == split
+        state = adapter.service_api_instance.patch_namespaced_config_map.call_args.kwargs["body"]["data"]
+        assert json.loads(state["TRAFFIC_SPLIT"]) == split
+        body = adapter.apps_api_instance.patch_namespaced_deployment.call_args.kwargs["body"]
+        assert json.loads(body["metadata"]["annotations"]["model-platform/traffic-split"])["mode"] == "canary"
+
+    def test_refused_split_is_not_saved(self):
+        from backend.infrastructure.k8s_model_deployment_adapter import ModelSwapRefusedError
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1")
+        response = MagicMock(status_code=409)
+        response.json.return_value = {"detail": "Traffic split needs a single serving worker (SERVING_WORKERS=1)"}
+
+        with patch("backend.infrastructure.k8s_model_deployment_adapter.httpx.request", return_value=response):
+            with pytest.raises(ModelSwapRefusedError):
+                adapter.set_traffic_split("shadow", _make_adapter())
+
+        adapter.service_api_instance.patch_namespaced_config_map.assert_not_called()
+        adapter.apps_api_instance.patch_namespaced_deployment.assert_not_called()
+
+    def test_pods_that_accepted_a_refused_split_stop_splitting(self):
+        from backend.infrastructure.k8s_model_deployment_adapter import ModelSwapRefusedError
+
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1", "10.0.0.2")
+        accepted, refused = MagicMock(status_code=200), MagicMock(status_code=409)
+        refused.json.return_value = {"detail": "Traffic split needs a single serving worker (SERVING_WORKERS=1)"}
+
+        def admin_request(method, url, **kwargs):
+            return refused if url.startswith("http://10.0.0.2") else accepted
+
+        with patch(
+            "backend.infrastructure.k8s_model_deployment_adapter.httpx.request", side_effect=admin_request
+        ) as request:
+            with pytest.raises(ModelSwapRefusedError):
+                adapter.set_traffic_split("shadow", _make_adapter())
+
+        assert [call.args for call in request.call_args_list] == [
+            ("PUT", "http://10.0.0.1:8000/admin/traffic"),
+            ("PUT", "http://10.0.0.2:8000/admin/traffic"),
+            ("DELETE", "http://10.0.0.1:8000/admin/traffic"),
+        ]
+        adapter.service_api_instance.patch_namespaced_config_map.assert_not_called()
+
+    def test_clearing_split_stops_every_pod_and_removes_it(self):
+        adapter = _make_adapter()
+        adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+        _running_pods(adapter, "10.0.0.1", "10.0.0.2")
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"mode": None}
+
+        with patch(
+            "backend.infrastructure.k8s_model_deployment_adapter.httpx.request", return_value=response
+        ) as delete:
+            adapter.clear_traffic_split()
+
+        assert [call.args for call in delete.call_args_list] == [
+            ("DELETE", "http://10.0.0.1:8000/admin/traffic"),
+            ("DELETE", "http://10.0.0.2:8000/admin/traffic"),
+        ]
+        state = adapter.service_api_instance.patch_namespaced_config_map.call_args.kwargs["body"]["data"]
+        assert state == {"TRAFFIC_SPLIT": None}
+        body = adapter.apps_api_instance.patch_namespaced_deployment.call_args.kwargs["body"]
+        assert body["metadata"]["annotations"] == {"model-platform/traffic-split": None}
@@ -0,0 +1,125 @@
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from kubernetes.client.rest import ApiException
+
+os.environ.setdefault("MP_HOST_NAME", "localhost")
+os.environ.setdefault("MP_DEPLOYMENT_PATH", "/deploy")
+os.environ.setdefault("MP_DEPLOYMENT_PORT", "8000")
+
+DEPENDENCY_HASH = "0123456789abcdef" * 4
+
+
+@pytest.fixture
+def adapter():
+    with patch("backend.infrastructure.k8s_deployment.config.load_kube_config", return_value=None):
+        from backend.infrastructure.k8s_multi_model_deployment_adapter import K8SMultiModelDeployment
+
+        deployment = K8SMultiModelDeployment(
+            "Credit-Risk", DEPENDENCY_HASH, "credit-risk-scoring-3-ctr", {"MODEL_MEMORY_BUDGET_MB": "512"}
+        )
+        deployment.apps_api_instance = MagicMock()
+        deployment.service_api_instance = MagicMock()
+        yield deployment
+
+
+def _deployed_body(adapter):
+    if adapter.apps_api_instance.create_namespaced_deployment.called:
+        return adapter.apps_api_instance.create_namespaced_deployment.call_args.kwargs["body"]
+    return adapter.apps_api_instance.replace_namespaced_deployment.call_args.kwargs["body"]
+
+
+def test_deployment_is_named_after_dependency_set(adapter):
+    assert adapter.dependency_set == DEPENDENCY_HASH[:12]
+    assert DEPENDENCY_HASH[:12] in adapter.service_name
+
+
+def test_pod_runs_multi_model_app_from_given_image(adapter):
+    adapter._create_model_service_deployment()
+
+    container = _deployed_body(adapter).spec.template.spec.containers[0]
+    env = {e.name: e.value for e in container.env}
+    assert container.image == "credit-risk-scoring-3-ctr:latest"
+    assert env["SERVING_APP"] == "multi_model_template"
+    assert env["MLFLOW_TRACKING_URI"] == "http://credit-risk.credit-risk.svc.cluster.local:5000"
+    assert env["OTEL_METRICS_EXPORTER_LABELS"] == "project_name=credit-risk"
+    assert env["MODEL_MEMORY_BUDGET_MB"] == "512"
+
+
+def test_deployment_is_listed_as_a_model_deployment_of_its_dependency_set(adapter):
+    from backend.domain.entities.model_deployment import ModelDeployment
+
+    adapter._create_model_service_deployment()
+
+    labels = _deployed_body(adapter).metadata.labels
+    assert labels["type"] == "multi_model"
+    assert labels["dependency_set"] == DEPENDENCY_HASH[:12]
+    listed = ModelDeployment(**labels, deployment_name=adapter.service_name)
+    assert (listed.model_name, listed.model_version) == ("models", DEPENDENCY_HASH[:12])
+
+
+def test_deleting_the_deployment_deletes_its_pod_service_and_deployed_versions(adapter):
+    with patch("backend.infrastructure.k8s_model_deployment_adapter.client.CustomObjectsApi") as custom_objects:
+        adapter.delete_model_deployment()
+
+    adapter.apps_api_instance.delete_namespaced_deployment.assert_called_once()
+    assert adapter.apps_api_instance.delete_namespaced_deployment.call_args.kwargs["name"] == adapter.service_name
+    adapter.service_api_instance.delete_namespaced_service.assert_called_once()
+    assert custom_objects.return_value.delete_namespaced_custom_object.call_args.kwargs["name"] == (
+        f"{adapter.service_name}-monitor"
+    )
+    adapter.service_api_instance.delete_namespaced_config_map.assert_called_once_with(
+        adapter.serving_state_name, adapter.namespace
+    )
+
+
+def test_deployment_exists(adapter):
+    assert adapter.deployment_exists()
+
+    adapter.apps_api_instance.read_namespaced_deployment.side_effect = ApiException(status=404)
+    assert not adapter.deployment_exists()
+
+
+def test_model_path(adapter):
+    assert adapter.model_path("scoring", "4") == f"/deploy/credit-risk/{adapter.service_name}/models/scoring/4/predict"
+
+
+def test_pod_reads_deployed_versions_and_admin_token(adapter):
+    adapter._create_model_service_deployment()
+
+    env_from = _deployed_body(adapter).spec.template.spec.containers[0].env_from
+    assert [source.secret_ref.name for source in env_from if source.secret_ref] == [adapter.admin_secret_name]
+    assert [source.config_map_ref.name for source in env_from if source.config_map_ref] == [adapter.serving_state_name]
+    adapter.service_api_instance.delete_namespaced_config_map.assert_not_called()
+
+
+def test_deployed_version_is_saved_then_sent_to_every_pod(adapter):
+    adapter.service_api_instance.read_namespaced_secret.return_value.data = {"MODEL_ADMIN_TOKEN": ""}
+    pods = [MagicMock() for _ in range(2)]
+    for index, pod in enumerate(pods):
+        pod.metadata.name, pod.metadata.deletion_timestamp = f"pod-{index}", None
+        pod.status.phase, pod.status.pod_ip = "Running", f"10.0.0.{index + 1}"
+    adapter.service_api_instance.list_namespaced_pod.return_value.items = pods
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"name": "scoring", "version": "4"}
+
+    with patch("backend.infrastructure.k8s_model_deployment_adapter.httpx.request", return_value=response) as put:
+        adapter.deploy_model_version("scoring", "4")
+        adapter.deploy_model_version("scoring", "5")
+
+    assert [call.args for call in put.call_args_list[:2]] == [
+        ("PUT", "http://10.0.0.1:8000/admin/models/scoring/4"),
+        ("PUT", "http://10.0.0.2:8000/admin/models/scoring/4"),
+    ]
+    states = [
+        call.kwargs["body"]["data"] for call in adapter.service_api_instance.patch_namespaced_config_map.call_args_list
+    ]
+    assert [json.loads(value) for state in states for value in state.values()] == [
+        {"name": "scoring", "version": "4"},
+        {"name": "scoring", "version": "5"},
+    ]
+    # One key per version, read by the pod from its environment
+    assert states[0].keys() != states[1].keys()
+    assert all(key.startswith("DEPLOYED_MODEL_") and key.isidentifier() for state in states for key in state)
@@ -144,3 +144,26 @@ def test_search_model_infos_no_results(handler):
     )
     results = handler.search_model_infos(query="nonexistent_term_xyz")
     assert results == []
+
+
+def test_update_serving_backend(handler):
+    handler.add_model_info(ModelInfo(model_name="my_model", model_version="1", project_name="proj_a"))
+    handler.update_serving_backend(
+        model_name="my_model",
+        model_version="1",
+        project_name="proj_a",
+        serving_backend="onnx",
+        onnx_conversion='{"serving_backend": "onnx"}',
+    )
+    retrieved = handler.get_model_info(model_name="my_model", model_version="1", project_name="proj_a")
+    assert retrieved.serving_backend == "onnx"
+    assert retrieved.onnx_conversion == '{"serving_backend": "onnx"}'
+
+
+def test_update_replay_report(handler):
+    handler.add_model_info(ModelInfo(model_name="my_model", model_version="2", project_name="proj_a"))
+    handler.update_replay_report(
+        model_name="my_model", model_version="2", project_name="proj_a", replay_report='{"saturation": null}'
+    )
+    retrieved = handler.get_model_info(model_name="my_model", model_version="2", project_name="proj_a")
+    assert retrieved.replay_report == '{"saturation": null}'
@@ -0,0 +1,81 @@
+# Philippe Stepniewski
+import os
+
+os.environ.setdefault("PATH_LOG_EVENTS", "/tmp/test_log_events")
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.api.app import create_app
+from backend.api.models_routes import (
+    get_dashboard_handler,
+    get_model_info_db_handler,
+    get_object_storage_handler,
+    get_platform_config_handler,
+    get_registry_pool,
+    get_tasks_status,
+)
+from backend.domain.entities.docker.task_build_statuses import TaskBuildStatuses
+from backend.domain.use_cases.auth_usecases import get_current_user, get_user_adapter
+from backend.domain.use_cases.deploy_model import HOT_SWAP_REDEPLOYED
+
+
+@pytest.fixture
+def tasks_status():
+    return {}
+
+
+@pytest.fixture
+def client(tasks_status):
+    app = create_app()
+    app.dependency_overrides[get_tasks_status] = lambda: tasks_status
+    app.dependency_overrides[get_object_storage_handler] = lambda: MagicMock()
+    app.dependency_overrides[get_model_info_db_handler] = lambda: MagicMock()
+    app.dependency_overrides[get_current_user] = lambda: {"id": "user123", "email": "user@test"}
+    app.dependency_overrides[get_user_adapter] = lambda: MagicMock()
+    app.dependency_overrides[get_registry_pool] = lambda: MagicMock()
+    app.dependency_overrides[get_dashboard_handler] = lambda: MagicMock()
+    app.dependency_overrides[get_platform_config_handler] = lambda: MagicMock()
+    with patch("backend.api.models_routes.user_can_perform_action_for_project"):
+        yield TestClient(app)
+
+
+class TestReplayTraffic:
+    def test_replay_is_queued_with_the_multipliers(self, client, tasks_status):
+        with patch("backend.api.models_routes.replay_traffic") as replay_traffic:
+            response = client.get("/proj/models/replay/model/1/2", params={"multipliers": "1,2.5"})
+
+        assert response.status_code == 200
+        assert replay_traffic.call_args.args[6] == (1.0, 2.5)
+
+    def test_zero_multiplier_is_rejected(self, client, tasks_status):
+        with patch("backend.api.models_routes.replay_traffic") as replay_traffic:
+            response = client.get("/proj/models/replay/model/1/2", params={"multipliers": "0,2"})
+
+        assert response.status_code == 400
+        replay_traffic.assert_not_called()
+        assert tasks_status == {}
+
+
+class TestHotSwap:
+    def _hot_swap(self, client, status):
+        with (
+            patch("backend.api.models_routes.get_project_registry_tracking_uri", return_value="http://mlflow"),
+            patch("backend.api.models_routes._check_deployment_gate"),
+            patch("backend.api.models_routes.hot_swap_model", return_value=status),
+        ):
+            return client.get("/proj/models/hot_swap/model/1/2")
+
+    def test_swap_completes(self, client, tasks_status):
+        response = self._hot_swap(client, 1)
+
+        assert response.status_code == 200
+        assert tasks_status[response.json()["task_id"]] == TaskBuildStatuses.completed
+
+    def test_fallback_to_a_regular_deployment_is_reported(self, client, tasks_status):
+        response = self._hot_swap(client, HOT_SWAP_REDEPLOYED)
+
+        assert TaskBuildStatuses.redeployed in response.json()["fallback"]
+        assert tasks_status[response.json()["task_id"]] == TaskBuildStatuses.redeployed
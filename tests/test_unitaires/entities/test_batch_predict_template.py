@@ -0,0 +1,441 @@
+import importlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from botocore.exceptions import ClientError
+
+DOCKER_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "../../../backend/domain/entities/docker")
+
+
+@pytest.fixture
+def batch_template(monkeypatch):
+    # The template imports native_threads_template as it is laid out in the image, next to it
+    monkeypatch.syspath_prepend(os.path.abspath(DOCKER_TEMPLATES_DIR))
+    return importlib.import_module("backend.domain.entities.docker.batch_predict_template")
+
+
+@pytest.fixture
+def doubling_model():
+    model = MagicMock()
+    model.predict.side_effect = lambda chunk: np.asarray(chunk["a"] * 2)
+    return model
+
+
+def _parquet_bytes(table, row_group_size):
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=row_group_size)
+    return buffer.getvalue()
+
+
+def _arrow_file_bytes(table):
+    buffer = io.BytesIO()
+    with pa.ipc.new_file(buffer, table.schema) as writer:
+        writer.write_table(table)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def s3():
+    s3 = MagicMock()
+    s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    s3.upload_part.side_effect = lambda **kwargs: {"ETag": f"etag-{kwargs['PartNumber']}"}
+    return s3
+
+
+class TestMultipartUploadWriter:
+    def test_small_output_is_written_with_one_put(self, batch_template, s3):
+        with batch_template.MultipartUploadWriter(s3, "bucket", "out.csv", part_bytes=10) as sink:
+            sink.write(b"abc")
+
+        s3.put_object.assert_called_once_with(Bucket="bucket", Key="out.csv", Body=b"abc")
+        s3.create_multipart_upload.assert_not_called()
+
+    def test_output_is_uploaded_by_parts(self, batch_template, s3):
+        with batch_template.MultipartUploadWriter(s3, "bucket", "out.csv", part_bytes=10) as sink:
+            for _ in range(5):
+                sink.write(b"123456")
+
+        bodies = [call.kwargs["Body"] for call in s3.upload_part.call_args_list]
+        assert bodies == [b"123456123456", b"123456123456", b"123456"]
+        s3.complete_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="out.csv",
+            UploadId="upload-1",
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": "etag-1", "PartNumber": 1},
+                    {"ETag": "etag-2", "PartNumber": 2},
+                    {"ETag": "etag-3", "PartNumber": 3},
+                ]
+            },
+        )
+        s3.put_object.assert_not_called()
+
+    def test_failed_job_aborts_the_upload(self, batch_template, s3):
+        with pytest.raises(RuntimeError):
+            with batch_template.MultipartUploadWriter(s3, "bucket", "out.csv", part_bytes=10) as sink:
+                sink.write(b"12345678901")
+                raise RuntimeError("prediction failed")
+
+        s3.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="out.csv", UploadId="upload-1")
+        s3.complete_multipart_upload.assert_not_called()
+
+
+class TestPredictFile:
+    def test_predictions_of_every_chunk_follow_one_header(self, batch_template, doubling_model):
+        source = io.BytesIO(b"a,b\n1,x\n2,y\n3,z\n4,t\n5,u\n")
+        sink = io.BytesIO()
+
+        rows = batch_template.predict_file(doubling_model, source, sink, chunk_rows=2)
+
+        assert rows == 5
+        assert doubling_model.predict.call_count == 3
+        assert sink.getvalue() == b"prediction\n2\n4\n6\n8\n10\n"
+
+    def test_input_without_rows_gives_an_empty_prediction_column(self, batch_template):
+        sink = io.BytesIO()
+
+        rows = batch_template.predict_file(MagicMock(), io.BytesIO(b"a,b\n"), sink)
+
+        assert rows == 0
+        assert sink.getvalue() == b"prediction\n"
+
+    def test_only_signature_columns_are_read(self, batch_template, doubling_model):
+        table = pa.table({"a": [1, 2, 3], "unused": ["x", "y", "z"]})
+
+        for input_format, content in (
+            ("csv", b"a,unused\n1,x\n2,y\n3,z\n"),
+            ("parquet", _parquet_bytes(table, row_group_size=2)),
+            ("arrow", _arrow_file_bytes(table)),
+        ):
+            chunks = list(batch_template.read_chunks(io.BytesIO(content), input_format, 2, columns=["a", "b"]))
+
+            assert [list(chunk.columns) for chunk in chunks] == [["a"], ["a"]], input_format
+            assert [len(chunk) for chunk in chunks] == [2, 1], input_format
+
+    def test_parquet_to_zstd_parquet_through_a_multipart_upload(self, batch_template, doubling_model, s3):
+        source = io.BytesIO(_parquet_bytes(pa.table({"a": list(range(10))}), row_group_size=4))
+
+        with batch_template.MultipartUploadWriter(s3, "bucket", "predictions.parquet") as sink:
+            rows = batch_template.predict_file(doubling_model, source, sink, "parquet", "parquet", chunk_rows=3)
+
+        assert rows == 10
+        output = pq.ParquetFile(io.BytesIO(s3.put_object.call_args.kwargs["Body"]))
+        assert output.read().column("prediction").to_pylist() == [2 * i for i in range(10)]
+        assert output.metadata.row_group(0).column(0).compression == "ZSTD"
+
+    def test_arrow_stream_to_arrow_file(self, batch_template, doubling_model):
+        table = pa.table({"a": [1.5, 2.5]})
+        stream = io.BytesIO()
+        with pa.ipc.new_stream(stream, table.schema) as writer:
+            writer.write_table(table)
+        sink = io.BytesIO()
+
+        batch_template.predict_file(doubling_model, io.BytesIO(stream.getvalue()), sink, "arrow", "arrow")
+
+        assert pa.ipc.open_file(io.BytesIO(sink.getvalue())).read_all().column("prediction").to_pylist() == [3.0, 5.0]
+
+
+class TestPipeline:
+    def test_chunks_predicted_concurrently_are_written_in_input_order(self, batch_template, monkeypatch):
+        model = MagicMock()
+
+        def predict(chunk):
+            # Later chunks finish first
+            time.sleep(0.02 / chunk["a"].iloc[0])
+            return chunk["a"] * 2
+
+        model.predict.side_effect = predict
+        monkeypatch.setattr(batch_template, "worker_model", model)
+        source = io.BytesIO(b"a\n" + b"".join(f"{i}\n".encode() for i in range(1, 41)))
+        sink = io.BytesIO()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            rows = batch_template.predict_file(None, source, sink, chunk_rows=3, pool=pool, workers=4)
+
+        assert rows == 40
+        assert sink.getvalue() == b"prediction\n" + b"".join(f"{2 * i}\n".encode() for i in range(1, 41))
+
+    def test_reader_errors_reach_the_caller(self, batch_template):
+        def items():
+            yield 1
+            raise ValueError("unreadable input")
+
+        with pytest.raises(ValueError, match="unreadable input"):
+            list(batch_template.read_ahead(items(), depth=1))
+
+    def test_worker_count_follows_the_cpu_limit(self, batch_template, monkeypatch):
+        monkeypatch.setattr(importlib.import_module("native_threads_template"), "cgroup_cpu_limit", lambda: 3.5)
+
+        assert batch_template.worker_count("auto") == 3
+        assert batch_template.worker_count("2") == 2
+
+
+class TestChunkSizer:
+    def test_fixed_rows_are_kept(self, batch_template):
+        sizer = batch_template.ChunkSizer(500)
+
+        sizer.observe(500, 0.001, 4000)
+
+        assert sizer() == 500
+
+    def test_chunks_grow_towards_the_target_duration(self, batch_template, monkeypatch):
+        monkeypatch.setattr(batch_template, "memory_headroom", lambda: None)
+        sizer = batch_template.ChunkSizer()
+
+        # 100 000 rows/s: 200 000 rows per 2 s chunk, reached half-way each time
+        for _ in range(20):
+            sizer.observe(sizer(), sizer() / 100_000, 8 * sizer())
+
+        assert 190_000 < sizer() <= 200_000
+
+    def test_chunks_in_flight_fit_in_the_memory_headroom(self, batch_template, monkeypatch):
+        monkeypatch.setattr(batch_template, "memory_headroom", lambda: 100 * 1024 * 1024)
+        sizer = batch_template.ChunkSizer(in_flight=4)
+
+        for _ in range(20):
+            sizer.observe(sizer(), sizer() / 1_000_000, 100 * sizer())
+
+        # Half of 100 MiB for 4 chunks of 100 bytes per row, times CHUNK_MEMORY_FACTOR
+        assert sizer() <= 50 * 1024 * 1024 // (4 * 100 * batch_template.CHUNK_MEMORY_FACTOR)
+
+    def test_chunk_rows_can_change_while_reading(self, batch_template):
+        table = pa.table({"a": list(range(20))})
+
+        for input_format, content in (
+            ("csv", b"a\n" + b"".join(f"{i}\n".encode() for i in range(20))),
+            ("parquet", _parquet_bytes(table, row_group_size=3)),
+        ):
+            sizes = iter([2, 5, 1, 10, 10])
+            chunks = list(batch_template.read_chunks(io.BytesIO(content), input_format, lambda: next(sizes, 10)))
+
+            assert sum((list(chunk["a"]) for chunk in chunks), []) == list(range(20)), input_format
+            assert all(len(chunk) <= 10 for chunk in chunks), input_format
+
+
+def _ranged_s3(objects):
+    s3 = MagicMock()
+    s3.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+
+    def head_object(**kwargs):
+        if kwargs["Key"] not in objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(objects[kwargs["Key"]])}
+
+    def get_object(**kwargs):
+        if kwargs["Key"] not in objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        content = objects[kwargs["Key"]]
+        if "Range" not in kwargs:
+            return {"Body": io.BytesIO(content)}
+        start, end = (int(bound) for bound in kwargs["Range"].removeprefix("bytes=").split("-"))
+        return {"Body": io.BytesIO(content[start : end + 1])}
+
+    def delete_objects(**kwargs):
+        for item in kwargs["Delete"]["Objects"]:
+            objects.pop(item["Key"], None)
+
+    s3.head_object.side_effect = head_object
+    s3.get_object.side_effect = get_object
+    s3.delete_objects.side_effect = delete_objects
+
+    def put_object(**kwargs):
+        if kwargs.get("IfNoneMatch") == "*" and kwargs["Key"] in objects:
+            raise ClientError({"Error": {"Code": "PreconditionFailed"}}, "PutObject")
+        objects[kwargs["Key"]] = kwargs["Body"]
+
+    s3.put_object.side_effect = put_object
+    s3.get_paginator.return_value.paginate.side_effect = lambda **kwargs: [
+        {"Contents": [{"Key": key} for key in sorted(objects) if key.startswith(kwargs["Prefix"])]}
+    ]
+    return s3
+
+
+class TestShards:
+    def test_csv_shards_partition_the_lines(self, batch_template, monkeypatch):
+        monkeypatch.setattr(batch_template, "LINE_SEARCH_BYTES", 4)
+        content = b"a,b\n" + b"".join(f"{i},{i * 1000}\n".encode() for i in range(50))
+        s3 = _ranged_s3({"input.csv": content})
+
+        rows = []
+        for index in range(7):
+            source = batch_template.csv_shard_source(s3, "bucket", "input.csv", 7, index)
+            for chunk in batch_template.read_chunks(source, "csv", chunk_rows=8):
+                assert list(chunk.columns) == ["a", "b"]
+                rows.extend(chunk["a"])
+
+        assert rows == list(range(50))
+
+    def test_parquet_shards_are_ranges_of_row_groups(self, batch_template):
+        source = io.BytesIO(_parquet_bytes(pa.table({"a": list(range(100))}), row_group_size=10))
+
+        shards = [
+            [value for chunk in batch_template.read_chunks(source, "parquet", shard=(index, 3)) for value in chunk["a"]]
+            for index in range(3)
+        ]
+
+        assert [len(rows) for rows in shards] == [30, 30, 40]
+        assert sum(shards, []) == list(range(100))
+
+    def test_arrow_file_shards_are_ranges_of_record_batches(self, batch_template):
+        buffer = io.BytesIO()
+        table = pa.table({"a": list(range(4))})
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            for offset in range(4):
+                writer.write_table(table.slice(offset, 1))
+
+        shards = [
+            [value for chunk in batch_template.read_chunks(buffer, "arrow", shard=(index, 2)) for value in chunk["a"]]
+            for index in range(2)
+        ]
+
+        assert shards == [[0, 1], [2, 3]]
+
+    def test_csv_parts_are_assembled_in_order_under_one_header(self, batch_template):
+        objects = {"p/part-0.csv": b"2\n4\n", "p/part-1.csv": b"6\n", "p/part-2.csv": b"8\n10\n"}
+        s3 = _ranged_s3(objects)
+
+        batch_template.assemble_parts(s3, "bucket", "p/predictions-job.csv", sorted(objects))
+
+        assert objects["p/predictions-job.csv"] == b"prediction\n2\n4\n6\n8\n10\n"
+
+    def test_parquet_parts_are_assembled_in_order(self, batch_template):
+        objects = {
+            f"p/part-{index}.parquet": _parquet_bytes(
+                pa.table({"prediction": [float(value) for value in values]}), row_group_size=10
+            )
+            for index, values in enumerate([[1, 2], [], [3]])
+        }
+        s3 = _ranged_s3(objects)
+
+        batch_template.assemble_parts(s3, "bucket", "p/predictions-job.parquet", sorted(objects))
+
+        merged = pq.read_table(io.BytesIO(objects["p/predictions-job.parquet"]))
+        assert merged.column("prediction").to_pylist() == [1.0, 2.0, 3.0]
+
+    def test_checkpoints_are_next_to_the_output(self, batch_template):
+        output_path = "p/m/1/job/predictions-job.parquet"
+
+        assert batch_template.part_key(output_path, 3, 7) == "p/m/1/job/checkpoints/part-00003-000007.parquet"
+        assert batch_template.manifest_key(output_path, 3) == "p/m/1/job/checkpoints/manifest-00003.json"
+
+
+class TestCheckpoint:
+    output_path = "p/m/1/job/predictions-job.csv"
+
+    def _predict(self, batch_template, model, s3, content, shard=(0, 1)):
+        checkpoint = batch_template.Checkpoint(s3, "bucket", self.output_path, shard)
+        with batch_template.CheckpointWriter(s3, "bucket", checkpoint, "csv", checkpoint_seconds=0) as writer:
+            batch_template.predict_file(
+                model, io.BytesIO(content), None, chunk_rows=2, writer=writer, skip_rows=checkpoint.rows
+            )
+        return checkpoint
+
+    def test_restart_resumes_after_the_committed_parts(self, batch_template, doubling_model):
+        objects = {}
+        s3 = _ranged_s3(objects)
+        content = b"a\n" + b"".join(f"{i}\n".encode() for i in range(1, 8))
+        failing_model = MagicMock()
+        failing_model.predict.side_effect = [np.asarray([2, 4]), np.asarray([6, 8]), RuntimeError("OOM killed")]
+
+        with pytest.raises(RuntimeError):
+            self._predict(batch_template, failing_model, s3, content)
+
+        manifest = batch_template.read_manifest(s3, "bucket", batch_template.manifest_key(self.output_path, 0))
+        assert (manifest["rows"], len(manifest["parts"]), manifest["complete"]) == (4, 2, False)
+        s3.abort_multipart_upload.assert_not_called()
+
+        checkpoint = self._predict(batch_template, doubling_model, s3, content)
+
+        predicted = [value for call in doubling_model.predict.call_args_list for value in call.args[0]["a"]]
+        assert predicted == [5, 6, 7]
+        assert (checkpoint.rows, checkpoint.complete) == (7, True)
+        manifests = batch_template.shard_manifests(s3, "bucket", self.output_path)
+        part_keys = [part["key"] for part in manifests[0]["parts"]]
+        batch_template.assemble_parts(s3, "bucket", self.output_path, part_keys)
+        assert objects[self.output_path] == b"prediction\n" + b"".join(f"{2 * i}\n".encode() for i in range(1, 8))
+
+    def test_parts_are_deleted_once_assembled(self, batch_template, doubling_model):
+        objects = {}
+        s3 = _ranged_s3(objects)
+        self._predict(batch_template, doubling_model, s3, b"a\n1\n2\n3\n")
+        manifests = batch_template.shard_manifests(s3, "bucket", self.output_path)
+        batch_template.assemble_parts(s3, "bucket", self.output_path, [part["key"] for part in manifests[0]["parts"]])
+
+        assert batch_template.delete_parts(s3, "bucket", self.output_path) == 2
+
+        manifest_key = batch_template.manifest_key(self.output_path, 0)
+        assert sorted(objects) == sorted([manifest_key, self.output_path])
+        assert batch_template.read_manifest(s3, "bucket", manifest_key)["rows"] == 3
+        assert batch_template.object_exists(s3, "bucket", self.output_path)
+
+    def test_one_shard_assembles_the_output(self, batch_template):
+        s3 = _ranged_s3({})
+
+        claims = [batch_template.claim_assembly(s3, "bucket", self.output_path, index) for index in (2, 0, 1)]
+        # The pod of the shard holding the lock is restarted
+        reclaimed = batch_template.claim_assembly(s3, "bucket", self.output_path, 2)
+
+        assert claims == [True, False, False]
+        assert reclaimed
+
+    def test_manifests_of_every_shard_are_listed(self, batch_template, doubling_model):
+        objects = {}
+        s3 = _ranged_s3(objects)
+
+        self._predict(batch_template, doubling_model, s3, b"a\n1\n2\n3\n", shard=(1, 2))
+
+        manifests = batch_template.shard_manifests(s3, "bucket", self.output_path)
+        assert list(manifests) == [1]
+        assert manifests[1]["shards"] == 2
+        assert [part["rows"] for part in manifests[1]["parts"]] == [2, 1]
+
+    def test_rows_already_predicted_are_skipped_in_every_format(self, batch_template):
+        table = pa.table({"a": list(range(10))})
+
+        for input_format, content in (
+            ("csv", b"a\n" + b"".join(f"{i}\n".encode() for i in range(10))),
+            ("parquet", _parquet_bytes(table, row_group_size=3)),
+            ("arrow", _arrow_file_bytes(table)),
+        ):
+            chunks = list(batch_template.read_chunks(io.BytesIO(content), input_format, 4, skip_rows=7))
+
+            assert sum((list(chunk["a"]) for chunk in chunks), []) == [7, 8, 9], input_format
+
+    def test_parquet_manifest_knows_the_rows_of_its_shard(self, batch_template):
+        content = _parquet_bytes(pa.table({"a": list(range(100))}), row_group_size=10)
+
+        assert batch_template.input_row_count(io.BytesIO(content), "parquet", (1, 3)) == 30
+        assert batch_template.input_row_count(io.BytesIO(b"a\n1\n"), "csv") is None
+
+
+class TestS3RangeReader:
+    def test_parquet_is_read_with_range_requests(self, batch_template):
+        content = _parquet_bytes(pa.table({"a": list(range(100))}), row_group_size=10)
+        s3 = MagicMock()
+        s3.head_object.return_value = {"ContentLength": len(content)}
+
+        def get_object(**kwargs):
+            start, end = (int(bound) for bound in kwargs["Range"].removeprefix("bytes=").split("-"))
+            return {"Body": io.BytesIO(content[start : end + 1])}
+
+        s3.get_object.side_effect = get_object
+        reader = batch_template.S3RangeReader(s3, "bucket", "input.parquet")
+
+        chunks = list(batch_template.read_chunks(reader, "parquet", chunk_rows=10))
+
+        assert sum(len(chunk) for chunk in chunks) == 100
+        assert all(call.kwargs["Range"].startswith("bytes=") for call in s3.get_object.call_args_list)
+
+
+def test_file_format_follows_the_extension(batch_template):
+    assert batch_template.file_format("p/m/1/job/input.parquet") == "parquet"
+    assert batch_template.file_format("p/m/1/job/predictions-job.arrow") == "arrow"
+    assert batch_template.file_format("p/m/1/job/input.csv") == "csv"
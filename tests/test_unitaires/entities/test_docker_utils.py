@@ -1,9 +1,12 @@
+import json
 from unittest.mock import MagicMock, patch
 
 from backend.domain.entities.docker.utils import (
     build_docker_image_from_context_path,
     build_image_from_context,
+    build_model_docker_image,
     ensure_agent_base_image,
+    read_onnx_conversion_report,
 )
 
 
@@ -104,7 +107,9 @@ class TestBuildDockerImageFromContextPathAgentWiring:
             build_docker_image_from_context_path(str(tmp_path), "img", "proj", "agent", "1", is_agent=True)
 
         mock_ensure.assert_called_once()
-        mock_template_cls.assert_called_once_with(python_version="3.9", use_agent_base_image=True)
+        mock_template_cls.assert_called_once_with(
+            python_version="3.9", use_agent_base_image=True, onnx_conversion=False
+        )
 
     def test_agent_build_falls_back_when_base_image_unavailable(self, tmp_path):
         with (
@@ -115,7 +120,9 @@ class TestBuildDockerImageFromContextPathAgentWiring:
             mock_template_cls.return_value = MagicMock()
             build_docker_image_from_context_path(str(tmp_path), "img", "proj", "agent", "1", is_agent=True)
 
-        mock_template_cls.assert_called_once_with(python_version="3.9", use_agent_base_image=False)
+        mock_template_cls.assert_called_once_with(
+            python_version="3.9", use_agent_base_image=False, onnx_conversion=False
+        )
 
     def test_model_build_never_checks_base_image(self, tmp_path):
         with (
@@ -127,4 +134,54 @@ class TestBuildDockerImageFromContextPathAgentWiring:
             build_docker_image_from_context_path(str(tmp_path), "img", "proj", "model", "1", is_agent=False)
 
         mock_ensure.assert_not_called()
-        mock_template_cls.assert_called_once_with(python_version="3.9", use_agent_base_image=False)
+        mock_template_cls.assert_called_once_with(
+            python_version="3.9", use_agent_base_image=False, onnx_conversion=False
+        )
+
+
+class TestOnnxConversion:
+    def test_report_is_read_from_the_built_image(self):
+        report = {"serving_backend": "onnx", "reason": None, "parity": {"rows": 256, "passed": True}}
+        with patch("backend.domain.entities.docker.utils.subprocess.run") as mock_run:
+            mock_run.return_value = MagicMock(returncode=0, stdout=json.dumps(report))
+            assert read_onnx_conversion_report("img") == report
+
+        assert mock_run.call_args[0][0][-2:] == ["img", "/opt/mlflow/onnx/conversion.json"]
+
+    def test_missing_report_means_pyfunc(self):
+        with patch("backend.domain.entities.docker.utils.subprocess.run") as mock_run:
+            mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="No such file")
+            assert read_onnx_conversion_report("img")["serving_backend"] == "pyfunc"
+
+    def test_build_records_the_serving_backend_on_the_model_info(self):
+        report = {"serving_backend": "onnx", "reason": None, "parity": {"rows": 256, "passed": True}}
+        model_info_db_handler = MagicMock()
+        with (
+            patch("backend.domain.entities.docker.utils.prepare_docker_context", return_value="/tmp/ctx"),
+            patch(
+                "backend.domain.entities.docker.utils.build_docker_image_from_context_path", return_value=1
+            ) as mock_build,
+            patch("backend.domain.entities.docker.utils.read_onnx_conversion_report", return_value=report),
+        ):
+            build_model_docker_image(
+                MagicMock(), "proj", "model", "2", onnx_conversion=True, model_info_db_handler=model_info_db_handler
+            )
+
+        assert mock_build.call_args.kwargs["onnx_conversion"] is True
+        model_info_db_handler.update_serving_backend.assert_called_once_with(
+            "model", "2", "proj", "onnx", json.dumps(report)
+        )
+
+    def test_failed_build_records_nothing(self):
+        model_info_db_handler = MagicMock()
+        with (
+            patch("backend.domain.entities.docker.utils.prepare_docker_context", return_value="/tmp/ctx"),
+            patch("backend.domain.entities.docker.utils.build_docker_image_from_context_path", return_value=0),
+            patch("backend.domain.entities.docker.utils.read_onnx_conversion_report") as mock_read,
+        ):
+            build_model_docker_image(
+                MagicMock(), "proj", "model", "2", onnx_conversion=True, model_info_db_handler=model_info_db_handler
+            )
+
+        mock_read.assert_not_called()
+        model_info_db_handler.update_serving_backend.assert_not_called()
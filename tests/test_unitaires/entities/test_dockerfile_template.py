@@ -29,3 +29,104 @@ class TestDockerfileTemplate:
 
         content = (tmp_path / "Dockerfile").read_text()
         assert "uv venv --clear" in content
+
+    def test_micro_batching_is_opt_in_with_tunable_defaults(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert 'ENV MICRO_BATCHING_ENABLED="false"' in content
+        assert "ENV MICRO_BATCH_MAX_SIZE=32" in content
+        assert "ENV MICRO_BATCH_MAX_WAIT_MS=5" in content
+
+    def test_inference_runs_on_a_bounded_thread_pool_by_default(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert 'ENV INFERENCE_EXECUTOR="thread"' in content
+        assert "ENV INFERENCE_EXECUTOR_WORKERS=4" in content
+
+    def test_numpy_fast_path_is_on_by_default(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert 'ENV NUMPY_FAST_PATH_ENABLED="true"' in content
+
+    def test_installs_binary_payload_codecs(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        for package in ("orjson", "msgpack", "pyarrow"):
+            assert package in content
+
+    def test_prediction_cache_is_disabled_by_default(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert 'ENV PREDICTION_CACHE_ENABLED="false"' in content
+
+    def test_warm_up_runs_a_few_synthetic_predictions_by_default(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "ENV WARMUP_REQUESTS=5" in content
+
+    def test_admission_control_is_disabled_by_default(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "ENV MAX_CONCURRENT_REQUESTS=0" in content
+        assert "ENV MAX_QUEUED_REQUESTS=100" in content
+
+    def test_agent_queues_are_bounded(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "ENV AGENT_METRICS_QUEUE_SIZE=1000" in content
+        assert "ENV AGENT_STREAM_BUFFER_EVENTS=64" in content
+
+    def test_single_process_by_default_with_gunicorn_available(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "ENV SERVING_WORKERS=1" in content
+        assert "COPY gunicorn_conf_template.py /opt/mlflow" in content
+        assert "gunicorn -c gunicorn_conf_template.py $SERVING_APP:app" in content
+        assert "-k gevent" not in content
+
+    def test_serves_image_model_by_default_with_multi_model_app_available(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "ENV SERVING_APP=fast_api_template" in content
+        assert "COPY multi_model_template.py /opt/mlflow" in content
+        assert "uvicorn $SERVING_APP:app" in content
+
+    def test_streaming_predictions_are_chunked(self, tmp_path):
+        template = DockerfileTemplate(python_version="3.9")
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "ENV STREAM_CHUNK_ROWS=1000" in content
+
+    def test_onnx_conversion_only_runs_when_requested(self, tmp_path):
+        DockerfileTemplate(python_version="3.9").generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "COPY onnx_conversion_template.py /opt/mlflow" in content
+        assert "RUN uv run python onnx_conversion_template.py" not in content
+
+        template = DockerfileTemplate(python_version="3.9", onnx_conversion=True)
+        template.generate_dockerfile(str(tmp_path), "my-image", "proj", "model", "1")
+        content = (tmp_path / "Dockerfile").read_text()
+        assert "uv pip install -c /tmp/model_packages.txt onnxruntime skl2onnx onnxmltools" in content
+        assert "uv run python onnx_conversion_template.py /opt/mlflow || true" in content
+        assert 'ENV ONNX_RUNTIME_ENABLED="true"' in content
@@ -0,0 +1,678 @@
+import asyncio
+import importlib
+import io
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import mlflow
+import mlflow.sklearn
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from mlflow.models import infer_signature
+from prometheus_client.parser import text_string_to_metric_families
+from sklearn.linear_model import LinearRegression
+
+DOCKER_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "../../../backend/domain/entities/docker")
+SERVING_MODULE = "backend.domain.entities.docker.fast_api_template"
+
+
+class DoublingModel(mlflow.pyfunc.PythonModel):
+    def predict(self, context, model_input, params=None):
+        return model_input["x"].to_numpy() * 2
+
+
+class TriplingModel(mlflow.pyfunc.PythonModel):
+    def predict(self, context, model_input, params=None):
+        return model_input["x"].to_numpy() * 3
+
+
+def _save_model(path, python_model):
+    signature = infer_signature(pd.DataFrame({"x": [1.0]}), [2.0])
+    mlflow.pyfunc.save_model(path, python_model=python_model, signature=signature, pip_requirements=["mlflow"])
+    return path
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    return _save_model(str(tmp_path_factory.mktemp("model") / "doubling"), DoublingModel())
+
+
+@pytest.fixture(scope="module")
+def next_version_dir(tmp_path_factory):
+    """Another version of the model, with the same dependencies and signature."""
+    return _save_model(str(tmp_path_factory.mktemp("model") / "tripling"), TriplingModel())
+
+
+@pytest.fixture(scope="module")
+def sklearn_model_dir(tmp_path_factory):
+    """A linear regression of 10 * a + b."""
+    features = pd.DataFrame({"a": [0.0, 0.0, 1.0, 1.0], "b": [0.0, 1.0, 0.0, 2.0]})
+    regression = LinearRegression().fit(features, 10 * features["a"] + features["b"])
+    signature = infer_signature(features, regression.predict(features))
+    path = str(tmp_path_factory.mktemp("model") / "sklearn")
+    mlflow.sklearn.save_model(regression, path, signature=signature, pip_requirements=["mlflow", "scikit-learn"])
+    return path
+
+
+@pytest.fixture
+def load_serving_app(monkeypatch, model_dir):
+    """Imports the serving app of the image with the given environment, serving the doubling model unless an
+    image_model_dir is given."""
+
+    def load(image_model_dir=None, **env):
+        image_model_dir = image_model_dir or model_dir
+        # The template imports native_threads_template as it is laid out in the image, next to it
+        monkeypatch.syspath_prepend(os.path.abspath(DOCKER_TEMPLATES_DIR))
+        monkeypatch.setenv("IMAGE_NAME", "doubling-image")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        # The model folder of the image, /opt/mlflow/, is image_model_dir
+        load_model = mlflow.pyfunc.load_model
+        monkeypatch.setattr(
+            mlflow.pyfunc,
+            "load_model",
+            lambda uri, *args, **kwargs: load_model(image_model_dir if uri == "/opt/mlflow/" else uri, *args, **kwargs),
+        )
+        dependencies = importlib.import_module("model_dependencies_template")
+        hash_model_dependencies = dependencies.hash_model_dependencies
+        monkeypatch.setattr(
+            dependencies,
+            "hash_model_dependencies",
+            lambda path: hash_model_dependencies(image_model_dir if path == "/opt/mlflow/" else path),
+        )
+        sys.modules.pop(SERVING_MODULE, None)
+        return importlib.import_module(SERVING_MODULE)
+
+    yield load
+    sys.modules.pop(SERVING_MODULE, None)
+
+
+def _client(serving):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=serving.app), base_url="http://model")
+
+
+def _request(serving, method, path, **kwargs):
+    async def run():
+        async with _client(serving) as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(run())
+
+
+def _metric_samples(serving, name, **labels):
+    """Samples of the metric family `name` in /metrics, whose labels include `labels`."""
+    families = text_string_to_metric_families(_request(serving, "GET", "/metrics").text)
+    return [
+        sample
+        for family in families
+        if family.name == name
+        for sample in family.samples
+        if labels.items() <= sample.labels.items()
+    ]
+
+
+def _wait_until_ready(client, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while client.get("/ready").status_code != 200:
+        assert time.monotonic() < deadline, "the serving app never got ready"
+        time.sleep(0.05)
+
+
+def _block_predictions(serving, monkeypatch):
+    """Makes model.predict wait for `release`; `started` is set once a prediction is waiting."""
+    started, release = threading.Event(), threading.Event()
+    doubling = serving.model
+
+    def blocking_predict(model_input):
+        started.set()
+        release.wait(5)
+        return doubling.predict(model_input)
+
+    monkeypatch.setattr(serving, "model", SimpleNamespace(predict=blocking_predict))
+    return started, release
+
+
+def _record_batch_sizes(serving, monkeypatch):
+    batch_sizes = []
+    predict = serving.inference_executor.predict
+
+    async def recording_predict(model_input):
+        batch_sizes.append(serving._input_rows(model_input))
+        return await predict(model_input)
+
+    monkeypatch.setattr(serving.inference_executor, "predict", recording_predict)
+    return batch_sizes
+
+
+class TestInferencePool:
+    def test_health_answers_while_a_prediction_runs(self, load_serving_app, monkeypatch):
+        serving = load_serving_app()
+        started, release = _block_predictions(serving, monkeypatch)
+
+        async def run():
+            async with _client(serving) as client:
+                prediction = asyncio.create_task(client.post("/predict", json={"inputs": {"x": 1.0}}))
+                await asyncio.to_thread(started.wait, 5)
+                health = await client.get("/health")
+                predicting = not prediction.done()
+                release.set()
+                return health, predicting, await prediction
+
+        health, predicting, prediction = asyncio.run(run())
+
+        assert health.json() == {"status": "healthy"}
+        assert predicting
+        assert prediction.json() == {"outputs": [2.0]}
+
+
+class TestBatchPredictions:
+    @pytest.mark.parametrize(
+        "inputs", [{"x": [3.0, 1.0, 2.0]}, [{"x": 3.0}, {"x": 1.0}, {"x": 2.0}]], ids=["columns", "records"]
+    )
+    def test_predictions_follow_input_order(self, load_serving_app, monkeypatch, inputs):
+        serving = load_serving_app()
+        batch_sizes = _record_batch_sizes(serving, monkeypatch)
+
+        response = _request(serving, "POST", "/predict_batch", json={"inputs": inputs})
+
+        assert response.json() == {"outputs": [6.0, 2.0, 4.0]}
+        assert batch_sizes == [3]
+
+
+class TestSignatureDecoder:
+    @pytest.mark.parametrize(
+        "inputs, detail",
+        [
+            ({"x": "two"}, "Invalid value for column 'x' (float64)"),
+            ({"x": [1.0]}, "Invalid value for column 'x' (float64)"),
+            ({"y": 1.0}, "Missing input columns: ['x']"),
+        ],
+    )
+    def test_invalid_inputs_are_rejected(self, load_serving_app, inputs, detail):
+        serving = load_serving_app()
+
+        response = _request(serving, "POST", "/predict", json={"inputs": inputs})
+
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith(detail)
+
+    @pytest.mark.parametrize(
+        "content_type, body",
+        [("application/json", b'{"inputs": {"x": 1.0'), ("application/msgpack", b"\xc1")],
+        ids=["json", "msgpack"],
+    )
+    @pytest.mark.parametrize("path", ["/predict", "/predict_batch"])
+    def test_malformed_bodies_are_rejected(self, load_serving_app, path, content_type, body):
+        if content_type == "application/msgpack":
+            pytest.importorskip("msgpack")
+        serving = load_serving_app()
+
+        response = _request(serving, "POST", path, content=body, headers={"Content-Type": content_type})
+
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith("Malformed")
+
+    def test_numeric_strings_are_still_accepted(self, load_serving_app):
+        serving = load_serving_app()
+
+        response = _request(serving, "POST", "/predict", json={"inputs": {"x": "2.5"}})
+
+        assert response.json() == {"outputs": [5.0]}
+
+
+class TestPayloadFormats:
+    def test_msgpack_in_and_out(self, load_serving_app):
+        # Optional codecs of the image, like in the template
+        msgpack = pytest.importorskip("msgpack")
+        serving = load_serving_app()
+
+        response = _request(
+            serving,
+            "POST",
+            "/predict",
+            content=msgpack.packb({"inputs": {"x": 1.5}}),
+            headers={"Content-Type": "application/msgpack", "Accept": "application/msgpack"},
+        )
+
+        assert response.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content) == {"outputs": [3.0]}
+
+    def test_arrow_in_and_out(self, load_serving_app):
+        pa = pytest.importorskip("pyarrow")
+        serving = load_serving_app()
+        sink = pa.BufferOutputStream()
+        table = pa.table({"x": [1.0, 2.0, 3.0]})
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        response = _request(
+            serving,
+            "POST",
+            "/predict_batch",
+            content=sink.getvalue().to_pybytes(),
+            headers={"Content-Type": serving.ARROW_STREAM_MEDIA_TYPE, "Accept": serving.ARROW_STREAM_MEDIA_TYPE},
+        )
+
+        predictions = pa.ipc.open_stream(pa.py_buffer(response.content)).read_all()
+        assert predictions.to_pydict() == {"prediction": [2.0, 4.0, 6.0]}
+
+    def test_json_stays_the_default(self, load_serving_app):
+        serving = load_serving_app()
+
+        response = _request(serving, "POST", "/predict", json={"inputs": {"x": 1.5}})
+
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {"outputs": [3.0]}
+
+
+class TestPredictionCache:
+    def test_repeated_records_are_predicted_once(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(PREDICTION_CACHE_ENABLED="true")
+        batch_sizes = _record_batch_sizes(serving, monkeypatch)
+
+        async def run():
+            async with _client(serving) as client:
+                coalesced = await asyncio.gather(
+                    *(client.post("/predict", json={"inputs": {"x": 1.0}}) for _ in range(3))
+                )
+                hit = await client.post("/predict", json={"inputs": {"x": 1.0}})
+                miss = await client.post("/predict", json={"inputs": {"x": 2.0}})
+                return [*coalesced, hit, miss]
+
+        responses = asyncio.run(run())
+
+        assert [response.json()["outputs"] for response in responses] == [[2.0], [2.0], [2.0], [2.0], [4.0]]
+        assert batch_sizes == [1, 1]
+        assert serving.prediction_cache.size() == 2
+
+    def test_expired_predictions_are_predicted_again(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(PREDICTION_CACHE_ENABLED="true", PREDICTION_CACHE_TTL_SECONDS="0")
+        batch_sizes = _record_batch_sizes(serving, monkeypatch)
+
+        for _ in range(2):
+            assert _request(serving, "POST", "/predict", json={"inputs": {"x": 1.0}}).json() == {"outputs": [2.0]}
+
+        assert batch_sizes == [1, 1]
+
+
+class TestStageMetrics:
+    def test_each_stage_of_a_prediction_is_timed(self, load_serving_app):
+        # A label of its own: the OTel meter provider, and so the metrics, outlive the reloaded app
+        serving = load_serving_app(OTEL_METRICS_EXPORTER_LABELS="model_version=stages")
+
+        _request(serving, "POST", "/predict", json={"inputs": {"x": 1.0}})
+        _request(serving, "POST", "/predict_batch", json={"inputs": {"x": [1.0, 2.0, 3.0]}})
+
+        stage_counts = {
+            (sample.labels["endpoint"], sample.labels["stage"]): sample.value
+            for sample in _metric_samples(serving, "inference_stage_duration_seconds", model_version="stages")
+            if sample.name.endswith("_count")
+        }
+        assert stage_counts == {
+            (endpoint, stage): 1.0
+            for endpoint in ("/predict", "/predict_batch")
+            for stage in ("parse", "decode", "dataframe", "predict", "serialize")
+        }
+        row_counts = _metric_samples(serving, "inference_row_count", model_version="stages", endpoint="/predict_batch")
+        assert [sample.value for sample in row_counts if sample.name.endswith("_sum")] == [3.0]
+
+
+class TestReadiness:
+    def test_ready_once_warmed_up(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(WARMUP_REQUESTS="3")
+        batch_sizes = _record_batch_sizes(serving, monkeypatch)
+
+        # The lifespan, which warms the model up, has not run yet
+        not_ready = _request(serving, "GET", "/ready")
+        with TestClient(serving.app) as client:
+            _wait_until_ready(client)
+            health = client.get("/health")
+
+        assert not_ready.status_code == 503
+        assert not_ready.json()["detail"] == "Model warming up"
+        assert health.json() == {"status": "healthy"}
+        assert batch_sizes == [1, 1, 1]
+
+    def test_failed_warm_up_does_not_block_readiness(self, load_serving_app, monkeypatch):
+        serving = load_serving_app()
+
+        async def failing_predict(model_input):
+            raise ValueError("zeros are not supported")
+
+        monkeypatch.setattr(serving.inference_executor, "predict", failing_predict)
+
+        with TestClient(serving.app) as client:
+            _wait_until_ready(client)
+
+        assert serving.warmup_done
+
+
+class TestAdmissionControl:
+    def _saturate(self, serving, monkeypatch):
+        """Answers of /predict, then /health, sent while a first prediction holds the only slot."""
+        started, release = _block_predictions(serving, monkeypatch)
+
+        async def run():
+            async with _client(serving) as client:
+                admitted = asyncio.create_task(client.post("/predict", json={"inputs": {"x": 1.0}}))
+                await asyncio.to_thread(started.wait, 5)
+                shed = await client.post("/predict", json={"inputs": {"x": 2.0}})
+                health = await client.get("/health")
+                release.set()
+                return await admitted, shed, health
+
+        return asyncio.run(run())
+
+    def test_requests_beyond_the_queue_are_shed(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(MAX_CONCURRENT_REQUESTS="1", MAX_QUEUED_REQUESTS="0", RETRY_AFTER_SECONDS="3")
+
+        admitted, shed, health = self._saturate(serving, monkeypatch)
+
+        assert admitted.json() == {"outputs": [2.0]}
+        assert shed.status_code == 429
+        assert shed.headers["Retry-After"] == "3"
+        assert health.status_code == 200
+
+    def test_requests_queued_for_too_long_are_shed(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(
+            MAX_CONCURRENT_REQUESTS="1", MAX_QUEUED_REQUESTS="1", ADMISSION_QUEUE_TIMEOUT_SECONDS="0.05"
+        )
+
+        admitted, shed, _ = self._saturate(serving, monkeypatch)
+
+        assert admitted.json() == {"outputs": [2.0]}
+        assert shed.status_code == 503
+        assert shed.headers["Retry-After"] == "1"
+
+
+class TestAgentMetrics:
+    def test_agent_answers_before_its_trace_is_read(self, load_serving_app, monkeypatch):
+        serving = load_serving_app()
+        monkeypatch.setattr(serving, "model", SimpleNamespace(predict=lambda body: {"output": body["input"]}))
+        monkeypatch.setattr(mlflow, "get_last_active_trace_id", lambda thread_local=False: "trace-1")
+        release, recorded = threading.Event(), []
+
+        def slow_record(trace_id):
+            release.wait(5)
+            recorded.append(trace_id)
+
+        monkeypatch.setattr(serving, "_record_agent_metrics_from_trace", slow_record)
+
+        async def run():
+            async with _client(serving) as client:
+                response = await client.post("/agent_predict", json={"input": "hello"})
+            recorded_before_response = list(recorded)
+            release.set()
+            deadline = time.monotonic() + 5
+            while not recorded and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            return response, recorded_before_response
+
+        response, recorded_before_response = asyncio.run(run())
+
+        assert response.json() == {"output": "hello"}
+        assert recorded_before_response == []
+        assert recorded == ["trace-1"]
+
+
+class TestAgentStreaming:
+    def _stream(self, serving, monkeypatch, events):
+        def predict_stream(body):
+            for event in events:
+                if isinstance(event, Exception):
+                    raise event
+                yield event
+
+        monkeypatch.setattr(serving, "model", SimpleNamespace(predict_stream=predict_stream))
+        monkeypatch.setattr(serving, "_record_agent_metrics_from_trace", lambda trace_id: None)
+        return _request(serving, "POST", "/agent_predict_stream", json={"input": [{"role": "user", "content": "hi"}]})
+
+    def test_events_are_sent_as_server_sent_events(self, load_serving_app, monkeypatch):
+        serving = load_serving_app()
+        deltas = [{"type": "response.output_text.delta", "delta": delta} for delta in ("Hel", "lo")]
+
+        response = self._stream(serving, monkeypatch, deltas)
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == (
+            "".join(f"event: response.output_text.delta\ndata: {json.dumps(delta)}\n\n" for delta in deltas)
+            + "event: done\ndata: [DONE]\n\n"
+        )
+
+    def test_agent_failure_ends_the_stream_with_an_error_event(self, load_serving_app, monkeypatch):
+        serving = load_serving_app()
+        delta = {"type": "response.output_text.delta", "delta": "Hel"}
+
+        response = self._stream(serving, monkeypatch, [delta, RuntimeError("LLM unavailable")])
+
+        assert response.status_code == 200
+        assert response.text == (
+            f"event: response.output_text.delta\ndata: {json.dumps(delta)}\n\n"
+            'event: error\ndata: {"detail": "LLM unavailable"}\n\n'
+        )
+
+
+class TestWorkerMetrics:
+    def test_metrics_of_all_workers_are_merged(self, load_serving_app, tmp_path):
+        for pid, (requests, utilization) in {"101": (2, 0.5), "102": (3, 1.0)}.items():
+            (tmp_path / f"{pid}.prom").write_text(
+                "# TYPE worker_test_requests_total counter\n"
+                f'worker_test_requests_total{{model_version="workers"}} {requests}\n'
+                "# TYPE inference_executor_utilization gauge\n"
+                f'inference_executor_utilization{{model_version="workers"}} {utilization}\n'
+            )
+        serving = load_serving_app(METRICS_MULTIPROC_DIR=str(tmp_path))
+
+        requests = _metric_samples(serving, "worker_test_requests", model_version="workers")
+        utilization = _metric_samples(serving, "inference_executor_utilization", model_version="workers")
+
+        assert [sample.value for sample in requests] == [5.0]
+        assert [sample.value for sample in utilization] == [0.75]
+        # This worker's own snapshot, written for the scrape
+        assert (tmp_path / f"{os.getpid()}.prom").exists()
+
+
+class TestNumpyFastPath:
+    def test_sklearn_model_predicts_on_decoded_columns(self, load_serving_app, sklearn_model_dir, monkeypatch):
+        serving = load_serving_app(sklearn_model_dir)
+        model_inputs = []
+        predict = serving.inference_executor.predict
+
+        async def recording_predict(model_input):
+            model_inputs.append(model_input)
+            return await predict(model_input)
+
+        monkeypatch.setattr(serving.inference_executor, "predict", recording_predict)
+
+        record = _request(serving, "POST", "/predict", json={"inputs": {"a": 1.0, "b": 2.0}})
+        batch = _request(serving, "POST", "/predict_batch", json={"inputs": {"a": [1.0, 2.0], "b": [2.0, 0.0]}})
+
+        assert serving.numpy_predictor.columns == ["a", "b"]
+        assert all(isinstance(model_input, dict) for model_input in model_inputs)
+        assert record.json()["outputs"] == pytest.approx([12.0])
+        assert batch.json()["outputs"] == pytest.approx([12.0, 20.0])
+
+    def test_fast_path_can_be_turned_off(self, load_serving_app, sklearn_model_dir):
+        serving = load_serving_app(sklearn_model_dir, NUMPY_FAST_PATH_ENABLED="false")
+
+        response = _request(serving, "POST", "/predict", json={"inputs": {"a": 1.0, "b": 2.0}})
+
+        assert serving.numpy_predictor is None
+        assert response.json()["outputs"] == pytest.approx([12.0])
+
+
+class TestStreamingPredictions:
+    def test_ndjson_records_are_predicted_in_chunks(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(STREAM_CHUNK_ROWS="2")
+        batch_sizes = _record_batch_sizes(serving, monkeypatch)
+        body = "".join(json.dumps({"x": float(x)}) + "\n" for x in range(5))
+
+        response = _request(
+            serving, "POST", "/predict_stream", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.text.splitlines()] == [0.0, 2.0, 4.0, 6.0, 8.0]
+        assert batch_sizes == [2, 2, 1]
+
+    def test_csv_records_are_predicted(self, load_serving_app):
+        serving = load_serving_app()
+
+        response = _request(
+            serving, "POST", "/predict_stream", content="x\n1.0\n2.5\n", headers={"Content-Type": "text/csv"}
+        )
+
+        assert [json.loads(line) for line in response.text.splitlines()] == [2.0, 5.0]
+
+    def test_invalid_line_ends_the_stream_with_an_error(self, load_serving_app):
+        serving = load_serving_app(STREAM_CHUNK_ROWS="2")
+        body = '{"x": 1.0}\n{"x": 2.0}\nnot json\n{"x": 3.0}\n'
+
+        response = _request(
+            serving, "POST", "/predict_stream", content=body, headers={"Content-Type": "application/x-ndjson"}
+        )
+
+        *predictions, error = [json.loads(line) for line in response.text.splitlines()]
+        assert predictions == [2.0, 4.0]
+        assert error["row"] == 2
+        assert error["error"].startswith("Line 3: invalid JSON")
+
+    def test_other_media_types_are_refused(self, load_serving_app):
+        serving = load_serving_app()
+
+        response = _request(serving, "POST", "/predict_stream", json=[{"x": 1.0}])
+
+        assert response.status_code == 415
+
+
+class TestMicroBatching:
+    def test_concurrent_records_are_predicted_together(self, load_serving_app, monkeypatch):
+        serving = load_serving_app(
+            MICRO_BATCHING_ENABLED="true", MICRO_BATCH_MAX_SIZE="4", MICRO_BATCH_MAX_WAIT_MS="200"
+        )
+        batch_sizes = _record_batch_sizes(serving, monkeypatch)
+
+        async def run():
+            async with _client(serving) as client:
+                return await asyncio.gather(
+                    *(client.post("/predict", json={"inputs": {"x": float(x)}}) for x in range(8))
+                )
+
+        responses = asyncio.run(run())
+
+        assert [response.json() for response in responses] == [{"outputs": [2.0 * x]} for x in range(8)]
+        assert batch_sizes == [4, 4]
+
+    def test_batches_are_flushed_concurrently_up_to_the_limit(self, load_serving_app, monkeypatch):
+        serving = load_serving_app()
+        batcher = serving.MicroBatcher(max_batch_size=1, max_wait_ms=0, max_concurrent_flushes=2)
+        running, peak = set(), []
+
+        async def slow_predict(model_input):
+            running.add(id(model_input))
+            peak.append(len(running))
+            await asyncio.sleep(0.05)
+            running.discard(id(model_input))
+            return model_input["x"] * 2
+
+        monkeypatch.setattr(serving.inference_executor, "predict", slow_predict)
+
+        async def run():
+            return await asyncio.gather(
+                *(batcher.predict(serving._decode_record({"inputs": {"x": x}})) for x in (1, 2, 3))
+            )
+
+        predictions = asyncio.run(run())
+
+        assert [list(prediction) for prediction in predictions] == [[2.0], [4.0], [6.0]]
+        assert max(peak) == 2
+
+
+class TestModelHotSwap:
+    def test_pod_started_after_a_swap_serves_the_swapped_version(self, load_serving_app, next_version_dir, tmp_path):
+        serving = load_serving_app(
+            OTEL_METRICS_EXPORTER_LABELS="model_version=1",
+            SERVED_MODEL_VERSION="2",
+            SERVED_MODEL_URI=next_version_dir,
+            MODEL_VERSIONS_DIR=str(tmp_path / "versions"),
+        )
+
+        with TestClient(serving.app) as client:
+            _wait_until_ready(client)
+            response = client.post("/predict", json={"inputs": {"x": 2.0}})
+
+        assert response.json() == {"outputs": [6.0]}
+        assert serving.active_model_version == "2"
+
+    def test_image_version_is_served_when_the_swapped_one_cannot_be_restored(self, load_serving_app, tmp_path):
+        serving = load_serving_app(
+            OTEL_METRICS_EXPORTER_LABELS="model_version=1",
+            SERVED_MODEL_VERSION="2",
+            SERVED_MODEL_URI=str(tmp_path / "missing"),
+            MODEL_VERSIONS_DIR=str(tmp_path / "versions"),
+        )
+
+        with TestClient(serving.app) as client:
+            _wait_until_ready(client)
+            response = client.post("/predict", json={"inputs": {"x": 2.0}})
+
+        assert response.json() == {"outputs": [4.0]}
+        assert serving.active_model_version == "1"
+        assert os.listdir(tmp_path / "versions") == []
+
+    def test_staged_version_is_served_once_activated(self, load_serving_app, next_version_dir, tmp_path):
+        serving = load_serving_app(
+            OTEL_METRICS_EXPORTER_LABELS="model_version=1",
+            MODEL_ADMIN_TOKEN="token",
+            MODEL_VERSIONS_DIR=str(tmp_path / "versions"),
+        )
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+            tar.add(next_version_dir, arcname=".")
+        admin = {"Authorization": "Bearer token"}
+
+        with TestClient(serving.app) as client:
+            _wait_until_ready(client)
+            staged = client.put(
+                "/admin/model", params={"version": "2", "activate": "false"}, content=archive.getvalue(), headers=admin
+            )
+            before_activation = client.post("/predict", json={"inputs": {"x": 2.0}})
+            not_staged = client.post("/admin/model/activate", params={"version": "3"}, headers=admin)
+            activated = client.post("/admin/model/activate", params={"version": "2"}, headers=admin)
+            after_activation = client.post("/predict", json={"inputs": {"x": 2.0}})
+
+        assert staged.status_code == 200 and staged.json()["staged_version"] == "2"
+        assert before_activation.json() == {"outputs": [4.0]}
+        assert not_staged.status_code == 409
+        assert activated.status_code == 200
+        assert after_activation.json() == {"outputs": [6.0]}
+        assert serving.active_model_version == "2"
+
+
+class TestTrafficSplit:
+    def test_pod_started_during_a_split_splits_its_traffic(self, load_serving_app):
+        split = {
+            "mode": "shadow",
+            "candidate_url": "http://model-2.project.svc.cluster.local:8000",
+            "candidate_version": "2",
+            "weight": 0.0,
+        }
+        serving = load_serving_app(MODEL_ADMIN_TOKEN="token", TRAFFIC_SPLIT=json.dumps(split))
+
+        async def run():
+            async with _client(serving) as client:
+                return await client.get("/admin/traffic", headers={"Authorization": "Bearer token"})
+
+        assert asyncio.run(run()).json() == split
+
+    def test_invalid_split_is_ignored(self, load_serving_app):
+        serving = load_serving_app(TRAFFIC_SPLIT=json.dumps({"mode": "canary", "candidate_url": "model-2"}))
+
+        assert serving.traffic_split is None
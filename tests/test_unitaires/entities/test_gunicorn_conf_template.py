@@ -0,0 +1,49 @@
+import importlib
+import os
+
+import pytest
+
+DOCKER_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "../../../backend/domain/entities/docker")
+
+
+@pytest.fixture
+def gunicorn_conf(monkeypatch, tmp_path):
+    monkeypatch.setenv("METRICS_MULTIPROC_DIR", str(tmp_path / "metrics"))
+    # The conf imports native_threads_template as it is laid out in the image, next to it
+    monkeypatch.syspath_prepend(os.path.abspath(DOCKER_TEMPLATES_DIR))
+    native_threads = importlib.import_module("native_threads_template")
+    monkeypatch.setattr(native_threads, "CGROUP_V2_CPU_MAX", str(tmp_path / "cpu.max"))
+    monkeypatch.setattr(native_threads, "CGROUP_V1_CPU_QUOTA", str(tmp_path / "cpu.cfs_quota_us"))
+    monkeypatch.setattr(native_threads, "CGROUP_V1_CPU_PERIOD", str(tmp_path / "cpu.cfs_period_us"))
+    return importlib.import_module("backend.domain.entities.docker.gunicorn_conf_template")
+
+
+class TestGunicornConf:
+    def test_reads_cgroup_v2_cpu_limit(self, gunicorn_conf, tmp_path):
+        (tmp_path / "cpu.max").write_text("250000 100000\n")
+
+        assert gunicorn_conf.cgroup_cpu_limit() == 2.5
+
+    def test_no_cpu_limit_when_cgroup_v2_is_unbounded(self, gunicorn_conf, tmp_path):
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+
+        assert gunicorn_conf.cgroup_cpu_limit() is None
+
+    def test_reads_cgroup_v1_cpu_limit(self, gunicorn_conf, tmp_path):
+        (tmp_path / "cpu.cfs_quota_us").write_text("400000\n")
+        (tmp_path / "cpu.cfs_period_us").write_text("100000\n")
+
+        assert gunicorn_conf.cgroup_cpu_limit() == 4
+
+    def test_auto_workers_follow_cpu_limit_rounded_down(self, gunicorn_conf, tmp_path):
+        (tmp_path / "cpu.max").write_text("250000 100000\n")
+
+        assert gunicorn_conf.worker_count("auto") == 2
+
+    def test_at_least_one_worker_below_one_cpu(self, gunicorn_conf, tmp_path):
+        (tmp_path / "cpu.max").write_text("50000 100000\n")
+
+        assert gunicorn_conf.worker_count("auto") == 1
+
+    def test_explicit_worker_count(self, gunicorn_conf):
+        assert gunicorn_conf.worker_count("3") == 3
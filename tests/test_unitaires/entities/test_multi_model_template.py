@@ -0,0 +1,113 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+DOCKER_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "../../../backend/domain/entities/docker")
+MULTI_MODEL_MODULE = "backend.domain.entities.docker.multi_model_template"
+
+
+@pytest.fixture
+def multi_model(monkeypatch, tmp_path):
+    # The template imports its helpers as they are laid out in the image, next to it
+    monkeypatch.syspath_prepend(os.path.abspath(DOCKER_TEMPLATES_DIR))
+    monkeypatch.setenv("IMAGE_NAME", "multi-model-image")
+    monkeypatch.setenv("MODEL_CACHE_DIR", str(tmp_path / "models"))
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", "http://127.0.0.1:9")
+    sys.modules.pop(MULTI_MODEL_MODULE, None)
+    yield importlib.import_module(MULTI_MODEL_MODULE)
+    sys.modules.pop(MULTI_MODEL_MODULE, None)
+
+
+def _request(module, method, path, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://model") as client:
+            # Not client.get, which the tests replace to fake the registry
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(run())
+
+
+def _get(module, path):
+    return _request(module, "GET", path)
+
+
+def test_refused_versions_are_capped(multi_model, monkeypatch):
+    monkeypatch.setattr(multi_model, "MAX_REFUSED_VERSIONS", 2)
+    loads = []
+
+    def refuse(name, version):
+        loads.append(version)
+        raise multi_model.ModelLoadError(409, "dependencies_changed", f"{name} {version}")
+
+    monkeypatch.setattr(multi_model, "_load_model", refuse)
+    store = multi_model.ModelStore(budget_bytes=1)
+
+    async def request(*versions):
+        for version in versions:
+            with pytest.raises(multi_model.ModelLoadError):
+                await store.get("model", version)
+
+    asyncio.run(request("1", "2", "3", "2", "1"))
+
+    # "1" was forgotten to make room for "3", "2" was still refused without a download
+    assert loads == ["1", "2", "3", "1"]
+    assert list(store._refused) == [("model", "2"), ("model", "1")]
+
+
+def test_not_ready_while_the_registry_is_unreachable(multi_model):
+    response = _get(multi_model, "/ready")
+
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Model registry unreachable"
+
+
+def test_ready_when_the_registry_answers(multi_model, monkeypatch):
+    requested = []
+
+    async def registry_health(self, url, **kwargs):
+        requested.append(url)
+        return httpx.Response(200, text="OK")
+
+    monkeypatch.setattr(httpx.AsyncClient, "get", registry_health)
+
+    response = _get(multi_model, "/ready")
+
+    assert response.status_code == 200
+    assert requested == ["http://127.0.0.1:9/health"]
+
+
+def test_only_deployed_versions_are_served(multi_model, monkeypatch):
+    monkeypatch.setenv("MODEL_ADMIN_TOKEN", "token")
+    monkeypatch.setenv("DEPLOYED_MODEL_0123", json.dumps({"name": "scoring", "version": "3"}))
+    sys.modules.pop(MULTI_MODEL_MODULE, None)
+    multi_model = importlib.import_module(MULTI_MODEL_MODULE)
+    loads = []
+    model = MagicMock()
+    model.predict.side_effect = lambda frame: frame["x"] * 2
+
+    def load(name, version):
+        loads.append((name, version))
+        return multi_model.LoadedModel(name, version, model, 1)
+
+    monkeypatch.setattr(multi_model, "_load_model", load)
+    body = {"inputs": {"x": 1.0}}
+
+    deployed = _request(multi_model, "POST", "/models/scoring/3/predict", json=body)
+    not_deployed = _request(multi_model, "POST", "/models/scoring/4/predict", json=body)
+    unauthorized = _request(multi_model, "PUT", "/admin/models/scoring/4")
+    added = _request(multi_model, "PUT", "/admin/models/scoring/4", headers={"Authorization": "Bearer token"})
+    newly_deployed = _request(multi_model, "POST", "/models/scoring/4/predict", json=body)
+
+    assert deployed.json() == {"outputs": [2.0]}
+    assert not_deployed.status_code == 404
+    assert unauthorized.status_code == 401
+    assert added.status_code == 200
+    assert newly_deployed.json() == {"outputs": [2.0]}
+    assert loads == [("scoring", "3"), ("scoring", "4")]
@@ -0,0 +1,65 @@
+import importlib
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def native_threads(monkeypatch, tmp_path):
+    module = importlib.import_module("backend.domain.entities.docker.native_threads_template")
+    monkeypatch.setattr(module, "CGROUP_V2_CPU_MAX", str(tmp_path / "cpu.max"))
+    monkeypatch.setattr(module, "CGROUP_V1_CPU_QUOTA", str(tmp_path / "cpu.cfs_quota_us"))
+    monkeypatch.setattr(module, "CGROUP_V1_CPU_PERIOD", str(tmp_path / "cpu.cfs_period_us"))
+    for name in module.THREAD_ENV_VARS:
+        monkeypatch.delenv(name, raising=False)
+    return module
+
+
+class TestNativeThreadCount:
+    def test_auto_follows_cpu_limit_rounded_down(self, native_threads, tmp_path):
+        (tmp_path / "cpu.max").write_text("250000 100000\n")
+
+        assert native_threads.native_thread_count("auto") == 2
+
+    def test_auto_shares_cpu_limit_between_prediction_processes(self, native_threads, tmp_path):
+        (tmp_path / "cpu.max").write_text("800000 100000\n")
+
+        assert native_threads.native_thread_count("auto", processes=3) == 2
+
+    def test_at_least_one_thread(self, native_threads, tmp_path):
+        (tmp_path / "cpu.max").write_text("50000 100000\n")
+
+        assert native_threads.native_thread_count("auto", processes=4) == 1
+
+    def test_auto_without_limit_uses_the_cpus_of_the_process(self, native_threads, tmp_path):
+        (tmp_path / "cpu.max").write_text("max 100000\n")
+
+        assert native_threads.native_thread_count("auto") == len(os.sched_getaffinity(0))
+
+    def test_explicit_count_overrides_the_limit(self, native_threads, tmp_path):
+        (tmp_path / "cpu.max").write_text("100000 100000\n")
+
+        assert native_threads.native_thread_count("6") == 6
+
+
+class TestConfigureNativeThreads:
+    def test_sets_the_thread_variables_of_every_library(self, native_threads, monkeypatch, tmp_path):
+        (tmp_path / "cpu.cfs_quota_us").write_text("200000\n")
+        (tmp_path / "cpu.cfs_period_us").write_text("100000\n")
+        monkeypatch.setattr(native_threads, "threadpoolctl", None)
+
+        settings = native_threads.configure_native_threads()
+
+        assert settings == {"threads": 2, "cpu_limit": 2, "processes": 1}
+        assert {os.environ[name] for name in native_threads.THREAD_ENV_VARS} == {"2"}
+
+    def test_limits_the_pools_already_loaded(self, native_threads, monkeypatch, tmp_path):
+        (tmp_path / "cpu.max").write_text("400000 100000\n")
+        monkeypatch.setenv("NATIVE_THREADS", "auto")
+        threadpoolctl = MagicMock()
+        monkeypatch.setattr(native_threads, "threadpoolctl", threadpoolctl)
+
+        native_threads.configure_native_threads(processes=2)
+
+        threadpoolctl.threadpool_limits.assert_called_once_with(limits=2)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from backend.domain.entities.docker.onnx_conversion_template import compare_predictions, sample_inputs
+
+
+class TestSampleInputs:
+    def test_rows_follow_the_signature_types(self):
+        dtypes = {"a": np.dtype(np.float64), "b": np.dtype(np.int64), "c": np.dtype(np.bool_)}
+
+        sample = sample_inputs(dtypes, 10)
+
+        assert list(sample.columns) == ["a", "b", "c"]
+        assert len(sample) == 10
+        assert dict(sample.dtypes) == dtypes
+
+    def test_rows_are_seeded(self):
+        dtypes = {"a": np.dtype(np.float32)}
+
+        assert sample_inputs(dtypes, 5).equals(sample_inputs(dtypes, 5))
+
+
+class TestComparePredictions:
+    def test_labels_must_match_exactly(self):
+        result = compare_predictions(np.array([0, 1, 1]), np.array([0, 1, 0]))
+
+        assert result["passed"] is False
+        assert result["mismatched_rows"] == 1
+
+    def test_scores_match_within_float32_tolerance(self):
+        expected = np.array([[0.2, 0.8], [0.5, 0.5]])
+        actual = expected.astype(np.float32)
+
+        result = compare_predictions(actual, expected)
+
+        assert result["passed"] is True
+        assert result["max_abs_diff"] < 1e-6
+
+    def test_single_column_output_is_compared_to_flat_predictions(self):
+        result = compare_predictions(np.array([[1.5], [2.5]], dtype=np.float32), np.array([1.5, 2.5]))
+
+        assert result["passed"] is True
+
+    def test_shape_mismatch_fails_every_row(self):
+        result = compare_predictions(np.array([[0.2, 0.8]]), np.array([1]))
+
+        assert result == {"rows": 1, "passed": False, "max_abs_diff": None, "mismatched_rows": 1}
@@ -0,0 +1,55 @@
+import pytest
+from pydantic import ValidationError
+
+from backend.domain.entities.serving_config import ServingConfig
+
+
+class TestServingConfig:
+    def test_unset_fields_produce_no_env_vars(self):
+        assert ServingConfig().to_env_vars() == {}
+
+    def test_prediction_cache_settings_map_to_template_env_vars(self):
+        config = ServingConfig(prediction_cache=True, prediction_cache_max_size=500, prediction_cache_ttl_seconds=60)
+
+        assert config.to_env_vars() == {
+            "PREDICTION_CACHE_ENABLED": "true",
+            "PREDICTION_CACHE_MAX_SIZE": "500",
+            "PREDICTION_CACHE_TTL_SECONDS": "60.0",
+        }
+
+    def test_booleans_are_lowercased(self):
+        assert ServingConfig(prediction_cache=False).to_env_vars() == {"PREDICTION_CACHE_ENABLED": "false"}
+
+    def test_warmup_requests_can_be_disabled(self):
+        assert ServingConfig(warmup_requests=0).to_env_vars() == {"WARMUP_REQUESTS": "0"}
+
+    def test_admission_limits_map_to_template_env_vars(self):
+        config = ServingConfig(max_concurrent_requests=8, max_queued_requests=16)
+
+        assert config.to_env_vars() == {"MAX_CONCURRENT_REQUESTS": "8", "MAX_QUEUED_REQUESTS": "16"}
+
+    def test_serving_workers_accepts_auto_or_a_count(self):
+        assert ServingConfig(serving_workers="auto").to_env_vars() == {"SERVING_WORKERS": "auto"}
+        assert ServingConfig(serving_workers="4").to_env_vars() == {"SERVING_WORKERS": "4"}
+        with pytest.raises(ValidationError):
+            ServingConfig(serving_workers="0")
+
+    def test_rejects_non_positive_cache_size(self):
+        with pytest.raises(ValidationError):
+            ServingConfig(prediction_cache_max_size=0)
+
+    def test_model_memory_budget_maps_to_multi_model_env_var(self):
+        assert ServingConfig(model_memory_budget_mb=512).to_env_vars() == {"MODEL_MEMORY_BUDGET_MB": "512"}
+
+    def test_onnx_conversion_enables_onnx_runtime_in_the_pod(self):
+        assert ServingConfig(onnx_conversion=True).to_env_vars() == {"ONNX_RUNTIME_ENABLED": "true"}
+
+    def test_traffic_capture_settings_map_to_template_env_vars(self):
+        env_vars = ServingConfig(traffic_capture=True, traffic_capture_sample_size=500).to_env_vars()
+        assert env_vars == {"TRAFFIC_CAPTURE_ENABLED": "true", "TRAFFIC_CAPTURE_SAMPLE_SIZE": "500"}
+
+    def test_native_threads_accepts_auto_or_a_count(self):
+        assert ServingConfig(native_threads="auto").to_env_vars() == {"NATIVE_THREADS": "auto"}
+        assert ServingConfig(native_threads="2").to_env_vars() == {"NATIVE_THREADS": "2"}
+        with pytest.raises(ValidationError):
+            ServingConfig(native_threads="0")
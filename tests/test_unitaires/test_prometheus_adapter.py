@@ -157,3 +157,66 @@ async def test_get_fleet_metrics():
             assert len(result) == 3
             assert result[0]["success_rate"] == 95.0
             assert result[2]["error_rate"] == 8.0
+
+
+@pytest.mark.asyncio
+async def test_get_version_comparison():
+    """Test per-version latency and shadow agreement of a deployment splitting its traffic."""
+    adapter = PrometheusAdapter()
+
+    incumbent = {"target_version": "1", "role": "incumbent"}
+    candidate = {"target_version": "2", "role": "candidate"}
+    with patch.object(adapter, "_execute_vector_query", new_callable=AsyncMock) as mock_query:
+        # requests, p50, p95, agreement
+        mock_query.side_effect = [
+            [(incumbent, 1000), (candidate, 990)],
+            [(incumbent, 0.004), (candidate, 0.006)],
+            [(incumbent, 0.009)],
+            [({"target_version": "2", "result": "agree"}, 891), ({"target_version": "2", "result": "disagree"}, 99)],
+        ]
+
+        result = await adapter.get_version_comparison("credit-v1-prod", "1d")
+
+    assert result == [
+        {
+            "target_version": "1",
+            "role": "incumbent",
+            "total_requests": 1000,
+            "p50_latency_ms": 4.0,
+            "p95_latency_ms": 9.0,
+            "agreement_rate": None,
+        },
+        {
+            "target_version": "2",
+            "role": "candidate",
+            "total_requests": 990,
+            "p50_latency_ms": 6.0,
+            "p95_latency_ms": None,
+            "agreement_rate": 90.0,
+        },
+    ]
+    assert 'job="credit-v1-prod"' in mock_query.call_args_list[0].args[0]
+
+
+@pytest.mark.asyncio
+async def test_execute_vector_query_skips_nan():
+    """Histogram quantiles of series without observations are NaN."""
+    adapter = PrometheusAdapter()
+
+    mock_response = MagicMock()
+    mock_response.json.return_value = {
+        "status": "success",
+        "data": {
+            "result": [
+                {"metric": {"target_version": "1"}, "value": [0, "0.5"]},
+                {"metric": {"target_version": "2"}, "value": [0, "NaN"]},
+            ]
+        },
+    }
+
+    with patch.object(adapter.client, "get", new_callable=AsyncMock) as mock_get:
+        mock_get.return_value = mock_response
+
+        result = await adapter._execute_vector_query("test_query")
+
+    assert result == [({"target_version": "1"}, 0.5)]
@@ -1,4 +1,5 @@
 # Philippe Stepniewski
+import json
 import os
 from unittest.mock import MagicMock, patch
 
@@ -6,7 +7,7 @@ import pytest
 
 os.environ.setdefault("PATH_LOG_EVENTS", "/tmp/test_log_events")
 
-from backend.domain.entities.batch_prediction import BatchPrediction, BatchPredictionStatus
+from backend.domain.entities.batch_prediction import BatchFileFormat, BatchPrediction, BatchPredictionStatus
 from backend.domain.entities.project import Project
 from backend.domain.use_cases.batch_predict import (
     delete_batch_prediction,
@@ -111,6 +112,38 @@ def test_get_status_delegates_to_handler(mock_batch_handler, sample_batch_predic
     assert result["status"] == "pending"
 
 
+def test_status_reports_the_rows_of_the_progress_manifests(
+    mock_batch_handler, mock_object_storage, sample_batch_prediction
+):
+    sample_batch_prediction.status = BatchPredictionStatus.RUNNING
+    sample_batch_prediction.shards = 2
+    mock_batch_handler.get_job_status.return_value = sample_batch_prediction
+    manifests = {
+        "my-model/1/abc12345/checkpoints/manifest-00000.json": {"shard": 0, "rows": 300, "input_rows": 500},
+        "my-model/1/abc12345/checkpoints/manifest-00001.json": {"shard": 1, "rows": 100, "input_rows": 500},
+    }
+    mock_object_storage.list_files.return_value = list(manifests)
+    mock_object_storage.download_file.side_effect = lambda project, path: json.dumps(manifests[path]).encode()
+
+    result = get_batch_prediction_status("test-project", "abc12345", mock_batch_handler, mock_object_storage)
+
+    mock_object_storage.list_files.assert_called_once_with("test-project", "my-model/1/abc12345/checkpoints/manifest-")
+    assert result["row_count"] == 400
+    assert result["progress"] == 0.4
+
+
+def test_status_without_input_size_has_rows_but_no_progress(
+    mock_batch_handler, mock_object_storage, sample_batch_prediction
+):
+    mock_batch_handler.get_job_status.return_value = sample_batch_prediction
+    mock_object_storage.list_files.return_value = ["manifest-00000.json"]
+    mock_object_storage.download_file.return_value = b'{"shard": 0, "rows": 42, "input_rows": null}'
+
+    result = get_batch_prediction_status("test-project", "abc12345", mock_batch_handler, mock_object_storage)
+
+    assert (result["row_count"], result["progress"]) == (42, None)
+
+
 def test_list_delegates_to_handler(mock_batch_handler, sample_batch_prediction):
     mock_batch_handler.list_batch_jobs.return_value = [sample_batch_prediction]
 
@@ -125,12 +158,73 @@ def test_download_returns_file_content(mock_batch_handler, mock_object_storage,
     mock_batch_handler.get_job_status.return_value = sample_batch_prediction
     mock_object_storage.download_file.return_value = b"prediction\n0.95\n0.32"
 
-    result = download_batch_result("test-project", "abc12345", mock_batch_handler, mock_object_storage)
+    filename, content = download_batch_result("test-project", "abc12345", mock_batch_handler, mock_object_storage)
 
     mock_object_storage.download_file.assert_called_once_with(
         "test-project", "my-model/1/abc12345/predictions-abc12345.csv"
     )
-    assert result == b"prediction\n0.95\n0.32"
+    assert filename == "predictions-abc12345.csv"
+    assert content == b"prediction\n0.95\n0.32"
+
+
+def test_download_follows_the_output_format_of_the_job(
+    mock_batch_handler, mock_object_storage, sample_batch_prediction
+):
+    sample_batch_prediction.output_path = "test-project/my-model/1/abc12345/predictions-abc12345.parquet"
+    mock_batch_handler.get_job_status.return_value = sample_batch_prediction
+
+    filename, _ = download_batch_result("test-project", "abc12345", mock_batch_handler, mock_object_storage)
+
+    mock_object_storage.download_file.assert_called_once_with(
+        "test-project", "my-model/1/abc12345/predictions-abc12345.parquet"
+    )
+    assert filename == "predictions-abc12345.parquet"
+
+
+def test_submit_keeps_the_detected_input_format_for_the_output(
+    mock_batch_handler, mock_object_storage, mock_project_db_handler, sample_batch_prediction
+):
+    mock_batch_handler.create_batch_job.return_value = sample_batch_prediction
+
+    submit_batch_prediction(
+        project_name="test-project",
+        model_name="my-model",
+        version="1",
+        file_content=b"PAR1...PAR1",
+        job_id="abc12345",
+        object_storage=mock_object_storage,
+        batch_handler=mock_batch_handler,
+        project_db_handler=mock_project_db_handler,
+    )
+
+    mock_object_storage.upload_file.assert_called_once_with(
+        "test-project", "my-model/1/abc12345/input.parquet", b"PAR1...PAR1"
+    )
+    _, _, _, input_path, output_path, _ = mock_batch_handler.create_batch_job.call_args.args
+    assert input_path == "test-project/my-model/1/abc12345/input.parquet"
+    assert output_path == "test-project/my-model/1/abc12345/predictions-abc12345.parquet"
+
+
+def test_submit_converts_to_the_requested_output_format(
+    mock_batch_handler, mock_object_storage, mock_project_db_handler, sample_batch_prediction
+):
+    mock_batch_handler.create_batch_job.return_value = sample_batch_prediction
+
+    submit_batch_prediction(
+        project_name="test-project",
+        model_name="my-model",
+        version="1",
+        file_content=b"col1,col2\n1,2",
+        job_id="abc12345",
+        object_storage=mock_object_storage,
+        batch_handler=mock_batch_handler,
+        project_db_handler=mock_project_db_handler,
+        output_format=BatchFileFormat.ARROW,
+    )
+
+    _, _, _, input_path, output_path, _ = mock_batch_handler.create_batch_job.call_args.args
+    assert input_path.endswith("/input.csv")
+    assert output_path.endswith("/predictions-abc12345.arrow")
 
 
 def test_delete_cleans_up_job_and_storage(mock_batch_handler, mock_object_storage, sample_batch_prediction):
@@ -234,3 +328,31 @@ def test_submit_fails_if_build_fails(
 
     assert exc_info.value.status_code == 500
     assert "Failed to build model image" in exc_info.value.detail
+
+
+def test_batch_file_format_detection_from_magic_bytes():
+    assert BatchFileFormat.detect(b"PAR1\x15\x04") == BatchFileFormat.PARQUET
+    assert BatchFileFormat.detect(b"ARROW1\x00\x00") == BatchFileFormat.ARROW
+    assert BatchFileFormat.detect(b"\xff\xff\xff\xff\x78\x00") == BatchFileFormat.ARROW
+    assert BatchFileFormat.detect(b"col1,col2\n1,2") == BatchFileFormat.CSV
+
+
+def test_submit_passes_the_sharding_to_the_job(
+    mock_batch_handler, mock_object_storage, mock_project_db_handler, sample_batch_prediction
+):
+    mock_batch_handler.create_batch_job.return_value = sample_batch_prediction
+
+    submit_batch_prediction(
+        project_name="test-project",
+        model_name="my-model",
+        version="1",
+        file_content=b"col1,col2\n1,2",
+        job_id="abc12345",
+        object_storage=mock_object_storage,
+        batch_handler=mock_batch_handler,
+        project_db_handler=mock_project_db_handler,
+        shards=8,
+        parallelism=2,
+    )
+
+    assert mock_batch_handler.create_batch_job.call_args.kwargs == {"shards": 8, "parallelism": 2}
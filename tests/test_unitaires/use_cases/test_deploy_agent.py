@@ -3,6 +3,7 @@ from unittest.mock import MagicMock, patch
 
 os.environ.setdefault("PATH_LOG_EVENTS", "/tmp/test_log_events")
 
+from backend.domain.entities.serving_config import ServingConfig
 from backend.domain.use_cases.deploy_agent import deploy_agent, remove_agent_deployment
 
 
@@ -64,6 +65,37 @@ class TestDeployAgent:
             "proj", "my_agent", "1", "dash-uid", {}, {"MAMMOUTH_API_KEY": "sk-new"}
         )
 
+    def test_deploy_agent_merges_serving_config_into_env_vars(self):
+        agent_registry = MagicMock()
+        agent_registry.get_deployment_config.return_value = {"PG_HOST": "host.minikube.internal"}
+        k8s_agent_deployment_instance = MagicMock()
+        k8s_agent_deployment_instance.service_name = "proj-my-agent-1-deployment"
+        k8s_agent_deployment_cls = MagicMock(return_value=k8s_agent_deployment_instance)
+        dashboard_handler = MagicMock()
+        dashboard_handler.generate_dashboard_uid.return_value = "dash-uid"
+
+        with patch("backend.domain.use_cases.deploy_agent.build_model_docker_image", return_value=1):
+            deploy_agent(
+                registry=MagicMock(),
+                project_name="proj",
+                agent_name="my_agent",
+                version="1",
+                dashboard_handler=dashboard_handler,
+                agent_registry=agent_registry,
+                serving_config=ServingConfig(max_concurrent_requests=4),
+                k8s_deployment_cluster_cls=_fake_k8s_deployment_cluster(exists=False),
+                k8s_agent_deployment_cls=k8s_agent_deployment_cls,
+            )
+
+        k8s_agent_deployment_cls.assert_called_once_with(
+            "proj",
+            "my_agent",
+            "1",
+            "dash-uid",
+            {"PG_HOST": "host.minikube.internal", "MAX_CONCURRENT_REQUESTS": "4"},
+            None,
+        )
+
     def test_deploy_agent_without_agent_registry_still_deploys(self):
         k8s_agent_deployment_instance = MagicMock()
         k8s_agent_deployment_instance.service_name = "proj-my-agent-1-deployment"
@@ -0,0 +1,228 @@
+import os
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("PATH_LOG_EVENTS", "/tmp/test_log_events")
+
+from backend.domain.entities.docker.model_dependencies_template import hash_model_dependencies
+from backend.domain.entities.serving_config import ServingConfig
+from backend.domain.use_cases.deploy_model import (
+    HOT_SWAP_REDEPLOYED,
+    deploy_model_to_multi_model_pod,
+    hot_swap_model,
+    remove_multi_model_deployment,
+    split_traffic,
+)
+from backend.infrastructure.k8s_model_deployment_adapter import ModelSwapRefusedError
+
+
+def _registry(tmp_path):
+    model_path = tmp_path / "custom_model"
+    model_path.mkdir()
+    (model_path / "MLmodel").write_text("flavors: {}")
+    registry = MagicMock()
+    registry.download_model_artifacts.return_value = str(model_path)
+    return registry
+
+
+def _hot_swap(registry, k8s_model_deployment, deployment_exists=True):
+    cluster = MagicMock()
+    cluster.check_if_model_deployment_exists.return_value = deployment_exists
+    dashboard_handler = MagicMock()
+    dashboard_handler.generate_dashboard_uid.return_value = "dash-uid"
+    with (
+        patch("backend.domain.use_cases.deploy_model.K8SDeploymentClusterAdapter", return_value=cluster),
+        patch("backend.domain.use_cases.deploy_model.K8SModelDeployment", return_value=k8s_model_deployment),
+        patch("backend.domain.use_cases.deploy_model.deploy_model", return_value=1) as deploy_model,
+    ):
+        status = hot_swap_model(registry, "proj", "model", "1", "2", dashboard_handler, "user@example.com")
+    return status, deploy_model
+
+
+class TestHotSwapModel:
+    def test_swaps_new_version_into_running_deployment(self, tmp_path):
+        registry = _registry(tmp_path)
+        k8s_model_deployment = MagicMock(service_name="proj-model-1-deployment")
+
+        status, deploy_model = _hot_swap(registry, k8s_model_deployment)
+
+        assert status == 1
+        registry.download_model_artifacts.assert_called_once()
+        archive_path, version, model_uri = k8s_model_deployment.swap_model_version.call_args.args
+        assert archive_path.endswith(".tar.gz")
+        assert version == "2"
+        assert model_uri == "models:/model/2"
+        deploy_model.assert_not_called()
+
+    def test_falls_back_to_regular_deployment_when_refused(self, tmp_path):
+        k8s_model_deployment = MagicMock(service_name="proj-model-1-deployment")
+        k8s_model_deployment.swap_model_version.side_effect = ModelSwapRefusedError(409, "other dependencies")
+
+        status, deploy_model = _hot_swap(_registry(tmp_path), k8s_model_deployment)
+
+        assert status == HOT_SWAP_REDEPLOYED
+        assert deploy_model.call_args.args[1:4] == ("proj", "model", "2")
+
+    def test_failed_swap_does_not_redeploy(self, tmp_path):
+        k8s_model_deployment = MagicMock(service_name="proj-model-1-deployment")
+        k8s_model_deployment.swap_model_version.side_effect = ModelSwapRefusedError(422, "warm-up failed")
+
+        status, deploy_model = _hot_swap(_registry(tmp_path), k8s_model_deployment)
+
+        assert status == 0
+        deploy_model.assert_not_called()
+
+    def test_requires_running_deployment(self, tmp_path):
+        k8s_model_deployment = MagicMock()
+
+        status, _ = _hot_swap(_registry(tmp_path), k8s_model_deployment, deployment_exists=False)
+
+        assert status == 0
+        k8s_model_deployment.swap_model_version.assert_not_called()
+
+
+def _split_traffic(k8s_model_deployment, deployed_versions=("1", "2"), deploy_status=1):
+    cluster = MagicMock()
+    cluster.check_if_model_deployment_exists.side_effect = lambda project, model, version: version in deployed_versions
+    dashboard_handler = MagicMock()
+    dashboard_handler.generate_dashboard_uid.return_value = "dash-uid"
+    with (
+        patch("backend.domain.use_cases.deploy_model.K8SDeploymentClusterAdapter", return_value=cluster),
+        patch("backend.domain.use_cases.deploy_model.K8SModelDeployment", return_value=k8s_model_deployment),
+        patch("backend.domain.use_cases.deploy_model.deploy_model", return_value=deploy_status) as deploy_model,
+    ):
+        status = split_traffic(
+            MagicMock(), "proj", "model", "1", "2", "shadow", 0.0, dashboard_handler, "user@example.com"
+        )
+    return status, deploy_model
+
+
+class TestSplitTraffic:
+    def test_points_running_deployment_at_candidate(self):
+        k8s_model_deployment = MagicMock(service_name="proj-model-1-deployment")
+
+        status, deploy_model = _split_traffic(k8s_model_deployment)
+
+        assert status == 1
+        mode, _, weight = k8s_model_deployment.set_traffic_split.call_args.args
+        assert (mode, weight) == ("shadow", 0.0)
+        deploy_model.assert_not_called()
+
+    def test_deploys_missing_candidate_first(self):
+        k8s_model_deployment = MagicMock(service_name="proj-model-1-deployment")
+
+        status, deploy_model = _split_traffic(k8s_model_deployment, deployed_versions=("1",))
+
+        assert status == 1
+        assert deploy_model.call_args.args[1:4] == ("proj", "model", "2")
+        k8s_model_deployment.set_traffic_split.assert_called_once()
+
+    def test_failed_candidate_deployment_leaves_traffic_alone(self):
+        k8s_model_deployment = MagicMock()
+
+        status, _ = _split_traffic(k8s_model_deployment, deployed_versions=("1",), deploy_status=0)
+
+        assert status == 0
+        k8s_model_deployment.set_traffic_split.assert_not_called()
+
+    def test_refused_split_fails(self):
+        k8s_model_deployment = MagicMock(service_name="proj-model-1-deployment")
+        k8s_model_deployment.set_traffic_split.side_effect = ModelSwapRefusedError(409, "several serving workers")
+
+        status, _ = _split_traffic(k8s_model_deployment)
+
+        assert status == 0
+
+
+def _deploy_to_multi_model_pod(registry, k8s_multi_model_deployment, build_status=1):
+    with (
+        patch(
+            "backend.domain.use_cases.deploy_model.K8SMultiModelDeployment", return_value=k8s_multi_model_deployment
+        ) as deployment_cls,
+        patch("backend.domain.use_cases.deploy_model.build_model_docker_image", return_value=build_status) as build,
+    ):
+        status = deploy_model_to_multi_model_pod(registry, "proj", "model", "2", "user@example.com")
+    return status, deployment_cls, build
+
+
+class TestDeployModelToMultiModelPod:
+    def test_first_version_of_dependency_set_builds_and_creates_pod(self, tmp_path):
+        registry = _registry(tmp_path)
+        (tmp_path / "custom_model" / "requirements.txt").write_text("scikit-learn==1.5.0")
+        k8s_multi_model_deployment = MagicMock(service_name="proj-models-0123-deployment")
+        k8s_multi_model_deployment.deployment_exists.return_value = False
+
+        status, deployment_cls, build = _deploy_to_multi_model_pod(registry, k8s_multi_model_deployment)
+
+        assert status == 1
+        assert deployment_cls.call_args.args == ("proj", hash_model_dependencies(str(tmp_path / "custom_model")))
+        build.assert_called_once()
+        assert k8s_multi_model_deployment.docker_image_name == "proj-model-2-ctr"
+        # The version is saved for the pod before the pod is created
+        calls = [name for name, _, _ in k8s_multi_model_deployment.method_calls]
+        assert calls.index("deploy_model_version") < calls.index("create_model_deployment")
+        k8s_multi_model_deployment.deploy_model_version.assert_called_once_with("model", "2")
+
+    def test_existing_pod_serves_version_without_build(self, tmp_path):
+        k8s_multi_model_deployment = MagicMock(service_name="proj-models-0123-deployment")
+        k8s_multi_model_deployment.deployment_exists.return_value = True
+
+        status, _, build = _deploy_to_multi_model_pod(_registry(tmp_path), k8s_multi_model_deployment)
+
+        assert status == 1
+        build.assert_not_called()
+        k8s_multi_model_deployment.deploy_model_version.assert_called_once_with("model", "2")
+        k8s_multi_model_deployment.create_model_deployment.assert_not_called()
+
+    def test_version_refused_by_a_running_pod_fails(self, tmp_path):
+        k8s_multi_model_deployment = MagicMock(service_name="proj-models-0123-deployment")
+        k8s_multi_model_deployment.deployment_exists.return_value = True
+        k8s_multi_model_deployment.deploy_model_version.side_effect = ModelSwapRefusedError(503, "pod unreachable")
+
+        status, _, _ = _deploy_to_multi_model_pod(_registry(tmp_path), k8s_multi_model_deployment)
+
+        assert status == 0
+
+    def test_failed_build_creates_no_pod(self, tmp_path):
+        k8s_multi_model_deployment = MagicMock()
+        k8s_multi_model_deployment.deployment_exists.return_value = False
+
+        status, _, _ = _deploy_to_multi_model_pod(_registry(tmp_path), k8s_multi_model_deployment, build_status=0)
+
+        assert status == 0
+        k8s_multi_model_deployment.deploy_model_version.assert_not_called()
+        k8s_multi_model_deployment.create_model_deployment.assert_not_called()
+
+    def test_several_serving_workers_are_refused(self, tmp_path):
+        registry = _registry(tmp_path)
+
+        with patch("backend.domain.use_cases.deploy_model.K8SMultiModelDeployment") as deployment_cls:
+            status = deploy_model_to_multi_model_pod(
+                registry, "proj", "model", "2", serving_config=ServingConfig(serving_workers="auto")
+            )
+
+        assert status == 0
+        deployment_cls.assert_not_called()
+        registry.download_model_artifacts.assert_not_called()
+
+
+def test_multi_model_pod_is_removed_by_its_dependency_set():
+    with patch("backend.domain.use_cases.deploy_model.K8SMultiModelDeployment") as deployment_cls:
+        deployment_cls.return_value = MagicMock(
+            model_name="models", model_version="0123456789ab", service_name="proj-models-0123456789ab-deployment"
+        )
+        assert remove_multi_model_deployment("proj", "0123456789ab", "user@example.com")
+
+    assert deployment_cls.call_args.args == ("proj", "0123456789ab")
+    deployment_cls.return_value.delete_model_deployment.assert_called_once()
+
+
+def test_dependency_hash_ignores_model_weights(tmp_path):
+    for name in ("v1", "v2"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "requirements.txt").write_text("scikit-learn==1.5.0")
+        (tmp_path / name / "model.pkl").write_bytes(name.encode())
+    (tmp_path / "v3").mkdir()
+    (tmp_path / "v3" / "requirements.txt").write_text("scikit-learn==1.6.0")
+
+    assert hash_model_dependencies(str(tmp_path / "v1")) == hash_model_dependencies(str(tmp_path / "v2"))
+    assert hash_model_dependencies(str(tmp_path / "v1")) != hash_model_dependencies(str(tmp_path / "v3"))
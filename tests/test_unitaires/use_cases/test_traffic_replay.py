@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+os.environ.setdefault("PATH_LOG_EVENTS", "/tmp/test_log_events")
+
+from backend.domain.entities.model_deployment import ModelDeployment
+from backend.domain.use_cases.traffic_replay import (
+    TrafficReplayer,
+    load_captured_traffic,
+    replay_traffic,
+    summarize_step,
+)
+
+
+def _window(started_at, ended_at, requests_seen, bodies):
+    return {
+        "model_version": "1",
+        "started_at": started_at,
+        "ended_at": ended_at,
+        "requests_seen": requests_seen,
+        "oversize": 0,
+        "samples": [
+            {"t": started_at + i, "content_type": "application/json", "accept": "", "body": base64.b64encode(body)}
+            for i, body in enumerate(bodies)
+        ],
+    }
+
+
+@pytest.fixture
+def object_storage():
+    windows = {
+        # Two serving workers capturing over the same 100 s, then a later window
+        "model/1/captures/1000-pod-1.json": _window(1000, 1100, 300, [b'{"inputs": {"a": 1}}']),
+        "model/1/captures/1000-pod-2.json": _window(1000, 1100, 200, [b'{"inputs": {"a": 2}}']),
+        "model/1/captures/2000-pod-1.json": _window(2000, 2100, 500, [b'{"inputs": {"a": 3}}']),
+    }
+    storage = MagicMock()
+    storage.list_files.return_value = list(windows)
+    storage.download_file.side_effect = lambda project, path: json.dumps(
+        {**windows[path], "samples": [{**s, "body": s["body"].decode()} for s in windows[path]["samples"]]}
+    ).encode()
+    return storage
+
+
+class TestLoadCapturedTraffic:
+    def test_recorded_rate_counts_overlapping_windows_once(self, object_storage):
+        captured = load_captured_traffic("proj", "model", "1", object_storage)
+
+        assert captured["requests_seen"] == 1000
+        assert captured["recorded_rps"] == 5.0
+        object_storage.list_files.assert_called_once_with("proj", "model/1/captures/")
+
+    def test_samples_are_replayed_in_recorded_order(self, object_storage):
+        captured = load_captured_traffic("proj", "model", "1", object_storage)
+
+        assert [sample["body"] for sample in captured["samples"]] == [
+            b'{"inputs": {"a": 1}}',
+            b'{"inputs": {"a": 2}}',
+            b'{"inputs": {"a": 3}}',
+        ]
+
+    def test_no_capture_raises(self):
+        storage = MagicMock()
+        storage.list_files.return_value = []
+
+        with pytest.raises(ValueError):
+            load_captured_traffic("proj", "model", "1", storage)
+
+
+class TestSummarizeStep:
+    def test_percentiles_of_successful_calls(self):
+        results = [(True, i / 1000) for i in range(1, 101)]
+
+        step = summarize_step(1.0, 10.0, 10.0, results)
+
+        assert (step["p50_ms"], step["p95_ms"], step["p99_ms"]) == (50.0, 95.0, 99.0)
+        assert step["achieved_rps"] == 10.0
+        assert step["saturated"] is False
+
+    def test_falling_behind_target_rate_is_saturation(self):
+        step = summarize_step(4.0, 40.0, 10.0, [(True, 0.01)] * 300)
+
+        assert step["saturated"] is True
+
+    def test_errors_are_saturation(self):
+        step = summarize_step(1.0, 10.0, 10.0, [(True, 0.01)] * 95 + [(False, 0.01)] * 5)
+
+        assert step["errors"] == 5
+        assert step["saturated"] is True
+
+
+class TestTrafficReplayer:
+    def test_step_sends_captured_bodies_with_their_headers(self):
+        received = []
+
+        def handler(request):
+            received.append((request.headers["content-type"], request.content))
+            return httpx.Response(200, json={"outputs": [1]})
+
+        samples = [{"content_type": "application/msgpack", "accept": "application/json", "body": b"\x81"}]
+        replayer = TrafficReplayer("http://candidate/predict", samples, recorded_rps=50.0, step_seconds=0.1)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await replayer.run_step(client, 2.0)
+
+        step = asyncio.run(run())
+
+        assert step["requests"] == 10
+        assert step["errors"] == 0
+        assert received[0] == ("application/msgpack", b"\x81")
+
+    def test_multipliers_must_be_positive(self):
+        with pytest.raises(ValueError):
+            TrafficReplayer("http://candidate/predict", [], recorded_rps=10.0, multipliers=(0.0, 2.0))
+
+    def test_run_stops_at_saturation_point(self):
+        replayer = TrafficReplayer("http://candidate/predict", [], recorded_rps=10.0, multipliers=(1.0, 2.0, 4.0))
+        steps = [
+            summarize_step(1.0, 10.0, 1.0, [(True, 0.01)] * 10),
+            summarize_step(2.0, 20.0, 1.0, [(True, 0.01)] * 12),
+        ]
+
+        with patch.object(TrafficReplayer, "run_step", side_effect=steps) as run_step:
+            result = asyncio.run(replayer.run())
+
+        assert run_step.call_count == 2
+        assert result["saturation_point"] == {"multiplier": 2.0, "target_rps": 20.0}
+        assert result["max_sustained_rps"] == 10.0
+
+
+def test_replay_report_is_stored_with_candidate_model_info(object_storage):
+    model_info_db_handler = MagicMock()
+    deployment = ModelDeployment(
+        project_name="proj",
+        model_name="model",
+        model_version="2",
+        deployment_name="proj-model-2-deployment",
+        deployment_date=0,
+        dashboard_uid="uid",
+    )
+    result = {"steps": [], "saturation_point": None, "max_sustained_rps": 5.0}
+
+    with (
+        patch("backend.domain.use_cases.traffic_replay.find_model_deployment", return_value=deployment),
+        patch.object(TrafficReplayer, "run", return_value=result),
+    ):
+        status = replay_traffic("proj", "model", "1", "2", object_storage, model_info_db_handler, replay_id="r1")
+
+    assert status == 1
+    remote_path, content = object_storage.upload_file.call_args.args[1:]
+    assert remote_path == "model/2/replays/r1/report.json"
+    report = json.loads(content)
+    assert report["endpoint_url"] == "http://proj-model-2-deployment.proj.svc.cluster.local:8000/predict"
+    assert report["recorded_rps"] == 5.0
+    model_name, version, project_name, stored = model_info_db_handler.update_replay_report.call_args.args
+    assert (model_name, version, project_name) == ("model", "2", "proj")
+    assert json.loads(stored) == report